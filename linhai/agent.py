@@ -1,6 +1,5 @@
 """Agent核心模块，负责处理消息、调用工具和管理状态。"""
 
-import json
 from pathlib import Path
 import datetime
 from pathlib import Path
@@ -13,22 +12,23 @@ from typing import (
     Any,
     TypeAlias,
     Sequence,
+    Literal,
 )
 
 import asyncio
 import logging
-import json
 import traceback
 import datetime
-import random
+import sqlite3
 from asyncio import Queue, QueueEmpty
 
+from linhai import json_backend
 from linhai.agent_base import (
     RuntimeMessage,
-    DestroyedRuntimeMessage,
     GlobalMemory,
 )
 from linhai.markdown_parser import extract_tool_calls_with_errors
+from linhai.generation_state import GenerationState
 from linhai.llm import (
     Message,
     ChatMessage,
@@ -43,11 +43,28 @@ from linhai.llm import (
     LanguageModelMessage,
 )
 from linhai.type_hints import AgentState
-from linhai.config import load_config
+from linhai.config import load_config, HistoryConfig
 from linhai.tool.main import ToolManager
 from linhai.prompt import DEFAULT_SYSTEM_PROMPT
-from linhai.agent_plugin import register_default_plugins
-from linhai.agent_workflow import compress_history_range
+from linhai.agent_plugin import (
+    register_default_plugins,
+    OversizedOutputDigestPlugin,
+    RepetitionPlugin,
+    ReasoningBudgetConfig,
+    ReasoningBudgetPlugin,
+)
+from linhai.agent_workflow import compress_history_range, compress_history_local
+from linhai.history import HistoryStore, SessionLease
+from linhai.history_summary import HistorySummarizer
+from linhai.history_compressor import estimate_message_tokens
+from linhai.eviction import (
+    DEFAULT_EVICTION_POLICY,
+    DEFAULT_TARGET_RATIO,
+    evict_messages,
+    get_eviction_policy,
+)
+from linhai.history_index import HistoryIndex, SessionMetadata, maintain_history
+from linhai.repetition import RepetitionConfig, RepetitionDetector
 
 logger = logging.getLogger(__name__)
 
@@ -59,9 +76,20 @@ class AgentConfig(TypedDict):
     model: LanguageModel
     compress_threshold_soft: int
     compress_threshold_hard: int
+    # 达到硬限制时的压缩策略：local先在本地压缩，不够时再让LLM选择范围；llm直接让LLM选择范围
+    compress_strategy: NotRequired[Literal["local", "llm"]]
+    local_compress_keep_recent: NotRequired[int]  # 本地压缩时保持不变的最近消息数量
+    eviction_policy: NotRequired[str]  # thanox_history使用的淘汰策略
+    eviction_target_ratio: NotRequired[float]  # thanox_history删除后保留的token比例
     memory: NotRequired[dict]  # 可选 memory 字段
     tool_confirmation: NotRequired[dict]  # 可选 tool_confirmation 字段
     cheap_model: NotRequired[LanguageModel]  # 可选廉价LLM字段
+    fast_model: NotRequired[LanguageModel]  # 可选不思考的LLM，思考超过预算时使用
+    history: NotRequired[HistoryConfig]  # 可选历史存储配置
+    digest_oversized_outputs: NotRequired[bool]  # 是否为超长工具输出生成摘要
+    digest_timeout_seconds: NotRequired[float]  # 生成回复前最多等待摘要的秒数
+    repetition: NotRequired[RepetitionConfig]  # 生成时的重复检测配置
+    reasoning_budget: NotRequired[ReasoningBudgetConfig]  # 思考预算配置
 
 
 class CheapLlmStatusMessage:
@@ -126,11 +154,11 @@ class CheapLlmStatusMessage:
 
     def to_json(self) -> str:
         data = {"is_cheap_llm_available": self.is_cheap_llm_available}
-        return json.dumps(data)
+        return json_backend.dumps(data)
 
     @classmethod
     def from_json(cls, json_str: str):
-        data = json.loads(json_str)
+        data = json_backend.loads(json_str)
         return cls(is_cheap_llm_available=data["is_cheap_llm_available"])
 
 
@@ -160,6 +188,11 @@ DuringMessageGenerationCallback: TypeAlias = Callable[
     Awaitable[bool],  # 返回True表示中断，False表示继续
 ]
 
+MessageDeltaCallback: TypeAlias = Callable[
+    ["Agent", Answer, AnswerToken, GenerationState],  # agent, answer, token, state
+    Awaitable[bool],  # 返回True表示中断，False表示继续
+]
+
 
 class Lifecycle:
     """生命周期回调管理器，使用明确的参数传递。"""
@@ -176,6 +209,7 @@ class Lifecycle:
         self._during_message_generation_callbacks: list[
             DuringMessageGenerationCallback
         ] = []
+        self._message_delta_callbacks: list[MessageDeltaCallback] = []
 
     def register_before_message_generation(
         self, callback: BeforeMessageGenerationCallback
@@ -200,9 +234,27 @@ class Lifecycle:
     def register_during_message_generation(
         self, callback: DuringMessageGenerationCallback
     ):
-        """注册消息生成中的回调。"""
+        """注册消息生成中的回调，每个token都会传入完整的当前回答。"""
         self._during_message_generation_callbacks.append(callback)
 
+    def register_message_delta(self, callback: MessageDeltaCallback):
+        """注册消息生成中的增量回调，每个token只传入新的token和增量状态。"""
+        self._message_delta_callbacks.append(callback)
+
+    async def trigger_message_delta(
+        self, agent: "Agent", answer: Answer, token: AnswerToken, state: GenerationState
+    ) -> bool:
+        """触发消息生成中的增量事件，state需要已经用token更新。"""
+        should_interrupt = False
+        for callback in self._message_delta_callbacks:
+            try:
+                result = await callback(agent, answer, token, state)
+                if result:
+                    should_interrupt = True
+            except Exception as e:
+                logger.error("Message delta callback error: %s", e)
+        return should_interrupt
+
     async def trigger_during_message_generation(
         self, agent: "Agent", answer: Answer, current_content: str
     ) -> bool:
@@ -297,12 +349,35 @@ class Agent:
 
         self.messages: list[Message] = list(init_messages)
 
+        # 历史会话ID，每个Agent实例的历史只保存在一个文件中
+        session_start = datetime.datetime.now()
+        model_name = getattr(config["model"], "model", "")
+        self.session_id = session_start.isoformat().replace(":", "-")
+        self.session_metadata: SessionMetadata = {
+            "start_time": session_start.isoformat(timespec="seconds"),
+            "model": model_name if isinstance(model_name, str) else "",
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "total_tokens": 0,
+            "tools_used": [],
+        }
+        self._history_maintenance_task: asyncio.Task | None = None
+        # 持有会话租约期间，其他进程中的历史维护不会关闭或删除这个会话
+        self._history_lease: SessionLease | None = None
+        # 上一次成功写入索引的历史，索引时跳过与之相同的前缀
+        self._indexed_history: list[dict] = []
+
+        # 为被压缩的历史在后台生成摘要
+        self.history_summarizer = HistorySummarizer()
+
         self.last_token_usage = None
         self.current_enable_compress = True
         self.soft_compress_triggered = False  # 软压缩限制触发标志
 
         # 廉价LLM状态跟踪
         self.cheap_llm_remaining_messages = 0
+        # 只用于下一次回答的模型，例如思考超过预算后改用不思考的模型
+        self.model_override: LanguageModel | None = None
 
         # Plugin使用的变量
         self.current_disable_waiting_user_warning = False
@@ -311,6 +386,17 @@ class Agent:
         self.lifecycle = Lifecycle()
         # 注册默认Plugin
         register_default_plugins(self.lifecycle)
+        if self.config.get("digest_oversized_outputs", False):
+            OversizedOutputDigestPlugin(
+                timeout_seconds=self.config.get("digest_timeout_seconds", 2)
+            ).register(self.lifecycle)
+        repetition_config = self.config.get("repetition", {})
+        if repetition_config.get("enabled", True):
+            RepetitionPlugin(repetition_config).register(self.lifecycle)
+        if "reasoning_budget" in self.config:
+            ReasoningBudgetPlugin(self.config["reasoning_budget"]).register(
+                self.lifecycle
+            )
 
         # 解析tool_confirmation配置并存储
         tool_confirmation_config = self.config.get("tool_confirmation", {})
@@ -359,7 +445,9 @@ class Agent:
         if self.last_token_usage and self.last_token_usage > self.config.get(
             "compress_threshold_soft", int(65536 * 0.5)
         ):
-            hard_threshold = self.config.get("compress_threshold_hard", int(65536 * 0.8))
+            hard_threshold = self.config.get(
+                "compress_threshold_hard", int(65536 * 0.8)
+            )
             percentage = (self.last_token_usage / hard_threshold) * 100
             remaining = hard_threshold - self.last_token_usage
             self.messages.append(
@@ -372,7 +460,12 @@ class Agent:
             "compress_threshold_hard", int(65536 * 0.8)
         ):
             # await self.compress()
-            await compress_history_range(self)
+            # 先等待之前的摘要完成，避免尚未生成的摘要被再次压缩
+            await self.history_summarizer.wait(timeout=60)
+            if self.config.get(
+                "compress_strategy", "local"
+            ) == "llm" or not await compress_history_local(self):
+                await compress_history_range(self)
 
     async def state_paused(self):
         """
@@ -393,21 +486,22 @@ class Agent:
             raise RuntimeError("处理消息时出错") from e
 
     async def thanox_history(self):
-        """随机删除一半消息（不包括前5条系统消息）"""
+        """按配置的淘汰策略删除历史消息，使估计的token数减半（不包括前5条系统消息）"""
         if len(self.messages) <= 10:
             return
 
-        indices_to_delete = random.sample(
-            range(5, len(self.messages)), len(self.messages) // 2
+        policy_name = self.config.get("eviction_policy", DEFAULT_EVICTION_POLICY)
+        target_ratio = self.config.get("eviction_target_ratio", DEFAULT_TARGET_RATIO)
+        tokens = sum(estimate_message_tokens(msg) for msg in self.messages)
+        self.messages, report = evict_messages(
+            self.messages, int(tokens * target_ratio), policy_name
         )
 
-        self.messages = [
-            msg if idx not in indices_to_delete else DestroyedRuntimeMessage()
-            for idx, msg in enumerate(self.messages)
-        ]
-
         self.messages.append(
-            RuntimeMessage(f"thanox_history: 随机删除了{len(indices_to_delete)}条消息")
+            RuntimeMessage(
+                f"thanox_history: 按{policy_name}策略删除了{report['evicted']}条消息，"
+                f"预计token数从{report['tokens_before']}减少到{report['tokens_after']}"
+            )
         )
 
     async def call_tool(self, tool_call: ToolCallMessage) -> bool:
@@ -423,6 +517,10 @@ class Agent:
         if self.state == "waiting_user":
             self.state = "working"
 
+        tools_used = self.session_metadata.setdefault("tools_used", [])
+        if tool_call.function_name not in tools_used:
+            tools_used.append(tool_call.function_name)
+
         # 检查是否是workflow工具
         workflow = self.tool_manager.get_workflow(tool_call.function_name)
         if workflow:
@@ -497,6 +595,9 @@ class Agent:
             allowed_tools = {
                 "read_file",
                 "list_files",
+                "search_code",
+                "find_symbol",
+                "read_symbol",
                 "get_absolute_path",
                 "get_token_usage",
             }
@@ -609,11 +710,14 @@ class Agent:
 
     async def _select_model(self) -> LanguageModel:
         """
-        根据廉价LLM剩余消息计数选择合适的模型。
+        根据廉价LLM剩余消息计数选择合适的模型，model_override只使用一次。
 
         返回:
             LanguageModel: 选择的语言模型实例
         """
+        if self.model_override is not None:
+            model, self.model_override = self.model_override, None
+            return model
         if self.cheap_llm_remaining_messages > 0 and "cheap_model" in self.config:
             return self.config["cheap_model"]
         return self.config["model"]
@@ -652,19 +756,25 @@ class Agent:
         model = await self._select_model()
 
         answer: Answer = await model.answer_stream(self.messages)
+        generation_state = GenerationState()
 
         async for token in answer:
             await self.user_output_queue.put(token)
 
-            # 实时检查工具调用量（通过lifecycle回调处理）
+            # 实时检查工具调用量等（通过lifecycle回调处理）
+            generation_state.feed(token)
+            should_interrupt = await self.lifecycle.trigger_message_delta(
+                self, answer, token, generation_state
+            )
             current_content = answer.get_current_content()
-
-            # 触发消息生成中的生命周期事件
-            should_interrupt = await self.lifecycle.trigger_during_message_generation(
+            if await self.lifecycle.trigger_during_message_generation(
                 self, answer, current_content
-            )
+            ):
+                should_interrupt = True
             if should_interrupt:
-                return await self.generate_response()
+                if generation_state.salvage_length is None:
+                    return await self.generate_response()
+                break
 
             if not self.user_input_queue.empty():
                 await self.user_output_queue.put(answer)
@@ -675,13 +785,23 @@ class Agent:
                 answer.interrupt()
                 return await self.generate_response()
 
-        await self.user_output_queue.put(answer)
-
-        chat_message = cast(ChatMessage, answer.get_message())
+        if generation_state.salvage_length is None:
+            await self.user_output_queue.put(answer)
+            chat_message = cast(ChatMessage, answer.get_message())
+        else:
+            # 中断回答的Plugin已经输出了回答，只保留有效的前缀
+            chat_message = ChatMessage(
+                "assistant",
+                answer.get_current_content()[: generation_state.salvage_length],
+            )
         full_response = chat_message.message
         self.messages.append(chat_message)
+        if generation_state.salvage_note is not None:
+            self.messages.append(RuntimeMessage(generation_state.salvage_note))
 
         tool_calls, errors = extract_tool_calls_with_errors(full_response)
+        if generation_state.salvage_tool_call_limit is not None:
+            tool_calls = tool_calls[: generation_state.salvage_tool_call_limit]
 
         for error in errors:
             self.messages.append(RuntimeMessage(error))
@@ -708,6 +828,16 @@ class Agent:
 
         if isinstance(answer, OpenAiAnswer):
             self.last_token_usage = answer.total_tokens
+            metadata = self.session_metadata
+            metadata["input_tokens"] = (
+                metadata.get("input_tokens", 0) + answer.input_tokens
+            )
+            metadata["output_tokens"] = (
+                metadata.get("output_tokens", 0) + answer.output_tokens
+            )
+            metadata["total_tokens"] = (
+                metadata.get("total_tokens", 0) + answer.total_tokens
+            )
 
         # 触发消息生成后的生命周期事件
         await self.lifecycle.trigger_after_message_generation(
@@ -718,38 +848,72 @@ class Agent:
         await self.save_conversation_history()
         return answer
 
+    def history_store(self) -> HistoryStore:
+        """根据配置创建历史存储。"""
+        return HistoryStore.from_config(self.config.get("history", {}))
+
+    def update_history_index(
+        self, store: HistoryStore, history_data: list[dict], metadata: SessionMetadata
+    ) -> None:
+        """在工作线程中增量更新当前会话的索引。"""
+        index = HistoryIndex.for_store(store)
+        try:
+            index.update_session(
+                self.session_id, history_data, metadata, self._indexed_history
+            )
+        finally:
+            index.close()
+        self._indexed_history = history_data
+
     async def save_conversation_history(self):
-        """保存对话历史到文件。"""
-        history_dir = Path.home() / ".local" / "share" / "linhai" / "history"
-        history_dir.mkdir(parents=True, exist_ok=True)
-        
-        # 使用当前时间戳生成文件名
-        timestamp = datetime.datetime.now().isoformat().replace(":", "-")
-        filename = f"conversation_{timestamp}.json"
-        filepath = history_dir / filename
-        
+        """保存对话历史到当前会话的历史文件。"""
         # 将消息列表转换为JSON可序列化的数据
         history_data = []
         for msg in self.messages:
             # 只保存有to_json方法的消息
-            if hasattr(msg, 'to_json'):
+            if hasattr(msg, "to_json"):
                 try:
                     to_json_result = msg.to_json()
                     # 如果to_json是协程，则await它
                     if asyncio.iscoroutine(to_json_result):
                         to_json_result = await to_json_result
-                    msg_dict = json.loads(to_json_result)
+                    msg_dict = json_backend.loads(to_json_result)
+                    msg_dict["type"] = type(msg).__name__
                     history_data.append(msg_dict)
                 except (TypeError, ValueError, AttributeError):
                     # 如果序列化失败，跳过该消息
                     continue
-        
+
         try:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(history_data, f, ensure_ascii=False, indent=2)
+            store = self.history_store()
+            if self._history_lease is None:
+                self._history_lease = store.acquire_lease(self.session_id)
+            else:
+                self._history_lease.refresh()
+            filepath = store.save_session(self.session_id, history_data)
             logger.info("对话历史已保存到: %s", filepath)
-        except (IOError, OSError) as e:
+        except (IOError, OSError, ValueError) as e:
             logger.error("保存对话历史失败: %s", str(e))
+            return
+
+        try:
+            self.session_metadata["end_time"] = datetime.datetime.now().isoformat(
+                timespec="seconds"
+            )
+            metadata = self.session_metadata.copy()
+            metadata["tools_used"] = list(self.session_metadata.get("tools_used", []))
+            await asyncio.to_thread(
+                self.update_history_index, store, history_data, metadata
+            )
+        except sqlite3.Error as e:
+            logger.error("更新历史索引失败: %s", str(e))
+
+        auto_maintain = self.config.get("history", {}).get("auto_maintain", False)
+        if auto_maintain and self._history_maintenance_task is None:
+            self._history_maintenance_task = asyncio.create_task(
+                asyncio.to_thread(maintain_history, store, [self.session_id])
+            )
+
     async def run(self):
         """
         Agent主循环，负责状态机的管理和状态切换。
@@ -782,6 +946,9 @@ class Agent:
             #     self.state = "paused"
             #     raise RuntimeError("Agent运行出错") from e
             await asyncio.sleep(0)
+        if self._history_lease is not None:
+            self._history_lease.release()
+            self._history_lease = None
 
 
 def create_agent(
@@ -824,6 +991,19 @@ def create_agent(
             ),
         )
 
+    # 加载不思考的LLM配置
+    fast_llm = None
+    if "fast" in config["llm"]:
+        fast_llm = OpenAi(
+            api_key=config["llm"]["fast"]["api_key"],
+            base_url=config["llm"]["fast"]["base_url"],
+            model=config["llm"]["fast"]["model"],
+            openai_config=config["llm"]["fast"].get("openai_config", {}),
+            chat_completion_kwargs=config["llm"]["fast"].get(
+                "chat_completion_kwargs", {}
+            ),
+        )
+
     user_input_queue: "Queue[ChatMessage]" = Queue()
     user_output_queue: "Queue[AnswerToken | Answer]" = Queue()
     tool_request_queue: "Queue[ToolCallMessage]" = Queue()
@@ -843,12 +1023,43 @@ def create_agent(
         "compress_threshold_soft": int(
             config_dict.get("agent", {}).get("compress_threshold_soft", 65536 * 0.5)
         ),
+        "compress_strategy": config_dict.get("agent", {}).get(
+            "compress_strategy", "local"
+        ),
         "tool_confirmation": tool_confirmation_config,
+        "history": config_dict.get("history", {}),
     }
     if cheap_llm:
         agent_config["cheap_model"] = cheap_llm
-
-    tool_manager = ToolManager()
+    if fast_llm:
+        agent_config["fast_model"] = fast_llm
+    tools_config = config_dict.get("tools", {})
+    if tools_config.get("digest_oversized", False):
+        agent_config["digest_oversized_outputs"] = True
+        agent_config["digest_timeout_seconds"] = float(
+            tools_config.get("digest_timeout_seconds", 2)
+        )
+    if "eviction_policy" in config_dict.get("agent", {}):
+        # 提前检查策略名称，避免运行到一半才发现配置错误
+        get_eviction_policy(config_dict["agent"]["eviction_policy"])
+        agent_config["eviction_policy"] = config_dict["agent"]["eviction_policy"]
+    if "eviction_target_ratio" in config_dict.get("agent", {}):
+        agent_config["eviction_target_ratio"] = float(
+            config_dict["agent"]["eviction_target_ratio"]
+        )
+    if "local_compress_keep_recent" in config_dict.get("agent", {}):
+        agent_config["local_compress_keep_recent"] = int(
+            config_dict["agent"]["local_compress_keep_recent"]
+        )
+    if "repetition" in config_dict.get("agent", {}):
+        # 提前检查阈值，避免运行到一半才发现配置错误
+        RepetitionDetector.from_config(config_dict["agent"]["repetition"])
+        agent_config["repetition"] = config_dict["agent"]["repetition"]
+    if "reasoning_budget" in config_dict.get("agent", {}):
+        agent_config["reasoning_budget"] = config_dict["agent"]["reasoning_budget"]
+
+    history_store = HistoryStore.from_config(agent_config["history"])
+    tool_manager = ToolManager(config=config, blob_store=history_store.blobs)
     tool_manager.register_workflow(
         "compress_history_range",
         "压缩指定范围的历史消息：总结并删除指定范围内的消息。调用这个工具来开始压缩指定范围的流程。",
@@ -861,7 +1072,7 @@ def create_agent(
         agent_config["system_prompt"]
         .replace(
             "{|TOOLS|}",
-            json.dumps(tool_manager.get_tools_info(), ensure_ascii=False, indent=2),
+            json_backend.dumps(tool_manager.get_tools_info(), pretty=True),
         )
         .replace("{|CURRENT_TIME|}", current_time)
     )
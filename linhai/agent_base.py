@@ -2,8 +2,8 @@
 
 from reprlib import Repr
 from pathlib import Path
-import json
 
+from linhai import json_backend
 from linhai.llm import (
     Message,
     LanguageModelMessage,
@@ -40,12 +40,12 @@ class CompressRangeRequest(Message):
             "messages_summerization": self.messages_summerization,
             "message_length": self.message_length,
         }
-        return json.dumps(data)
+        return json_backend.dumps(data)
 
     @classmethod
     def from_json(cls, json_str: str):
 
-        data = json.loads(json_str)
+        data = json_backend.loads(json_str)
         return cls(
             messages_summerization=data["messages_summerization"],
             message_length=data["message_length"],
@@ -66,15 +66,57 @@ class RuntimeMessage(Message):
     def to_json(self) -> str:
 
         data = {"role": "user", "message": self.message}
-        return json.dumps(data)
+        return json_backend.dumps(data)
 
     @classmethod
     def from_json(cls, json_str: str):
 
-        data = json.loads(json_str)
+        data = json_backend.loads(json_str)
         return cls(message=data["message"])
 
 
+class SummaryMessage(Message):
+    """历史摘要消息，代替被压缩删除的历史消息。
+
+    level为1表示直接总结原始消息的摘要，更高的level表示由多条低一级摘要合并而成。
+    摘要在后台生成，生成完成前summary为None。
+    """
+
+    def __init__(self, level: int, covered: int, summary: str | None = None):
+        self.level = level
+        self.covered = covered  # 摘要覆盖的原始消息数量
+        self.summary = summary
+
+    def to_llm_message(self) -> LanguageModelMessage:
+        if self.summary is None:
+            content = f"历史压缩已删除{self.covered}条消息，摘要正在生成"
+        else:
+            content = (
+                f"<history-summary level={self.level}>"
+                f"以下是已被压缩的{self.covered}条历史消息的摘要：\n{self.summary}"
+                "</history-summary>"
+            )
+        return {"role": "user", "content": f"<runtime>{content}</runtime>"}
+
+    def to_json(self) -> str:
+
+        data = {
+            "role": "user",
+            "level": self.level,
+            "covered": self.covered,
+            "summary": self.summary,
+        }
+        return json_backend.dumps(data)
+
+    @classmethod
+    def from_json(cls, json_str: str):
+
+        data = json_backend.loads(json_str)
+        return cls(
+            level=data["level"], covered=data["covered"], summary=data["summary"]
+        )
+
+
 class DestroyedRuntimeMessage(Message):
     """被截断的运行时消息，表示消息已被截断。"""
 
@@ -91,7 +133,7 @@ class DestroyedRuntimeMessage(Message):
 
     def to_json(self) -> str:
 
-        return json.dumps({})
+        return json_backend.dumps({})
 
     @classmethod
     def from_json(cls, json_str: str):
@@ -147,10 +189,10 @@ class GlobalMemory:
     def to_json(self) -> str:
 
         data = {"filepath": str(self.filepath)}
-        return json.dumps(data)
+        return json_backend.dumps(data)
 
     @classmethod
     def from_json(cls, json_str: str):
 
-        data = json.loads(json_str)
+        data = json_backend.loads(json_str)
         return cls(filepath=Path(data["filepath"]))
@@ -1,8 +1,29 @@
 """Plugin系统，用于模块化Agent的各种功能。"""
 
 from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Literal, TypedDict, cast
+import asyncio
+import logging
+import re
+import time
+
 from linhai.agent_base import RuntimeMessage, WAITING_USER_MARKER
-from linhai.llm import Answer
+from linhai.generation_state import GenerationState
+from linhai.llm import Answer, AnswerToken, ChatMessage, SystemMessage
+from linhai.prompt import OVERSIZED_OUTPUT_DIGEST_PROMPT
+from linhai.tool.main import ToolResultMessage
+from linhai.history_compressor import estimate_tokens, mark_superseded_results
+from linhai.repetition import (
+    DEFAULT_MAX_OUTPUT_TOKENS,
+    RepetitionConfig,
+    RepetitionDetector,
+    RepetitionMatch,
+    RepetitionStats,
+    repetition_stats,
+)
+
+logger = logging.getLogger(__name__)
 
 
 class Plugin(ABC):
@@ -62,11 +83,15 @@ class WaitingUserPlugin(Plugin):
 class ToolCallCountPlugin(Plugin):
     """工具调用量检查Plugin。"""
 
-    async def during_message_generation(self, agent, answer: Answer, current_content):
+    async def during_message_delta(
+        self, agent, answer: Answer, token: AnswerToken, state: GenerationState
+    ):
         """检查工具调用量是否超过限制。"""
-        json_block_count = current_content.count("\n```json toolcall")
+        if not token["content"]:
+            return False
+        json_block_count = state.content.tool_call_count
 
-        content_length = len(current_content)
+        content_length = state.content.length
         if content_length < 2000:
             max_json_blocks = 5
         else:
@@ -74,11 +99,17 @@ class ToolCallCountPlugin(Plugin):
 
         if json_block_count > max_json_blocks:
             await agent.user_output_queue.put(answer)
-            agent.messages.append(
-                RuntimeMessage(
-                    f"错误：一次性调用了超过{max_json_blocks}个工具，当前回答长度{content_length}字符，"
-                    f"最多允许{max_json_blocks}个工具调用。请分多次调用。"
-                )
+            # 同时只有一个代码块没有结束，所以允许的工具调用都已经结束，
+            # 保留到最后一个允许的工具调用为止的内容，并执行这些工具调用。
+            # 扫描器只统计顶层代码块，列表或引用中的工具调用会被重新解析出来，
+            # 所以同时限制执行的工具调用数量
+            end = state.content.scanner.events[max_json_blocks - 1]["end"]
+            state.salvage(
+                end,
+                f"错误：一次性调用了超过{max_json_blocks}个工具，当前回答长度{content_length}字符，"
+                f"最多允许{max_json_blocks}个工具调用。已保留前{max_json_blocks}个工具调用及之前的内容"
+                "并执行这些工具调用，之后的内容已被丢弃。请根据工具结果继续，分多次调用。",
+                max_json_blocks,
             )
             answer.interrupt()
             return True
@@ -86,19 +117,20 @@ class ToolCallCountPlugin(Plugin):
         return False
 
     def register(self, lifecycle):
-        """注册到during_message_generation回调。"""
-        lifecycle.register_during_message_generation(self.during_message_generation)
+        """注册到消息生成中的增量回调。"""
+        lifecycle.register_message_delta(self.during_message_delta)
 
 
 class ThinkingToolCallPlugin(Plugin):
     """禁止过度思考工具调用plugin"""
 
-    async def during_message_generation(self, agent, answer: Answer, current_content):
-        """检查工具调用量是否超过限制。"""
-        current_reasoning_content = answer.get_reasoning_message()
-        if not isinstance(current_reasoning_content, str):
+    async def during_message_delta(
+        self, agent, answer: Answer, token: AnswerToken, state: GenerationState
+    ):
+        """检查思考中的工具调用量是否超过限制。"""
+        if not token["reasoning_content"]:
             return False
-        json_block_count = current_reasoning_content.count("\n```json toolcall")
+        json_block_count = state.reasoning.tool_call_count
 
         max_json_blocks = 2
 
@@ -115,8 +147,202 @@ class ThinkingToolCallPlugin(Plugin):
         return False
 
     def register(self, lifecycle):
-        """注册到during_message_generation回调。"""
-        lifecycle.register_during_message_generation(self.during_message_generation)
+        """注册到消息生成中的增量回调。"""
+        lifecycle.register_message_delta(self.during_message_delta)
+
+
+class RepetitionPlugin(Plugin):
+    """重复输出检测Plugin。
+
+    生成时分别检测回答内容和推理内容是否陷入循环，发现循环时立即中断生成，
+    不需要等到回答结束或达到输出长度限制。json toolcall代码块中的内容不检测，
+    写入文件的数据本身可能包含大量重复。
+    """
+
+    def __init__(
+        self,
+        config: RepetitionConfig | None = None,
+        stats: RepetitionStats | None = None,
+    ):
+        self.config: RepetitionConfig = config or {}
+        self.stats = repetition_stats if stats is None else stats
+        self._answer: Answer | None = None
+        self._content = RepetitionDetector.from_config(self.config)
+        self._reasoning = RepetitionDetector.from_config(self.config)
+
+    async def during_message_delta(
+        self, agent, answer: Answer, token: AnswerToken, state: GenerationState
+    ):
+        """检查新生成的内容是否在重复之前的内容。"""
+        if answer is not self._answer:
+            self._answer = answer
+            self._content = RepetitionDetector.from_config(self.config)
+            self._reasoning = RepetitionDetector.from_config(self.config)
+
+        if token["reasoning_content"]:
+            match = self._reasoning.feed(token["reasoning_content"])
+            if match is not None:
+                text = answer.get_reasoning_message() or ""
+                return await self.interrupt(agent, answer, "思考", text, match)
+        if token["content"] and not state.content.scanner.in_tool_call:
+            match = self._content.feed(token["content"])
+            if match is not None:
+                text = answer.get_current_content()
+                return await self.interrupt(agent, answer, "回答", text, match)
+        return False
+
+    async def interrupt(
+        self, agent, answer: Answer, kind: str, text: str, match: RepetitionMatch
+    ) -> bool:
+        """中断生成，让LLM换一种方式继续，并记录节省的token数。"""
+        repeated_tokens = estimate_tokens(text[-match["repeated_chars"] :])
+        generated_tokens = estimate_tokens(
+            answer.get_current_content()
+        ) + estimate_tokens(answer.get_reasoning_message() or "")
+        max_output_tokens = self.config.get(
+            "max_output_tokens", DEFAULT_MAX_OUTPUT_TOKENS
+        )
+        self.stats["interrupts"] += 1
+        self.stats["repeated_tokens"] += repeated_tokens
+        self.stats["avoided_tokens"] += max(0, max_output_tokens - generated_tokens)
+        logger.info(
+            "%s陷入重复，周期%d字符，重复%d次，已中断",
+            kind,
+            match["period_chars"],
+            match["repeats"],
+        )
+
+        unit = text[-match["period_chars"] :].strip()
+        if len(unit) > 100:
+            unit = unit[:100] + "……"
+        await agent.user_output_queue.put(answer)
+        agent.messages.append(
+            RuntimeMessage(
+                f"错误：你的{kind}陷入了重复，同一段内容已经重复了{match['repeats']}次，已中断生成。"
+                f"重复的内容：{unit!r}。请不要重复之前的内容，总结已有的结论并换一种思路继续"
+            )
+        )
+        answer.interrupt()
+        return True
+
+    def register(self, lifecycle):
+        """注册到消息生成中的增量回调。"""
+        lifecycle.register_message_delta(self.during_message_delta)
+
+
+class ReasoningBudgetConfig(TypedDict, total=False):
+    """思考预算配置类型定义，没有配置的限制不生效。"""
+
+    working_tokens: int  # 自动运行时最多思考的token数
+    working_seconds: float  # 自动运行时最多思考的秒数
+    waiting_user_tokens: int  # 回答用户消息时最多思考的token数
+    waiting_user_seconds: float  # 回答用户消息时最多思考的秒数
+    # 超过预算后如何重试：brief要求LLM减少思考；fast_model使用[llm.fast]配置的不思考的模型
+    fallback: Literal["brief", "fast_model"]
+    max_retries: int  # 同一轮对话最多因超过预算重试的次数，之后不再限制
+
+
+class ReasoningBudgetStats(TypedDict):
+    """思考超过预算的统计。"""
+
+    hits: int  # 超过预算的次数
+    tokens: int  # 被中断的思考的token数
+    seconds: float  # 被中断的思考的秒数
+    states: dict[str, int]  # 每个Agent状态超过预算的次数
+
+
+def new_reasoning_budget_stats() -> ReasoningBudgetStats:
+    """创建空的思考预算统计。"""
+    return {"hits": 0, "tokens": 0, "seconds": 0.0, "states": {}}
+
+
+# 进程内所有超过思考预算的统计
+reasoning_budget_stats = new_reasoning_budget_stats()
+
+
+class ReasoningBudgetPlugin(Plugin):
+    """思考预算Plugin。
+
+    生成时统计推理内容的token数和思考时间，超过当前Agent状态的预算时中断回答，
+    让LLM减少思考后重试，或者改用不思考的模型重试。
+    """
+
+    def __init__(
+        self,
+        config: ReasoningBudgetConfig,
+        stats: ReasoningBudgetStats | None = None,
+    ):
+        self.config = config
+        self.stats = reasoning_budget_stats if stats is None else stats
+        self._answer: Answer | None = None
+        self._started = 0.0
+        self._hit = False  # 当前回答是否超过了预算
+        self._retries = 0  # 当前轮对话已经重试的次数
+
+    def budget(self, state: str) -> tuple[int | None, float | None]:
+        """返回Agent状态对应的token数和秒数限制。"""
+        if state == "waiting_user":
+            return (
+                self.config.get("waiting_user_tokens"),
+                self.config.get("waiting_user_seconds"),
+            )
+        return self.config.get("working_tokens"), self.config.get("working_seconds")
+
+    async def during_message_delta(
+        self, agent, answer: Answer, token: AnswerToken, state: GenerationState
+    ):
+        """检查思考是否超过预算。"""
+        if answer is not self._answer:
+            self._answer = answer
+            self._started = time.monotonic()
+            if not self._hit:
+                self._retries = 0
+            self._hit = False
+
+        # 开始输出回答内容后思考已经结束
+        if not token["reasoning_content"] or state.content.length:
+            return False
+        if self._retries >= self.config.get("max_retries", 1):
+            return False
+
+        max_tokens, max_seconds = self.budget(agent.state)
+        tokens = state.reasoning.token_count
+        seconds = time.monotonic() - self._started
+        if max_tokens is not None and tokens > max_tokens:
+            reason = f"{tokens}个token"
+        elif max_seconds is not None and seconds > max_seconds:
+            reason = f"{seconds:.0f}秒"
+        else:
+            return False
+
+        self._hit = True
+        self._retries += 1
+        self.stats["hits"] += 1
+        self.stats["tokens"] += tokens
+        self.stats["seconds"] += seconds
+        self.stats["states"][agent.state] = self.stats["states"].get(agent.state, 0) + 1
+        logger.info("思考超过预算（%s），已中断", reason)
+
+        await agent.user_output_queue.put(answer)
+        if (
+            self.config.get("fallback", "brief") == "fast_model"
+            and "fast_model" in agent.config
+        ):
+            agent.model_override = agent.config["fast_model"]
+            instruction = "下一次回答将使用不思考的模型，请直接给出回答"
+        else:
+            instruction = "请减少思考，直接给出简短的回答或下一步操作"
+        agent.messages.append(
+            RuntimeMessage(
+                f"错误：你的思考超过了预算（{reason}），已中断生成。{instruction}"
+            )
+        )
+        answer.interrupt()
+        return True
+
+    def register(self, lifecycle):
+        """注册到消息生成中的增量回调。"""
+        lifecycle.register_message_delta(self.during_message_delta)
 
 
 def register_default_plugins(lifecycle) -> None:
@@ -126,6 +352,7 @@ def register_default_plugins(lifecycle) -> None:
         ToolCallCountPlugin(),
         ExcessiveCheckmarkPlugin(),
         MarkdownSyntaxPlugin(),
+        FileSupersessionPlugin(),
     ]
 
     for plugin in plugins:
@@ -171,3 +398,125 @@ class MarkdownSyntaxPlugin(Plugin):
     def register(self, lifecycle):
         """注册到after_message_generation回调。"""
         lifecycle.register_after_message_generation(self.after_message_generation)
+
+
+class FileSupersessionPlugin(Plugin):
+    """过期文件读取结果标记Plugin。
+
+    每次生成回复前重新标记被之后的读取或修改取代的文件读取结果，
+    被取代的结果只以一行说明的形式发送给LLM。
+    """
+
+    async def before_message_generation(
+        self, agent, enable_compress, disable_waiting_user_warning
+    ):
+        """标记被取代的文件读取结果。"""
+        mark_superseded_results(agent.messages)
+
+    def register(self, lifecycle):
+        """注册到before_message_generation回调。"""
+        lifecycle.register_before_message_generation(self.before_message_generation)
+
+
+# 输出可能很长、适合让廉价LLM生成摘要的工具
+DIGEST_TOOLS = frozenset(
+    {
+        "run_simple_command",
+        "run_complex_command",
+        "show_git_changes",
+        "http_request",
+        "fetch_article",
+        "search_web",
+    }
+)
+# 发送给廉价LLM的最大字符数，超过时保留开头和结尾
+DIGEST_INPUT_HEAD_CHARS = 40000
+DIGEST_INPUT_TAIL_CHARS = 20000
+# 后台生成摘要的最长时间，超时的摘要被取消
+DIGEST_TASK_TIMEOUT_SECONDS = 300
+DIGEST_PROBLEM_PATTERN = re.compile(
+    r"error|exception|traceback|fail|warning|错误|异常|失败|警告", re.IGNORECASE
+)
+
+
+def build_digest_input(content: str) -> str:
+    """为超长输出添加行号和统计信息，过长时省略中间部分。"""
+    lines = content.splitlines()
+    problem_lines = sum(1 for line in lines if DIGEST_PROBLEM_PATTERN.search(line))
+    numbered = "\n".join(f"{i}|{line}" for i, line in enumerate(lines, 1))
+    if len(numbered) > DIGEST_INPUT_HEAD_CHARS + DIGEST_INPUT_TAIL_CHARS:
+        omitted = len(numbered) - DIGEST_INPUT_HEAD_CHARS - DIGEST_INPUT_TAIL_CHARS
+        numbered = (
+            f"{numbered[:DIGEST_INPUT_HEAD_CHARS]}\n"
+            f"……（中间省略{omitted}字符）……\n"
+            f"{numbered[-DIGEST_INPUT_TAIL_CHARS:]}"
+        )
+    return (
+        f"输出共{len(lines)}行、{len(content)}字符，"
+        f"其中{problem_lines}行包含错误或警告相关的关键词。\n\n{numbered}"
+    )
+
+
+class OversizedOutputDigestPlugin(Plugin):
+    """超长工具输出摘要Plugin。
+
+    命令和HTTP工具的输出超过max_output_length被保存到临时文件时，
+    在后台让廉价LLM阅读完整输出并生成结构化摘要。
+    生成回复前最多短暂等待timeout_seconds秒，未完成的摘要继续在后台运行，
+    完成后附加到工具结果中，在之后的回合发送给LLM。
+    """
+
+    def __init__(self, timeout_seconds: float = 2):
+        self.timeout_seconds = timeout_seconds
+        self.pending: list[asyncio.Task] = []
+
+    async def digest(self, model, result: ToolResultMessage) -> None:
+        """读取临时文件并让廉价LLM生成摘要。"""
+        assert result.spill_path is not None
+        try:
+            content = await asyncio.to_thread(
+                Path(result.spill_path).read_text, encoding="utf-8", errors="replace"
+            )
+            async with asyncio.timeout(DIGEST_TASK_TIMEOUT_SECONDS):
+                answer = await model.answer_stream(
+                    [
+                        SystemMessage(OVERSIZED_OUTPUT_DIGEST_PROMPT),
+                        ChatMessage("user", build_digest_input(content)),
+                    ]
+                )
+                async for _ in answer:
+                    pass
+            message = cast(ChatMessage, answer.get_message())
+            result.digest = message.message.strip() or None
+        except TimeoutError:
+            logger.warning("生成超长输出摘要超时，已放弃")
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.warning("生成超长输出摘要失败: %s", e)
+
+    async def after_tool_call(self, agent, tool_call, tool_result, success):
+        """工具输出被保存到临时文件时开始生成摘要。"""
+        if (
+            not success
+            or not isinstance(tool_result, ToolResultMessage)
+            or tool_result.spill_path is None
+            or tool_call.function_name not in DIGEST_TOOLS
+            or "cheap_model" not in agent.config
+        ):
+            return
+        self.pending.append(
+            asyncio.create_task(self.digest(agent.config["cheap_model"], tool_result))
+        )
+
+    async def before_message_generation(
+        self, agent, enable_compress, disable_waiting_user_warning
+    ):
+        """短暂等待尚未完成的摘要，未完成的摘要留到之后的回合。"""
+        if not self.pending:
+            return
+        _, not_done = await asyncio.wait(self.pending, timeout=self.timeout_seconds)
+        self.pending = list(not_done)
+
+    def register(self, lifecycle):
+        """注册到after_tool_call和before_message_generation回调。"""
+        lifecycle.register_after_tool_call(self.after_tool_call)
+        lifecycle.register_before_message_generation(self.before_message_generation)
@@ -1,17 +1,53 @@
 """Agent核心模块，负责处理消息、调用工具和管理状态。"""
 
 from typing import cast
-from reprlib import Repr
 
 import linhai
-from linhai.agent_base import RuntimeMessage, CompressRangeRequest, GlobalMemory
+from linhai.agent_base import RuntimeMessage, CompressRangeRequest, SummaryMessage
 from linhai.markdown_parser import extract_json_blocks
-from linhai.llm import (
-    ChatMessage,
-    SystemMessage,
+from linhai.llm import ChatMessage
+from linhai.message_summary import default_summary_index
+from linhai.history_compressor import (
+    DEFAULT_KEEP_RECENT,
+    compress_messages_locally,
+    min_safe_index,
 )
 
-repr_obj = Repr(maxstring=100)
+
+async def compress_history_local(agent: "linhai.agent.Agent") -> bool:
+    """
+    不调用LLM，按固定规则在本地压缩历史消息。
+
+    删除过期的文件读取结果、把旧的工具结果替换为摘要并合并连续的运行时消息。
+
+    返回:
+        bool: 压缩后估计的token用量是否已经低于软限制，
+            为False时调用方应该继续使用compress_history_range
+    """
+    keep_recent = agent.config.get("local_compress_keep_recent", DEFAULT_KEEP_RECENT)
+    messages, stats = compress_messages_locally(agent.messages, keep_recent=keep_recent)
+    if stats["tokens_after"] >= stats["tokens_before"]:
+        return False
+
+    agent.messages = messages
+    saved = stats["tokens_before"] - stats["tokens_after"]
+    agent.messages.append(
+        RuntimeMessage(
+            f"本地历史压缩：删除了{stats['stale_results']}条过期的文件读取结果，"
+            f"将{stats['stubbed_results']}条旧的工具结果替换为摘要，"
+            f"合并了{stats['collapsed_runtime']}条运行时消息，预计减少{saved} token"
+        )
+    )
+
+    if not agent.last_token_usage:
+        return True
+    # 用估计值的压缩比例推算实际token用量
+    estimated_usage = (
+        agent.last_token_usage * stats["tokens_after"] / stats["tokens_before"]
+    )
+    return estimated_usage < agent.config.get(
+        "compress_threshold_soft", int(65536 * 0.5)
+    )
 
 
 async def compress_history_range(agent: "linhai.agent.Agent") -> bool:
@@ -19,9 +55,14 @@ async def compress_history_range(agent: "linhai.agent.Agent") -> bool:
     压缩指定范围的历史消息以减少上下文长度。
 
     通过提示LLM输出要压缩的消息范围（start_id和end_id），
-    然后删除指定范围内的消息。
+    然后删除指定范围内的消息。等待LLM期间后台完成的摘要合并推迟到压缩结束，
+    避免LLM给出的消息ID失效。
     """
+    with agent.history_summarizer.hold_merges():
+        return await _compress_history_range(agent)
 
+
+async def _compress_history_range(agent: "linhai.agent.Agent") -> bool:
     agent.messages = [
         (
             RuntimeMessage("已经失效的历史压缩prompt")
@@ -31,11 +72,8 @@ async def compress_history_range(agent: "linhai.agent.Agent") -> bool:
         for msg in agent.messages
     ]
 
-    messages = [msg.to_llm_message() for msg in agent.messages]
-    messages_summerization = "\n".join(
-        f"- id: {i} role: {msg["role"]!r} content: {repr_obj.repr(msg.get('content', None))}"
-        for i, msg in enumerate(messages)
-    )
+    # 每条消息的摘要在索引中缓存，只有新增的消息需要重新转换
+    messages_summerization = default_summary_index.summarize(agent.messages)
 
     agent.messages.append(
         CompressRangeRequest(messages_summerization, len(agent.messages))
@@ -82,15 +120,7 @@ async def compress_history_range(agent: "linhai.agent.Agent") -> bool:
             return True
 
         # 通过检查消息类来确定最小安全ID，保护系统消息
-        max_system_index = -1
-        for i, msg in enumerate(agent.messages):
-            if isinstance(msg, (SystemMessage, GlobalMemory)):
-                max_system_index = i
-
-        if max_system_index == -1:
-            min_safe_id = 0
-        else:
-            min_safe_id = max_system_index + 1
+        min_safe_id = min_safe_index(agent.messages)
 
         if start_id < min_safe_id:
             agent.messages.append(
@@ -128,12 +158,11 @@ async def compress_history_range(agent: "linhai.agent.Agent") -> bool:
                 if content:
                     deleted_user_messages.append(content)
 
-        # 直接删除指定范围的消息
-        agent.messages[start_id : end_id + 1] = [
-            RuntimeMessage(
-                f"历史压缩已删除{range_size}条消息（从{start_id}到{end_id}）"
-            ),
-        ]
+        # 删除指定范围的消息，用摘要代替，摘要在后台生成
+        evicted = agent.messages[start_id : end_id + 1]
+        placeholder = SummaryMessage(level=1, covered=range_size)
+        agent.messages[start_id : end_id + 1] = [placeholder]
+        agent.history_summarizer.schedule_evicted(agent, placeholder, evicted)
 
         # 如果删除了用户消息，添加额外的消息包含被删除的用户消息内容
         if deleted_user_messages:
@@ -0,0 +1,5 @@
+"""林海的性能基准测试。
+
+每个模块都可以通过python -m linhai.benchmarks.<模块名>运行，结果以JSON格式输出，
+便于在不同版本之间比较。
+"""
@@ -0,0 +1,509 @@
+"""历史压缩基准测试。
+
+从历史目录读取保存的会话，在每个会话的某个位置截断，用各个压缩策略压缩截断位置之前的历史，
+再用截断位置之后实际发生的工具调用回放，统计压缩导致的重复读取。
+
+用法：
+    python -m linhai.benchmarks.compression [--config config.toml] [--output result.json]
+
+没有指定配置文件时，LLM选择压缩范围的策略使用一个确定性的模拟模型（总是压缩最早的80%消息），
+历史摘要使用本地摘要，此时LLM开销为0。
+"""
+
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from typing import Any, Awaitable, Callable, NotRequired, Sequence, TypedDict, cast
+import argparse
+import asyncio
+import datetime
+import random
+import sys
+import time
+
+from linhai import json_backend
+from linhai.agent import Agent
+from linhai.agent_base import CompressRangeRequest
+from linhai.agent_workflow import compress_history_local, compress_history_range
+from linhai.config import HistoryConfig, load_config
+from linhai.history import HistoryStore
+from linhai.history_compressor import (
+    estimate_message_tokens,
+    estimate_tokens,
+    mark_superseded_results,
+    min_safe_index,
+)
+from linhai.history_replay import message_from_dict
+from linhai.history_summary import HistorySummarizer
+from linhai.llm import ChatMessage, LanguageModel, Message, OpenAi
+from linhai.tool.main import FILE_READ_TOOLS, ToolResultMessage
+
+DEFAULT_CUT = 0.5
+# 少于这个数量的消息的会话不参与测试
+MIN_SESSION_MESSAGES = 20
+
+
+class CompressionResult(TypedDict):
+    """单个策略在单个会话上的结果。"""
+
+    tokens_before: int  # 压缩前估计的token数
+    tokens_after: int  # 压缩后估计的token数
+    reduction: float  # 减少的比例
+    seconds: float  # 压缩耗时，包括等待后台摘要
+    llm_calls: int  # 压缩过程中调用LLM的次数
+    llm_input_tokens: int  # 压缩过程中LLM的输入token数
+    llm_output_tokens: int  # 压缩过程中LLM的输出token数
+    later_reads: int  # 截断位置之后读取文件的次数
+    rereads_caused: int  # 其中读取的是压缩前可见、压缩后不可见的文件的次数
+    error: NotRequired[str]
+
+
+class SessionReport(TypedDict):
+    """单个会话的结果。"""
+
+    session_id: str
+    messages: int
+    cut_index: int
+    results: dict[str, CompressionResult]
+
+
+class StrategyTotals(TypedDict):
+    """单个策略在所有会话上的汇总。"""
+
+    sessions: int
+    errors: int
+    tokens_before: int
+    tokens_after: int
+    reduction: float
+    seconds: float
+    llm_calls: int
+    llm_input_tokens: int
+    llm_output_tokens: int
+    later_reads: int
+    rereads_caused: int
+
+
+class BenchmarkReport(TypedDict):
+    """基准测试的完整结果。"""
+
+    benchmark: str
+    linhai_version: str
+    created: str
+    history_dir: str
+    model: str
+    cut: float
+    strategies: list[str]
+    sessions: list[SessionReport]
+    totals: dict[str, StrategyTotals]
+
+
+class FixedAnswer:
+    """直接返回固定内容的回答。"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        raise StopAsyncIteration
+
+    def get_message(self) -> Message:
+        """返回固定内容的助手消息。"""
+        return ChatMessage("assistant", self.text)
+
+    def get_token_usage(self) -> dict[str, int] | None:
+        """固定回答没有token用量。"""
+        return None
+
+
+class SimulatedRangeModel:
+    """模拟LLM选择压缩范围：总是压缩可压缩部分中最早的80%消息。"""
+
+    # pylint: disable=too-few-public-methods
+
+    async def answer_stream(self, history: Sequence[Message]) -> FixedAnswer:
+        """根据历史中的压缩范围请求返回选择的范围。"""
+        request = next(
+            (msg for msg in reversed(history) if isinstance(msg, CompressRangeRequest)),
+            None,
+        )
+        if request is None:
+            return FixedAnswer("")
+        start = min_safe_index(history)
+        end = start + int((request.message_length - start) * 0.8) - 1
+        return FixedAnswer(
+            f'```json\n{{"start_id": {start}, "end_id": {max(end, start + 9)}}}\n```'
+        )
+
+
+class MeteredModel:
+    """统计调用次数和token用量的语言模型包装。"""
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, model: Any):
+        self.model = model
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    async def answer_stream(self, history: Sequence[Message]) -> Any:
+        """调用被包装的模型并记录调用次数。"""
+        self.calls += 1
+        answer = await self.model.answer_stream(history)
+        return MeteredAnswer(self, answer, history)
+
+
+class MeteredAnswer:
+    """在回答结束时把token用量记到MeteredModel上。"""
+
+    def __init__(self, meter: MeteredModel, answer: Any, history: Sequence[Message]):
+        self.meter = meter
+        self.answer = answer
+        self.history = history
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        async for token in self.answer:
+            yield token
+        usage = self.answer.get_token_usage()
+        if usage:
+            self.meter.input_tokens += usage.get("input_tokens", 0)
+            self.meter.output_tokens += usage.get("output_tokens", 0)
+        else:
+            # 模型没有返回用量时使用估计值
+            self.meter.input_tokens += sum(
+                estimate_message_tokens(msg) for msg in self.history
+            )
+            message = self.answer.get_message()
+            self.meter.output_tokens += estimate_tokens(message.message)
+
+    def get_message(self) -> Message:
+        """返回被包装的回答的消息。"""
+        return self.answer.get_message()
+
+    def get_token_usage(self) -> dict[str, int] | None:
+        """返回被包装的回答的token用量。"""
+        return self.answer.get_token_usage()
+
+
+class ReplayAgent:
+    """回放历史时代替Agent的最小实现，只提供压缩策略需要的属性。"""
+
+    def __init__(
+        self,
+        messages: list[Any],
+        model: LanguageModel,
+        cheap_model: LanguageModel | None,
+    ):
+        self.messages = messages
+        self.config: dict[str, Any] = {"model": model}
+        if cheap_model is not None:
+            self.config["cheap_model"] = cheap_model
+        self.history_summarizer = HistorySummarizer()
+        self.last_token_usage: int | None = None
+
+    async def generate_response(
+        self, enable_compress: bool = True, disable_waiting_user_warning: bool = False
+    ) -> Any:
+        """调用模型生成回答并加入历史，与Agent.generate_response的行为一致。"""
+        # 参数只为与Agent.generate_response的签名一致
+        # pylint: disable=unused-argument
+        answer = await self.config["model"].answer_stream(self.messages)
+        async for _ in answer:
+            pass
+        self.messages.append(answer.get_message())
+        return answer
+
+    async def thanox_history(self) -> None:
+        """使用Agent的淘汰实现。"""
+        await Agent.thanox_history(self)  # type: ignore[arg-type]
+
+
+async def strategy_local(agent: ReplayAgent) -> None:
+    """只进行本地压缩。"""
+    await compress_history_local(agent)  # type: ignore[arg-type]
+
+
+async def strategy_llm_range(agent: ReplayAgent) -> None:
+    """让LLM选择范围进行压缩。"""
+    await compress_history_range(agent)  # type: ignore[arg-type]
+
+
+async def strategy_local_then_llm(agent: ReplayAgent) -> None:
+    """Agent默认的策略：先本地压缩，不够时再让LLM选择范围。"""
+    if not await compress_history_local(agent):  # type: ignore[arg-type]
+        await compress_history_range(agent)  # type: ignore[arg-type]
+
+
+async def strategy_thanox(agent: ReplayAgent) -> None:
+    """按默认淘汰策略删除消息，使token数减半。"""
+    await agent.thanox_history()
+
+
+async def strategy_thanox_random(agent: ReplayAgent) -> None:
+    """随机删除消息，使token数减半。"""
+    agent.config["eviction_policy"] = "random"
+    await agent.thanox_history()
+
+
+STRATEGIES: dict[str, Callable[[ReplayAgent], Awaitable[None]]] = {
+    "local": strategy_local,
+    "llm_range": strategy_llm_range,
+    "local_then_llm": strategy_local_then_llm,
+    "thanox": strategy_thanox,
+    "thanox_random": strategy_thanox_random,
+}
+
+
+def visible_file_reads(messages: list[Any]) -> set[str]:
+    """返回历史中仍能看到完整读取结果的文件。"""
+    mark_superseded_results(messages)
+    return {
+        msg.file_path
+        for msg in messages
+        if isinstance(msg, ToolResultMessage)
+        and msg.file_path is not None
+        and msg.tool_name in FILE_READ_TOOLS
+        and msg.superseded_by is None
+    }
+
+
+def later_file_reads(messages: list[Any]) -> list[str]:
+    """返回截断位置之后读取的文件，按调用顺序排列。"""
+    return [
+        msg.file_path
+        for msg in messages
+        if isinstance(msg, ToolResultMessage)
+        and msg.file_path is not None
+        and msg.tool_name in FILE_READ_TOOLS
+    ]
+
+
+async def run_strategy(
+    name: str,
+    history: list[dict],
+    cut_index: int,
+    store: HistoryStore,
+    model: LanguageModel,
+    cheap_model: LanguageModel | None,
+    seed: int,
+) -> CompressionResult:
+    """用一个策略压缩截断位置之前的历史并统计结果。"""
+    # 每个策略都从字典重新构造消息，避免策略之间互相影响
+    messages = [message_from_dict(data, store.blobs) for data in history]
+    prefix, suffix = messages[:cut_index], messages[cut_index:]
+    metered_model = MeteredModel(model)
+    metered_cheap = MeteredModel(cheap_model) if cheap_model is not None else None
+    agent = ReplayAgent(list(prefix), metered_model, metered_cheap)
+
+    tokens_before = sum(estimate_message_tokens(msg) for msg in prefix)
+    visible_before = visible_file_reads(list(prefix))
+    # 以估计值作为当前用量，使本地压缩判断是否足够时使用与Agent相同的比例
+    agent.last_token_usage = tokens_before
+    agent.config["compress_threshold_soft"] = tokens_before // 2
+
+    error = None
+    random.seed(seed)
+    start = time.perf_counter()
+    try:
+        await STRATEGIES[name](agent)
+        await agent.history_summarizer.wait()
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        error = f"{type(e).__name__}: {e}"
+    seconds = time.perf_counter() - start
+
+    tokens_after = sum(estimate_message_tokens(msg) for msg in agent.messages)
+    lost = visible_before - visible_file_reads(agent.messages)
+    reads = later_file_reads(suffix)
+    meters = [metered_model] + ([metered_cheap] if metered_cheap else [])
+    result: CompressionResult = {
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "reduction": (
+            round(1 - tokens_after / tokens_before, 4) if tokens_before else 0.0
+        ),
+        "seconds": round(seconds, 6),
+        "llm_calls": sum(meter.calls for meter in meters),
+        "llm_input_tokens": sum(meter.input_tokens for meter in meters),
+        "llm_output_tokens": sum(meter.output_tokens for meter in meters),
+        "later_reads": len(reads),
+        "rereads_caused": sum(1 for path in reads if path in lost),
+    }
+    if error is not None:
+        result["error"] = error
+    return result
+
+
+def summarize_totals(
+    sessions: list[SessionReport], strategies: list[str]
+) -> dict[str, StrategyTotals]:
+    """汇总每个策略在所有会话上的结果。"""
+    totals: dict[str, StrategyTotals] = {}
+    for name in strategies:
+        results = [session["results"][name] for session in sessions]
+        tokens_before = sum(result["tokens_before"] for result in results)
+        tokens_after = sum(result["tokens_after"] for result in results)
+        totals[name] = {
+            "sessions": len(results),
+            "errors": sum(1 for result in results if "error" in result),
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_after,
+            "reduction": (
+                round(1 - tokens_after / tokens_before, 4) if tokens_before else 0.0
+            ),
+            "seconds": round(sum(result["seconds"] for result in results), 6),
+            "llm_calls": sum(result["llm_calls"] for result in results),
+            "llm_input_tokens": sum(result["llm_input_tokens"] for result in results),
+            "llm_output_tokens": sum(result["llm_output_tokens"] for result in results),
+            "later_reads": sum(result["later_reads"] for result in results),
+            "rereads_caused": sum(result["rereads_caused"] for result in results),
+        }
+    return totals
+
+
+def linhai_version() -> str:
+    """返回安装的linhai版本。"""
+    try:
+        return version("linhai")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+async def run_benchmark(
+    store: HistoryStore,
+    strategies: list[str],
+    model: LanguageModel | None = None,
+    cheap_model: LanguageModel | None = None,
+    cut: float = DEFAULT_CUT,
+    limit: int | None = None,
+    seed: int = 0,
+) -> BenchmarkReport:
+    """对历史目录中的会话运行压缩基准测试。
+
+    Args:
+        store: 历史存储
+        strategies: 要测试的策略名称
+        model: 选择压缩范围的模型，None时使用模拟模型
+        cheap_model: 生成历史摘要的廉价模型，None时使用本地摘要
+        cut: 截断位置占会话长度的比例
+        limit: 最多测试的会话数量，从最新的会话开始
+        seed: 随机策略使用的随机种子
+
+    Returns:
+        基准测试结果
+    """
+    for name in strategies:
+        if name not in STRATEGIES:
+            raise ValueError(f"未知的压缩策略: {name!r}")
+    # 模拟模型只实现了压缩流程用到的回答接口
+    range_model = model or cast(LanguageModel, SimulatedRangeModel())
+
+    infos = list(reversed(store.list_sessions()))
+    sessions: list[SessionReport] = []
+    for info in infos:
+        if limit is not None and len(sessions) >= limit:
+            break
+        history = store.load_session(info["session_id"])
+        if len(history) < MIN_SESSION_MESSAGES:
+            continue
+        cut_index = int(len(history) * cut)
+        results = {}
+        for name in strategies:
+            results[name] = await run_strategy(
+                name, history, cut_index, store, range_model, cheap_model, seed
+            )
+        sessions.append(
+            {
+                "session_id": info["session_id"],
+                "messages": len(history),
+                "cut_index": cut_index,
+                "results": results,
+            }
+        )
+
+    return {
+        "benchmark": "compression",
+        "linhai_version": linhai_version(),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "history_dir": str(store.root),
+        "model": getattr(model, "model", "configured") if model else "simulated",
+        "cut": cut,
+        "strategies": strategies,
+        "sessions": sessions,
+        "totals": summarize_totals(sessions, strategies),
+    }
+
+
+def load_models(config_path: str) -> tuple[LanguageModel, LanguageModel | None]:
+    """根据配置文件创建主模型和廉价模型。"""
+    config = load_config(config_path)
+    model = OpenAi(
+        api_key=config["llm"]["api_key"],
+        base_url=config["llm"]["base_url"],
+        model=config["llm"]["model"],
+        openai_config=config["llm"].get("openai_config", {}),
+        chat_completion_kwargs=config["llm"].get("chat_completion_kwargs", {}),
+    )
+    cheap_model = None
+    if "cheap" in config["llm"]:
+        cheap = config["llm"]["cheap"]
+        cheap_model = OpenAi(
+            api_key=cheap["api_key"],
+            base_url=cheap["base_url"],
+            model=cheap["model"],
+            openai_config=cheap.get("openai_config", {}),
+            chat_completion_kwargs=cheap.get("chat_completion_kwargs", {}),
+        )
+    return model, cheap_model
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """命令行入口。"""
+    parser = argparse.ArgumentParser(description="历史压缩基准测试")
+    parser.add_argument("--history-dir", help="历史目录，默认使用配置或默认目录")
+    parser.add_argument("--config", help="配置文件，指定时使用其中的LLM")
+    parser.add_argument(
+        "--strategies",
+        default=",".join(STRATEGIES),
+        help=f"逗号分隔的策略列表，可选：{', '.join(STRATEGIES)}",
+    )
+    parser.add_argument("--cut", type=float, default=DEFAULT_CUT, help="截断位置比例")
+    parser.add_argument("--limit", type=int, help="最多测试的会话数量")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--output", help="结果JSON文件，默认输出到标准输出")
+    args = parser.parse_args(argv)
+
+    model = cheap_model = None
+    history_config: HistoryConfig = {}
+    if args.config:
+        model, cheap_model = load_models(args.config)
+        history_config = load_config(args.config).get("history", {}).copy()
+    if args.history_dir:
+        history_config["dir"] = args.history_dir
+    store = HistoryStore.from_config(history_config)
+
+    report = asyncio.run(
+        run_benchmark(
+            store,
+            [name.strip() for name in args.strategies.split(",") if name.strip()],
+            model=model,
+            cheap_model=cheap_model,
+            cut=args.cut,
+            limit=args.limit,
+            seed=args.seed,
+        )
+    )
+    output = json_backend.dumps(report, pretty=True)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""文件读取缓存的基准测试。
+
+在临时目录中生成一个工作区，模拟会话中反复读取源文件（少数文件被读取的次数最多），
+中间穿插少量写入，比较三种读取方式的总耗时：
+旧实现先验证文件（exists、is_file、stat和一次完整的读取解码）再读取一次；
+只按stat结果判断是否变化的缓存；以及同时用inotify让缓存失效的缓存。
+
+用法：
+    python -m linhai.benchmarks.file_cache [--files 200] [--reads 5000] [--output result.json]
+"""
+
+from pathlib import Path
+from typing import Callable, Sequence, TypedDict
+import argparse
+import datetime
+import random
+import sys
+import tempfile
+import time
+
+from linhai import json_backend
+from linhai.benchmarks.compression import linhai_version
+from linhai.tool.file_cache import FileCacheStats, FileContentCache
+
+DEFAULT_FILES = 200
+DEFAULT_READS = 5000
+DEFAULT_FILE_CHARS = 20_000
+# 每多少次读取写入一个文件
+WRITE_INTERVAL = 50
+
+
+class CacheResult(TypedDict):
+    """一种读取方式的结果。"""
+
+    name: str
+    seconds: float
+    stats: FileCacheStats | None
+
+
+class BenchmarkReport(TypedDict):
+    """基准测试的完整结果。"""
+
+    benchmark: str
+    linhai_version: str
+    created: str
+    files: int
+    reads: int
+    watching: bool  # inotify是否可用
+    results: list[CacheResult]
+
+
+def legacy_read(file_path: Path) -> str | None:
+    """旧实现：验证文件时读取解码一次，读取内容时再读取一次。"""
+    if not file_path.exists() or not file_path.is_file():
+        return None
+    if file_path.stat().st_size > 1024 * 1024:
+        return None
+    try:
+        file_path.read_text(encoding="utf-8")
+    except UnicodeDecodeError:
+        return None
+    return file_path.read_text(encoding="utf-8")
+
+
+def create_workspace(root: Path, files: int, seed: int = 0) -> list[Path]:
+    """生成files个源文件。"""
+    rng = random.Random(seed)
+    paths = []
+    for i in range(files):
+        path = root / f"pkg{i % 10}" / f"module_{i}.py"
+        path.parent.mkdir(exist_ok=True)
+        lines = []
+        size = 0
+        while size < DEFAULT_FILE_CHARS:
+            line = f"value_{rng.randint(0, 999)} = compute({rng.random():.6f})\n"
+            lines.append(line)
+            size += len(line)
+        path.write_text("".join(lines), encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+def access_pattern(paths: list[Path], reads: int, seed: int = 0) -> list[Path]:
+    """按近似Zipf分布生成读取顺序，前面的文件被读取得更多。"""
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(paths))]
+    return rng.choices(paths, weights=weights, k=reads)
+
+
+def replay(pattern: list[Path], read: Callable[[Path], object]) -> float:
+    """按顺序读取文件，每WRITE_INTERVAL次读取修改一次刚读取的文件。"""
+    start = time.perf_counter()
+    for i, path in enumerate(pattern, 1):
+        read(path)
+        if i % WRITE_INTERVAL == 0:
+            with path.open("a", encoding="utf-8") as f:
+                f.write("# edited\n")
+    return time.perf_counter() - start
+
+
+def run_benchmark(
+    files: int = DEFAULT_FILES, reads: int = DEFAULT_READS
+) -> BenchmarkReport:
+    """比较三种读取方式。"""
+    results: list[CacheResult] = []
+    watching = False
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = create_workspace(Path(temp_dir), files)
+        pattern = access_pattern(paths, reads)
+        results.append(
+            {"name": "legacy", "seconds": replay(pattern, legacy_read), "stats": None}
+        )
+        for name, watch in (("stat", False), ("inotify", True)):
+            cache = FileContentCache(watch=watch)
+            if watch:
+                watching = cache.watching
+            seconds = replay(pattern, cache.read)
+            cache.close()
+            results.append({"name": name, "seconds": seconds, "stats": cache.stats})
+    for result in results:
+        result["seconds"] = round(result["seconds"], 6)
+    return {
+        "benchmark": "file_cache",
+        "linhai_version": linhai_version(),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "files": files,
+        "reads": reads,
+        "watching": watching,
+        "results": results,
+    }
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """命令行入口。"""
+    parser = argparse.ArgumentParser(description="文件读取缓存基准测试")
+    parser.add_argument("--files", type=int, default=DEFAULT_FILES, help="文件数量")
+    parser.add_argument("--reads", type=int, default=DEFAULT_READS, help="读取次数")
+    parser.add_argument("--output", help="结果JSON文件，默认输出到标准输出")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.files, args.reads)
+    output = json_backend.dumps(report, pretty=True)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
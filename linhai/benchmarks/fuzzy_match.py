@@ -0,0 +1,175 @@
+"""相似片段查找的基准测试。
+
+replace_file_content找不到要替换的内容时返回最相似的几段内容。旧实现对每个行窗口计算
+difflib.SequenceMatcher.ratio()再排序，新实现先用字符计数的上界筛选窗口。
+测试数据是确定性生成的Python风格文件，搜索字符串取自文件中的片段并做少量修改，
+每个用例都会确认两种实现返回相同的结果。
+
+用法：
+    python -m linhai.benchmarks.fuzzy_match [--lines 1000,5000] [--output result.json]
+"""
+
+from pathlib import Path
+from typing import Any, Callable, Sequence, TypedDict
+import argparse
+import datetime
+import difflib
+import random
+import sys
+import time
+
+from linhai import json_backend
+from linhai.benchmarks.compression import linhai_version
+from linhai.tool.fuzzy_match import SimilarChunk, find_similar_chunks
+
+DEFAULT_LINES = (1_000, 5_000)
+DEFAULT_REPEAT = 3
+SEARCH_LINES = (1, 3, 8)
+
+NAMES = ["content", "path", "result", "config", "message", "index", "cache", "state"]
+
+
+class MatchResult(TypedDict):
+    """单个测试用例的结果。"""
+
+    lines: int  # 文件行数
+    search_lines: int  # 搜索字符串的行数
+    legacy_seconds: float  # 旧实现单次查找的最短耗时
+    seconds: float  # 新实现单次查找的最短耗时
+    speedup: float
+
+
+class BenchmarkReport(TypedDict):
+    """基准测试的完整结果。"""
+
+    benchmark: str
+    linhai_version: str
+    created: str
+    repeat: int
+    results: list[MatchResult]
+
+
+def legacy_find_most_similar(
+    search_string: str, content: str, top_n: int = 3
+) -> list[SimilarChunk]:
+    """旧实现：对每个行窗口计算相似度后排序。"""
+    linenum = search_string.count("\n") + 1
+    lines = content.splitlines()
+    chunks = [
+        "\n".join(lines[i : i + linenum]) for i in range(0, len(lines) - linenum + 1)
+    ]
+    similarities = []
+    for i, chunk in enumerate(chunks):
+        similarity = difflib.SequenceMatcher(None, search_string, chunk).ratio()
+        similarities.append((similarity, i, chunk))
+    similarities.sort(key=lambda x: x[0], reverse=True)
+    return [
+        {
+            "similarity": similarity,
+            "start_line": chunk_index + 1,
+            "end_line": chunk_index + linenum,
+            "content": chunk_content,
+        }
+        for similarity, chunk_index, chunk_content in similarities[:top_n]
+    ]
+
+
+def synthetic_source(lines: int, seed: int = 0) -> str:
+    """生成大约lines行的Python风格代码。"""
+    rng = random.Random(seed)
+    output: list[str] = []
+    while len(output) < lines:
+        name = rng.choice(NAMES)
+        output.append(f"def handle_{name}_{len(output)}({name}, {rng.choice(NAMES)}):")
+        for _ in range(rng.randint(2, 8)):
+            left, right = rng.choice(NAMES), rng.choice(NAMES)
+            output.append(f"    {left} = {right}.get({rng.randint(0, 99)}) or {left}")
+        output.append(f"    return {name}")
+        output.append("")
+    return "\n".join(output[:lines])
+
+
+def mutated_search(content: str, search_lines: int, seed: int = 0) -> str:
+    """从内容中取search_lines行，改掉几个字符，使其不能精确匹配。"""
+    rng = random.Random(seed)
+    lines = content.splitlines()
+    start = rng.randrange(len(lines) - search_lines)
+    chars = list("\n".join(lines[start : start + search_lines]))
+    for _ in range(max(1, len(chars) // 40)):
+        chars[rng.randrange(len(chars))] = rng.choice("xyz_")
+    return "".join(chars)
+
+
+def best_time(
+    func: Callable[[str, str], Any], search: str, content: str, repeat: int
+) -> float:
+    """返回多次运行中的最短耗时。"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(search, content)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_case(lines: int, search_lines: int, repeat: int) -> MatchResult:
+    """测试一个用例，并确认两种实现的结果相同。"""
+    content = synthetic_source(lines, seed=lines)
+    search = mutated_search(content, search_lines, seed=search_lines)
+    if find_similar_chunks(search, content, time_budget=None) != (
+        legacy_find_most_similar(search, content)
+    ):
+        raise RuntimeError(f"{lines}行/{search_lines}行: 新旧实现的结果不同")
+
+    legacy_seconds = best_time(legacy_find_most_similar, search, content, repeat)
+    seconds = best_time(find_similar_chunks, search, content, repeat)
+    return {
+        "lines": lines,
+        "search_lines": search_lines,
+        "legacy_seconds": round(legacy_seconds, 6),
+        "seconds": round(seconds, 6),
+        "speedup": round(legacy_seconds / seconds, 2) if seconds else 0.0,
+    }
+
+
+def run_benchmark(
+    lines: Sequence[int] = DEFAULT_LINES, repeat: int = DEFAULT_REPEAT
+) -> BenchmarkReport:
+    """对每个文件行数和搜索行数运行基准测试。"""
+    return {
+        "benchmark": "fuzzy_match",
+        "linhai_version": linhai_version(),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "repeat": repeat,
+        "results": [
+            run_case(count, search_lines, repeat)
+            for count in lines
+            for search_lines in SEARCH_LINES
+        ],
+    }
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """命令行入口。"""
+    parser = argparse.ArgumentParser(description="相似片段查找基准测试")
+    parser.add_argument(
+        "--lines",
+        default=",".join(str(count) for count in DEFAULT_LINES),
+        help="逗号分隔的文件行数",
+    )
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="重复次数")
+    parser.add_argument("--output", help="结果JSON文件，默认输出到标准输出")
+    args = parser.parse_args(argv)
+
+    lines = [int(count) for count in args.lines.split(",") if count.strip()]
+    report = run_benchmark(lines, args.repeat)
+    output = json_backend.dumps(report, pretty=True)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
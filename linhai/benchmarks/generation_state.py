@@ -0,0 +1,171 @@
+"""生成中回调的基准测试。
+
+模拟LLM逐token生成回答内容和推理内容，比较两种生成中检查的总耗时：
+旧实现每个token对完整的回答和推理内容调用str.count统计工具调用，总耗时随回答长度平方增长；
+新实现每个token只用新增的文本更新GenerationState。
+
+用法：
+    python -m linhai.benchmarks.generation_state [--sizes 10000,100000] [--output result.json]
+"""
+
+from pathlib import Path
+from typing import Callable, Sequence, TypedDict
+import argparse
+import datetime
+import random
+import sys
+import time
+
+from linhai import json_backend
+from linhai.benchmarks.compression import linhai_version
+from linhai.benchmarks.markdown_parser import synthetic_response
+from linhai.generation_state import GenerationState
+from linhai.llm import AnswerToken
+
+DEFAULT_SIZES = (10_000, 100_000)
+DEFAULT_REPEAT = 3
+MAX_TOKEN_CHARS = 8
+
+
+class GenerationResult(TypedDict):
+    """单个回答大小的结果。"""
+
+    chars: int  # 回答内容和推理内容各自的字符数
+    tokens: int
+    legacy_seconds: float  # 旧实现所有token的总耗时，取多次运行中的最短耗时
+    seconds: float  # 新实现所有token的总耗时
+    speedup: float
+
+
+class BenchmarkReport(TypedDict):
+    """基准测试的完整结果。"""
+
+    benchmark: str
+    linhai_version: str
+    created: str
+    repeat: int
+    results: list[GenerationResult]
+
+
+def split_tokens(content: str, reasoning: str, seed: int = 0) -> list[AnswerToken]:
+    """把推理内容和回答内容切分为1到MAX_TOKEN_CHARS个字符的token，推理内容在前。"""
+    rng = random.Random(seed)
+    tokens: list[AnswerToken] = []
+    for is_reasoning, text in ((True, reasoning), (False, content)):
+        position = 0
+        while position < len(text):
+            piece = text[position : position + rng.randint(1, MAX_TOKEN_CHARS)]
+            tokens.append(
+                {
+                    "reasoning_content": piece if is_reasoning else None,
+                    "content": "" if is_reasoning else piece,
+                }
+            )
+            position += len(piece)
+    return tokens
+
+
+def legacy_generation(tokens: list[AnswerToken]) -> int:
+    """旧实现：累积文本，每个token统计完整文本中的工具调用。"""
+    content = ""
+    reasoning = ""
+    count = 0
+    for token in tokens:
+        content += token["content"]
+        if token["reasoning_content"]:
+            reasoning += token["reasoning_content"]
+        count = content.count("\n```json toolcall") + reasoning.count(
+            "\n```json toolcall"
+        )
+    return count
+
+
+def delta_generation(tokens: list[AnswerToken]) -> int:
+    """新实现：累积文本，每个token更新增量状态。"""
+    content = ""
+    state = GenerationState()
+    count = 0
+    for token in tokens:
+        content += token["content"]
+        state.feed(token)
+        count = state.content.tool_call_count + state.reasoning.tool_call_count
+    return count
+
+
+def best_time(
+    func: Callable[[list[AnswerToken]], int], tokens: list[AnswerToken], repeat: int
+) -> float:
+    """返回多次运行中的最短耗时。"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(tokens)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_case(size: int, repeat: int) -> GenerationResult:
+    """测试一个回答大小，并确认增量状态与完整文本的统计一致。"""
+    content = synthetic_response(size, seed=size)
+    reasoning = synthetic_response(size, seed=size + 1)
+    tokens = split_tokens(content, reasoning)
+
+    state = GenerationState()
+    for token in tokens:
+        state.feed(token)
+    if (
+        state.content.fence_count != content.count("```")
+        or state.content.line_count != content.count("\n")
+        or state.content.last_line != content.rpartition("\n")[2]
+        or state.reasoning.length != len(reasoning)
+    ):
+        raise RuntimeError(f"{size}: 增量状态与完整文本的统计不一致")
+
+    legacy_seconds = best_time(legacy_generation, tokens, repeat)
+    seconds = best_time(delta_generation, tokens, repeat)
+    return {
+        "chars": size,
+        "tokens": len(tokens),
+        "legacy_seconds": round(legacy_seconds, 6),
+        "seconds": round(seconds, 6),
+        "speedup": round(legacy_seconds / seconds, 2) if seconds else 0.0,
+    }
+
+
+def run_benchmark(
+    sizes: Sequence[int] = DEFAULT_SIZES, repeat: int = DEFAULT_REPEAT
+) -> BenchmarkReport:
+    """对每个回答大小运行基准测试。"""
+    return {
+        "benchmark": "generation_state",
+        "linhai_version": linhai_version(),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "repeat": repeat,
+        "results": [run_case(size, repeat) for size in sizes],
+    }
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """命令行入口。"""
+    parser = argparse.ArgumentParser(description="生成中回调基准测试")
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(size) for size in DEFAULT_SIZES),
+        help="逗号分隔的回答字符数",
+    )
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="重复次数")
+    parser.add_argument("--output", help="结果JSON文件，默认输出到标准输出")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    report = run_benchmark(sizes, args.repeat)
+    output = json_backend.dumps(report, pretty=True)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""JSON后端基准测试。
+
+用每个可用的JSON后端保存和读取同一段历史，分别统计消息序列化、保存会话、关闭会话和读取会话的耗时。
+历史是确定性生成的，包含用户消息、助手消息、工具调用和工具结果。
+
+用法：
+    python -m linhai.benchmarks.json_backend [--messages 10000] [--output result.json]
+"""
+
+from pathlib import Path
+from typing import Any, Sequence, TypedDict
+import argparse
+import datetime
+import random
+import sys
+import tempfile
+import time
+
+from linhai import json_backend
+from linhai.agent_base import RuntimeMessage
+from linhai.benchmarks.compression import linhai_version
+from linhai.history import HistoryStore
+from linhai.history_replay import message_from_dict
+from linhai.llm import ChatMessage, SystemMessage, ToolCallMessage
+from linhai.tool.main import ToolResultMessage
+
+DEFAULT_MESSAGES = 10_000
+SESSION_ID = "benchmark"
+
+
+class BackendResult(TypedDict):
+    """单个后端的结果，耗时单位为秒。"""
+
+    backend: str
+    serialize_seconds: float  # 与Agent保存历史时相同的to_json和解析
+    save_seconds: float  # HistoryStore.save_session
+    close_seconds: float  # HistoryStore.close_session
+    load_seconds: float  # 读取会话并还原为消息对象
+    total_seconds: float
+
+
+class BenchmarkReport(TypedDict):
+    """基准测试的完整结果。"""
+
+    benchmark: str
+    linhai_version: str
+    created: str
+    messages: int
+    results: list[BackendResult]
+
+
+def synthetic_messages(count: int, store: HistoryStore, seed: int = 0) -> list[Any]:
+    """生成count条消息的历史。"""
+    rng = random.Random(seed)
+    messages: list[Any] = [SystemMessage("系统提示 " * 50)]
+    while len(messages) < count:
+        i = len(messages)
+        filepath = f"src/module_{rng.randint(0, 50)}.py"
+        messages.append(ChatMessage("user", f"第{i}个需求：修改{filepath}中的函数"))
+        messages.append(
+            ChatMessage("assistant", f"读取{filepath}\n" + "分析 " * rng.randint(5, 60))
+        )
+        messages.append(
+            ToolCallMessage(
+                "read_file", {"filepath": filepath, "line": rng.randint(1, 500)}
+            )
+        )
+        messages.append(RuntimeMessage("你调用了工具'read_file'，结果如下"))
+        messages.append(
+            ToolResultMessage(
+                "".join(
+                    f"line {n}: value = {rng.random()}\n"
+                    for n in range(rng.randint(5, 40))
+                ),
+                blob_store=store.blobs,
+                tool_name="read_file",
+                tool_arguments={"filepath": filepath},
+            )
+        )
+    return messages[:count]
+
+
+def serialize_messages(messages: list[Any]) -> list[dict]:
+    """与Agent.save_conversation_history相同的序列化方式。"""
+    history_data = []
+    for message in messages:
+        data = json_backend.loads(message.to_json())
+        data["type"] = type(message).__name__
+        history_data.append(data)
+    return history_data
+
+
+def run_backend(name: str, count: int) -> BackendResult:
+    """用一个后端保存、关闭并读取历史。"""
+    previous = json_backend.backend
+    json_backend.set_backend(name)
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = HistoryStore(Path(temp_dir), compression="gzip")
+            messages = synthetic_messages(count, store)
+
+            start = time.perf_counter()
+            history_data = serialize_messages(messages)
+            serialized = time.perf_counter()
+            store.save_session(SESSION_ID, history_data)
+            saved = time.perf_counter()
+            store.close_session(SESSION_ID)
+            closed = time.perf_counter()
+            loaded = [
+                message_from_dict(data, store.blobs)
+                for data in store.load_session(SESSION_ID)
+            ]
+            end = time.perf_counter()
+            if len(loaded) != count:
+                raise RuntimeError(f"{name}: 读取到{len(loaded)}条消息，应为{count}条")
+    finally:
+        json_backend.set_backend(previous)
+
+    return {
+        "backend": name,
+        "serialize_seconds": round(serialized - start, 6),
+        "save_seconds": round(saved - serialized, 6),
+        "close_seconds": round(closed - saved, 6),
+        "load_seconds": round(end - closed, 6),
+        "total_seconds": round(end - start, 6),
+    }
+
+
+def run_benchmark(
+    count: int = DEFAULT_MESSAGES, backends: Sequence[str] | None = None
+) -> BenchmarkReport:
+    """对每个后端运行基准测试，默认测试所有可用的后端。"""
+    names = list(backends) if backends else json_backend.available_backends()
+    return {
+        "benchmark": "json_backend",
+        "linhai_version": linhai_version(),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "messages": count,
+        "results": [run_backend(name, count) for name in names],
+    }
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """命令行入口。"""
+    parser = argparse.ArgumentParser(description="JSON后端基准测试")
+    parser.add_argument(
+        "--messages", type=int, default=DEFAULT_MESSAGES, help="历史消息数量"
+    )
+    parser.add_argument(
+        "--backends",
+        help=f"逗号分隔的后端列表，可用：{', '.join(json_backend.available_backends())}",
+    )
+    parser.add_argument("--output", help="结果JSON文件，默认输出到标准输出")
+    args = parser.parse_args(argv)
+
+    backends = (
+        [name.strip() for name in args.backends.split(",") if name.strip()]
+        if args.backends
+        else None
+    )
+    report = run_benchmark(args.messages, backends)
+    output = json_backend.dumps(report, pretty=True)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
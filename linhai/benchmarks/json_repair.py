@@ -0,0 +1,133 @@
+"""工具调用JSON修复的效果统计。
+
+读取历史目录中保存的会话，重新解析助手回答中的每个json toolcall代码块，
+统计标准解析失败的代码块中有多少能被修复，以及因此可以省去的重试轮数：
+一个回答中所有解析失败的代码块都能修复时，LLM就不需要为此重新输出工具调用。
+
+用法：
+    python -m linhai.benchmarks.json_repair [--history-dir DIR] [--output result.json]
+"""
+
+from pathlib import Path
+from typing import Sequence, TypedDict
+import argparse
+import datetime
+import sys
+
+from linhai import json_backend
+from linhai.benchmarks.compression import linhai_version
+from linhai.config import HistoryConfig
+from linhai.history import HistoryStore
+from linhai.json_repair import RepairStats, new_repair_stats, record_repair, repair_json
+from linhai.markdown_parser import TOOL_CALL_LANGUAGE, extract_code_blocks
+
+
+class RepairReport(TypedDict):
+    """修复效果统计的完整结果。"""
+
+    benchmark: str
+    linhai_version: str
+    created: str
+    history_dir: str
+    sessions: int
+    answers: int  # 包含工具调用代码块的助手回答数量
+    blocks: int  # json toolcall代码块数量
+    parse_failures: int  # 标准解析失败的代码块数量
+    stats: RepairStats
+    success_rate: float  # 修复成功的比例
+    answers_with_failures: int  # 有解析失败代码块的回答数量
+    turns_saved: int  # 所有失败代码块都能修复的回答数量
+
+
+def run_benchmark(store: HistoryStore, limit: int | None = None) -> RepairReport:
+    """统计历史中工具调用代码块的修复效果。
+
+    Args:
+        store: 历史存储
+        limit: 最多统计的会话数量，从最新的会话开始
+
+    Returns:
+        统计结果
+    """
+    stats = new_repair_stats()
+    sessions = answers = blocks = failures = answers_with_failures = turns_saved = 0
+    for info in reversed(store.list_sessions()):
+        if limit is not None and sessions >= limit:
+            break
+        sessions += 1
+        for message in store.load_session(info["session_id"]):
+            if message.get("role") != "assistant" or not isinstance(
+                message.get("message"), str
+            ):
+                continue
+            contents = [
+                block["content"]
+                for block in extract_code_blocks(message["message"])
+                if block["language"].lower() == TOOL_CALL_LANGUAGE
+            ]
+            if not contents:
+                continue
+            answers += 1
+            blocks += len(contents)
+            unrepaired = 0
+            answer_failures = 0
+            for content in contents:
+                try:
+                    json_backend.loads(content)
+                    continue
+                except json_backend.JSONDecodeError:
+                    pass
+                answer_failures += 1
+                repaired = repair_json(content)
+                record_repair(stats, None if repaired is None else repaired[1])
+                if repaired is None:
+                    unrepaired += 1
+            failures += answer_failures
+            if answer_failures:
+                answers_with_failures += 1
+                if not unrepaired:
+                    turns_saved += 1
+
+    return {
+        "benchmark": "json_repair",
+        "linhai_version": linhai_version(),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "history_dir": str(store.root),
+        "sessions": sessions,
+        "answers": answers,
+        "blocks": blocks,
+        "parse_failures": failures,
+        "stats": stats,
+        "success_rate": (
+            round(stats["repaired"] / stats["attempts"], 4)
+            if stats["attempts"]
+            else 0.0
+        ),
+        "answers_with_failures": answers_with_failures,
+        "turns_saved": turns_saved,
+    }
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """命令行入口。"""
+    parser = argparse.ArgumentParser(description="工具调用JSON修复效果统计")
+    parser.add_argument("--history-dir", help="历史目录，默认使用默认目录")
+    parser.add_argument("--limit", type=int, help="最多统计的会话数量")
+    parser.add_argument("--output", help="结果JSON文件，默认输出到标准输出")
+    args = parser.parse_args(argv)
+
+    history_config: HistoryConfig = {}
+    if args.history_dir:
+        history_config["dir"] = args.history_dir
+    store = HistoryStore.from_config(history_config)
+    report = run_benchmark(store, args.limit)
+    output = json_backend.dumps(report, pretty=True)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
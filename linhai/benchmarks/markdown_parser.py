@@ -0,0 +1,166 @@
+"""Markdown解析基准测试。
+
+比较每次创建mistune实例并渲染HTML的旧实现与只做块级解析的extract_code_blocks，
+测试数据是确定性生成的LLM风格回答：包含行内格式、列表、普通代码块和工具调用。
+
+用法：
+    python -m linhai.benchmarks.markdown_parser [--sizes 5000,50000,200000] [--output result.json]
+"""
+
+from pathlib import Path
+from typing import Any, Callable, Sequence, TypedDict
+import argparse
+import datetime
+import random
+import sys
+import time
+
+import mistune
+
+from linhai import json_backend
+from linhai.benchmarks.compression import linhai_version
+from linhai.markdown_parser import CodeBlockRenderer, extract_tool_calls_with_errors
+
+DEFAULT_SIZES = (5_000, 50_000, 200_000)
+DEFAULT_REPEAT = 5
+
+WORDS = ["修改", "文件", "函数", "测试", "参数", "配置", "结果", "错误", "缓存", "调用"]
+
+
+class ParserResult(TypedDict):
+    """单个测试用例的结果。"""
+
+    name: str
+    chars: int
+    code_blocks: int
+    legacy_seconds: float  # 旧实现单次解析的最短耗时
+    seconds: float  # 新实现单次解析的最短耗时
+    speedup: float
+
+
+class BenchmarkReport(TypedDict):
+    """基准测试的完整结果。"""
+
+    benchmark: str
+    linhai_version: str
+    created: str
+    repeat: int
+    results: list[ParserResult]
+
+
+def legacy_code_blocks(markdown_text: str) -> list[dict[str, str]]:
+    """旧实现：每次创建mistune实例并渲染完整的HTML。"""
+    renderer = CodeBlockRenderer()
+    markdown = mistune.create_markdown(renderer=renderer)
+    markdown(markdown_text)
+    return renderer.code_blocks
+
+
+def synthetic_response(size: int, seed: int = 0, with_code: bool = True) -> str:
+    """生成大约size个字符的LLM风格回答。"""
+    rng = random.Random(seed)
+    parts: list[str] = []
+    length = 0
+    while length < size:
+        words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 40)))
+        kind = rng.random()
+        if kind < 0.5:
+            part = f"{words}，**注意** `value_{rng.randint(0, 99)}` 见[文档](https://example.com)。\n\n"
+        elif kind < 0.8:
+            part = (
+                "".join(f"- [x] {words[:30]}\n" for _ in range(rng.randint(2, 6)))
+                + "\n"
+            )
+        elif with_code:
+            lines = "".join(
+                f"    result_{i} = compute({i}, '{words[:10]}')\n" for i in range(20)
+            )
+            part = f"```python\ndef example():\n{lines}```\n\n"
+        else:
+            part = f"> {words}\n\n"
+        parts.append(part)
+        length += len(part)
+    if with_code:
+        for i in range(2):
+            arguments = json_backend.dumps({"filepath": f"src/file_{i}.py"})
+            parts.append(
+                f'```json toolcall\n{{"name": "read_file", "arguments": {arguments}}}\n```\n'
+            )
+    return "".join(parts)
+
+
+def best_time(func: Callable[[str], Any], text: str, repeat: int) -> float:
+    """返回多次运行中的最短耗时。"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_case(name: str, text: str, repeat: int) -> ParserResult:
+    """测试一个回答，并确认两种实现的工具调用结果一致。"""
+    legacy_blocks = legacy_code_blocks(text)
+    tool_call_blocks = [
+        block for block in legacy_blocks if block["language"].lower() == "json toolcall"
+    ]
+    tool_calls, errors = extract_tool_calls_with_errors(text)
+    if len(tool_calls) + len(errors) != len(tool_call_blocks):
+        raise RuntimeError(f"{name}: 新旧实现提取的工具调用不一致")
+
+    legacy_seconds = best_time(legacy_code_blocks, text, repeat)
+    seconds = best_time(extract_tool_calls_with_errors, text, repeat)
+    return {
+        "name": name,
+        "chars": len(text),
+        "code_blocks": len(legacy_blocks),
+        "legacy_seconds": round(legacy_seconds, 6),
+        "seconds": round(seconds, 6),
+        "speedup": round(legacy_seconds / seconds, 2) if seconds else 0.0,
+    }
+
+
+def run_benchmark(
+    sizes: Sequence[int] = DEFAULT_SIZES, repeat: int = DEFAULT_REPEAT
+) -> BenchmarkReport:
+    """对每个大小分别测试带代码块和不带代码块的回答。"""
+    results = []
+    for size in sizes:
+        results.append(run_case(f"code_{size}", synthetic_response(size), repeat))
+        results.append(
+            run_case(f"prose_{size}", synthetic_response(size, with_code=False), repeat)
+        )
+    return {
+        "benchmark": "markdown_parser",
+        "linhai_version": linhai_version(),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """命令行入口。"""
+    parser = argparse.ArgumentParser(description="Markdown解析基准测试")
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(size) for size in DEFAULT_SIZES),
+        help="逗号分隔的回答字符数",
+    )
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="重复次数")
+    parser.add_argument("--output", help="结果JSON文件，默认输出到标准输出")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    report = run_benchmark(sizes, args.repeat)
+    output = json_backend.dumps(report, pretty=True)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""按内容寻址的数据块存储模块。
+
+数据块以内容的sha256哈希命名并压缩保存，相同内容只保存一份。
+最近读取的数据块保存在一个按字节数限制大小的LRU缓存中。
+"""
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterator
+import gzip
+import hashlib
+import os
+import threading
+
+# zstandard是可选依赖，没有安装时mypy找不到它的类型信息，用None表示不可用
+try:
+    import zstandard  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - 可选依赖
+    zstandard = None  # type: ignore[assignment]
+
+COMPRESSION_SUFFIXES: dict[str, str] = {
+    "zstd": ".zst",
+    "gzip": ".gz",
+    "none": "",
+}
+
+
+def resolve_compression(kind: str = "auto") -> str:
+    """根据配置和可用依赖确定实际使用的压缩方式。
+
+    Args:
+        kind: 配置中的压缩方式，auto表示优先zstd
+
+    Returns:
+        zstd、gzip或none
+    """
+    if kind == "auto":
+        return "zstd" if zstandard is not None else "gzip"
+    if kind == "zstd" and zstandard is None:
+        return "gzip"
+    if kind not in COMPRESSION_SUFFIXES:
+        raise ValueError(f"未知的压缩方式: {kind!r}")
+    return kind
+
+
+def compress_bytes(data: bytes, compression: str) -> bytes:
+    """按指定方式压缩字节串。"""
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard未安装，无法使用zstd压缩")
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    return data
+
+
+def decompress_bytes(data: bytes, suffix: str) -> bytes:
+    """根据文件后缀解压字节串。"""
+    if suffix == ".zst":
+        if zstandard is None:
+            raise RuntimeError("zstandard未安装，无法读取zstd压缩的数据")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if suffix == ".gz":
+        return gzip.decompress(data)
+    return data
+
+
+def atomic_write(path: Path, data: bytes) -> None:
+    """先写入临时文件再重命名，避免留下写了一半的文件。"""
+    temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+
+class BlobStore:
+    """按内容寻址的压缩数据块存储。"""
+
+    def __init__(
+        self, root: Path, compression: str = "auto", cache_bytes: int = 16 * 1024 * 1024
+    ):
+        """初始化数据块存储。
+
+        Args:
+            root: 存储目录
+            compression: 新数据块使用的压缩方式
+            cache_bytes: 读取缓存的最大字节数
+        """
+        self.root = root
+        self.compression = resolve_compression(compression)
+        self.cache_bytes = cache_bytes
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._cache_size = 0
+        self._lock = threading.Lock()
+
+    def path(self, digest: str, compression: str | None = None) -> Path:
+        """数据块的文件路径。"""
+        suffix = COMPRESSION_SUFFIXES[compression or self.compression]
+        return self.root / digest[:2] / f"{digest}{suffix}"
+
+    def find(self, digest: str) -> Path | None:
+        """查找数据块文件，兼容不同压缩方式写入的数据块。"""
+        for compression in ("zstd", "gzip", "none"):
+            path = self.path(digest, compression)
+            if path.exists():
+                return path
+        return None
+
+    def __contains__(self, digest: str) -> bool:
+        return self.find(digest) is not None
+
+    def _remember(self, digest: str, data: bytes) -> None:
+        """把数据块放入LRU缓存。"""
+        if len(data) > self.cache_bytes:
+            return
+        with self._lock:
+            if digest in self._cache:
+                self._cache.move_to_end(digest)
+                return
+            self._cache[digest] = data
+            self._cache_size += len(data)
+            while self._cache_size > self.cache_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_size -= len(evicted)
+
+    def put_bytes(self, data: bytes) -> str:
+        """保存数据块，已存在时只更新修改时间。
+
+        Returns:
+            数据块的sha256哈希
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        existing = self.find(digest)
+        if existing is None:
+            path = self.path(digest)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write(path, compress_bytes(data, self.compression))
+        else:
+            os.utime(existing)
+        return digest
+
+    def get_bytes(self, digest: str) -> bytes:
+        """读取数据块。"""
+        with self._lock:
+            cached = self._cache.get(digest)
+            if cached is not None:
+                self._cache.move_to_end(digest)
+                return cached
+        path = self.find(digest)
+        if path is None:
+            raise FileNotFoundError(f"数据块{digest}不存在")
+        data = decompress_bytes(path.read_bytes(), path.suffix)
+        self._remember(digest, data)
+        return data
+
+    def put_text(self, text: str) -> str:
+        """以UTF-8编码保存文本。"""
+        return self.put_bytes(text.encode("utf-8"))
+
+    def get_text(self, digest: str) -> str:
+        """读取以UTF-8编码保存的文本。"""
+        return self.get_bytes(digest).decode("utf-8")
+
+    def iter_blobs(self) -> Iterator[tuple[str, Path]]:
+        """遍历所有数据块的哈希和路径。"""
+        if not self.root.exists():
+            return
+        for path in self.root.rglob("*"):
+            if path.is_file() and not path.name.startswith("."):
+                yield path.name.split(".", 1)[0], path
+
+    def delete(self, digest: str) -> int:
+        """删除数据块。
+
+        Returns:
+            释放的字节数，数据块不存在时返回0
+        """
+        with self._lock:
+            cached = self._cache.pop(digest, None)
+            if cached is not None:
+                self._cache_size -= len(cached)
+        path = self.find(digest)
+        if path is None:
+            return 0
+        size = path.stat().st_size
+        path.unlink()
+        return size
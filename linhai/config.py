@@ -1,6 +1,6 @@
 """Configuration module for LinHai agent."""
 
-from typing import TypedDict, cast, Union
+from typing import TypedDict, cast, Union, Literal, NotRequired
 import tomllib
 from pathlib import Path
 from urllib.parse import urlparse
@@ -14,6 +14,8 @@ class CheapLLMConfig(TypedDict):
     base_url: str
     api_key: str
     model: str
+    openai_config: NotRequired[dict]  # 传给OpenAI客户端的额外参数
+    chat_completion_kwargs: NotRequired[dict]  # 每次请求附加的参数
 
 
 class LLMConfig(TypedDict):
@@ -22,7 +24,10 @@ class LLMConfig(TypedDict):
     base_url: str
     api_key: str
     model: str
+    openai_config: NotRequired[dict]  # 传给OpenAI客户端的额外参数
+    chat_completion_kwargs: NotRequired[dict]  # 每次请求附加的参数
     cheap: CheapLLMConfig
+    fast: NotRequired[CheapLLMConfig]  # 不思考的模型，思考超过预算时可以改用它重试
 
 
 class MemoryConfig(TypedDict):
@@ -35,6 +40,21 @@ class ToolConfig(TypedDict):
     """工具配置类型定义。"""
 
     max_output_length: int
+    blob_threshold: NotRequired[int]  # 超过该长度的输出移入数据块存储
+    digest_oversized: NotRequired[bool]  # 是否让廉价LLM为超长的命令和HTTP输出生成摘要
+    digest_timeout_seconds: NotRequired[float]  # 生成回复前最多等待摘要的秒数
+
+
+class HistoryConfig(TypedDict, total=False):
+    """历史存储配置类型定义。"""
+
+    dir: str  # 历史目录，默认为~/.local/share/linhai/history
+    compression: Literal["auto", "zstd", "gzip", "none"]  # 关闭会话的压缩方式
+    idle_minutes: float  # 会话多久未更新后视为已关闭
+    auto_maintain: bool  # Agent启动时是否在后台执行维护
+    max_age_days: float  # 会话最长保留天数
+    max_sessions: int  # 最多保留的会话数量
+    max_total_mb: float  # 历史目录最大占用空间（MB）
 
 
 class Config(TypedDict):
@@ -45,6 +65,7 @@ class Config(TypedDict):
     compress_threshold_soft: float
     compress_threshold_hard: float
     tools: ToolConfig
+    history: NotRequired[HistoryConfig]
 
 
 def validate_config(config: Config) -> None:
@@ -57,6 +78,22 @@ def validate_config(config: Config) -> None:
         if not memory_config.get("file_path"):
             raise ConfigValidationError("memory.file_path cannot be empty")
 
+    # 验证history配置（可选）
+    if "history" in config:
+        history_config = config["history"]
+        if history_config.get("compression", "auto") not in (
+            "auto",
+            "zstd",
+            "gzip",
+            "none",
+        ):
+            raise ConfigValidationError(
+                "history.compression must be one of auto, zstd, gzip, none"
+            )
+        for key in ("max_age_days", "max_sessions", "max_total_mb", "idle_minutes"):
+            if key in history_config and history_config[key] < 0:  # type: ignore
+                raise ConfigValidationError(f"history.{key} cannot be negative")
+
     # 验证base_url
     try:
         result = urlparse(llm_config["base_url"])
@@ -85,6 +122,35 @@ def validate_config(config: Config) -> None:
         if not cheap_config.get("model"):
             raise ConfigValidationError("cheap.model cannot be empty")
 
+    # 验证fast配置（如果存在）
+    if "fast" in llm_config:
+        fast_config = llm_config["fast"]
+        for key in ("base_url", "api_key", "model"):
+            if not fast_config.get(key):
+                raise ConfigValidationError(f"fast.{key} cannot be empty")
+
+    # 验证思考预算配置（如果存在）
+    budget_config = cast(dict, config).get("agent", {}).get("reasoning_budget", {})
+    for key in (
+        "working_tokens",
+        "working_seconds",
+        "waiting_user_tokens",
+        "waiting_user_seconds",
+        "max_retries",
+    ):
+        if key in budget_config and budget_config[key] < 0:
+            raise ConfigValidationError(
+                f"agent.reasoning_budget.{key} cannot be negative"
+            )
+    if budget_config.get("fallback", "brief") not in ("brief", "fast_model"):
+        raise ConfigValidationError(
+            "agent.reasoning_budget.fallback must be one of brief, fast_model"
+        )
+    if budget_config.get("fallback") == "fast_model" and "fast" not in llm_config:
+        raise ConfigValidationError(
+            "agent.reasoning_budget.fallback = fast_model requires [llm.fast]"
+        )
+
 
 def load_config(config_path: Union[str, Path, None] = None) -> Config:
     """从指定路径加载配置并验证
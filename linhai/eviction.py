@@ -0,0 +1,250 @@
+"""历史消息淘汰模块。
+
+为每条消息计算特征（token数、距今的消息数、消息类型、之后是否被提及），
+由淘汰策略根据特征给出优先级，优先级最低的消息先被删除，直到估计的token数低于目标。
+排序的复杂度为O(n log n)。策略可以通过register_eviction_policy注册，在配置中按名称选择。
+"""
+
+from typing import Any, Callable, Sequence, TypedDict
+import os
+import random
+import re
+
+from linhai.agent_base import DestroyedRuntimeMessage, RuntimeMessage, SummaryMessage
+from linhai.history_compressor import (
+    estimate_message_tokens,
+    mark_superseded_results,
+    min_safe_index,
+)
+from linhai.llm import ChatMessage
+from linhai.tool.main import ToolErrorMessage, ToolResultMessage
+
+DEFAULT_EVICTION_POLICY = "scored"
+DEFAULT_TARGET_RATIO = 0.5
+DEFAULT_KEEP_RECENT = 10
+# 除系统消息外，历史开头始终保留的消息数量
+DEFAULT_PROTECTED_PREFIX = 5
+
+# 助手消息中类似文件名的词，用于判断工具结果之后是否被提及
+FILE_NAME_PATTERN = re.compile(r"[\w.-]+\.\w+", re.ASCII)
+
+
+class MessageFeatures(TypedDict):
+    """淘汰策略使用的消息特征。"""
+
+    index: int  # 消息下标
+    tokens: int  # 估计的token数
+    age: int  # 之后还有多少条消息
+    kind: str  # 消息类型，见message_kind
+    referenced: bool  # 之后的助手消息是否提及了该消息涉及的文件
+
+
+class EvictionReport(TypedDict):
+    """一次淘汰的结果。"""
+
+    policy: str
+    evicted: int  # 删除的消息数量
+    tokens_before: int
+    tokens_after: int
+    evicted_kinds: dict[str, int]  # 按类型统计的删除数量
+
+
+EvictionPolicy = Callable[[MessageFeatures], float]
+"""淘汰策略：根据消息特征返回优先级，优先级越低越先被删除。"""
+
+eviction_policies: dict[str, EvictionPolicy] = {}
+
+
+def register_eviction_policy(name: str):
+    """注册淘汰策略的装饰器。"""
+
+    def decorator(func: EvictionPolicy) -> EvictionPolicy:
+        eviction_policies[name] = func
+        return func
+
+    return decorator
+
+
+def get_eviction_policy(name: str) -> EvictionPolicy:
+    """按名称获取淘汰策略。
+
+    Raises:
+        ValueError: 策略不存在
+    """
+    try:
+        return eviction_policies[name]
+    except KeyError:
+        raise ValueError(
+            f"未知的淘汰策略: {name!r}，可选：{', '.join(sorted(eviction_policies))}"
+        ) from None
+
+
+def message_kind(message: Any) -> str:
+    """返回淘汰策略使用的消息类型。"""
+    if isinstance(message, ChatMessage):
+        return "user" if message.role == "user" else "assistant"
+    if isinstance(message, ToolResultMessage):
+        return "superseded" if message.superseded_by is not None else "tool_result"
+    if isinstance(message, ToolErrorMessage):
+        return "tool_error"
+    if isinstance(message, SummaryMessage):
+        return "summary"
+    if isinstance(message, DestroyedRuntimeMessage):
+        return "destroyed"
+    if isinstance(message, RuntimeMessage):
+        return "runtime"
+    return "other"
+
+
+def message_features(messages: Sequence[Any]) -> list[MessageFeatures]:
+    """计算所有消息的特征。
+
+    从后往前扫描一次，记录之后的助手消息中出现过的文件名，
+    因此判断是否被提及的总复杂度与历史文本长度成正比。
+    """
+    mark_superseded_results(messages)
+    mentioned: set[str] = set()
+    features: list[MessageFeatures] = []
+    for i in range(len(messages) - 1, -1, -1):
+        msg = messages[i]
+        referenced = False
+        if isinstance(msg, ToolResultMessage) and msg.file_path is not None:
+            referenced = os.path.basename(msg.file_path) in mentioned
+        elif isinstance(msg, ChatMessage) and msg.role == "assistant":
+            mentioned.update(FILE_NAME_PATTERN.findall(msg.message))
+        features.append(
+            {
+                "index": i,
+                "tokens": estimate_message_tokens(msg),
+                "age": len(messages) - 1 - i,
+                "kind": message_kind(msg),
+                "referenced": referenced,
+            }
+        )
+    features.reverse()
+    return features
+
+
+# 各类消息的价值，用户消息和摘要最重要，已被取代的读取结果几乎没有价值
+KIND_VALUES: dict[str, float] = {
+    "user": 10.0,
+    "summary": 8.0,
+    "assistant": 3.0,
+    "tool_result": 1.0,
+    "tool_error": 0.5,
+    "runtime": 0.5,
+    "other": 1.0,
+    "superseded": 0.05,
+    "destroyed": 0.0,
+}
+# 距今多少条消息时新近程度的加成减半
+RECENCY_HALF_LIFE = 20
+
+
+@register_eviction_policy("scored")
+def scored_policy(features: MessageFeatures) -> float:
+    """综合类型、新近程度和是否被提及计算价值，按每个token的价值淘汰。"""
+    value = KIND_VALUES.get(features["kind"], 1.0)
+    value *= 1 + 3 * RECENCY_HALF_LIFE / (RECENCY_HALF_LIFE + features["age"])
+    if features["referenced"]:
+        value *= 2
+    return value / max(features["tokens"], 1)
+
+
+@register_eviction_policy("oldest")
+def oldest_policy(features: MessageFeatures) -> float:
+    """最早的消息先被删除。"""
+    return -features["age"]
+
+
+@register_eviction_policy("largest")
+def largest_policy(features: MessageFeatures) -> float:
+    """token数最多的消息先被删除。"""
+    return -features["tokens"]
+
+
+@register_eviction_policy("random")
+def random_policy(features: MessageFeatures) -> float:
+    """随机删除，与原来的thanox_history行为相同。"""
+    return random.random()
+
+
+def plan_eviction(
+    messages: Sequence[Any],
+    target_tokens: int,
+    policy: EvictionPolicy,
+    keep_recent: int = DEFAULT_KEEP_RECENT,
+    protected_prefix: int = DEFAULT_PROTECTED_PREFIX,
+) -> tuple[list[int], list[MessageFeatures]]:
+    """选择需要删除的消息。
+
+    Args:
+        messages: 历史消息
+        target_tokens: 删除后估计token数的目标
+        policy: 淘汰策略
+        keep_recent: 末尾不会被删除的消息数量
+        protected_prefix: 开头不会被删除的消息数量，系统消息总是受保护
+
+    Returns:
+        按下标排序的待删除消息下标，以及所有消息的特征
+    """
+    features = message_features(messages)
+    total = sum(feature["tokens"] for feature in features)
+    start = max(min_safe_index(messages), protected_prefix)
+    end = len(messages) - keep_recent
+    candidates = sorted(features[start:end], key=policy)
+
+    # 连续被删除的消息合并为一条占位消息，占位消息的token数也计入总数
+    marker_tokens = estimate_message_tokens(DestroyedRuntimeMessage())
+    evicted: set[int] = set()
+    for feature in candidates:
+        if total <= target_tokens:
+            break
+        if feature["kind"] == "destroyed":
+            continue
+        index = feature["index"]
+        neighbours = (index - 1 in evicted) + (index + 1 in evicted)
+        evicted.add(index)
+        total -= feature["tokens"] - marker_tokens * (1 - neighbours)
+    return sorted(evicted), features
+
+
+def evict_messages(
+    messages: Sequence[Any],
+    target_tokens: int,
+    policy_name: str = DEFAULT_EVICTION_POLICY,
+    keep_recent: int = DEFAULT_KEEP_RECENT,
+    protected_prefix: int = DEFAULT_PROTECTED_PREFIX,
+) -> tuple[list[Any], EvictionReport]:
+    """删除价值最低的消息直到估计的token数低于目标，不修改传入的列表。
+
+    连续被删除的消息合并为一条DestroyedRuntimeMessage。
+
+    Returns:
+        删除后的消息列表和删除结果
+    """
+    policy = get_eviction_policy(policy_name)
+    evicted, features = plan_eviction(
+        messages, target_tokens, policy, keep_recent, protected_prefix
+    )
+    evicted_set = set(evicted)
+
+    result: list[Any] = []
+    evicted_kinds: dict[str, int] = {}
+    for i, msg in enumerate(messages):
+        if i not in evicted_set:
+            result.append(msg)
+            continue
+        kind = features[i]["kind"]
+        evicted_kinds[kind] = evicted_kinds.get(kind, 0) + 1
+        if i - 1 not in evicted_set:
+            result.append(DestroyedRuntimeMessage())
+
+    report: EvictionReport = {
+        "policy": policy_name,
+        "evicted": len(evicted),
+        "tokens_before": sum(feature["tokens"] for feature in features),
+        "tokens_after": sum(estimate_message_tokens(msg) for msg in result),
+        "evicted_kinds": evicted_kinds,
+    }
+    return result, report
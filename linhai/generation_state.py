@@ -0,0 +1,125 @@
+"""LLM生成回答时的增量状态。
+
+回答每生成一个token，Agent把token交给GenerationState更新一次，再把token和状态传给
+生成中的回调。回调只需要处理新增的文本，不需要每次重新扫描整个回答。
+"""
+
+from typing import List
+
+from linhai.llm import AnswerToken
+from linhai.markdown_parser import ToolCallEvent, ToolCallScanner
+
+
+class TextStreamState:
+    """一个输出流（回答内容或推理内容）的增量统计，每段新增文本只扫描一次。"""
+
+    def __init__(self):
+        self.length = 0  # 已生成的字符数
+        self.token_count = 0  # 包含这个输出流内容的token数量
+        self.line_count = 0  # 已结束的行数，即换行符的数量
+        self.last_line = ""  # 还没有结束的最后一行
+        self.scanner = ToolCallScanner()
+        self._closed_fence_count = 0  # 已结束的反引号串中```的数量
+        self._backtick_run = 0  # 末尾连续反引号的数量
+
+    @property
+    def fence_count(self) -> int:
+        """```出现的次数，与对完整文本调用str.count("```")的结果相同。"""
+        return self._closed_fence_count + self._backtick_run // 3
+
+    @property
+    def tool_call_count(self) -> int:
+        """已开始的顶层json toolcall代码块数量。"""
+        return self.scanner.tool_call_count
+
+    def feed(self, delta: str) -> List[ToolCallEvent]:
+        """
+        接收一段新增文本
+
+        Args:
+            delta: 新生成的文本
+
+        Returns:
+            list[ToolCallEvent]: 本段文本中结束的json toolcall代码块
+        """
+        if not delta:
+            return []
+        self.token_count += 1
+        self.length += len(delta)
+
+        newlines = delta.count("\n")
+        if newlines:
+            self.line_count += newlines
+            self.last_line = delta.rpartition("\n")[2]
+        else:
+            self.last_line += delta
+
+        if "`" in delta:
+            self._count_backticks(delta)
+        elif self._backtick_run:
+            self._closed_fence_count += self._backtick_run // 3
+            self._backtick_run = 0
+
+        return self.scanner.feed(delta)
+
+    def _count_backticks(self, delta: str) -> None:
+        """按连续反引号串统计```，反引号串可以跨越多段文本。"""
+        run = self._backtick_run
+        position = 0
+        while True:
+            backtick = delta.find("`", position)
+            if backtick == -1:
+                break
+            if backtick > position:
+                # 中间有其他字符，之前的反引号串已经结束
+                self._closed_fence_count += run // 3
+                run = 0
+            end = backtick
+            while end < len(delta) and delta[end] == "`":
+                end += 1
+            run += end - backtick
+            position = end
+        if position < len(delta):
+            self._closed_fence_count += run // 3
+            run = 0
+        self._backtick_run = run
+
+
+class GenerationState:
+    """一个回答生成过程中的增量状态，由Agent在每个token之后更新。"""
+
+    def __init__(self):
+        self.content = TextStreamState()
+        self.reasoning = TextStreamState()
+        self.token_count = 0  # 已接收的token数量
+        # 中断后保留的回答内容长度，None表示中断后丢弃整个回答重新生成
+        self.salvage_length: int | None = None
+        self.salvage_note: str | None = None  # 保留回答时附加在回答之后的说明
+        # 保留回答时最多执行的工具调用数量，None表示不限制
+        self.salvage_tool_call_limit: int | None = None
+
+    def salvage(
+        self, length: int, note: str, max_tool_calls: int | None = None
+    ) -> None:
+        """
+        请求Agent在中断后保留回答内容的前length个字符
+
+        Agent把保留的内容作为助手消息、把note作为运行时消息加入历史，
+        然后像回答正常结束一样执行其中的工具调用。
+
+        Args:
+            length: 保留的回答内容长度
+            note: 告诉LLM回答被截断的说明
+            max_tool_calls: 保留的内容中最多执行的工具调用数量
+        """
+        self.salvage_length = length
+        self.salvage_note = note
+        self.salvage_tool_call_limit = max_tool_calls
+
+    def feed(self, token: AnswerToken) -> None:
+        """用一个token更新回答内容和推理内容的状态。"""
+        self.token_count += 1
+        if token["reasoning_content"]:
+            self.reasoning.feed(token["reasoning_content"])
+        if token["content"]:
+            self.content.feed(token["content"])
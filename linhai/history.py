@@ -0,0 +1,635 @@
+"""对话历史存储模块，负责保存、压缩、去重和清理历史会话。
+
+每个会话只对应一个历史文件，运行中的会话保存为明文JSON，每轮对话覆盖写入。
+会话关闭后，其中的消息被移入按内容哈希去重的对象库，会话文件本身只保留
+消息哈希列表并进行压缩（优先使用zstd，不可用时使用gzip）。
+对象库是历史目录下的一个SQLite文件，而不是每条消息一个小文件。
+运行中的Agent持有会话的租约，其他进程中的维护不会关闭或删除持有租约的会话。
+"""
+
+from contextlib import closing
+from pathlib import Path
+from typing import Iterable, TypedDict
+import hashlib
+import os
+import sqlite3
+import time
+
+# fcntl只在POSIX系统上可用，不可用时根据租约文件的修改时间判断会话是否仍在运行
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+
+from linhai import json_backend
+from linhai.config import HistoryConfig
+from linhai.blob_store import (
+    BlobStore,
+    COMPRESSION_SUFFIXES,
+    atomic_write,
+    compress_bytes,
+    decompress_bytes,
+    resolve_compression,
+)
+
+SESSION_PREFIX = "conversation_"
+ACTIVE_SUFFIX = ".json"
+OBJECTS_DB_NAME = "objects.sqlite3"
+BLOBS_DIRNAME = "blobs"
+LEASES_DIRNAME = "leases"
+
+# 刚写入的对象可能属于另一个进程中正在关闭的会话，在这段时间内不回收
+GC_GRACE_SECONDS = 600
+# 一条SQL语句中最多使用的参数数量，低于SQLite的默认限制
+SQL_BATCH_SIZE = 500
+
+OBJECTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    digest TEXT PRIMARY KEY,
+    compression TEXT NOT NULL,
+    data BLOB NOT NULL,
+    mtime REAL NOT NULL
+);
+"""
+
+
+class RetentionPolicy(TypedDict, total=False):
+    """历史保留策略，未设置的字段表示不限制。"""
+
+    max_age_days: float  # 会话最长保留天数
+    max_sessions: int  # 最多保留的会话数量
+    max_total_mb: float  # 历史目录最大占用空间（MB）
+
+
+class SessionInfo(TypedDict):
+    """历史会话的基本信息。"""
+
+    session_id: str
+    path: str
+    closed: bool
+    size: int
+    mtime: float
+
+
+class MaintenanceReport(TypedDict):
+    """历史维护结果。"""
+
+    closed_sessions: int  # 本次被压缩关闭的会话数量
+    removed_sessions: int  # 因保留策略被删除的会话数量
+    removed_objects: int  # 被回收的消息对象数量
+    removed_blobs: int  # 被回收的工具输出数据块数量
+    bytes_before: int
+    bytes_after: int
+    bytes_reclaimed: int
+
+
+def default_history_dir() -> Path:
+    """默认的历史目录。"""
+    return Path.home() / ".local" / "share" / "linhai" / "history"
+
+
+def canonical_message_bytes(message: dict) -> bytes:
+    """把消息字典转换为稳定的字节表示，用于计算哈希和去重。"""
+    return json_backend.dumps_bytes(message, sort_keys=True)
+
+
+def blob_references(history_data: list[dict]) -> set[str]:
+    """找出历史消息中引用的工具输出数据块。"""
+    return {
+        message["content_ref"]
+        for message in history_data
+        if isinstance(message.get("content_ref"), str)
+    }
+
+
+def batched(items: list[str]) -> Iterable[list[str]]:
+    """把列表按SQL_BATCH_SIZE分批。"""
+    for start in range(0, len(items), SQL_BATCH_SIZE):
+        yield items[start : start + SQL_BATCH_SIZE]
+
+
+class ObjectStore:
+    """按内容哈希去重的消息对象库，所有对象保存在同一个SQLite文件中。
+
+    每条消息单独压缩，压缩后没有变小时保存原始内容。删除对象后用incremental_vacuum
+    把空闲的页归还给文件系统。
+    """
+
+    def __init__(self, db_path: Path, compression: str = "gzip"):
+        """初始化对象库，数据库文件在第一次写入时创建。
+
+        Args:
+            db_path: 数据库文件路径
+            compression: 新对象使用的压缩方式
+        """
+        self.db_path = db_path
+        self.compression = compression
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开数据库连接。每次操作使用单独的连接，可以在维护线程中使用。"""
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        # auto_vacuum只在创建表之前设置才生效
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.executescript(OBJECTS_SCHEMA)
+        return conn
+
+    def put_many(self, items: list[bytes]) -> list[str]:
+        """保存一批对象，已存在的对象只更新修改时间。
+
+        Returns:
+            与items一一对应的sha256哈希
+        """
+        digests = [hashlib.sha256(data).hexdigest() for data in items]
+        unique = dict(zip(digests, items))
+        now = time.time()
+        with closing(self._connect()) as conn:
+            with conn:
+                existing: set[str] = set()
+                for batch in batched(list(unique)):
+                    existing.update(
+                        row[0]
+                        for row in conn.execute(
+                            "SELECT digest FROM objects WHERE digest IN "
+                            f"({','.join('?' * len(batch))})",
+                            batch,
+                        )
+                    )
+                conn.executemany(
+                    "UPDATE objects SET mtime = ? WHERE digest = ?",
+                    ((now, digest) for digest in existing),
+                )
+                rows = []
+                for digest, data in unique.items():
+                    if digest in existing:
+                        continue
+                    compressed = compress_bytes(data, self.compression)
+                    if len(compressed) < len(data):
+                        rows.append((digest, self.compression, compressed, now))
+                    else:
+                        rows.append((digest, "none", data, now))
+                conn.executemany(
+                    "INSERT OR IGNORE INTO objects (digest, compression, data, mtime) "
+                    "VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+        return digests
+
+    def get_many(self, digests: list[str]) -> list[bytes]:
+        """按顺序读取一批对象。
+
+        Raises:
+            FileNotFoundError: 有对象不存在
+        """
+        found: dict[str, bytes] = {}
+        if self.db_path.exists():
+            with closing(self._connect()) as conn:
+                for batch in batched(list(dict.fromkeys(digests))):
+                    for digest, compression, data in conn.execute(
+                        "SELECT digest, compression, data FROM objects "
+                        f"WHERE digest IN ({','.join('?' * len(batch))})",
+                        batch,
+                    ):
+                        found[digest] = decompress_bytes(
+                            data, COMPRESSION_SUFFIXES[compression]
+                        )
+        missing = [digest for digest in digests if digest not in found]
+        if missing:
+            raise FileNotFoundError(f"消息对象{missing[0]}不存在")
+        return [found[digest] for digest in digests]
+
+    def mtimes(self) -> dict[str, float]:
+        """每个对象的哈希和修改时间。"""
+        if not self.db_path.exists():
+            return {}
+        with closing(self._connect()) as conn:
+            return dict(conn.execute("SELECT digest, mtime FROM objects"))
+
+    def disk_usage(self) -> int:
+        """数据库文件占用的字节数。"""
+        try:
+            return self.db_path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def delete_many(self, digests: Iterable[str], written_before: float) -> int:
+        """删除一批对象并回收空闲的页。
+
+        Args:
+            digests: 要删除的对象哈希
+            written_before: 只删除修改时间早于这个时间戳的对象，
+                之后被其他进程重新写入的对象仍被引用，不能删除
+
+        Returns:
+            实际删除的对象数量
+        """
+        digests = list(digests)
+        if not digests or not self.db_path.exists():
+            return 0
+        removed = 0
+        with closing(self._connect()) as conn:
+            with conn:
+                for batch in batched(digests):
+                    removed += conn.execute(
+                        "DELETE FROM objects WHERE mtime < ? AND digest IN "
+                        f"({','.join('?' * len(batch))})",
+                        [written_before, *batch],
+                    ).rowcount
+            # incremental_vacuum每执行一步释放一页，需要读取全部结果
+            conn.execute("PRAGMA incremental_vacuum").fetchall()
+        return removed
+
+
+class SessionLease:
+    """运行中会话的租约。
+
+    持有租约的进程对租约文件加排他锁，进程退出时锁自动释放，
+    其他进程通过尝试加锁判断会话是否仍在运行。
+    """
+
+    def __init__(self, path: Path):
+        """创建租约文件并加锁。
+
+        Args:
+            path: 租约文件路径
+        """
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # pylint: disable-next=consider-using-with
+        self._file = open(path, "ab")
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        self.refresh()
+
+    def refresh(self) -> None:
+        """更新租约文件的修改时间，没有fcntl时用于判断租约是否过期。"""
+        os.utime(self.path)
+
+    def release(self) -> None:
+        """删除租约文件并释放锁。"""
+        if self._file.closed:
+            return
+        self.path.unlink(missing_ok=True)
+        self._file.close()
+
+
+class HistoryStore:
+    """对话历史存储，管理会话文件、消息对象库和保留策略。"""
+
+    def __init__(
+        self,
+        root: Path,
+        retention: RetentionPolicy | None = None,
+        compression: str = "auto",
+        idle_minutes: float = 60,
+    ):
+        """初始化历史存储。
+
+        Args:
+            root: 历史目录
+            retention: 保留策略
+            compression: 关闭会话时使用的压缩方式
+            idle_minutes: 会话多久未更新后视为已关闭
+        """
+        self.root = root
+        self.retention: RetentionPolicy = retention or {}
+        self.compression = resolve_compression(compression)
+        self.idle_seconds = idle_minutes * 60
+        self.objects = ObjectStore(root / OBJECTS_DB_NAME, compression=self.compression)
+        self.blobs = BlobStore(root / BLOBS_DIRNAME, compression=self.compression)
+
+    @classmethod
+    def from_config(cls, config: HistoryConfig) -> "HistoryStore":
+        """根据配置创建历史存储，未配置目录时使用默认历史目录。"""
+        if "dir" in config:
+            root = Path(config["dir"]).expanduser()
+        else:
+            root = default_history_dir()
+        retention: RetentionPolicy = {}
+        for key in ("max_age_days", "max_sessions", "max_total_mb"):
+            if key in config:
+                retention[key] = config[key]  # type: ignore[literal-required]
+        return cls(
+            root,
+            retention=retention,
+            compression=config.get("compression", "auto"),
+            idle_minutes=config.get("idle_minutes", 60),
+        )
+
+    def session_path(self, session_id: str) -> Path:
+        """运行中会话的历史文件路径。"""
+        return self.root / f"{SESSION_PREFIX}{session_id}{ACTIVE_SUFFIX}"
+
+    def lease_path(self, session_id: str) -> Path:
+        """会话租约文件的路径。"""
+        return self.root / LEASES_DIRNAME / f"{session_id}.lease"
+
+    def acquire_lease(self, session_id: str) -> SessionLease:
+        """为运行中的会话获取租约，持有期间维护不会关闭或删除这个会话。"""
+        return SessionLease(self.lease_path(session_id))
+
+    def is_session_leased(self, session_id: str, now: float | None = None) -> bool:
+        """判断会话的租约是否被某个进程（包括当前进程）持有。
+
+        Args:
+            session_id: 会话ID
+            now: 当前时间戳，没有fcntl时用于判断租约是否过期
+
+        Returns:
+            租约被持有时返回True
+        """
+        path = self.lease_path(session_id)
+        now = time.time() if now is None else now
+        try:
+            with open(path, "rb") as lease_file:
+                age = now - os.fstat(lease_file.fileno()).st_mtime
+                if fcntl is None:
+                    return age < self.idle_seconds
+                fcntl.flock(lease_file.fileno(), fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except FileNotFoundError:
+            return False
+        except BlockingIOError:
+            return True
+        # 没有进程持有锁，是异常退出的进程留下的租约。刚创建的租约可能还没有加锁，不删除
+        if age >= self.idle_seconds:
+            path.unlink(missing_ok=True)
+        return False
+
+    def save_session(self, session_id: str, history_data: list[dict]) -> Path:
+        """保存（覆盖）运行中会话的完整历史。
+
+        Args:
+            session_id: 会话ID
+            history_data: 可JSON序列化的消息列表
+
+        Returns:
+            写入的文件路径
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.session_path(session_id)
+        atomic_write(path, json_backend.dumps_bytes(history_data, pretty=True))
+        return path
+
+    def _iter_session_files(self) -> Iterable[Path]:
+        """遍历历史目录中的所有会话文件。"""
+        if not self.root.exists():
+            return []
+        return (
+            path
+            for path in self.root.iterdir()
+            if path.name.startswith(SESSION_PREFIX) and path.is_file()
+        )
+
+    @staticmethod
+    def _split_session_name(path: Path) -> tuple[str, str]:
+        """把会话文件名拆分为会话ID和压缩后缀。"""
+        name = path.name[len(SESSION_PREFIX) :]
+        for suffix in (".zst", ".gz"):
+            if name.endswith(ACTIVE_SUFFIX + suffix):
+                return name[: -len(ACTIVE_SUFFIX + suffix)], suffix
+        return name[: -len(ACTIVE_SUFFIX)], ""
+
+    def _find_session_file(self, session_id: str) -> Path | None:
+        """查找会话对应的文件，兼容运行中和已关闭的会话。"""
+        for suffix in ("", ".zst", ".gz"):
+            path = self.root / f"{SESSION_PREFIX}{session_id}{ACTIVE_SUFFIX}{suffix}"
+            if path.exists():
+                return path
+        return None
+
+    def put_objects(self, messages: list[dict]) -> list[str]:
+        """把消息写入对象库（已存在则跳过），返回它们的哈希。"""
+        return self.objects.put_many(
+            [canonical_message_bytes(message) for message in messages]
+        )
+
+    def get_objects(self, digests: list[str]) -> list[dict]:
+        """从对象库读取消息。"""
+        return [json_backend.loads(data) for data in self.objects.get_many(digests)]
+
+    def _read_manifest(self, path: Path) -> dict:
+        """读取已关闭会话的清单。"""
+        _, suffix = self._split_session_name(path)
+        return json_backend.loads(decompress_bytes(path.read_bytes(), suffix))
+
+    def load_session(self, session_id: str) -> list[dict]:
+        """读取会话的完整历史，对调用者透明地处理压缩和去重。
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            消息字典列表
+        """
+        path = self._find_session_file(session_id)
+        if path is None:
+            raise FileNotFoundError(f"历史会话{session_id}不存在")
+        return self.load_session_file(path)
+
+    def load_session_file(self, path: Path) -> list[dict]:
+        """读取指定会话文件中的完整历史。"""
+        _, suffix = self._split_session_name(path)
+        if not suffix:
+            return json_backend.loads(path.read_bytes())
+        manifest = self._read_manifest(path)
+        return self.get_objects(manifest["messages"])
+
+    def list_sessions(self) -> list[SessionInfo]:
+        """列出所有会话，按最后修改时间从旧到新排序。"""
+        sessions: list[SessionInfo] = []
+        for path in self._iter_session_files():
+            session_id, suffix = self._split_session_name(path)
+            stat = path.stat()
+            sessions.append(
+                {
+                    "session_id": session_id,
+                    "path": path.as_posix(),
+                    "closed": bool(suffix),
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                }
+            )
+        sessions.sort(key=lambda info: info["mtime"])
+        return sessions
+
+    def close_session(self, session_id: str) -> Path | None:
+        """关闭会话：把消息移入对象库，并把会话文件替换为压缩后的清单。
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            压缩后的会话文件路径，会话不存在或已关闭时返回None
+        """
+        path = self.session_path(session_id)
+        if not path.exists():
+            return None
+        stat = path.stat()
+        history_data = json_backend.loads(path.read_bytes())
+        manifest = {
+            "session_id": session_id,
+            "messages": self.put_objects(history_data),
+            "blobs": sorted(blob_references(history_data)),
+        }
+        suffix = COMPRESSION_SUFFIXES[self.compression]
+        closed_path = path.with_name(path.name + suffix)
+        atomic_write(
+            closed_path,
+            compress_bytes(
+                json_backend.dumps_bytes(manifest),
+                self.compression,
+            ),
+        )
+        os.utime(closed_path, (stat.st_atime, stat.st_mtime))
+        if closed_path != path:
+            path.unlink()
+        return closed_path
+
+    def disk_usage(self) -> int:
+        """历史目录占用的总字节数。"""
+        if not self.root.exists():
+            return 0
+        return sum(
+            path.stat().st_size for path in self.root.rglob("*") if path.is_file()
+        )
+
+    def _session_blobs(self, info: SessionInfo) -> set[str]:
+        """会话引用的工具输出数据块。"""
+        path = Path(info["path"])
+        if info["closed"]:
+            return set(self._read_manifest(path).get("blobs", []))
+        return blob_references(self.load_session_file(path))
+
+    def maintain(
+        self, active_session_ids: Iterable[str] = (), now: float | None = None
+    ) -> MaintenanceReport:
+        """执行维护：关闭空闲会话、应用保留策略并回收无引用的消息对象。
+
+        持有租约的会话和active_session_ids中的会话都不会被关闭或删除，
+        因此可以在另一个进程中安全地维护正在运行的Agent的历史目录。
+
+        Args:
+            active_session_ids: 正在使用、不能关闭或删除的会话ID
+            now: 当前时间戳，默认使用time.time()
+
+        Returns:
+            MaintenanceReport: 维护结果
+        """
+        now = time.time() if now is None else now
+        active = set(active_session_ids)
+        active.update(
+            info["session_id"]
+            for info in self.list_sessions()
+            if self.is_session_leased(info["session_id"], now)
+        )
+        bytes_before = self.disk_usage()
+
+        closed_sessions = 0
+        for info in self.list_sessions():
+            if info["closed"] or info["session_id"] in active:
+                continue
+            if now - info["mtime"] >= self.idle_seconds:
+                self.close_session(info["session_id"])
+                closed_sessions += 1
+
+        all_sessions = self.list_sessions()
+        sessions = [info for info in all_sessions if info["session_id"] not in active]
+        stats_time = time.time()
+        object_mtimes = self.objects.mtimes()
+        refcounts: dict[str, int] = {}
+        references: dict[str, list[str]] = {}
+        blob_refcounts: dict[str, int] = {}
+        blob_refs: dict[str, set[str]] = {}
+        for info in all_sessions:
+            blobs = self._session_blobs(info)
+            blob_refs[info["session_id"]] = blobs
+            for digest in blobs:
+                blob_refcounts[digest] = blob_refcounts.get(digest, 0) + 1
+            if not info["closed"]:
+                continue
+            digests = self._read_manifest(Path(info["path"]))["messages"]
+            references[info["session_id"]] = digests
+            for digest in set(digests):
+                refcounts[digest] = refcounts.get(digest, 0) + 1
+
+        removed_sessions = 0
+        removed_objects = 0
+        removed_blobs = 0
+        # 没有被任何会话引用的旧对象和数据块，以及删除会话后不再被引用的对象和数据块
+        dead_objects = {
+            digest
+            for digest, mtime in object_mtimes.items()
+            if refcounts.get(digest, 0) == 0 and now - mtime > GC_GRACE_SECONDS
+        }
+        blob_paths = dict(self.blobs.iter_blobs())
+        dead_blobs = {
+            digest for digest in blob_paths if blob_refcounts.get(digest, 0) == 0
+        }
+
+        def remove(info: SessionInfo) -> None:
+            nonlocal removed_sessions
+            Path(info["path"]).unlink()
+            removed_sessions += 1
+            for digest in set(references.get(info["session_id"], [])):
+                refcounts[digest] -= 1
+                if refcounts[digest] == 0:
+                    dead_objects.add(digest)
+            for digest in blob_refs.get(info["session_id"], set()):
+                blob_refcounts[digest] -= 1
+                if blob_refcounts[digest] == 0 and digest in blob_paths:
+                    dead_blobs.add(digest)
+
+        def delete_dead() -> int:
+            """删除不再被引用的对象和数据块，返回数据块释放的字节数。"""
+            nonlocal removed_objects, removed_blobs
+            removed_objects += self.objects.delete_many(dead_objects, stats_time)
+            dead_objects.clear()
+            freed = 0
+            for digest in dead_blobs:
+                path = blob_paths.pop(digest)
+                try:
+                    if now - path.stat().st_mtime <= GC_GRACE_SECONDS:
+                        continue
+                except FileNotFoundError:
+                    continue
+                freed += self.blobs.delete(digest)
+                removed_blobs += 1
+            dead_blobs.clear()
+            return freed
+
+        max_age_days = self.retention.get("max_age_days")
+        max_sessions = self.retention.get("max_sessions")
+        max_total_mb = self.retention.get("max_total_mb")
+        remaining: list[SessionInfo] = []
+        for info in sessions:
+            if max_age_days is not None and now - info["mtime"] > max_age_days * 86400:
+                remove(info)
+            else:
+                remaining.append(info)
+        if max_sessions is not None:
+            active_count = len(all_sessions) - len(sessions)
+            while len(remaining) + active_count > max_sessions and remaining:
+                remove(remaining.pop(0))
+        delete_dead()
+        if max_total_mb is not None:
+            # 对象库文件释放的空间取决于SQLite的页，每删除一个会话都重新计算实际大小，
+            # 会话引用的数据块在删除会话后立即回收，再检查是否仍超过上限
+            total_bytes = self.disk_usage()
+            while total_bytes > max_total_mb * 1024 * 1024 and remaining:
+                info = remaining.pop(0)
+                objects_before = self.objects.disk_usage()
+                remove(info)
+                total_bytes -= delete_dead()
+                total_bytes -= info["size"]
+                total_bytes -= objects_before - self.objects.disk_usage()
+
+        bytes_after = self.disk_usage()
+        return {
+            "closed_sessions": closed_sessions,
+            "removed_sessions": removed_sessions,
+            "removed_objects": removed_objects,
+            "removed_blobs": removed_blobs,
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+            "bytes_reclaimed": bytes_before - bytes_after,
+        }
@@ -0,0 +1,228 @@
+"""本地历史压缩模块。
+
+不调用LLM，按固定规则压缩历史消息：
+1. 文件之后被再次读取或修改时，删除之前过期的读取结果（见mark_superseded_results）
+2. 较早的工具结果替换为一行摘要
+3. 连续的运行时消息合并为一条并去除重复行
+
+系统消息和最近的若干条消息不会被修改。
+"""
+
+from typing import Any, Sequence, TypedDict
+from reprlib import Repr
+
+from linhai.agent_base import RuntimeMessage, DestroyedRuntimeMessage, GlobalMemory
+from linhai.llm import Message, SystemMessage
+from linhai.tool.main import (
+    FILE_READ_TOOLS,
+    ToolResultMessage,
+    ToolErrorMessage,
+    batch_edit_file_paths,
+    is_full_file_read,
+)
+
+repr_obj = Repr(maxstring=60, maxother=60)
+
+DEFAULT_KEEP_RECENT = 20
+DEFAULT_STUB_MIN_CHARS = 400
+# 合并运行时消息时每行保留的最大字符数
+MAX_RUNTIME_LINE_CHARS = 200
+
+
+class LocalCompressionStats(TypedDict):
+    """本地压缩的统计结果。"""
+
+    stale_results: int  # 删除的过期文件读取结果数量
+    stubbed_results: int  # 替换为摘要的工具结果数量
+    collapsed_runtime: int  # 合并后减少的运行时消息数量
+    tokens_before: int  # 压缩前估计的token数
+    tokens_after: int  # 压缩后估计的token数
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计文本的token数。
+
+    ASCII字符按每4个字符一个token计算，其他字符（主要是中文）按每个字符一个token计算。
+    """
+    if text.isascii():
+        return (len(text) + 3) // 4
+    # 非ASCII字符在UTF-8中至少占2个字节，中文占3个字节
+    non_ascii = (len(text.encode("utf-8")) - len(text)) // 2
+    return (len(text) - non_ascii + 3) // 4 + non_ascii
+
+
+def estimate_message_tokens(message: Any) -> int:
+    """估计单条消息的token数，包括每条消息固定的格式开销。"""
+    content = message.to_llm_message().get("content") or ""
+    return estimate_tokens(str(content)) + 4
+
+
+def min_safe_index(messages: Sequence[Any]) -> int:
+    """返回第一条可以被压缩的消息下标，保护系统消息和全局记忆。"""
+    max_system_index = -1
+    for i, msg in enumerate(messages):
+        if isinstance(msg, (SystemMessage, GlobalMemory)):
+            max_system_index = i
+    return max_system_index + 1
+
+
+def mark_superseded_results(messages: Sequence[Any]) -> int:
+    """标记被之后的读取或修改取代的文件读取结果。
+
+    完整读取或修改文件会取代之前对该文件的所有读取结果；只读取一部分的结果
+    （例如run_sed_expression）、失败的工具调用和没有改变文件内容的写入不会取代其他结果。
+    每次调用都会重新计算，因此历史被压缩、消息下标变化后再次调用即可更新标记。
+
+    Args:
+        messages: 历史消息，其中的ToolResultMessage会被原地更新
+
+    Returns:
+        被取代的结果数量
+    """
+    # 文件路径 -> (之后最早取代它的消息下标, 该消息是读取时的内容哈希)
+    latest: dict[str, tuple[int, str | None]] = {}
+    superseded = 0
+    for i in range(len(messages) - 1, -1, -1):
+        msg = messages[i]
+        if not isinstance(msg, ToolResultMessage):
+            continue
+        msg.superseded_by = None
+        msg.superseded_same_content = False
+        if msg.failed:
+            continue
+        if msg.file_path is None:
+            # 批量修改会让每个确实被修改的文件之前的读取结果过期
+            paths = msg.changed_files
+            if paths is None:
+                paths = batch_edit_file_paths(msg.tool_name, msg.tool_arguments)
+            for path in paths:
+                latest[path] = (i, None)
+            continue
+        if msg.tool_name in FILE_READ_TOOLS and msg.file_path in latest:
+            index, file_hash = latest[msg.file_path]
+            msg.superseded_by = index
+            msg.superseded_same_content = (
+                file_hash is not None and file_hash == msg.file_hash
+            )
+            superseded += 1
+        is_partial_read = msg.tool_name in FILE_READ_TOOLS and not is_full_file_read(
+            msg.tool_name, msg.tool_arguments
+        )
+        unchanged = (
+            msg.changed_files is not None and msg.file_path not in msg.changed_files
+        )
+        if not is_partial_read and not unchanged:
+            latest[msg.file_path] = (i, msg.file_hash)
+    return superseded
+
+
+def describe_tool_call(message: ToolResultMessage | ToolErrorMessage) -> str:
+    """生成工具调用的简短描述，例如read_file(filepath='a.py')。"""
+    tool_name = getattr(message, "tool_name", None)
+    if tool_name is None:
+        return "工具调用"
+    arguments = getattr(message, "tool_arguments", None) or {}
+    args = ", ".join(
+        f"{key}={repr_obj.repr(value)}" for key, value in arguments.items()
+    )
+    return f"{tool_name}({args})"
+
+
+def tool_result_stub(message: ToolResultMessage | ToolErrorMessage) -> str:
+    """把工具结果压缩为一行摘要。"""
+    content = message.content
+    first_line = content.lstrip().split("\n", 1)[0]
+    kind = "错误" if isinstance(message, ToolErrorMessage) else "结果"
+    return (
+        f"[已压缩] {describe_tool_call(message)}的{kind}共{content.count(chr(10)) + 1}行、"
+        f"{len(content)}字符，已省略。首行：{repr_obj.repr(first_line)}"
+    )
+
+
+def collapse_runtime_run(run: list[Message]) -> RuntimeMessage:
+    """把连续的运行时消息合并为一条，去除重复行并截断过长的行。"""
+    lines: list[str] = []
+    seen: set[str] = set()
+    destroyed = 0
+    for msg in run:
+        if not isinstance(msg, RuntimeMessage):
+            destroyed += 1
+            continue
+        for line in msg.message.split("\n"):
+            if len(line) > MAX_RUNTIME_LINE_CHARS:
+                line = line[:MAX_RUNTIME_LINE_CHARS] + "……"
+            if line in seen:
+                continue
+            seen.add(line)
+            lines.append(line)
+    if destroyed:
+        lines.append(f"（另有{destroyed}条已被截断的消息）")
+    return RuntimeMessage("\n".join(lines))
+
+
+def compress_messages_locally(
+    messages: Sequence[Message],
+    keep_recent: int = DEFAULT_KEEP_RECENT,
+    stub_min_chars: int = DEFAULT_STUB_MIN_CHARS,
+) -> tuple[list[Message], LocalCompressionStats]:
+    """按固定规则压缩历史消息，不修改传入的列表。
+
+    Args:
+        messages: 历史消息
+        keep_recent: 末尾保持不变的消息数量
+        stub_min_chars: 超过该长度的旧工具结果会被替换为摘要
+
+    Returns:
+        压缩后的消息列表和统计结果
+    """
+    messages = list(messages)
+    stats: LocalCompressionStats = {
+        "stale_results": 0,
+        "stubbed_results": 0,
+        "collapsed_runtime": 0,
+        "tokens_before": sum(estimate_message_tokens(msg) for msg in messages),
+        "tokens_after": 0,
+    }
+    start = min_safe_index(messages)
+    end = max(start, len(messages) - keep_recent)
+
+    # 删除已被之后的读取或修改取代的文件读取结果
+    mark_superseded_results(messages)
+    compressed: list[Message] = list(messages)
+    for i in range(start, end):
+        msg = messages[i]
+        if isinstance(msg, ToolResultMessage) and msg.superseded_by is not None:
+            compressed[i] = RuntimeMessage(
+                f"[已压缩] {describe_tool_call(msg)}的结果已过期：该文件之后被再次读取或修改"
+            )
+            stats["stale_results"] += 1
+
+    # 较早的较长工具结果替换为一行摘要
+    for i in range(start, end):
+        msg = compressed[i]
+        if (
+            isinstance(msg, (ToolResultMessage, ToolErrorMessage))
+            and len(msg.content) > stub_min_chars
+        ):
+            compressed[i] = RuntimeMessage(tool_result_stub(msg))
+            stats["stubbed_results"] += 1
+
+    # 合并连续的运行时消息
+    result: list[Message] = compressed[:start]
+    run: list[Message] = []
+    for msg in compressed[start:end]:
+        if isinstance(msg, (RuntimeMessage, DestroyedRuntimeMessage)):
+            run.append(msg)
+            continue
+        if run:
+            result.append(collapse_runtime_run(run) if len(run) > 1 else run[0])
+            stats["collapsed_runtime"] += len(run) - 1
+            run = []
+        result.append(msg)
+    if run:
+        result.append(collapse_runtime_run(run) if len(run) > 1 else run[0])
+        stats["collapsed_runtime"] += len(run) - 1
+    result.extend(compressed[end:])
+
+    stats["tokens_after"] = sum(estimate_message_tokens(msg) for msg in result)
+    return result, stats
@@ -0,0 +1,465 @@
+"""历史会话索引模块，使用SQLite记录会话信息并提供全文搜索。
+
+索引在每次保存历史时增量更新：只有内容发生变化的消息会被重新写入全文索引。
+SQLite支持FTS5时使用trigram分词的全文索引，以支持中文子串搜索；
+否则退化为普通表加LIKE查询。
+"""
+
+from pathlib import Path
+from typing import Iterable, TypedDict, NotRequired
+import datetime
+import hashlib
+import re
+import sqlite3
+
+from linhai import json_backend
+from linhai.history import HistoryStore, MaintenanceReport
+
+TOOL_CALL_PATTERN = re.compile(r"你调用了工具'([^']+)'")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    start_time TEXT,
+    end_time TEXT,
+    model TEXT,
+    input_tokens INTEGER DEFAULT 0,
+    output_tokens INTEGER DEFAULT 0,
+    total_tokens INTEGER DEFAULT 0,
+    tools_used TEXT DEFAULT '[]',
+    message_count INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS sessions_end_time ON sessions(end_time);
+CREATE TABLE IF NOT EXISTS session_messages (
+    session_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    text_rowid INTEGER,
+    PRIMARY KEY (session_id, position)
+) WITHOUT ROWID;
+"""
+
+
+class SessionMetadata(TypedDict, total=False):
+    """保存历史时由Agent提供的会话信息。"""
+
+    start_time: str
+    end_time: str
+    model: str
+    input_tokens: int
+    output_tokens: int
+    total_tokens: int
+    tools_used: list[str]
+
+
+class SessionRecord(TypedDict):
+    """索引中的一条会话记录。"""
+
+    session_id: str
+    start_time: str
+    end_time: str
+    model: str
+    input_tokens: int
+    output_tokens: int
+    total_tokens: int
+    tools_used: list[str]
+    message_count: int
+
+
+class SearchResult(TypedDict):
+    """一条全文搜索结果。"""
+
+    session_id: str
+    position: int
+    role: str
+    snippet: str
+    end_time: NotRequired[str]
+
+
+def message_digest(message: dict) -> str:
+    """计算消息字典的摘要，用于判断消息是否变化。"""
+    return hashlib.sha1(json_backend.dumps_bytes(message, sort_keys=True)).hexdigest()
+
+
+def common_prefix_length(old: list[dict], new: list[dict]) -> int:
+    """两个历史开头相同的消息数量。"""
+    length = 0
+    for old_message, new_message in zip(old, new):
+        if old_message != new_message:
+            break
+        length += 1
+    return length
+
+
+def session_start_time(session_id: str, default: str) -> str:
+    """从会话ID恢复ISO格式的开始时间。
+
+    Agent的会话ID是把开始时间中的":"替换为"-"得到的，无法解析时返回default。
+    """
+    date, separator, clock = session_id.partition("T")
+    try:
+        start = datetime.datetime.fromisoformat(
+            date + separator + clock.replace("-", ":")
+        )
+    except ValueError:
+        return default
+    return start.isoformat(timespec="seconds")
+
+
+def searchable_text(message: dict) -> tuple[str, str] | None:
+    """提取需要全文索引的用户和助手消息。
+
+    Returns:
+        (role, text)，不需要索引的消息返回None
+    """
+    message_type = message.get("type")
+    if message_type is None:
+        # 旧版历史没有type字段，ChatMessage的序列化结果总是带有name字段
+        if "name" not in message or "message" not in message:
+            return None
+    elif message_type != "ChatMessage":
+        return None
+    role = message.get("role")
+    text = message.get("message")
+    if role not in ("user", "assistant") or not isinstance(text, str) or not text:
+        return None
+    return role, text
+
+
+def tools_used_in(history_data: list[dict]) -> list[str]:
+    """从历史消息中找出调用过的工具。"""
+    tools: set[str] = set()
+    for message in history_data:
+        text = message.get("message")
+        if isinstance(text, str):
+            tools.update(TOOL_CALL_PATTERN.findall(text))
+    return sorted(tools)
+
+
+def make_snippet(text: str, terms: list[str], width: int = 40) -> str:
+    """截取搜索词附近的文本片段。"""
+    lowered = text.lower()
+    positions = [lowered.find(term.lower()) for term in terms]
+    positions = [pos for pos in positions if pos >= 0]
+    start = max(min(positions, default=0) - width, 0)
+    end = min(start + width * 3, len(text))
+    snippet = text[start:end].replace("\n", " ")
+    if start > 0:
+        snippet = "…" + snippet
+    if end < len(text):
+        snippet = snippet + "…"
+    return snippet
+
+
+class HistoryIndex:
+    """基于SQLite的历史会话索引。"""
+
+    def __init__(self, db_path: Path):
+        """打开（必要时创建）索引数据库。
+
+        Args:
+            db_path: 数据库文件路径，可以是":memory:"
+        """
+        self.db_path = db_path
+        if str(db_path) != ":memory:":
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(db_path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.fts_enabled = self._create_text_table()
+
+    @classmethod
+    def for_store(cls, store: HistoryStore) -> "HistoryIndex":
+        """打开历史存储目录下的索引。"""
+        return cls(store.root / "index.sqlite3")
+
+    def _create_text_table(self) -> bool:
+        """创建消息文本表，优先使用FTS5。"""
+        try:
+            self.conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS message_text USING fts5("
+                "content, role UNINDEXED, session_id UNINDEXED, position UNINDEXED, "
+                "tokenize='trigram')"
+            )
+            return True
+        except sqlite3.OperationalError:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS message_text ("
+                "content TEXT, role TEXT, session_id TEXT, position INTEGER)"
+            )
+            return False
+
+    def close(self) -> None:
+        """关闭数据库连接。"""
+        self.conn.close()
+
+    def update_session(
+        self,
+        session_id: str,
+        history_data: list[dict],
+        metadata: SessionMetadata | None = None,
+        previous: list[dict] | None = None,
+    ) -> int:
+        """增量更新一个会话的索引。
+
+        从第一条发生变化的消息开始重新索引，之前的消息保持不变，
+        因此在只追加消息的情况下每次只需要写入新增的消息。
+
+        Args:
+            session_id: 会话ID
+            history_data: 会话的完整历史
+            metadata: 会话信息
+            previous: 上一次成功写入索引的历史，与之相同的前缀不再计算摘要
+
+        Returns:
+            本次重新索引的消息数量
+        """
+        metadata = metadata or {}
+        unchanged = common_prefix_length(previous or [], history_data)
+        digests: dict[int, str] = {}
+
+        def digest_at(position: int) -> str:
+            if position not in digests:
+                digests[position] = message_digest(history_data[position])
+            return digests[position]
+
+        with self.conn:
+            indexed = self.conn.execute(
+                "SELECT position, digest FROM session_messages "
+                "WHERE session_id = ? ORDER BY position",
+                (session_id,),
+            ).fetchall()
+            first_changed = 0
+            for position, digest in indexed:
+                if position != first_changed or position >= len(history_data):
+                    break
+                if position >= unchanged and digest != digest_at(position):
+                    break
+                first_changed = position + 1
+
+            self.conn.execute(
+                "DELETE FROM message_text WHERE rowid IN ("
+                "SELECT text_rowid FROM session_messages "
+                "WHERE session_id = ? AND position >= ?)",
+                (session_id, first_changed),
+            )
+            self.conn.execute(
+                "DELETE FROM session_messages WHERE session_id = ? AND position >= ?",
+                (session_id, first_changed),
+            )
+            for position in range(first_changed, len(history_data)):
+                text_rowid = None
+                searchable = searchable_text(history_data[position])
+                if searchable is not None:
+                    role, text = searchable
+                    cursor = self.conn.execute(
+                        "INSERT INTO message_text (content, role, session_id, position) "
+                        "VALUES (?, ?, ?, ?)",
+                        (text, role, session_id, position),
+                    )
+                    text_rowid = cursor.lastrowid
+                self.conn.execute(
+                    "INSERT INTO session_messages "
+                    "(session_id, position, digest, text_rowid) VALUES (?, ?, ?, ?)",
+                    (session_id, position, digest_at(position), text_rowid),
+                )
+
+            now = datetime.datetime.now().isoformat(timespec="seconds")
+            tools_used = metadata.get("tools_used")
+            if tools_used is None:
+                tools_used = tools_used_in(history_data)
+            self.conn.execute(
+                "INSERT INTO sessions (session_id, start_time, end_time, model, "
+                "input_tokens, output_tokens, total_tokens, tools_used, message_count) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET "
+                "end_time = excluded.end_time, model = excluded.model, "
+                "input_tokens = excluded.input_tokens, "
+                "output_tokens = excluded.output_tokens, "
+                "total_tokens = excluded.total_tokens, "
+                "tools_used = excluded.tools_used, "
+                "message_count = excluded.message_count",
+                (
+                    session_id,
+                    metadata.get("start_time", now),
+                    metadata.get("end_time", now),
+                    metadata.get("model", ""),
+                    metadata.get("input_tokens", 0),
+                    metadata.get("output_tokens", 0),
+                    metadata.get("total_tokens", 0),
+                    json_backend.dumps(sorted(tools_used)),
+                    len(history_data),
+                ),
+            )
+        return len(history_data) - first_changed
+
+    def remove_session(self, session_id: str) -> None:
+        """从索引中删除一个会话。"""
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM message_text WHERE rowid IN ("
+                "SELECT text_rowid FROM session_messages WHERE session_id = ?)",
+                (session_id,),
+            )
+            self.conn.execute(
+                "DELETE FROM session_messages WHERE session_id = ?", (session_id,)
+            )
+            self.conn.execute(
+                "DELETE FROM sessions WHERE session_id = ?", (session_id,)
+            )
+
+    def indexed_session_ids(self) -> set[str]:
+        """索引中所有会话的ID。"""
+        return {row[0] for row in self.conn.execute("SELECT session_id FROM sessions")}
+
+    def prune(self, existing_session_ids: Iterable[str]) -> int:
+        """删除索引中已经不存在于历史目录的会话。
+
+        Returns:
+            删除的会话数量
+        """
+        stale = self.indexed_session_ids() - set(existing_session_ids)
+        for session_id in stale:
+            self.remove_session(session_id)
+        return len(stale)
+
+    def rebuild(self, store: HistoryStore) -> int:
+        """把历史目录中尚未索引的会话加入索引，并删除已不存在的会话。
+
+        Returns:
+            新加入索引的会话数量
+        """
+        sessions = store.list_sessions()
+        self.prune(info["session_id"] for info in sessions)
+        indexed = self.indexed_session_ids()
+        added = 0
+        for info in sessions:
+            if info["session_id"] in indexed:
+                continue
+            try:
+                history_data = store.load_session_file(Path(info["path"]))
+            except (OSError, ValueError):
+                continue
+            end_time = datetime.datetime.fromtimestamp(info["mtime"]).isoformat(
+                timespec="seconds"
+            )
+            self.update_session(
+                info["session_id"],
+                history_data,
+                {
+                    "start_time": session_start_time(info["session_id"], end_time),
+                    "end_time": end_time,
+                },
+            )
+            added += 1
+        return added
+
+    @staticmethod
+    def _row_to_record(row: tuple) -> SessionRecord:
+        """把sessions表的一行转换为SessionRecord。"""
+        return {
+            "session_id": row[0],
+            "start_time": row[1],
+            "end_time": row[2],
+            "model": row[3],
+            "input_tokens": row[4],
+            "output_tokens": row[5],
+            "total_tokens": row[6],
+            "tools_used": json_backend.loads(row[7]),
+            "message_count": row[8],
+        }
+
+    def list_sessions(self, limit: int = 20, offset: int = 0) -> list[SessionRecord]:
+        """按结束时间从新到旧列出会话。"""
+        rows = self.conn.execute(
+            "SELECT session_id, start_time, end_time, model, input_tokens, "
+            "output_tokens, total_tokens, tools_used, message_count FROM sessions "
+            "ORDER BY end_time DESC LIMIT ? OFFSET ?",
+            (limit, offset),
+        ).fetchall()
+        return [self._row_to_record(row) for row in rows]
+
+    def get_session(self, session_id: str) -> SessionRecord | None:
+        """读取一个会话的记录。"""
+        row = self.conn.execute(
+            "SELECT session_id, start_time, end_time, model, input_tokens, "
+            "output_tokens, total_tokens, tools_used, message_count FROM sessions "
+            "WHERE session_id = ?",
+            (session_id,),
+        ).fetchone()
+        return None if row is None else self._row_to_record(row)
+
+    def search(self, query: str, limit: int = 20) -> list[SearchResult]:
+        """在用户和助手消息中全文搜索。
+
+        多个空格分隔的搜索词之间是“且”的关系。
+
+        Args:
+            query: 搜索词
+            limit: 最多返回的结果数量
+
+        Returns:
+            搜索结果列表
+        """
+        terms = query.split()
+        if not terms:
+            return []
+        if self.fts_enabled and all(len(term) >= 3 for term in terms):
+            match = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+            rows = self.conn.execute(
+                "SELECT message_text.session_id, message_text.position, "
+                "message_text.role, message_text.content, sessions.end_time "
+                "FROM message_text JOIN sessions "
+                "ON sessions.session_id = message_text.session_id "
+                "WHERE message_text MATCH ? ORDER BY rank LIMIT ?",
+                (match, limit),
+            ).fetchall()
+        else:
+            conditions = " AND ".join(
+                "message_text.content LIKE ? ESCAPE '\\'" for _ in terms
+            )
+            params = [
+                "%"
+                + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                + "%"
+                for term in terms
+            ]
+            rows = self.conn.execute(
+                "SELECT message_text.session_id, message_text.position, "
+                "message_text.role, message_text.content, sessions.end_time "
+                "FROM message_text JOIN sessions "
+                "ON sessions.session_id = message_text.session_id "
+                f"WHERE {conditions} ORDER BY message_text.rowid DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [
+            {
+                "session_id": session_id,
+                "position": position,
+                "role": role,
+                "snippet": make_snippet(content, terms),
+                "end_time": end_time,
+            }
+            for session_id, position, role, content, end_time in rows
+        ]
+
+
+def maintain_history(
+    store: HistoryStore, active_session_ids: Iterable[str] = ()
+) -> MaintenanceReport:
+    """维护历史存储，并在同一次维护中从索引里删除被删除的会话。
+
+    Args:
+        store: 历史存储
+        active_session_ids: 正在使用、不能关闭或删除的会话ID
+
+    Returns:
+        MaintenanceReport: 维护结果
+    """
+    report = store.maintain(active_session_ids)
+    index = HistoryIndex.for_store(store)
+    try:
+        index.prune(info["session_id"] for info in store.list_sessions())
+    finally:
+        index.close()
+    return report
@@ -0,0 +1,102 @@
+"""历史会话回放模块。
+
+把历史目录中保存的消息字典还原为消息对象。新版历史中的每条消息都带有type字段，
+旧版历史没有type字段时根据字段名推断消息类型。
+"""
+
+from typing import Any, Callable
+
+from linhai import json_backend
+from linhai.agent import CheapLlmStatusMessage
+from linhai.agent_base import (
+    CompressRangeRequest,
+    DestroyedRuntimeMessage,
+    GlobalMemory,
+    RuntimeMessage,
+    SummaryMessage,
+)
+from linhai.blob_store import BlobStore
+from linhai.history import HistoryStore
+from linhai.llm import (
+    ChatMessage,
+    SystemMessage,
+    ToolCallMessage,
+    ToolConfirmationMessage,
+)
+from linhai.tool.main import ToolErrorMessage, ToolResultMessage
+
+MESSAGE_TYPES: dict[str, Any] = {
+    cls.__name__: cls
+    for cls in (
+        ChatMessage,
+        SystemMessage,
+        ToolCallMessage,
+        ToolConfirmationMessage,
+        RuntimeMessage,
+        DestroyedRuntimeMessage,
+        CompressRangeRequest,
+        SummaryMessage,
+        GlobalMemory,
+        CheapLlmStatusMessage,
+        ToolResultMessage,
+        ToolErrorMessage,
+    )
+}
+
+# 旧版历史没有type字段，按顺序检查字段来推断消息类型
+LEGACY_RULES: list[tuple[Callable[[dict], bool], str]] = [
+    (lambda data: data == {}, "DestroyedRuntimeMessage"),
+    (lambda data: data.get("name") == "tool-result", "ToolResultMessage"),
+    (lambda data: data.get("name") == "tool-error", "ToolErrorMessage"),
+    (lambda data: "tool_calls" in data, "ToolCallMessage"),
+    (lambda data: "messages_summerization" in data, "CompressRangeRequest"),
+    (lambda data: "is_cheap_llm_available" in data, "CheapLlmStatusMessage"),
+    (lambda data: "filepath" in data, "GlobalMemory"),
+    (lambda data: "covered" in data, "SummaryMessage"),
+    (lambda data: data.get("role") == "system", "SystemMessage"),
+    (lambda data: "message" in data and "name" in data, "ChatMessage"),
+    (lambda data: "message" in data, "RuntimeMessage"),
+]
+
+
+def message_type_of(data: dict) -> str:
+    """返回消息字典对应的消息类型名称。"""
+    type_name = data.get("type")
+    if isinstance(type_name, str):
+        return type_name
+    for rule, name in LEGACY_RULES:
+        if rule(data):
+            return name
+    raise ValueError(f"无法识别的历史消息: {sorted(data)}")
+
+
+def message_from_dict(data: dict, blob_store: BlobStore | None = None) -> Any:
+    """把历史中保存的消息字典还原为消息对象。
+
+    Args:
+        data: 历史中的消息字典
+        blob_store: 工具输出数据块所在的存储
+
+    Returns:
+        消息对象
+
+    Raises:
+        ValueError: 消息类型未知，或工具输出引用了数据块但没有提供blob_store
+    """
+    type_name = message_type_of(data)
+    cls = MESSAGE_TYPES.get(type_name)
+    if cls is None:
+        raise ValueError(f"未知的历史消息类型: {type_name!r}")
+    fields = {key: value for key, value in data.items() if key != "type"}
+    if cls is ToolResultMessage:
+        return ToolResultMessage.from_json(
+            json_backend.dumps(fields), blob_store=blob_store
+        )
+    return cls.from_json(json_backend.dumps(fields))
+
+
+def load_session_messages(store: HistoryStore, session_id: str) -> list[Any]:
+    """读取历史会话并还原为消息对象列表。"""
+    return [
+        message_from_dict(data, store.blobs) for data in store.load_session(session_id)
+    ]
@@ -0,0 +1,260 @@
+"""历史摘要模块。
+
+历史压缩删除的消息会被总结为SummaryMessage保留在历史中。摘要由廉价LLM在后台生成，
+没有配置廉价LLM时使用本地提取的摘要。同一级别的摘要超过一定数量时，
+最早的几条会被合并为更高一级的摘要，使历史大小有上限而不丢失早期的信息。
+"""
+
+from typing import Any, Iterator, Sequence, cast
+import asyncio
+import contextlib
+import logging
+import re
+
+import linhai
+from linhai.agent_base import SummaryMessage, RuntimeMessage
+from linhai.llm import ChatMessage, LanguageModel, SystemMessage
+from linhai.message_summary import default_summary_index
+from linhai.prompt import HISTORY_SUMMARY_PROMPT, MERGE_SUMMARY_PROMPT
+from linhai.tool.main import ToolResultMessage
+
+logger = logging.getLogger(__name__)
+
+# 每个级别最多保留的摘要数量，超过时最早的摘要被合并
+DEFAULT_SUMMARY_FANOUT = 4
+# 发送给廉价LLM的最大字符数
+SUMMARY_INPUT_CHARS = 60000
+# 每条消息发送给廉价LLM的最大字符数
+SUMMARY_MESSAGE_CHARS = 2000
+# 本地摘要中每一部分最多列出的条目数量
+LOCAL_SUMMARY_ITEMS = 20
+
+TOOL_CALL_PATTERN = re.compile(r"你调用了工具'([^']+)'")
+
+
+def truncate(text: str, limit: int) -> str:
+    """截断过长的文本并注明省略的字符数。"""
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}……（省略{len(text) - limit}字符）"
+
+
+def render_messages(messages: Sequence[Any]) -> str:
+    """把消息转换为发送给廉价LLM的文本。"""
+    parts: list[str] = []
+    total = 0
+    for msg in messages:
+        llm_message = msg.to_llm_message()
+        content = truncate(str(llm_message.get("content") or ""), SUMMARY_MESSAGE_CHARS)
+        part = f"[{llm_message['role']}]\n{content}"
+        total += len(part)
+        if total > SUMMARY_INPUT_CHARS:
+            parts.append(f"……（之后的{len(messages) - len(parts)}条消息被省略）")
+            break
+        parts.append(part)
+    return "\n\n".join(parts)
+
+
+def local_summary(messages: Sequence[Any]) -> str:
+    """不调用LLM，从消息中提取用户需求、助手回答、使用的工具和文件。"""
+    user_messages: list[str] = []
+    assistant_messages: list[str] = []
+    tools: list[str] = []
+    files: list[str] = []
+    summaries: list[str] = []
+    for msg in messages:
+        if isinstance(msg, ChatMessage) and msg.message:
+            first_line = truncate(msg.message.strip().split("\n", 1)[0], 200)
+            if msg.role == "user":
+                user_messages.append(first_line)
+            else:
+                assistant_messages.append(first_line)
+        elif isinstance(msg, RuntimeMessage):
+            tools.extend(TOOL_CALL_PATTERN.findall(msg.message))
+        elif isinstance(msg, ToolResultMessage) and msg.file_path is not None:
+            files.append(msg.file_path)
+        elif isinstance(msg, SummaryMessage) and msg.summary is not None:
+            summaries.append(truncate(msg.summary, 1000))
+
+    sections = []
+    if summaries:
+        sections.append("## 更早的摘要\n" + "\n\n".join(summaries))
+    if user_messages:
+        sections.append(
+            "## 用户消息\n"
+            + "\n".join(f"- {line}" for line in user_messages[-LOCAL_SUMMARY_ITEMS:])
+        )
+    if assistant_messages:
+        sections.append(
+            "## 助手回答（首行）\n"
+            + "\n".join(
+                f"- {line}" for line in assistant_messages[-LOCAL_SUMMARY_ITEMS:]
+            )
+        )
+    if tools:
+        sections.append("## 使用的工具\n" + "，".join(dict.fromkeys(tools)))
+    if files:
+        recent_files = list(dict.fromkeys(reversed(files)))[:LOCAL_SUMMARY_ITEMS]
+        sections.append("## 涉及的文件\n" + "\n".join(f"- {f}" for f in recent_files))
+    return "\n\n".join(sections) or "（没有可以提取的信息）"
+
+
+async def run_summary_model(model: LanguageModel, prompt: str, content: str) -> str:
+    """让LLM根据提示总结内容，返回去除首尾空白的回答。"""
+    answer = await model.answer_stream(
+        [SystemMessage(prompt), ChatMessage("user", content)]
+    )
+    async for _ in answer:
+        pass
+    return cast(ChatMessage, answer.get_message()).message.strip()
+
+
+class HistorySummarizer:
+    """在后台为被压缩的历史生成摘要，并把同级摘要逐级合并。"""
+
+    def __init__(self, fanout: int = DEFAULT_SUMMARY_FANOUT):
+        """初始化历史摘要器。
+
+        Args:
+            fanout: 每个级别最多保留的摘要数量，超过时最早的fanout条被合并
+        """
+        self.fanout = fanout
+        self.pending: set[asyncio.Task] = set()
+        self._merging: set[int] = set()
+        self._hold_depth = 0
+        # 暂停期间完成的合并：(agent, group, summary, level)
+        self._deferred: list[tuple[Any, list[SummaryMessage], str, int]] = []
+
+    def _start(self, coroutine) -> None:
+        """启动后台任务并记录，任务结束后自动移除。"""
+        task = asyncio.create_task(coroutine)
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    def schedule_evicted(
+        self,
+        agent: "linhai.agent.Agent",
+        placeholder: SummaryMessage,
+        evicted: Sequence[Any],
+    ) -> None:
+        """为被删除的消息生成摘要，完成后写入placeholder。
+
+        Args:
+            agent: Agent实例，用于获取廉价LLM和历史消息
+            placeholder: 已经插入历史中、代替被删除消息的摘要消息
+            evicted: 被删除的消息
+        """
+        evicted = list(evicted)
+        cheap_model = agent.config.get("cheap_model")
+        if cheap_model is None:
+            placeholder.summary = local_summary(evicted)
+            self.schedule_merge(agent)
+            return
+        self._start(self._summarize_evicted(agent, cheap_model, placeholder, evicted))
+
+    async def _summarize_evicted(
+        self,
+        agent: "linhai.agent.Agent",
+        model: LanguageModel,
+        placeholder: SummaryMessage,
+        evicted: list[Any],
+    ) -> None:
+        try:
+            summary = await run_summary_model(
+                model, HISTORY_SUMMARY_PROMPT, render_messages(evicted)
+            )
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.warning("生成历史摘要失败，使用本地摘要: %s", e)
+            summary = ""
+        placeholder.summary = summary or local_summary(evicted)
+        default_summary_index.invalidate(placeholder)
+        self.schedule_merge(agent)
+
+    def schedule_merge(self, agent: "linhai.agent.Agent") -> None:
+        """某个级别的摘要超过fanout条时，合并该级别最早的fanout条摘要。"""
+        by_level: dict[int, list[SummaryMessage]] = {}
+        for msg in agent.messages:
+            if (
+                isinstance(msg, SummaryMessage)
+                and msg.summary is not None
+                and id(msg) not in self._merging
+            ):
+                by_level.setdefault(msg.level, []).append(msg)
+
+        for level, summaries in sorted(by_level.items()):
+            if len(summaries) <= self.fanout:
+                continue
+            group = summaries[: self.fanout]
+            self._merging.update(id(msg) for msg in group)
+            cheap_model = agent.config.get("cheap_model")
+            if cheap_model is None:
+                self.apply_merge(agent, group, local_summary(group), level + 1)
+            else:
+                self._start(self._merge(agent, cheap_model, group, level + 1))
+
+    async def _merge(
+        self,
+        agent: "linhai.agent.Agent",
+        model: LanguageModel,
+        group: list[SummaryMessage],
+        level: int,
+    ) -> None:
+        content = "\n\n".join(
+            f"# 摘要{i}（覆盖{msg.covered}条消息）\n{msg.summary}"
+            for i, msg in enumerate(group, 1)
+        )
+        try:
+            summary = await run_summary_model(model, MERGE_SUMMARY_PROMPT, content)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.warning("合并历史摘要失败，使用本地摘要: %s", e)
+            summary = ""
+        self.apply_merge(agent, group, summary or local_summary(group), level)
+
+    @contextlib.contextmanager
+    def hold_merges(self) -> Iterator[None]:
+        """
+        在with块中暂停修改历史，块结束后再应用期间完成的合并
+
+        按位置修改历史的代码（如按消息ID删除一段范围）在等待LLM时，后台合并会删除消息，
+        使之前得到的位置失效，这类代码需要在with块中运行。
+        """
+        self._hold_depth += 1
+        try:
+            yield
+        finally:
+            self._hold_depth -= 1
+            if not self._hold_depth:
+                deferred, self._deferred = self._deferred, []
+                for agent, group, summary, level in deferred:
+                    self.apply_merge(agent, group, summary, level)
+
+    def apply_merge(
+        self,
+        agent: "linhai.agent.Agent",
+        group: list[SummaryMessage],
+        summary: str,
+        level: int,
+    ) -> None:
+        """用合并后的摘要代替group中的摘要，放在最早一条的位置；暂停期间推迟执行。"""
+        if self._hold_depth:
+            self._deferred.append((agent, group, summary, level))
+            return
+        self._merging.difference_update(id(msg) for msg in group)
+        group_ids = {id(msg) for msg in group}
+        positions = [i for i, msg in enumerate(agent.messages) if id(msg) in group_ids]
+        if len(positions) != len(group):
+            # 合并期间部分摘要已经被删除，放弃这次合并
+            return
+        merged = SummaryMessage(
+            level=level, covered=sum(msg.covered for msg in group), summary=summary
+        )
+        agent.messages[positions[0]] = merged
+        agent.messages = [msg for msg in agent.messages if id(msg) not in group_ids]
+        self.schedule_merge(agent)
+
+    async def wait(self, timeout: float | None = None) -> None:
+        """等待所有后台摘要任务完成，包括完成后触发的合并。"""
+        while self.pending:
+            _, not_done = await asyncio.wait(set(self.pending), timeout=timeout)
+            if not_done:
+                return
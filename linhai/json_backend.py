@@ -0,0 +1,141 @@
+"""JSON序列化后端。
+
+所有模块通过这里读写JSON。安装了orjson时使用orjson，其次使用msgspec，都没有时使用标准库json。
+快速后端无法处理的数据（超过64位的整数、非字符串键、单独的代理字符等）
+会自动交给标准库处理，因此各个后端的解析结果相同。
+
+输出不转义非ASCII字符；默认输出紧凑格式，pretty=True时缩进2个空格，格式与标准库的indent=2相同。
+不同后端输出的空白和浮点数格式可能不同，需要稳定字节表示的地方应使用sort_keys=True并只比较同一后端的结果。
+"""
+
+from typing import Any
+import json
+
+# orjson和msgspec是可选依赖，没有安装时mypy找不到它们的类型信息，用None表示不可用
+try:
+    import orjson  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None  # type: ignore[assignment]
+
+try:
+    import msgspec  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - 可选依赖
+    msgspec = None  # type: ignore[assignment]
+
+JSONDecodeError = json.JSONDecodeError
+"""解析失败时抛出的异常，所有后端都抛出标准库的JSONDecodeError。"""
+
+
+def available_backends() -> list[str]:
+    """返回可用的后端，按优先级排序。"""
+    backends = []
+    if orjson is not None:
+        backends.append("orjson")
+    if msgspec is not None:
+        backends.append("msgspec")
+    backends.append("json")
+    return backends
+
+
+backend = available_backends()[0]
+
+
+def set_backend(name: str) -> None:
+    """切换使用的后端，用于基准测试和测试。
+
+    Raises:
+        ValueError: 后端不可用
+    """
+    global backend  # pylint: disable=global-statement
+    if name not in available_backends():
+        raise ValueError(
+            f"JSON后端{name!r}不可用，可用的后端：{', '.join(available_backends())}"
+        )
+    backend = name
+
+
+def _stdlib_dumps(obj: Any, pretty: bool, sort_keys: bool) -> str:
+    return json.dumps(
+        obj,
+        ensure_ascii=False,
+        sort_keys=sort_keys,
+        indent=2 if pretty else None,
+        separators=None if pretty else (",", ":"),
+    )
+
+
+def _fast_dumps(obj: Any, pretty: bool, sort_keys: bool) -> bytes | None:
+    """用快速后端序列化，后端不支持该数据时返回None。"""
+    if backend == "orjson":
+        option = (orjson.OPT_INDENT_2 if pretty else 0) | (
+            orjson.OPT_SORT_KEYS if sort_keys else 0
+        )
+        try:
+            return orjson.dumps(obj, option=option)
+        except TypeError:
+            return None
+    if backend == "msgspec":
+        try:
+            data = msgspec.json.encode(obj, order="sorted" if sort_keys else None)
+        except (TypeError, ValueError, OverflowError):
+            return None
+        return msgspec.json.format(data, indent=2) if pretty else data
+    return None
+
+
+def dumps(
+    obj: Any, *, pretty: bool = False, sort_keys: bool = False, compact: bool = True
+) -> str:
+    """把对象序列化为JSON字符串。
+
+    Args:
+        obj: 要序列化的对象
+        pretty: 是否缩进2个空格
+        sort_keys: 是否按键排序
+        compact: 单行输出时是否省略逗号和冒号后的空格。False时总是使用标准库，
+            输出与后端无关，用于需要展示给LLM的单行JSON
+    """
+    if not compact and not pretty:
+        return json.dumps(obj, ensure_ascii=False, sort_keys=sort_keys)
+    data = _fast_dumps(obj, pretty, sort_keys)
+    if data is not None:
+        return data.decode("utf-8")
+    return _stdlib_dumps(obj, pretty, sort_keys)
+
+
+def dumps_bytes(obj: Any, *, pretty: bool = False, sort_keys: bool = False) -> bytes:
+    """把对象序列化为UTF-8编码的JSON。"""
+    data = _fast_dumps(obj, pretty, sort_keys)
+    if data is not None:
+        return data
+    text = _stdlib_dumps(obj, pretty, sort_keys)
+    try:
+        return text.encode("utf-8")
+    except UnicodeEncodeError:
+        # 单独的代理字符无法用UTF-8编码，转义后输出
+        return json.dumps(
+            obj,
+            sort_keys=sort_keys,
+            indent=2 if pretty else None,
+            separators=None if pretty else (",", ":"),
+        ).encode("ascii")
+
+
+def loads(data: str | bytes) -> Any:
+    """解析JSON字符串或UTF-8编码的JSON。
+
+    Raises:
+        JSONDecodeError: 不是合法的JSON
+    """
+    if backend == "orjson":
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    elif backend == "msgspec":
+        try:
+            return msgspec.json.decode(data)
+        except msgspec.DecodeError:
+            pass
+    # 标准库可以解析快速后端拒绝的输入，不能解析时给出带位置的错误
+    return json.loads(data)
@@ -0,0 +1,203 @@
+"""LLM输出的JSON修复模块。
+
+工具调用的JSON解析失败时，先修复LLM常见的格式错误再放弃，避免为了重新输出工具调用多花一轮对话。
+修复只扫描一遍文本，耗时与文本长度成正比，超过MAX_REPAIR_CHARS的文本不修复。
+
+能修复的错误：
+- 对象和数组末尾多余的逗号
+- 字符串中没有转义的换行符、制表符等控制字符，以及无效的反斜杠转义
+- Python风格的True、False、None和单引号字符串，没有引号的对象键
+- 不匹配的括号，以及回答被中断导致缺少的右括号（最后一个值可能不完整时不修复，避免用不完整的参数调用工具）
+- JSON之后多余的内容
+"""
+
+from typing import Any, TypedDict
+
+from linhai import json_backend
+
+# 超过这个长度的文本不尝试修复
+MAX_REPAIR_CHARS = 200_000
+
+PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+JSON_ESCAPES = set('"\\/bfnrtu')
+CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+
+REPAIR_TRAILING_COMMA = "删除了多余的逗号"
+REPAIR_CONTROL_CHAR = "转义了字符串中的换行符等控制字符"
+REPAIR_INVALID_ESCAPE = "转义了无效的反斜杠"
+REPAIR_PYTHON_LITERAL = "把Python的True/False/None改为JSON的true/false/null"
+REPAIR_SINGLE_QUOTE = "把单引号字符串改为双引号字符串"
+REPAIR_BARE_KEY = "给对象的键加上了引号"
+REPAIR_MISSING_BRACKET = "补全了缺少的右括号"
+REPAIR_EXTRA_BRACKET = "删除了多余的右括号"
+REPAIR_EXTRA_DATA = "忽略了JSON之后多余的内容"
+
+
+class RepairStats(TypedDict):
+    """修复的统计，用于计算修复节省的对话轮数。"""
+
+    attempts: int  # 解析失败、尝试修复的次数
+    repaired: int  # 修复成功的次数
+    failed: int  # 修复失败的次数
+    repairs: dict[str, int]  # 每种修复的次数
+
+
+def new_repair_stats() -> RepairStats:
+    """创建空的修复统计。"""
+    return {"attempts": 0, "repaired": 0, "failed": 0, "repairs": {}}
+
+
+# 进程内所有修复的统计
+repair_stats = new_repair_stats()
+
+
+def record_repair(stats: RepairStats, repairs: list[str] | None) -> None:
+    """记录一次修复尝试，repairs为None表示修复失败。"""
+    stats["attempts"] += 1
+    if repairs is None:
+        stats["failed"] += 1
+        return
+    stats["repaired"] += 1
+    for repair in repairs:
+        stats["repairs"][repair] = stats["repairs"].get(repair, 0) + 1
+
+
+def _rewrite(text: str) -> tuple[str, list[str]] | None:
+    """按JSON的语法扫描一遍文本并改写常见错误，最后一个值可能被截断时返回None。"""
+    out: list[str] = []
+    repairs: list[str] = []
+    stack: list[str] = []
+    started = False  # 是否已经开始输出第一个值
+    quote = ""  # 当前字符串的引号，不在字符串中时为空
+    i = 0
+    length = len(text)
+
+    def note(repair: str) -> None:
+        if repair not in repairs:
+            repairs.append(repair)
+
+    def drop_trailing_comma() -> None:
+        j = len(out) - 1
+        while j >= 0 and out[j].isspace():
+            j -= 1
+        if j >= 0 and out[j] == ",":
+            del out[j]
+            note(REPAIR_TRAILING_COMMA)
+
+    while i < length:
+        char = text[i]
+        if quote:
+            if char == "\\":
+                if i + 1 >= length:
+                    return None
+                escaped = text[i + 1]
+                if escaped in JSON_ESCAPES:
+                    out.append(char + escaped)
+                elif escaped == "'":
+                    out.append("'")
+                else:
+                    out.append("\\\\")
+                    note(REPAIR_INVALID_ESCAPE)
+                    i += 1
+                    continue
+                i += 2
+                continue
+            if char == quote:
+                out.append('"')
+                quote = ""
+            elif char == '"':
+                # 单引号字符串中的双引号需要转义
+                out.append('\\"')
+            elif char < " ":
+                out.append(CONTROL_ESCAPES.get(char, f"\\u{ord(char):04x}"))
+                note(REPAIR_CONTROL_CHAR)
+            else:
+                out.append(char)
+            i += 1
+            continue
+
+        if started and not stack and not char.isspace():
+            # 第一个值已经结束，剩下的内容不属于JSON
+            note(REPAIR_EXTRA_DATA)
+            break
+        if char in "\"'":
+            quote = char
+            started = True
+            if char == "'":
+                note(REPAIR_SINGLE_QUOTE)
+            out.append('"')
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+            started = True
+            out.append(char)
+        elif char in "}]":
+            drop_trailing_comma()
+            if char in stack:
+                # 先闭合内层没有闭合的括号
+                while stack[-1] != char:
+                    out.append(stack.pop())
+                    note(REPAIR_MISSING_BRACKET)
+                stack.pop()
+                out.append(char)
+            else:
+                note(REPAIR_EXTRA_BRACKET)
+        elif char.isalpha() or char == "_":
+            end = i
+            while end < length and (text[end].isalnum() or text[end] == "_"):
+                end += 1
+            word = text[i:end]
+            after = end
+            while after < length and text[after].isspace():
+                after += 1
+            if stack and stack[-1] == "}" and after < length and text[after] == ":":
+                word = f'"{word}"'
+                note(REPAIR_BARE_KEY)
+            elif word in PYTHON_LITERALS:
+                word = PYTHON_LITERALS[word]
+                note(REPAIR_PYTHON_LITERAL)
+            out.append(word)
+            started = True
+            i = end
+            continue
+        else:
+            if not char.isspace():
+                started = True
+            out.append(char)
+        i += 1
+
+    if quote:
+        return None
+    if stack:
+        drop_trailing_comma()
+        while out and out[-1].isspace():
+            out.pop()
+        # 只有最后一个值以引号或括号结束时才能确定它是完整的
+        if not out or out[-1][-1] not in '"}]':
+            return None
+        out.extend(reversed(stack))
+        note(REPAIR_MISSING_BRACKET)
+    return "".join(out), repairs
+
+
+def repair_json(text: str) -> tuple[Any, list[str]] | None:
+    """
+    修复并解析LLM输出的JSON
+
+    Args:
+        text: 标准解析失败的JSON文本
+
+    Returns:
+        tuple[Any, list[str]] | None: 解析结果和进行的修复，无法修复时返回None
+    """
+    if len(text) > MAX_REPAIR_CHARS:
+        return None
+    rewritten = _rewrite(text)
+    if rewritten is None:
+        return None
+    fixed, repairs = rewritten
+    if not repairs:
+        return None
+    try:
+        return json_backend.loads(fixed), repairs
+    except json_backend.JSONDecodeError:
+        return None
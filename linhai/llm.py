@@ -2,11 +2,11 @@
 
 from typing import Sequence, Protocol, TypedDict, AsyncIterator, cast, runtime_checkable
 import asyncio
-import json
 
 from openai import AsyncOpenAI
 from openai import OpenAIError
 from openai.types.chat import ChatCompletionMessageParam, ChatCompletionChunk
+from linhai import json_backend
 from linhai.type_hints import LanguageModelMessage, ToolMessage
 
 
@@ -48,12 +48,12 @@ class SystemMessage:
 
     def to_json(self) -> str:
 
-        return json.dumps(self.to_llm_message())
+        return json_backend.dumps(self.to_llm_message())
 
     @classmethod
     def from_json(cls, json_str: str):
 
-        data = json.loads(json_str)
+        data = json_backend.loads(json_str)
         return cls(message=data["content"])
 
 
@@ -91,12 +91,12 @@ class ChatMessage:
             "message": self.message,  # 保存原始消息，不是包装后的消息
             "name": self.name,
         }
-        return json.dumps(data)
+        return json_backend.dumps(data)
 
     @classmethod
     def from_json(cls, json_str: str):
 
-        data = json.loads(json_str)
+        data = json_backend.loads(json_str)
         return cls(role=data["role"], message=data["message"], name=data.get("name"))
 
 
@@ -116,9 +116,9 @@ class ToolCallMessage:
             # 如果是字符串，尝试解析为字典
             try:
                 self.function_arguments = (
-                    json.loads(function_arguments) if function_arguments else {}
+                    json_backend.loads(function_arguments) if function_arguments else {}
                 )
-            except json.JSONDecodeError:
+            except json_backend.JSONDecodeError:
                 # 解析失败时设置为空字典
                 self.function_arguments = {}
 
@@ -147,12 +147,12 @@ class ToolCallMessage:
 
     def to_json(self) -> str:
 
-        return json.dumps(self.to_llm_message())
+        return json_backend.dumps(self.to_llm_message())
 
     @classmethod
     def from_json(cls, json_str: str):
 
-        data = json.loads(json_str)
+        data = json_backend.loads(json_str)
         # 从tool_calls中提取函数名和参数
         tool_call = data["tool_calls"][0]
         function_name = tool_call["function"]["name"]
@@ -193,12 +193,12 @@ class ToolConfirmationMessage:
     def to_json(self) -> str:
 
         data = {"tool_call": self.tool_call.to_json(), "confirmed": self.confirmed}
-        return json.dumps(data)
+        return json_backend.dumps(data)
 
     @classmethod
     def from_json(cls, json_str: str):
 
-        data = json.loads(json_str)
+        data = json_backend.loads(json_str)
         tool_call = ToolCallMessage.from_json(data["tool_call"])
         return cls(tool_call=tool_call, confirmed=data["confirmed"])
 
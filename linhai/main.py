@@ -1,15 +1,19 @@
 """
 LinHai 主程序入口模块。
 
-提供命令行接口，支持运行测试和Agent模式。
+提供命令行接口，支持运行测试、Agent模式和历史会话管理。
 """
 
 from pathlib import Path
 import argparse
+import time
 import unittest
 
 from linhai.agent import create_agent
 from linhai.cli_ui import CLIApp
+from linhai.config import load_config, HistoryConfig
+from linhai.history import HistoryStore
+from linhai.history_index import HistoryIndex, maintain_history
 
 
 def run_tests():
@@ -21,6 +25,68 @@ def run_tests():
     return result.wasSuccessful()
 
 
+def load_history_store(config_path: Path) -> HistoryStore:
+    """根据配置文件创建历史存储，配置文件不存在时使用默认配置。"""
+    history_config: HistoryConfig = {}
+    if config_path.exists():
+        history_config = load_config(config_path).get("history", {})
+    return HistoryStore.from_config(history_config)
+
+
+def format_size(size: int) -> str:
+    """把字节数格式化为易读的字符串。"""
+    value = float(size)
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(value) < 1024 or unit == "GB":
+            return f"{value:.1f}{unit}"
+        value /= 1024
+    return f"{value:.1f}GB"
+
+
+def run_history_command(args: argparse.Namespace) -> None:
+    """执行history子命令。"""
+    store = load_history_store(args.config.expanduser())
+    if args.history_command == "maintain":
+        report = maintain_history(store)
+        print(f"历史目录: {store.root.as_posix()}")
+        print(f"压缩关闭的会话: {report['closed_sessions']}")
+        print(f"按保留策略删除的会话: {report['removed_sessions']}")
+        print(f"回收的消息对象: {report['removed_objects']}")
+        print(f"回收的工具输出数据块: {report['removed_blobs']}")
+        print(
+            f"占用空间: {format_size(report['bytes_before'])} -> "
+            f"{format_size(report['bytes_after'])}，"
+            f"回收{format_size(report['bytes_reclaimed'])}"
+        )
+        return
+
+    index = HistoryIndex.for_store(store)
+    try:
+        start = time.perf_counter()
+        if args.history_command == "index":
+            added = index.rebuild(store)
+            print(f"新索引了{added}个会话")
+        elif args.history_command == "search":
+            for result in index.search(" ".join(args.query), limit=args.limit):
+                print(
+                    f"{result['session_id']} #{result['position']} "
+                    f"[{result['role']}] {result['snippet']}"
+                )
+        elif args.history_command == "list":
+            for record in index.list_sessions(limit=args.limit):
+                print(
+                    f"{record['session_id']} {record['start_time']} -> "
+                    f"{record['end_time']} model={record['model'] or '-'} "
+                    f"messages={record['message_count']} "
+                    f"tokens={record['total_tokens']} "
+                    f"tools={','.join(record['tools_used']) or '-'}"
+                )
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"用时{elapsed_ms:.1f}ms")
+    finally:
+        index.close()
+
+
 def main():
     """主函数，解析命令行参数并执行相应命令。"""
     parser = argparse.ArgumentParser(description="LinHai 主程序")
@@ -32,8 +98,27 @@ def main():
     )
     parser.add_argument("-m", "--message", type=str, help="初始用户消息")
 
+    subparsers = parser.add_subparsers(dest="command")
+    history_parser = subparsers.add_parser("history", help="管理历史会话")
+    history_subparsers = history_parser.add_subparsers(
+        dest="history_command", required=True
+    )
+    history_subparsers.add_parser(
+        "maintain", help="压缩空闲会话、应用保留策略并报告回收的空间"
+    )
+    history_subparsers.add_parser("index", help="把尚未索引的历史会话加入索引")
+    search_parser = history_subparsers.add_parser("search", help="全文搜索历史消息")
+    search_parser.add_argument("query", nargs="+", help="搜索词")
+    search_parser.add_argument("--limit", type=int, default=20, help="最多显示的结果数")
+    list_parser = history_subparsers.add_parser("list", help="列出最近的历史会话")
+    list_parser.add_argument("--limit", type=int, default=20, help="最多显示的会话数")
+
     args = parser.parse_args()
 
+    if args.command == "history":
+        run_history_command(args)
+        return
+
     (
         agent,
         input_queue,
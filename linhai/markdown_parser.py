@@ -1,15 +1,29 @@
 """Markdown解析模块，用于从Markdown文本中提取JSON代码块和工具调用。"""
 
-import json
-from typing import List, Dict, Any, Tuple
+import re
+from typing import List, Dict, Any, Tuple, TypedDict
 import mistune
 from reprlib import Repr
 
+from linhai import json_backend
+from linhai.json_repair import RepairStats, record_repair, repair_json, repair_stats
+
 repr_obj = Repr(maxstring=50)
 
+TOOL_CALL_LANGUAGE = "json toolcall"
+# 与mistune相同的围栏规则：最多3个空格缩进，3个以上反引号或波浪号
+FENCE_OPEN_PATTERN = re.compile(r"^( {0,3})(`{3,}|~{3,})[ \t]*(.*?)$")
+# 带语言标记的代码块只能是围栏代码块，文本中没有围栏时可以跳过解析
+FENCE_HINT_PATTERN = re.compile(r"```|~~~")
+# mistune对info字符串做的反斜杠转义还原
+ESCAPED_CHAR_PATTERN = re.compile(r"\\([!\"#$%&'()*+,\-./:;<=>?@\[\\\]^_`{|}~])")
+
 
 class CodeBlockRenderer(mistune.HTMLRenderer):
-    """自定义渲染器用于提取JSON工具调用的代码块"""
+    """自定义渲染器用于提取JSON工具调用的代码块
+
+    会完整渲染HTML，提取代码块请使用更快的extract_code_blocks。
+    """
 
     def __init__(self):
         super().__init__()
@@ -22,6 +36,46 @@ class CodeBlockRenderer(mistune.HTMLRenderer):
         return super().block_code(code, info)
 
 
+# 只做块级解析的mistune解析器，解析器本身没有状态，可以重复使用
+_block_parser = mistune.BlockParser()
+
+
+def _collect_code_blocks(
+    tokens: List[Dict[str, Any]], code_blocks: List[Dict[str, str]]
+) -> None:
+    """按文档顺序收集块级token中的代码块，包括列表和引用中的代码块。"""
+    for token in tokens:
+        if token["type"] == "block_code":
+            info = token.get("attrs", {}).get("info")
+            language = info.strip() if info else "plaintext"
+            code_blocks.append({"language": language, "content": token["raw"]})
+        elif "children" in token:
+            _collect_code_blocks(token["children"], code_blocks)
+
+
+def extract_code_blocks(markdown_text: str) -> List[Dict[str, str]]:
+    """
+    从Markdown文本中提取所有代码块
+
+    只进行mistune的块级解析，不解析行内元素、不渲染HTML，结果与CodeBlockRenderer相同。
+
+    Args:
+        markdown_text: 要解析的Markdown文本
+
+    Returns:
+        代码块列表，每个元素包含language和content，缩进代码块的language为plaintext
+    """
+    text = markdown_text.replace("\r\n", "\n").replace("\r", "\n")
+    if not text.endswith("\n"):
+        text += "\n"
+    state = _block_parser.state_cls()
+    state.process(text)
+    _block_parser.parse(state)
+    code_blocks: List[Dict[str, str]] = []
+    _collect_code_blocks(state.tokens, code_blocks)
+    return code_blocks
+
+
 def extract_json_blocks(markdown_text: str) -> List[Any]:
     """
     从Markdown文本中提取所有JSON代码块
@@ -32,17 +86,15 @@ def extract_json_blocks(markdown_text: str) -> List[Any]:
     Returns:
         包含所有JSON代码块内容的列表，每个元素是解析后的数据
     """
-    renderer = CodeBlockRenderer()
-    markdown = mistune.create_markdown(renderer=renderer)
-    markdown(markdown_text)
-
+    if not FENCE_HINT_PATTERN.search(markdown_text):
+        return []
     json_blocks = []
-    for block in renderer.code_blocks:
+    for block in extract_code_blocks(markdown_text):
         if block["language"].lower() == "json":
             try:
-                data = json.loads(block["content"])
+                data = json_backend.loads(block["content"])
                 json_blocks.append(data)
-            except json.JSONDecodeError:
+            except json_backend.JSONDecodeError:
                 continue
     return json_blocks
 
@@ -71,29 +123,224 @@ def extract_tool_calls_with_errors(
         markdown_text: 要解析的Markdown文本
 
     Returns:
-        tuple[list[dict], list[str]]: 工具调用列表和错误消息列表
+        tuple[list[dict], list[str]]: 工具调用列表和错误消息列表，错误消息包括自动修复JSON的说明
     """
-    renderer = CodeBlockRenderer()
-    markdown = mistune.create_markdown(renderer=renderer)
-    markdown(markdown_text)
-
-    tool_calls = []
-    errors = []
+    tool_calls: List[Dict[str, Any]] = []
+    errors: List[str] = []
+    if not FENCE_HINT_PATTERN.search(markdown_text):
+        return tool_calls, errors
 
-    for i, block in enumerate(renderer.code_blocks):
-        if block["language"].lower() == "json toolcall":
-            try:
-                data = json.loads(block["content"])
-                if isinstance(data, dict) and "name" in data and "arguments" in data:
-                    tool_calls.append(data)
-                else:
-                    errors.append(
-                        f"工具调用解析出错：第{i+1}工具调用{repr_obj.repr(block["content"])}不是合法的工具调用"
-                        "，可能为其他json数据，已忽略"
-                    )
-            except json.JSONDecodeError:
-                errors.append(
-                    f"工具调用解析出错：第{i+1}工具调用{repr_obj.repr(block["content"])}解析JSON出错，已忽略"
-                )
+    for i, block in enumerate(extract_code_blocks(markdown_text)):
+        if block["language"].lower() == TOOL_CALL_LANGUAGE:
+            tool_call, error = parse_tool_call_block(i, block["content"], repair_stats)
+            if tool_call is not None:
+                tool_calls.append(tool_call)
+            if error is not None:
+                errors.append(error)
 
     return tool_calls, errors
+
+
+def parse_tool_call_block(
+    index: int, content: str, stats: RepairStats | None = None
+) -> Tuple[Dict[str, Any] | None, str | None]:
+    """
+    解析一个json toolcall代码块的内容，JSON格式有误时先尝试修复
+
+    Args:
+        index: 代码块在回答所有代码块中的序号，从0开始，用于错误消息
+        content: 代码块内容
+        stats: 记录修复结果的统计，None时不记录
+
+    Returns:
+        tuple[dict | None, str | None]: 工具调用和错误消息。修复成功时两者都不为None，
+        错误消息说明进行了哪些修复
+    """
+    repairs: List[str] = []
+    try:
+        data = json_backend.loads(content)
+    except json_backend.JSONDecodeError:
+        repaired = repair_json(content)
+        if stats is not None:
+            record_repair(stats, None if repaired is None else repaired[1])
+        if repaired is None:
+            return None, (
+                f"工具调用解析出错：第{index+1}工具调用{repr_obj.repr(content)}解析JSON出错，已忽略"
+            )
+        data, repairs = repaired
+    if isinstance(data, dict) and "name" in data and "arguments" in data:
+        if repairs:
+            return data, (
+                f"工具调用修复：第{index+1}工具调用的JSON格式有误，已自动修复（{'；'.join(repairs)}）"
+                "后调用，请输出合法的JSON"
+            )
+        return data, None
+    return None, (
+        f"工具调用解析出错：第{index+1}工具调用{repr_obj.repr(content)}不是合法的工具调用"
+        "，可能为其他json数据，已忽略"
+    )
+
+
+class ToolCallEvent(TypedDict):
+    """一个结束的json toolcall代码块。"""
+
+    block_index: int  # 在回答所有代码块中的序号，从0开始
+    start: int  # 开始围栏所在行在回答中的偏移
+    end: int  # 结束围栏所在行之后的偏移，代码块直到回答结束都没有结束时为回答长度
+    content: str
+    tool_call: Dict[str, Any] | None
+    error: str | None  # 错误消息，JSON被自动修复时为修复说明
+
+
+class ToolCallScanner:
+    """
+    流式回答的增量代码块围栏扫描器
+
+    逐段接收LLM输出的增量文本，按行识别代码块围栏，每个json toolcall代码块结束时
+    立即产生一个ToolCallEvent，每段文本只扫描一次。围栏规则与mistune一致：
+    开始围栏最多缩进3个空格，反引号围栏的info字符串不能包含反引号，结束围栏使用相同字符
+    且长度不小于开始围栏，代码块内的其他围栏（包括更短的反引号行）属于代码内容。
+
+    只识别顶层的代码块，列表、引用和HTML块中的代码块以extract_tool_calls_with_errors为准。
+    """
+
+    def __init__(self):
+        self.events: List[ToolCallEvent] = []
+        self.block_count = 0  # 已开始的代码块数量
+        self.tool_call_count = 0  # 已开始的json toolcall代码块数量
+        self._pending = ""  # 还没有结束的最后一行
+        self._pending_start = 0  # 最后一行在回答中的偏移
+        self._scanned = 0  # 已接收的文本长度
+        # 当前打开的围栏：(缩进, 围栏字符串, 语言, 开始偏移, 代码块序号)
+        self._fence: Tuple[int, str, str, int, int] | None = None
+        self._code_lines: List[str] = []
+
+    @property
+    def in_code_block(self) -> bool:
+        """当前是否位于代码块中。"""
+        return self._fence is not None
+
+    @property
+    def in_tool_call(self) -> bool:
+        """当前是否位于json toolcall代码块中。"""
+        return self._fence is not None and self._fence[2].lower() == TOOL_CALL_LANGUAGE
+
+    def feed(self, delta: str) -> List[ToolCallEvent]:
+        """
+        接收一段增量文本
+
+        Args:
+            delta: 新生成的文本
+
+        Returns:
+            list[ToolCallEvent]: 本段文本中结束的json toolcall代码块
+        """
+        if not delta:
+            return []
+        self._scanned += len(delta)
+        self._pending += delta
+        events: List[ToolCallEvent] = []
+        line_start = 0
+        newline = self._pending.find("\n", len(self._pending) - len(delta))
+        while newline != -1:
+            line = self._pending[line_start : newline + 1]
+            event = self._process_line(line, self._pending_start + line_start)
+            if event is not None:
+                events.append(event)
+            line_start = newline + 1
+            newline = self._pending.find("\n", line_start)
+        if line_start:
+            self._pending = self._pending[line_start:]
+            self._pending_start += line_start
+        return events
+
+    def sync(self, text: str) -> List[ToolCallEvent]:
+        """
+        用累积的完整回答更新扫描器，只扫描上次之后新增的部分
+
+        Args:
+            text: 到目前为止的完整回答，必须以之前接收的文本开头
+
+        Returns:
+            list[ToolCallEvent]: 新增部分中结束的json toolcall代码块
+        """
+        return self.feed(text[self._scanned :])
+
+    def finish(self) -> List[ToolCallEvent]:
+        """
+        回答结束时处理最后一行，与mistune一样把没有结束的代码块延续到回答末尾
+
+        Returns:
+            list[ToolCallEvent]: 最后结束的json toolcall代码块
+        """
+        events: List[ToolCallEvent] = []
+        if self._pending:
+            event = self._process_line(self._pending, self._pending_start)
+            if event is not None:
+                events.append(event)
+            self._pending_start += len(self._pending)
+            self._pending = ""
+        if self._fence is not None:
+            # mistune会在文本末尾补一个换行
+            if self._code_lines and not self._code_lines[-1].endswith("\n"):
+                self._code_lines[-1] += "\n"
+            event = self._close_fence(self._scanned)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def _process_line(self, line: str, offset: int) -> ToolCallEvent | None:
+        """处理一个完整的行，行可以带换行符。"""
+        text = line.rstrip("\n")
+        if text.endswith("\r"):
+            text = text[:-1]
+        if self._fence is None:
+            match = FENCE_OPEN_PATTERN.match(text)
+            if match is None:
+                return None
+            spaces, marker, info = match.groups()
+            if info and marker[0] == "`" and "`" in info:
+                return None
+            language = ESCAPED_CHAR_PATTERN.sub(r"\1", info).strip() or "plaintext"
+            self._fence = (len(spaces), marker, language, offset, self.block_count)
+            self._code_lines = []
+            self.block_count += 1
+            if language.lower() == TOOL_CALL_LANGUAGE:
+                self.tool_call_count += 1
+            return None
+
+        indent, marker, _, _, _ = self._fence
+        stripped = text.lstrip(" ")
+        if (
+            len(text) - len(stripped) <= 3
+            and stripped.startswith(marker)
+            and not stripped.lstrip(marker[0]).strip(" \t")
+        ):
+            return self._close_fence(offset + len(line))
+        if line.endswith("\r\n"):
+            line = line[:-2] + "\n"
+        if indent:
+            line = line[min(indent, len(line) - len(line.lstrip(" "))) :]
+        self._code_lines.append(line)
+        return None
+
+    def _close_fence(self, end: int) -> ToolCallEvent | None:
+        """结束当前代码块，是json toolcall代码块时返回事件。"""
+        assert self._fence is not None
+        _, _, language, start, block_index = self._fence
+        content = "".join(self._code_lines)
+        self._fence = None
+        self._code_lines = []
+        if language.lower() != TOOL_CALL_LANGUAGE:
+            return None
+        tool_call, error = parse_tool_call_block(block_index, content)
+        event: ToolCallEvent = {
+            "block_index": block_index,
+            "start": start,
+            "end": end,
+            "content": content,
+            "tool_call": tool_call,
+            "error": error,
+        }
+        self.events.append(event)
+        return event
@@ -0,0 +1,128 @@
+"""历史消息摘要索引模块。
+
+为每条消息缓存一行摘要，生成历史压缩提示时不需要每次都重新转换所有消息。
+缓存以消息对象为键（弱引用），历史被删除或插入消息后已有的摘要仍然有效。
+历史很长时只输出最早和最近的若干条消息，中间的消息按区间汇总，
+使压缩提示的大小不随会话长度增长。
+"""
+
+from collections import Counter
+from reprlib import Repr
+from typing import Any, Sequence
+from weakref import WeakKeyDictionary
+
+from linhai.agent_base import SummaryMessage
+from linhai.history_compressor import min_safe_index
+from linhai.tool.main import ToolResultMessage
+
+repr_obj = Repr(maxstring=100)
+
+# 超过这个数量的消息时只输出窗口内的消息
+DEFAULT_SUMMARY_MAX_LINES = 300
+# 窗口外的消息最多汇总为多少行
+MAX_SUMMARY_BUCKETS = 10
+
+
+def render_version(message: Any) -> Any:
+    """消息渲染结果的版本，版本变化时缓存的摘要失效。"""
+    if isinstance(message, ToolResultMessage):
+        return (message.superseded_by, message.digest)
+    if isinstance(message, SummaryMessage):
+        return (message.level, message.summary)
+    return None
+
+
+class MessageSummaryIndex:
+    """按消息对象缓存一行摘要的索引。"""
+
+    def __init__(self):
+        self._digests: "WeakKeyDictionary[Any, tuple[Any, str]]" = WeakKeyDictionary()
+
+    def digest(self, message: Any) -> str:
+        """返回消息的一行摘要，不包含消息ID。"""
+        version = render_version(message)
+        try:
+            cached = self._digests.get(message)
+        except TypeError:  # 不支持弱引用的对象不缓存
+            cached = None
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        llm_message = message.to_llm_message()
+        digest = (
+            f"role: {llm_message['role']!r} "
+            f"content: {repr_obj.repr(llm_message.get('content', None))}"
+        )
+        try:
+            self._digests[message] = (version, digest)
+        except TypeError:
+            pass
+        return digest
+
+    def invalidate(self, message: Any) -> None:
+        """删除消息的缓存摘要，消息内容被原地修改后调用。"""
+        try:
+            self._digests.pop(message, None)
+        except TypeError:
+            pass
+
+    def __len__(self) -> int:
+        return len(self._digests)
+
+    def line(self, index: int, message: Any) -> str:
+        """带消息ID的一行摘要。"""
+        return f"- id: {index} {self.digest(message)}"
+
+    def summarize(
+        self,
+        messages: Sequence[Any],
+        max_lines: int | None = DEFAULT_SUMMARY_MAX_LINES,
+    ) -> str:
+        """生成历史压缩提示使用的消息摘要。
+
+        Args:
+            messages: 历史消息
+            max_lines: 最多逐条输出的消息数量，None表示全部输出
+
+        Returns:
+            每条消息一行的摘要，消息过多时中间部分按区间汇总
+        """
+        if max_lines is None or len(messages) <= max_lines:
+            return "\n".join(self.line(i, msg) for i, msg in enumerate(messages))
+
+        # 最早的可压缩消息最适合压缩，因此窗口的大部分放在开头
+        start = min_safe_index(messages)
+        head_end = min(len(messages), start + max_lines * 3 // 4)
+        tail_start = max(head_end, len(messages) - (max_lines - (head_end - start)))
+
+        lines = []
+        if start > 0:
+            lines.append(f"- id: 0-{start - 1} 系统消息和全局记忆，不能压缩")
+        lines.extend(self.line(i, messages[i]) for i in range(start, head_end))
+        lines.extend(self.summarize_buckets(messages, head_end, tail_start))
+        lines.extend(
+            self.line(i, messages[i]) for i in range(tail_start, len(messages))
+        )
+        return "\n".join(lines)
+
+    @staticmethod
+    def summarize_buckets(messages: Sequence[Any], start: int, end: int) -> list[str]:
+        """把[start, end)范围内的消息按区间汇总为不超过MAX_SUMMARY_BUCKETS行。"""
+        if start >= end:
+            return []
+        bucket_size = -(-(end - start) // MAX_SUMMARY_BUCKETS)
+        lines = []
+        for bucket_start in range(start, end, bucket_size):
+            bucket_end = min(end, bucket_start + bucket_size)
+            counts = Counter(
+                type(msg).__name__ for msg in messages[bucket_start:bucket_end]
+            )
+            kinds = "，".join(f"{name}×{count}" for name, count in counts.most_common())
+            lines.append(
+                f"- id: {bucket_start}-{bucket_end - 1} 省略{bucket_end - bucket_start}条消息（{kinds}）"
+            )
+        return lines
+
+
+# Agent之间共享的默认索引，消息对象被释放后缓存自动删除
+default_summary_index = MessageSummaryIndex()
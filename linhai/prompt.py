@@ -41,8 +41,11 @@ DEFAULT_SYSTEM_PROMPT_ZH = """
 - 以下情况不属于顺序依赖，可以同时调用：
   - 同时修改一个文件的多个地方，且修改位置不重复（修改的地方相隔至少5行）。
   - 同时修改多个文件。
+- 需要修改多个文件或一个文件的多处时，优先使用batch_edit_files在一次工具调用中完成，它只会全部成功或全部不修改。
 
-- 在处理超长代码文件时，应该先使用grep -n寻找对应关键字的行号，然后用sed读取周围的行（约50行）
+- 在处理超长代码文件时，应该先使用search_code寻找对应关键字的行号，然后用read_file的start_line和end_line读取周围的行（约50行）
+- 搜索代码时优先使用search_code，而不是通过命令运行grep或rg
+- 查找Python类、函数或方法的定义时，优先使用find_symbol定位，用read_symbol只读取定义的代码，而不是列出目录和读取整个文件
 - 当需要添加内容到文件时，优先使用insert操作（如insert_at_line），然后是append操作（如append_file），最后考虑replace操作（如replace_file_content），以确保修改的准确性。
 - 一次性工具调用数量基于回答长度动态调整：
   - 如果回答长度小于2000字符，最多可以调用5个简单工具调用（参数少且短，每个参数仅有几十个字符）
@@ -360,3 +363,85 @@ COMPRESS_RANGE_PROMPT_ZH = """
 """
 
 COMPRESS_RANGE_PROMPT = COMPRESS_RANGE_PROMPT_ZH
+
+OVERSIZED_OUTPUT_DIGEST_PROMPT_ZH = """
+# 情景
+
+- 一个工具调用的输出过长，已经被保存到临时文件中
+- 主模型只能看到文件路径，需要用sed等工具分页读取
+- 你需要阅读输出并生成结构化摘要，让主模型尽量不需要再手动分页读取
+
+# 要求
+
+按以下格式输出摘要，不要输出其他内容：
+
+## 概况
+一到两句话说明这是什么输出、执行是否成功
+
+## 错误与警告
+逐条列出错误、异常和警告，附上行号和原文，没有则写“无”
+
+## 关键行
+列出最重要的若干行（不超过20行），附上行号和原文
+
+## 统计
+列出输出中的数量信息，例如测试通过/失败数量、文件数量、匹配数量
+
+# 注意
+
+- 行号以输入中`行号|`前缀为准
+- 输入可能省略了中间部分，省略的内容无法看到，不要猜测
+- 只根据输入内容总结，不要编造
+"""
+
+OVERSIZED_OUTPUT_DIGEST_PROMPT = OVERSIZED_OUTPUT_DIGEST_PROMPT_ZH
+
+HISTORY_SUMMARY_PROMPT_ZH = """
+# 情景
+
+- 为了节省上下文，一段历史消息即将被删除
+- 你需要把这段历史总结为简洁的摘要，代替原消息保留在历史中
+- 之后的工作只能看到你的摘要，摘要遗漏的信息需要重新探索才能获得
+
+# 要求
+
+按以下格式输出摘要，不要输出其他内容：
+
+## 用户需求
+用户提出的要求和约束
+
+## 已完成的工作
+做了什么、修改了哪些文件、得出了什么结论
+
+## 重要发现
+文件路径、函数名、命令、错误原因等之后可能用到的事实
+
+## 未完成的事项
+尚未完成或计划中的工作，没有则写“无”
+
+# 注意
+
+- 保留具体的路径、名称和数字，省略过程性的细节
+- 只根据输入内容总结，不要编造
+- 摘要不超过1000字
+"""
+
+HISTORY_SUMMARY_PROMPT = HISTORY_SUMMARY_PROMPT_ZH
+
+MERGE_SUMMARY_PROMPT_ZH = """
+# 情景
+
+- 历史中积累了多条按时间顺序排列的历史摘要
+- 你需要把它们合并为一条摘要，代替这些摘要保留在历史中
+
+# 要求
+
+- 使用与输入摘要相同的格式：用户需求、已完成的工作、重要发现、未完成的事项
+- 后面的摘要更新，与前面的摘要冲突时以后面的为准
+- 已经完成的事项不要再列为未完成
+- 保留具体的路径、名称和数字，合并重复的内容
+- 只根据输入内容总结，不要编造
+- 摘要不超过1500字
+"""
+
+MERGE_SUMMARY_PROMPT = MERGE_SUMMARY_PROMPT_ZH
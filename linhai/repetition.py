@@ -0,0 +1,177 @@
+"""LLM输出的重复检测模块。
+
+推理LLM有时会陷入循环，反复输出同一段话或同一个任务列表，直到达到输出长度限制。
+RepetitionDetector逐段接收生成的文本，用滚动哈希计算每个位置结尾的window_chars个字符的哈希，
+同一个窗口在不久之前出现过时记录两次出现的距离（周期）；连续的位置都以相同的周期重复时，
+说明文本正在以这个周期循环，重复的长度和次数都达到阈值时报告重复。
+短于min_period_chars的周期不计入：一长串相同的字符（如填充数据"000…"）周期为1，不是LLM在循环。
+
+每个字符只处理一次，耗时与文本长度成正比；只保留最近max_period_chars个位置的哈希。
+"""
+
+from typing import TypedDict
+
+DEFAULT_WINDOW_CHARS = 32
+DEFAULT_MIN_REPEATS = 4
+DEFAULT_MIN_REPEATED_CHARS = 800
+DEFAULT_MAX_PERIOD_CHARS = 4000
+# 陷入循环的回答通常会一直输出到LLM的输出长度限制
+DEFAULT_MAX_OUTPUT_TOKENS = 32768
+
+HASH_MODULUS = (1 << 61) - 1
+HASH_BASE = 1_000_003
+
+
+class RepetitionConfig(TypedDict, total=False):
+    """重复检测配置类型定义。"""
+
+    enabled: bool  # 是否在生成时检测重复，默认启用
+    window_chars: int  # 比较的窗口长度（字符）
+    min_repeats: int  # 同一段内容至少出现的次数
+    min_repeated_chars: int  # 至少重复输出的字符数
+    min_period_chars: int  # 重复单元的最小长度（字符），默认为window_chars
+    max_period_chars: int  # 重复单元的最大长度（字符）
+    max_output_tokens: int  # LLM的输出长度限制，用于估计中断节省的token数
+
+
+class RepetitionMatch(TypedDict):
+    """检测到的重复。"""
+
+    period_chars: int  # 重复单元的长度
+    repeated_chars: int  # 第一次出现之后重复输出的字符数
+    repeats: int  # 重复单元完整出现的次数
+
+
+class RepetitionStats(TypedDict):
+    """因重复而中断生成的统计。"""
+
+    interrupts: int  # 中断的次数
+    repeated_tokens: int  # 中断前已经重复输出的token数
+    avoided_tokens: int  # 估计中断后不再生成的token数
+
+
+def new_repetition_stats() -> RepetitionStats:
+    """创建空的重复统计。"""
+    return {"interrupts": 0, "repeated_tokens": 0, "avoided_tokens": 0}
+
+
+# 进程内所有中断的统计
+repetition_stats = new_repetition_stats()
+
+
+class RepetitionDetector:
+    """
+    流式文本的重复检测器
+
+    Args:
+        window_chars: 比较的窗口长度，越短越容易把正常的相似文本当作重复
+        min_repeats: 同一段内容至少出现的次数
+        min_repeated_chars: 第一次出现之后至少重复输出的字符数
+        min_period_chars: 重复单元的最小长度，None表示与window_chars相同
+        max_period_chars: 重复单元的最大长度
+    """
+
+    def __init__(
+        self,
+        window_chars: int = DEFAULT_WINDOW_CHARS,
+        min_repeats: int = DEFAULT_MIN_REPEATS,
+        min_repeated_chars: int = DEFAULT_MIN_REPEATED_CHARS,
+        min_period_chars: int | None = None,
+        max_period_chars: int = DEFAULT_MAX_PERIOD_CHARS,
+    ):
+        if window_chars < 1:
+            raise ValueError("window_chars必须大于0")
+        self.window_chars = window_chars
+        self.min_repeats = min_repeats
+        self.min_repeated_chars = min_repeated_chars
+        self.min_period_chars = (
+            window_chars if min_period_chars is None else min_period_chars
+        )
+        self.max_period_chars = max_period_chars
+        self.position = 0  # 已接收的字符数
+        self._high = pow(HASH_BASE, window_chars - 1, HASH_MODULUS)
+        self._hash = 0
+        self._tail = ""  # 最后window_chars个字符，用于移出窗口
+        self._seen: dict[int, int] = {}  # 窗口哈希 -> 最近一次出现的结束位置
+        self._pruned_at = 0
+        self._period = 0  # 当前连续重复的周期
+        self._run_start = 0  # 当前连续重复开始的位置
+        self._last_match = -1  # 上一个以当前周期重复的位置
+
+    @classmethod
+    def from_config(cls, config: RepetitionConfig) -> "RepetitionDetector":
+        """按配置创建检测器，没有配置的项使用默认值。"""
+        return cls(
+            window_chars=config.get("window_chars", DEFAULT_WINDOW_CHARS),
+            min_repeats=config.get("min_repeats", DEFAULT_MIN_REPEATS),
+            min_repeated_chars=config.get(
+                "min_repeated_chars", DEFAULT_MIN_REPEATED_CHARS
+            ),
+            min_period_chars=config.get("min_period_chars"),
+            max_period_chars=config.get("max_period_chars", DEFAULT_MAX_PERIOD_CHARS),
+        )
+
+    def feed(self, delta: str) -> RepetitionMatch | None:
+        """
+        接收一段新增文本
+
+        Args:
+            delta: 新生成的文本
+
+        Returns:
+            RepetitionMatch | None: 达到阈值时返回检测到的重复，否则返回None
+        """
+        if not delta:
+            return None
+        window = self.window_chars
+        buffer = self._tail + delta
+        seen = self._seen
+        current = self._hash
+        position = self.position
+        match: RepetitionMatch | None = None
+        for index in range(len(self._tail), len(buffer)):
+            position += 1
+            if position > window:
+                current = (
+                    current - ord(buffer[index - window]) * self._high
+                ) % HASH_MODULUS
+            current = (current * HASH_BASE + ord(buffer[index])) % HASH_MODULUS
+            if position < window:
+                continue
+            previous = seen.get(current)
+            seen[current] = position
+            if previous is None:
+                continue
+            period = position - previous
+            if not self.min_period_chars <= period <= self.max_period_chars:
+                continue
+            if period != self._period or self._last_match != position - 1:
+                self._period = period
+                self._run_start = position
+            self._last_match = position
+            # 从_run_start之前window个字符开始，每个字符都与period个字符之前的字符相同
+            repeated = position - self._run_start + window
+            if match is None and repeated >= max(
+                self.min_repeated_chars, (self.min_repeats - 1) * period
+            ):
+                match = {
+                    "period_chars": period,
+                    "repeated_chars": repeated,
+                    "repeats": repeated // period + 1,
+                }
+        self.position = position
+        self._hash = current
+        self._tail = buffer[-window:]
+        if position - self._pruned_at > self.max_period_chars:
+            self._prune()
+        return match
+
+    def _prune(self) -> None:
+        """删除超出最大周期、不会再被匹配的哈希。"""
+        oldest = self.position - self.max_period_chars
+        self._seen = {
+            value: position
+            for value, position in self._seen.items()
+            if position >= oldest
+        }
+        self._pruned_at = self.position
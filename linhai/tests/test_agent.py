@@ -7,6 +7,7 @@ from unittest.mock import AsyncMock, MagicMock
 from typing import TypedDict, Any
 
 from linhai.agent import Agent, AgentConfig
+from linhai.agent_base import RuntimeMessage
 from linhai.llm import (
     ChatMessage,
     AnswerToken,
@@ -31,12 +32,13 @@ class MockAnswer:
     def __init__(self, tokens: list[MockAnswerToken]):
         self.tokens = tokens
         self.index = 0
+        self.interrupted = False
 
     def __aiter__(self):
         return self
 
     async def __anext__(self):
-        if self.index >= len(self.tokens):
+        if self.interrupted or self.index >= len(self.tokens):
             raise StopAsyncIteration
         token = self.tokens[self.index]
         self.index += 1
@@ -55,6 +57,10 @@ class MockAnswer:
         """Get the current accumulated response content."""
         return "".join(token["content"] for token in self.tokens[: self.index])
 
+    def interrupt(self) -> None:
+        """Stop streaming the remaining tokens."""
+        self.interrupted = True
+
 
 class TestAgent(unittest.IsolatedAsyncioTestCase):
     """Test cases for the Agent class."""
@@ -144,6 +150,15 @@ class TestAgent(unittest.IsolatedAsyncioTestCase):
         # 验证上下文更新
         self.assertEqual(self.agent.state, "waiting_user")
 
+    async def test_model_override(self):
+        """model_override只用于下一次回答。"""
+        fast_model = MagicMock()
+        self.agent.model_override = fast_model
+
+        self.assertIs(await self.agent._select_model(), fast_model)
+        self.assertIsNone(self.agent.model_override)
+        self.assertIs(await self.agent._select_model(), self.mock_llm)
+
     async def test_state_transitions(self):
         """Test agent state transitions."""
         # Test state transitions
@@ -282,6 +297,54 @@ class TestAgent(unittest.IsolatedAsyncioTestCase):
         # 验证状态转换
         self.assertEqual(self.agent.state, "working")
 
+    async def test_salvage_tool_calls_over_limit(self):
+        """工具调用超过限制时保留前5个工具调用并执行，不重新生成回答"""
+        blocks = [
+            f'```json toolcall\n{{"name": "add_numbers", "arguments": {{"a": {i}, "b": 1}}}}\n```\n'
+            for i in range(7)
+        ]
+        tokens: list[MockAnswerToken] = [
+            {"reasoning_content": None, "content": "计划：\n"}
+        ]
+        tokens += [{"reasoning_content": None, "content": block} for block in blocks]
+        self.mock_llm.answer_stream.return_value = MockAnswer(tokens)
+
+        await self.agent.handle_messages([ChatMessage(role="user", message="Add")])
+
+        self.mock_llm.answer_stream.assert_called_once()
+        self.assertEqual(self.tool_manager.process_tool_call.call_count, 5)
+        self.assertEqual(
+            [
+                call.args[0].function_arguments["a"]
+                for call in self.tool_manager.process_tool_call.call_args_list
+            ],
+            [0, 1, 2, 3, 4],
+        )
+        assistant = next(
+            message
+            for message in self.agent.messages
+            if isinstance(message, ChatMessage) and message.role == "assistant"
+        )
+        self.assertEqual(assistant.message, "计划：\n" + "".join(blocks[:5]))
+        note = self.agent.messages[self.agent.messages.index(assistant) + 1]
+        self.assertIsInstance(note, RuntimeMessage)
+        self.assertIn("已保留前5个工具调用", note.message)
+
+    async def test_salvage_caps_nested_tool_calls(self):
+        """保留的内容中引用里的工具调用也被解析时，执行数量仍不超过限制"""
+        block = '```json toolcall\n{"name": "add_numbers", "arguments": {"a": 1, "b": 1}}\n```\n'
+        nested = "> " + block.replace("\n", "\n> ") + "\n"
+        tokens: list[MockAnswerToken] = [
+            {"reasoning_content": None, "content": nested * 3}
+        ]
+        tokens += [{"reasoning_content": None, "content": block} for _ in range(6)]
+        self.mock_llm.answer_stream.return_value = MockAnswer(tokens)
+
+        await self.agent.handle_messages([ChatMessage(role="user", message="Add")])
+
+        self.mock_llm.answer_stream.assert_called_once()
+        self.assertEqual(self.tool_manager.process_tool_call.call_count, 5)
+
 
 if __name__ == "__main__":
     unittest.main()
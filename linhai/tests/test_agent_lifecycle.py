@@ -5,7 +5,8 @@ from unittest.mock import AsyncMock, MagicMock
 from typing import TypedDict, Any
 
 from linhai.agent import Lifecycle
-from linhai.llm import ChatMessage
+from linhai.generation_state import GenerationState
+from linhai.llm import AnswerToken, ChatMessage
 
 
 # 定义模拟的 AnswerToken 和 Answer
@@ -138,6 +139,28 @@ class TestLifecycle(unittest.IsolatedAsyncioTestCase):
             self.mock_agent, self.mock_tool_call, self.mock_tool_result, True
         )
 
+    async def test_register_and_trigger_message_delta(self):
+        """增量回调收到token和状态，任意一个回调返回True时中断。"""
+        callback1 = AsyncMock(return_value=False)
+        callback2 = AsyncMock(return_value=True)
+        token: AnswerToken = {"reasoning_content": None, "content": "Hi"}
+        state = GenerationState()
+        state.feed(token)
+
+        self.lifecycle.register_message_delta(callback1)
+        self.lifecycle.register_message_delta(callback2)
+        result = await self.lifecycle.trigger_message_delta(
+            self.mock_agent, self.mock_answer, token, state
+        )
+
+        self.assertTrue(result)
+        callback1.assert_called_once_with(
+            self.mock_agent, self.mock_answer, token, state
+        )
+        callback2.assert_called_once_with(
+            self.mock_agent, self.mock_answer, token, state
+        )
+
     async def test_callback_order(self):
         """Test that callbacks are triggered in registration order."""
         call_order = []
@@ -1,8 +1,10 @@
 """Unit tests for agent plugins."""
 
+import asyncio
+import os
 import reprlib
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 # 创建自定义repr函数，限制长度为200字符
 r = reprlib.Repr()
@@ -21,11 +23,20 @@ from linhai.agent_plugin import (
     WaitingUserPlugin,
     ToolCallCountPlugin,
     ThinkingToolCallPlugin,
+    RepetitionPlugin,
+    ReasoningBudgetPlugin,
+    new_reasoning_budget_stats,
     MarkdownSyntaxPlugin,
+    FileSupersessionPlugin,
+    OversizedOutputDigestPlugin,
+    build_digest_input,
 )
+from linhai.tool.main import ToolResultMessage
 from linhai.agent_base import WAITING_USER_MARKER, RuntimeMessage
 from unittest.mock import AsyncMock
-from linhai.llm import Answer
+from linhai.generation_state import GenerationState
+from linhai.repetition import new_repetition_stats
+from linhai.llm import Answer, AnswerToken, ChatMessage
 
 
 class TestWaitingUserPlugin(unittest.IsolatedAsyncioTestCase):
@@ -73,6 +84,15 @@ class TestWaitingUserPlugin(unittest.IsolatedAsyncioTestCase):
         )
 
 
+async def feed_plugin(plugin, agent, answer, text, field="content", state=None):
+    """把文本作为一个token传给插件的增量回调。"""
+    state = state or GenerationState()
+    token: AnswerToken = {"reasoning_content": None, "content": ""}
+    token[field] = text
+    state.feed(token)
+    return await plugin.during_message_delta(agent, answer, token, state)
+
+
 class TestToolCallCountPlugin(unittest.IsolatedAsyncioTestCase):
     """Test cases for ToolCallCountPlugin."""
 
@@ -86,10 +106,9 @@ class TestToolCallCountPlugin(unittest.IsolatedAsyncioTestCase):
     async def test_tool_call_within_limit_short_content(self):
         """测试短内容时工具调用在限制内"""
         current_content = 'Some content\n```json toolcall\n{"name": "tool1"}\n```\n```json toolcall\n{"name": "tool2"}\n```'
-        self.answer.content = current_content
 
-        result = await self.plugin.during_message_generation(
-            self.agent, self.answer, current_content
+        result = await feed_plugin(
+            self.plugin, self.agent, self.answer, current_content
         )
 
         self.assertFalse(result)
@@ -99,26 +118,28 @@ class TestToolCallCountPlugin(unittest.IsolatedAsyncioTestCase):
     async def test_tool_call_exceed_limit_short_content(self):
         """测试短内容时工具调用超过限制"""
         current_content = 'Some content\n```json toolcall\n{"name": "tool1"}\n```\n```json toolcall\n{"name": "tool2"}\n```\n```json toolcall\n{"name": "tool3"}\n```\n```json toolcall\n{"name": "tool4"}\n```\n```json toolcall\n{"name": "tool5"}\n```\n```json toolcall\n{"name": "tool6"}\n```'
-        self.answer.content = current_content
 
-        result = await self.plugin.during_message_generation(
-            self.agent, self.answer, current_content
+        state = GenerationState()
+
+        result = await feed_plugin(
+            self.plugin, self.agent, self.answer, current_content, state=state
         )
 
         self.assertTrue(result)
         self.agent.user_output_queue.put.assert_called_once_with(self.answer)
-        self.agent.messages.append.assert_called_once()
-        call_args = self.agent.messages.append.call_args[0][0]
-        self.assertIn("错误：一次性调用了超过5个工具", call_args.message)
-        self.assertTrue(self.answer.interrupted)
+        self.agent.messages.append.assert_not_called()
+        self.assertIn("错误：一次性调用了超过5个工具", state.salvage_note)
+        self.assertTrue(
+            current_content[: state.salvage_length].endswith('tool5"}\n```\n')
+        )
+        self.answer.interrupt.assert_called_once()
 
     async def test_tool_call_within_limit_long_content(self):
         """测试长内容时工具调用在限制内"""
         current_content = "A" * 2000 + '\n```json toolcall\n{"name": "tool1"}\n```'
-        self.answer.content = current_content
 
-        result = await self.plugin.during_message_generation(
-            self.agent, self.answer, current_content
+        result = await feed_plugin(
+            self.plugin, self.agent, self.answer, current_content
         )
 
         self.assertFalse(result)
@@ -131,18 +152,56 @@ class TestToolCallCountPlugin(unittest.IsolatedAsyncioTestCase):
             "A" * 2000
             + '\n```json toolcall\n{"name": "tool1"}\n```\n```json toolcall\n{"name": "tool2"}\n```'
         )
-        self.answer.content = current_content
 
-        result = await self.plugin.during_message_generation(
-            self.agent, self.answer, current_content
+        state = GenerationState()
+
+        result = await feed_plugin(
+            self.plugin, self.agent, self.answer, current_content, state=state
         )
 
         self.assertTrue(result)
         self.agent.user_output_queue.put.assert_called_once_with(self.answer)
-        self.agent.messages.append.assert_called_once()
-        call_args = self.agent.messages.append.call_args[0][0]
-        self.assertIn("错误：一次性调用了超过1个工具", call_args.message)
-        self.assertTrue(self.answer.interrupted)
+        self.agent.messages.append.assert_not_called()
+        self.assertIn("错误：一次性调用了超过1个工具", state.salvage_note)
+        self.assertTrue(
+            current_content[: state.salvage_length].endswith('tool1"}\n```\n')
+        )
+        self.answer.interrupt.assert_called_once()
+
+    async def test_streamed_content_ignores_nested_examples(self):
+        """逐token检查时，其他代码块中的工具调用示例不计数。"""
+        example = '```json toolcall\n{"name": "tool"}\n```\n'
+        current_content = "示例：\n````markdown\n" + example * 6 + "````\n" + example
+        state = GenerationState()
+        results = []
+
+        for char in current_content:
+            results.append(
+                await feed_plugin(
+                    self.plugin, self.agent, self.answer, char, state=state
+                )
+            )
+
+        self.assertFalse(any(results))
+        self.assertEqual(state.content.tool_call_count, 1)
+
+    async def test_reasoning_token_ignored(self):
+        """推理内容中的工具调用不计入回答的工具调用量。"""
+        example = '```json toolcall\n{"name": "tool"}\n```\n'
+
+        result = await feed_plugin(
+            self.plugin, self.agent, self.answer, example * 6, "reasoning_content"
+        )
+
+        self.assertFalse(result)
+
+    async def test_register_plugin(self):
+        """注册到增量回调。"""
+        lifecycle = MagicMock()
+        self.plugin.register(lifecycle)
+        lifecycle.register_message_delta.assert_called_once_with(
+            self.plugin.during_message_delta
+        )
 
 
 class TestThinkingToolCallPlugin(unittest.IsolatedAsyncioTestCase):
@@ -153,21 +212,13 @@ class TestThinkingToolCallPlugin(unittest.IsolatedAsyncioTestCase):
         self.agent = MagicMock()
         self.agent.user_output_queue = AsyncMock()
         self.answer = MagicMock()
-        self.answer.reasoning_message = None
-        self.answer.set_reasoning_message = lambda message: setattr(
-            self.answer, "reasoning_message", message
-        )
-        self.answer.get_reasoning_message = lambda: self.answer.reasoning_message
-        self.answer.content = ""
 
     async def test_thinking_within_limit(self):
         """测试思考中的工具调用在限制内"""
         current_reasoning = 'Some reasoning\n```json toolcall\n{"name": "tool1"}\n```\n```json toolcall\n{"name": "tool2"}\n```'
-        self.answer.set_reasoning_message(current_reasoning)
-        current_content = "Some content"
 
-        result = await self.plugin.during_message_generation(
-            self.agent, self.answer, current_content
+        result = await feed_plugin(
+            self.plugin, self.agent, self.answer, current_reasoning, "reasoning_content"
         )
 
         self.assertFalse(result)
@@ -177,11 +228,9 @@ class TestThinkingToolCallPlugin(unittest.IsolatedAsyncioTestCase):
     async def test_thinking_exceed_limit(self):
         """测试思考中的工具调用超过限制"""
         current_reasoning = 'Some reasoning\n```json toolcall\n{"name": "tool1"}\n```\n```json toolcall\n{"name": "tool2"}\n```\n```json toolcall\n{"name": "tool3"}\n```\n```json toolcall\n{"name": "tool4"}\n```'
-        self.answer.set_reasoning_message(current_reasoning)
-        current_content = "Some content"
 
-        result = await self.plugin.during_message_generation(
-            self.agent, self.answer, current_content
+        result = await feed_plugin(
+            self.plugin, self.agent, self.answer, current_reasoning, "reasoning_content"
         )
 
         self.assertTrue(result)
@@ -191,36 +240,242 @@ class TestThinkingToolCallPlugin(unittest.IsolatedAsyncioTestCase):
         self.assertIn(
             "错误：大量思考如何使用```json toolcall调用工具", call_args.message
         )
-        self.assertTrue(self.answer.interrupted)
+        self.answer.interrupt.assert_called_once()
 
     async def test_thinking_no_json_blocks(self):
         """测试思考中没有JSON块"""
         current_reasoning = "Some reasoning without json blocks"
-        self.answer.set_reasoning_message(current_reasoning)
-        current_content = "Some content"
 
-        result = await self.plugin.during_message_generation(
-            self.agent, self.answer, current_content
+        result = await feed_plugin(
+            self.plugin, self.agent, self.answer, current_reasoning, "reasoning_content"
         )
 
         self.assertFalse(result)
         self.agent.user_output_queue.put.assert_not_called()
         self.agent.messages.append.assert_not_called()
 
-    async def test_thinking_not_string(self):
-        """测试思考内容不是字符串"""
-        self.answer.set_reasoning_message(None)
-        current_content = "Some content"
+    async def test_content_token_ignored(self):
+        """测试回答内容中的工具调用不计入思考的工具调用量"""
+        example = '```json toolcall\n{"name": "tool"}\n```\n'
 
-        result = await self.plugin.during_message_generation(
-            self.agent, self.answer, current_content
-        )
+        result = await feed_plugin(self.plugin, self.agent, self.answer, example * 4)
 
         self.assertFalse(result)
         self.agent.user_output_queue.put.assert_not_called()
         self.agent.messages.append.assert_not_called()
 
 
+class TestRepetitionPlugin(unittest.IsolatedAsyncioTestCase):
+    """Test cases for RepetitionPlugin."""
+
+    async def asyncSetUp(self):
+        self.stats = new_repetition_stats()
+        self.plugin = RepetitionPlugin({"max_output_tokens": 10000}, self.stats)
+        self.agent = MagicMock()
+        self.agent.user_output_queue = AsyncMock()
+        self.answer = MagicMock()
+        self.answer.get_current_content.return_value = ""
+        self.answer.get_reasoning_message.return_value = None
+
+    async def stream(self, text, field="content"):
+        """逐段输入文本，返回中断时已输入的文本。"""
+        state = GenerationState()
+        for position in range(0, len(text), 5):
+            delta = text[: position + 5]
+            if field == "content":
+                self.answer.get_current_content.return_value = delta
+            else:
+                self.answer.get_reasoning_message.return_value = delta
+            piece = text[position : position + 5]
+            if await feed_plugin(
+                self.plugin, self.agent, self.answer, piece, field, state
+            ):
+                return delta
+        return None
+
+    async def test_repeated_reasoning(self):
+        """思考陷入循环时中断并记录节省的token数。"""
+        paragraph = "让我再检查一下这个函数的参数和返回值，确认没有遗漏任何边界情况和异常处理。\n"
+
+        streamed = await self.stream(paragraph * 100, "reasoning_content")
+
+        self.assertIsNotNone(streamed)
+        self.assertLess(len(streamed), 1000)
+        self.answer.interrupt.assert_called_once()
+        self.agent.user_output_queue.put.assert_called_once_with(self.answer)
+        message = self.agent.messages.append.call_args[0][0]
+        self.assertIsInstance(message, RuntimeMessage)
+        self.assertIn("思考陷入了重复", message.message)
+        self.assertIn("确认没有遗漏", message.message)
+        self.assertEqual(self.stats["interrupts"], 1)
+        self.assertGreater(self.stats["repeated_tokens"], 0)
+        self.assertGreater(self.stats["avoided_tokens"], 9000)
+
+    async def test_repeated_content(self):
+        """回答陷入循环时中断。"""
+        streamed = await self.stream(
+            "- [x] 完成了同一个任务：修改src/config.py中的配置并重新运行测试\n" * 100
+        )
+
+        self.assertIsNotNone(streamed)
+        self.assertIn(
+            "回答陷入了重复", self.agent.messages.append.call_args[0][0].message
+        )
+
+    async def test_normal_content(self):
+        """正常的回答不中断。"""
+        text = "".join(f"- [x] 修改了文件src/module_{i}.py\n" for i in range(100))
+
+        self.assertIsNone(await self.stream(text))
+        self.agent.messages.append.assert_not_called()
+        self.assertEqual(self.stats["interrupts"], 0)
+
+    async def test_tool_call_content(self):
+        """json toolcall代码块中的重复内容不中断。"""
+        text = (
+            "写入测试数据。\n```json toolcall\n"
+            + '{"name": "write_file", "arguments": {"content": "'
+            + "0" * 100
+            + "1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20\\n" * 100
+            + '"}}\n```\n完成。\n'
+        )
+
+        self.assertIsNone(await self.stream(text))
+        self.assertEqual(self.stats["interrupts"], 0)
+
+    async def test_new_answer_resets(self):
+        """每个回答重新开始检测。"""
+        paragraph = "让我再检查一下这个函数的参数和返回值，确认没有遗漏任何边界情况和异常处理。\n"
+        self.assertIsNone(await self.stream(paragraph * 20))
+        self.answer = MagicMock()
+
+        self.assertIsNone(await self.stream(paragraph * 20))
+
+    async def test_register_plugin(self):
+        """注册到增量回调。"""
+        lifecycle = MagicMock()
+        self.plugin.register(lifecycle)
+        lifecycle.register_message_delta.assert_called_once_with(
+            self.plugin.during_message_delta
+        )
+
+
+class TestReasoningBudgetPlugin(unittest.IsolatedAsyncioTestCase):
+    """Test cases for ReasoningBudgetPlugin."""
+
+    async def asyncSetUp(self):
+        self.stats = new_reasoning_budget_stats()
+        self.agent = MagicMock()
+        self.agent.state = "working"
+        self.agent.config = {}
+        self.agent.user_output_queue = AsyncMock()
+        self.answer = MagicMock()
+
+    async def think(self, plugin, tokens, content=""):
+        """输入tokens个推理token，最后输入回答内容，返回是否中断。"""
+        state = GenerationState()
+        for _ in range(tokens):
+            if await feed_plugin(
+                plugin, self.agent, self.answer, "想", "reasoning_content", state
+            ):
+                return True
+        if content:
+            return await feed_plugin(
+                plugin, self.agent, self.answer, content, state=state
+            )
+        return False
+
+    async def test_token_budget(self):
+        """思考超过token预算时中断并要求减少思考。"""
+        plugin = ReasoningBudgetPlugin({"working_tokens": 10}, self.stats)
+
+        self.assertTrue(await self.think(plugin, 20))
+
+        self.answer.interrupt.assert_called_once()
+        self.agent.user_output_queue.put.assert_called_once_with(self.answer)
+        message = self.agent.messages.append.call_args[0][0]
+        self.assertIn("思考超过了预算（11个token）", message.message)
+        self.assertIn("请减少思考", message.message)
+        self.assertEqual(self.stats["hits"], 1)
+        self.assertEqual(self.stats["tokens"], 11)
+        self.assertEqual(self.stats["states"], {"working": 1})
+
+    async def test_within_budget(self):
+        """没有超过预算时不中断。"""
+        plugin = ReasoningBudgetPlugin({"working_tokens": 10}, self.stats)
+
+        self.assertFalse(await self.think(plugin, 10, "回答"))
+        self.answer.interrupt.assert_not_called()
+        self.assertEqual(self.stats["hits"], 0)
+
+    async def test_budget_per_state(self):
+        """回答用户消息和自动运行使用不同的预算。"""
+        plugin = ReasoningBudgetPlugin(
+            {"working_tokens": 100, "waiting_user_tokens": 5}, self.stats
+        )
+        self.agent.state = "waiting_user"
+
+        self.assertTrue(await self.think(plugin, 20))
+        self.assertEqual(self.stats["states"], {"waiting_user": 1})
+
+        self.agent.state = "working"
+        self.answer = MagicMock()
+        plugin = ReasoningBudgetPlugin({"waiting_user_tokens": 5}, self.stats)
+        self.assertFalse(await self.think(plugin, 20))
+
+    async def test_time_budget(self):
+        """思考时间超过预算时中断。"""
+        plugin = ReasoningBudgetPlugin({"working_seconds": 30}, self.stats)
+
+        with patch("linhai.agent_plugin.time.monotonic", side_effect=[0, 10, 31]):
+            self.assertTrue(await self.think(plugin, 5))
+
+        self.assertIn("31秒", self.agent.messages.append.call_args[0][0].message)
+        self.assertEqual(self.stats["seconds"], 31)
+
+    async def test_max_retries(self):
+        """同一轮对话重试次数用完后不再限制，下一轮重新计数。"""
+        plugin = ReasoningBudgetPlugin(
+            {"working_tokens": 5, "max_retries": 1}, self.stats
+        )
+
+        self.assertTrue(await self.think(plugin, 10))
+        self.answer = MagicMock()
+        self.assertFalse(await self.think(plugin, 10, "回答"))
+        self.answer = MagicMock()
+        self.assertTrue(await self.think(plugin, 10))
+        self.assertEqual(self.stats["hits"], 2)
+
+    async def test_fast_model_fallback(self):
+        """配置了不思考的模型时，下一次回答使用它。"""
+        fast_model = MagicMock()
+        self.agent.config = {"fast_model": fast_model}
+        self.agent.model_override = None
+        plugin = ReasoningBudgetPlugin(
+            {"working_tokens": 5, "fallback": "fast_model"}, self.stats
+        )
+
+        self.assertTrue(await self.think(plugin, 10))
+
+        self.assertIs(self.agent.model_override, fast_model)
+        self.assertIn(
+            "不思考的模型", self.agent.messages.append.call_args[0][0].message
+        )
+
+    async def test_content_ends_reasoning(self):
+        """开始输出回答后不再检查思考预算。"""
+        plugin = ReasoningBudgetPlugin({"working_tokens": 1}, self.stats)
+        state = GenerationState()
+        await feed_plugin(plugin, self.agent, self.answer, "回答", state=state)
+
+        token: AnswerToken = {"reasoning_content": "想" * 10, "content": ""}
+        for _ in range(5):
+            state.feed(token)
+            self.assertFalse(
+                await plugin.during_message_delta(self.agent, self.answer, token, state)
+            )
+
+
 class TestMarkdownSyntaxPlugin(unittest.IsolatedAsyncioTestCase):
     """Test cases for MarkdownSyntaxPlugin."""
 
@@ -274,5 +529,147 @@ class TestMarkdownSyntaxPlugin(unittest.IsolatedAsyncioTestCase):
         )
 
 
+class TestFileSupersessionPlugin(unittest.IsolatedAsyncioTestCase):
+    """Test cases for FileSupersessionPlugin."""
+
+    async def test_superseded_read_is_rendered_as_stub(self):
+        """An older read of the same file is sent to the LLM as a one-line stub."""
+        plugin = FileSupersessionPlugin()
+        agent = MagicMock()
+        old_read = ToolResultMessage(
+            "old content", tool_name="read_file", tool_arguments={"filepath": "a.py"}
+        )
+        new_read = ToolResultMessage(
+            "new content", tool_name="read_file", tool_arguments={"filepath": "a.py"}
+        )
+        agent.messages = [old_read, RuntimeMessage("edited"), new_read]
+
+        await plugin.before_message_generation(agent, True, False)
+
+        self.assertEqual(old_read.superseded_by, 2)
+        self.assertIn("已被第2条消息取代", old_read.to_llm_message()["content"])
+        self.assertEqual(old_read.content, "old content")
+        self.assertEqual(new_read.to_llm_message()["content"], "new content")
+
+    async def test_register_plugin(self):
+        """Test plugin registration."""
+        plugin = FileSupersessionPlugin()
+        lifecycle = MagicMock()
+        plugin.register(lifecycle)
+        lifecycle.register_before_message_generation.assert_called_once_with(
+            plugin.before_message_generation
+        )
+
+
+class FakeDigestAnswer:
+    """Answer stub that yields no tokens and returns a fixed message."""
+
+    def __init__(self, text):
+        self.text = text
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        raise StopAsyncIteration
+
+    def get_message(self):
+        return ChatMessage("assistant", self.text)
+
+
+class TestOversizedOutputDigestPlugin(unittest.IsolatedAsyncioTestCase):
+    """Test cases for OversizedOutputDigestPlugin."""
+
+    async def asyncSetUp(self):
+        self.plugin = OversizedOutputDigestPlugin(timeout_seconds=5)
+        self.cheap_model = MagicMock()
+        self.cheap_model.answer_stream = AsyncMock(
+            return_value=FakeDigestAnswer("## 概况\n测试失败1个")
+        )
+        self.agent = MagicMock()
+        self.agent.config = {"cheap_model": self.cheap_model}
+        self.tool_call = MagicMock()
+        self.tool_call.function_name = "run_simple_command"
+
+    def spilled_result(self):
+        output = "ok\n" * 100 + "FAILED test_x - AssertionError\n"
+        result = ToolResultMessage(output, max_output_length=10)
+        self.addCleanup(os.remove, result.spill_path)
+        return result
+
+    async def test_digest_is_attached_before_next_generation(self):
+        """The digest runs in the background and is attached before the next turn."""
+        result = self.spilled_result()
+
+        await self.plugin.after_tool_call(self.agent, self.tool_call, result, True)
+        await self.plugin.before_message_generation(self.agent, True, False)
+
+        self.assertEqual(result.digest, "## 概况\n测试失败1个")
+        content = result.to_llm_message()["content"]
+        self.assertIn(result.spill_path, content)
+        self.assertIn("测试失败1个", content)
+        history = self.cheap_model.answer_stream.call_args[0][0]
+        self.assertIn("101|FAILED test_x", history[1].message)
+        self.assertIn("其中1行包含错误或警告", history[1].message)
+
+    async def test_skipped_without_cheap_model_or_for_other_tools(self):
+        """Nothing runs without a cheap model, for other tools, or short output."""
+        result = self.spilled_result()
+        self.tool_call.function_name = "read_file"
+        await self.plugin.after_tool_call(self.agent, self.tool_call, result, True)
+
+        self.tool_call.function_name = "run_simple_command"
+        self.agent.config = {}
+        await self.plugin.after_tool_call(self.agent, self.tool_call, result, True)
+
+        self.agent.config = {"cheap_model": self.cheap_model}
+        short = ToolResultMessage("short")
+        await self.plugin.after_tool_call(self.agent, self.tool_call, short, True)
+
+        self.assertEqual(self.plugin.pending, [])
+        self.cheap_model.answer_stream.assert_not_called()
+
+    async def test_slow_digest_is_attached_on_a_later_turn(self):
+        """A slow digest does not block generation and is attached once ready."""
+        release = asyncio.Event()
+
+        async def slow_answer(history):
+            await release.wait()
+            return FakeDigestAnswer("## 概况\n稍后完成")
+
+        self.cheap_model.answer_stream = slow_answer
+        self.plugin.timeout_seconds = 0.01
+        result = self.spilled_result()
+
+        await self.plugin.after_tool_call(self.agent, self.tool_call, result, True)
+        await self.plugin.before_message_generation(self.agent, True, False)
+        self.assertIsNone(result.digest)
+        self.assertEqual(len(self.plugin.pending), 1)
+
+        release.set()
+        await self.plugin.before_message_generation(self.agent, True, False)
+        self.assertEqual(result.digest, "## 概况\n稍后完成")
+        self.assertEqual(self.plugin.pending, [])
+
+    async def test_digest_failure_is_ignored(self):
+        """A failing cheap model leaves the result without a digest."""
+        self.cheap_model.answer_stream = AsyncMock(side_effect=RuntimeError("boom"))
+        result = self.spilled_result()
+
+        await self.plugin.after_tool_call(self.agent, self.tool_call, result, True)
+        await self.plugin.before_message_generation(self.agent, True, False)
+
+        self.assertIsNone(result.digest)
+
+    def test_build_digest_input_truncates_middle(self):
+        """Very long outputs keep the head and tail with line numbers."""
+        text = build_digest_input("x" * 100 + "\n" + "y" * 100000)
+
+        self.assertTrue(text.startswith("输出共2行"))
+        self.assertIn("1|xxx", text)
+        self.assertIn("中间省略", text)
+        self.assertLess(len(text), 61000)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -20,10 +20,10 @@ def format_messages_for_assert(messages):
 
 
 from linhai.agent import Agent, AgentConfig
-from linhai.agent_base import RuntimeMessage
+from linhai.agent_base import RuntimeMessage, SummaryMessage
 from linhai.agent_workflow import compress_history_range
 from linhai.llm import ChatMessage
-from linhai.tool.main import ToolManager
+from linhai.tool.main import ToolManager, ToolResultMessage
 
 
 class TestAgentWorkflow(unittest.IsolatedAsyncioTestCase):
@@ -157,6 +157,99 @@ class TestAgentWorkflow(unittest.IsolatedAsyncioTestCase):
                 # Verify compression was triggered
                 mock_compress.assert_called_once()
 
+    async def test_local_compress_avoids_llm_round_trip(self):
+        """Local compression is enough, so the LLM range compressor is skipped."""
+        self.agent.config["local_compress_keep_recent"] = 4
+        self.agent.messages = [
+            ToolResultMessage(
+                "x" * 4000, tool_name="read_file", tool_arguments={"filepath": "a.py"}
+            )
+            for _ in range(30)
+        ]
+        self.agent.last_token_usage = 900
+
+        with patch(
+            "linhai.agent.compress_history_range", AsyncMock(return_value=True)
+        ) as mock_compress:
+            with patch.object(self.agent, "generate_response", AsyncMock()):
+                await self.agent.state_working()
+
+        mock_compress.assert_not_called()
+        self.assertIsInstance(self.agent.messages[0], RuntimeMessage)
+        self.assertIn("本地历史压缩", self.agent.messages[-1].message)
+
+    async def test_llm_compress_strategy(self):
+        """The llm strategy goes straight to the LLM range compressor."""
+        self.agent.config["compress_strategy"] = "llm"
+        self.agent.messages = [
+            ToolResultMessage("x" * 4000, tool_name="execute_command")
+            for _ in range(30)
+        ]
+        self.agent.last_token_usage = 900
+
+        with patch(
+            "linhai.agent.compress_history_range", AsyncMock(return_value=True)
+        ) as mock_compress:
+            with patch.object(self.agent, "generate_response", AsyncMock()):
+                await self.agent.state_working()
+
+        mock_compress.assert_called_once()
+        self.assertIsInstance(self.agent.messages[0], ToolResultMessage)
+
+    async def test_compress_history_range_keeps_summary(self):
+        """Evicted messages are replaced by a summary instead of being lost."""
+        self.agent.messages = [
+            ChatMessage("user", f"Please inspect module_{i}.py") for i in range(12)
+        ]
+        mock_response = MagicMock()
+        mock_response.get_message.return_value = ChatMessage(
+            role="assistant", message='```json\n{"start_id": 0, "end_id": 9}\n```'
+        )
+
+        with patch.object(
+            self.agent, "generate_response", AsyncMock(return_value=mock_response)
+        ):
+            await compress_history_range(self.agent)
+
+        summary = self.agent.messages[0]
+        self.assertIsInstance(summary, SummaryMessage)
+        self.assertEqual(summary.covered, 10)
+        self.assertIn("Please inspect module_9.py", summary.summary)
+        self.assertEqual(len(self.agent.messages), 4)
+
+    async def test_merge_during_range_compression_is_deferred(self):
+        """A summary merge finishing while the LLM picks a range does not shift ids."""
+        summaries = [
+            SummaryMessage(level=1, covered=3, summary=f"Summary {i}") for i in range(3)
+        ]
+        chats = [
+            ChatMessage("user", f"Please inspect module_{i}.py") for i in range(12)
+        ]
+        self.agent.messages = summaries + chats
+        summarizer = self.agent.history_summarizer
+        mock_response = MagicMock()
+        mock_response.get_message.return_value = ChatMessage(
+            role="assistant", message='```json\n{"start_id": 3, "end_id": 12}\n```'
+        )
+
+        async def generate_response(**kwargs):
+            # 后台合并在LLM回答期间完成，会删除范围之前的两条摘要
+            summarizer.apply_merge(self.agent, summaries[:2], "Merged", 2)
+            return mock_response
+
+        with patch.object(self.agent, "generate_response", generate_response):
+            await compress_history_range(self.agent)
+
+        placeholder = next(
+            msg
+            for msg in self.agent.messages
+            if isinstance(msg, SummaryMessage) and msg.covered == 10
+        )
+        self.assertIn("Please inspect module_9.py", placeholder.summary)
+        self.assertNotIn("module_10.py", placeholder.summary)
+        self.assertEqual(self.agent.messages[0].summary, "Merged")
+        self.assertEqual(self.agent.messages[-2:], chats[-2:])
+
     async def test_workflow_with_invalid_range(self):
         """Test compress_history_range with invalid range parameters."""
         mock_agent = MagicMock()
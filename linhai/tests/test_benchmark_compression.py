@@ -0,0 +1,115 @@
+"""测试历史压缩基准测试。"""
+
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from linhai.agent_base import RuntimeMessage
+from linhai.benchmarks.compression import main, run_benchmark
+from linhai.history import HistoryStore
+from linhai.llm import ChatMessage, SystemMessage
+from linhai.tool.main import ToolResultMessage
+
+
+def to_dict(message) -> dict:
+    """与Agent保存历史时相同的序列化方式。"""
+    data = json.loads(message.to_json())
+    data["type"] = type(message).__name__
+    return data
+
+
+def make_session(store: HistoryStore, rounds: int = 20) -> list[dict]:
+    """构造一个反复读取少量文件的会话。"""
+    messages = [SystemMessage("系统提示"), ChatMessage("user", "请重构项目")]
+    for i in range(rounds):
+        filepath = f"src/module_{i % 3}.py"
+        messages.append(ChatMessage("assistant", f"读取{filepath}"))
+        messages.append(RuntimeMessage("你调用了工具'read_file'，结果如下"))
+        messages.append(
+            ToolResultMessage(
+                f"# {filepath}\n" + "code line\n" * 300,
+                blob_store=store.blobs,
+                tool_name="read_file",
+                tool_arguments={"filepath": filepath},
+            )
+        )
+    return [to_dict(msg) for msg in messages]
+
+
+class TestCompressionBenchmark(unittest.IsolatedAsyncioTestCase):
+    """测试基准测试的回放和统计。"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = HistoryStore(Path(self.temp_dir), compression="gzip")
+        self.store.save_session("s1", make_session(self.store))
+        self.store.save_session("short", make_session(self.store, rounds=2))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    async def test_report_covers_all_strategies(self):
+        """报告包含每个策略的token、耗时、LLM开销和重复读取统计。"""
+        strategies = ["local", "llm_range", "local_then_llm", "thanox", "thanox_random"]
+
+        report = await run_benchmark(self.store, strategies)
+
+        json.dumps(report)
+        self.assertEqual(report["model"], "simulated")
+        self.assertEqual([s["session_id"] for s in report["sessions"]], ["s1"])
+        results = report["sessions"][0]["results"]
+        for name in strategies:
+            self.assertNotIn("error", results[name], name)
+            self.assertLess(
+                results[name]["tokens_after"], results[name]["tokens_before"]
+            )
+            self.assertEqual(results[name]["later_reads"], 11)
+        self.assertEqual(results["local"]["llm_calls"], 0)
+        self.assertEqual(results["local"]["rereads_caused"], 0)
+        self.assertEqual(results["llm_range"]["llm_calls"], 1)
+        self.assertGreater(results["llm_range"]["llm_input_tokens"], 0)
+        self.assertGreater(results["llm_range"]["rereads_caused"], 0)
+        self.assertEqual(report["totals"]["local"]["sessions"], 1)
+
+    async def test_unknown_strategy(self):
+        """未知策略抛出ValueError。"""
+        with self.assertRaises(ValueError):
+            await run_benchmark(self.store, ["no_such_strategy"])
+
+
+class TestCompressionBenchmarkCli(unittest.TestCase):
+    """测试命令行入口。"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = HistoryStore(Path(self.temp_dir) / "history", compression="gzip")
+        self.store.save_session("s1", make_session(self.store))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_writes_json_report(self):
+        """结果写入指定的JSON文件。"""
+        output = Path(self.temp_dir) / "result.json"
+
+        exit_code = main(
+            [
+                "--history-dir",
+                str(self.store.root),
+                "--strategies",
+                "local,thanox",
+                "--output",
+                str(output),
+            ]
+        )
+
+        self.assertEqual(exit_code, 0)
+        report = json.loads(output.read_text(encoding="utf-8"))
+        self.assertEqual(report["strategies"], ["local", "thanox"])
+        self.assertEqual(len(report["sessions"]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+"""测试Markdown解析基准测试。"""
+
+import json
+import unittest
+
+from linhai.benchmarks.markdown_parser import run_benchmark, synthetic_response
+from linhai.markdown_parser import extract_tool_calls
+
+
+class TestMarkdownParserBenchmark(unittest.TestCase):
+    """测试基准测试的数据生成和报告。"""
+
+    def test_synthetic_response(self):
+        """生成的回答达到指定大小并以两个工具调用结尾。"""
+        text = synthetic_response(3000)
+
+        self.assertGreaterEqual(len(text), 3000)
+        self.assertEqual(len(extract_tool_calls(text)), 2)
+        self.assertEqual(synthetic_response(3000), text)
+        self.assertNotIn("```", synthetic_response(3000, with_code=False))
+
+    def test_report(self):
+        """报告包含每个用例两种实现的耗时。"""
+        report = run_benchmark([2000], repeat=1)
+
+        json.dumps(report)
+        self.assertEqual(
+            [result["name"] for result in report["results"]],
+            ["code_2000", "prose_2000"],
+        )
+        for result in report["results"]:
+            self.assertGreater(result["legacy_seconds"], 0)
+            self.assertGreater(result["seconds"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+"""测试数据块存储模块。"""
+
+import asyncio
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from typing import cast
+
+from linhai.blob_store import BlobStore
+from linhai.config import Config
+from linhai.llm import ToolCallMessage
+from linhai.tool.main import ToolManager, ToolResultMessage
+
+
+class TestBlobStore(unittest.TestCase):
+    """测试BlobStore的读写、去重和缓存。"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = BlobStore(Path(self.temp_dir), compression="gzip")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_put_and_get_text(self):
+        """保存的文本可以按哈希读回。"""
+        digest = self.store.put_text("人类有三大欲望：饮食、繁殖、睡眠")
+
+        self.assertIn(digest, self.store)
+        self.assertEqual(
+            self.store.get_text(digest), "人类有三大欲望：饮食、繁殖、睡眠"
+        )
+        self.assertTrue(str(self.store.find(digest)).endswith(".gz"))
+
+    def test_same_content_stored_once(self):
+        """相同内容只保存一份。"""
+        first = self.store.put_text("114514" * 1000)
+        second = self.store.put_text("114514" * 1000)
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(list(self.store.iter_blobs())), 1)
+
+    def test_cache_is_bounded(self):
+        """读取缓存不超过限制的字节数。"""
+        store = BlobStore(Path(self.temp_dir), compression="gzip", cache_bytes=100)
+        digests = [store.put_text(str(i) * 40) for i in range(5)]
+        for digest in digests:
+            store.get_text(digest)
+
+        self.assertLessEqual(store._cache_size, 100)
+        self.assertEqual(store.get_text(digests[0]), "0" * 40)
+
+    def test_delete(self):
+        """删除后数据块不可读取。"""
+        digest = self.store.put_text("要删除的内容")
+
+        self.assertGreater(self.store.delete(digest), 0)
+        self.assertEqual(self.store.delete(digest), 0)
+        with self.assertRaises(FileNotFoundError):
+            self.store.get_text(digest)
+
+
+class TestToolResultMessageBlob(unittest.TestCase):
+    """测试ToolResultMessage使用数据块存储保存较长的输出。"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = BlobStore(Path(self.temp_dir), compression="gzip")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_short_content_stays_inline(self):
+        """短输出直接保存在消息中。"""
+        message = ToolResultMessage("短输出", blob_store=self.store)
+
+        self.assertIsNone(message.content_hash)
+        self.assertEqual(json.loads(message.to_json())["content"], "短输出")
+
+    def test_long_content_moves_to_blob(self):
+        """长输出只在消息中保留哈希，读取时按需加载。"""
+        content = "李田所\n" * 2000
+        message = ToolResultMessage(content, blob_store=self.store, blob_threshold=100)
+
+        self.assertIsNotNone(message.content_hash)
+        self.assertIsNone(message._content)
+        self.assertEqual(message.content, content)
+        self.assertEqual(message.to_llm_message()["content"], content)
+
+        data = json.loads(message.to_json())
+        self.assertNotIn("content", data)
+        self.assertEqual(data["content_ref"], message.content_hash)
+
+    def test_json_roundtrip_with_blob(self):
+        """从JSON恢复时不读取数据块，访问内容时才加载。"""
+        content = "x" * 10000
+        message = ToolResultMessage(content, blob_store=self.store)
+
+        restored = ToolResultMessage.from_json(message.to_json(), blob_store=self.store)
+
+        self.assertEqual(restored.content_hash, message.content_hash)
+        self.assertEqual(restored.content, content)
+
+    def test_json_without_blob_store_fails(self):
+        """引用数据块的消息没有提供数据块存储时报错，而不是使用默认目录。"""
+        message = ToolResultMessage("x" * 10000, blob_store=self.store)
+
+        with self.assertRaises(ValueError):
+            ToolResultMessage.from_json(message.to_json())
+
+    def test_json_roundtrip_keeps_tool_call(self):
+        """工具名和参数在序列化后保留。"""
+        for content in ("短输出", "x" * 10000):
+            message = ToolResultMessage(
+                content,
+                blob_store=self.store,
+                tool_name="read_file",
+                tool_arguments={"filepath": "a.py"},
+            )
+
+            restored = ToolResultMessage.from_json(
+                message.to_json(), blob_store=self.store
+            )
+
+            self.assertEqual(restored.tool_name, "read_file")
+            self.assertEqual(restored.tool_arguments, {"filepath": "a.py"})
+            self.assertNotIn("tool_name", restored.to_llm_message())
+
+    def test_missing_blob(self):
+        """数据块被清理后返回提示而不是抛出异常。"""
+        message = ToolResultMessage("y" * 10000, blob_store=self.store)
+        assert message.content_hash is not None
+        self.store.delete(message.content_hash)
+
+        self.assertIn("已被清理", message.content)
+
+    def test_tool_manager_uses_configured_threshold(self):
+        """ToolManager按配置中的tools.blob_threshold决定是否移入数据块存储。"""
+        tool_call = ToolCallMessage("safe_calculator", {"expression": "10 ** 200"})
+        for threshold, stored in ((100, True), (1000, False)):
+            config = cast(Config, {"tools": {"blob_threshold": threshold}})
+            manager = ToolManager(config=config, blob_store=self.store)
+            message = asyncio.run(manager.process_tool_call(tool_call))
+
+            assert isinstance(message, ToolResultMessage)
+            self.assertEqual(message.content_hash is not None, stored)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,8 +3,9 @@
 import unittest
 from unittest.mock import patch, mock_open
 import tomllib
+from typing import cast
 
-from linhai.config import ConfigValidationError, load_config
+from linhai.config import Config, ConfigValidationError, load_config, validate_config
 
 
 class TestConfig(unittest.TestCase):
@@ -77,6 +78,36 @@ model = ""
         with self.assertRaises(ConfigValidationError):
             load_config()
 
+    def test_reasoning_budget(self):
+        """思考预算不能为负数，fast_model需要配置[llm.fast]。"""
+        llm = {"base_url": "https://api.example.com", "api_key": "key", "model": "m"}
+        budget = {"working_tokens": 10}
+        validate_config(
+            cast(Config, {"llm": llm, "agent": {"reasoning_budget": budget}})
+        )
+        for budget in (
+            {"working_tokens": -1},
+            {"fallback": "unknown"},
+            {"fallback": "fast_model"},
+        ):
+            with self.assertRaises(ConfigValidationError):
+                validate_config(
+                    cast(Config, {"llm": llm, "agent": {"reasoning_budget": budget}})
+                )
+
+        llm_with_fast = dict(llm, fast=dict(llm))
+        validate_config(
+            cast(
+                Config,
+                {
+                    "llm": llm_with_fast,
+                    "agent": {"reasoning_budget": {"fallback": "fast_model"}},
+                },
+            )
+        )
+        with self.assertRaises(ConfigValidationError):
+            validate_config(cast(Config, {"llm": dict(llm, fast=dict(llm, model=""))}))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,202 @@
+"""测试历史消息淘汰模块。"""
+
+import random
+import unittest
+from types import SimpleNamespace
+
+from linhai.agent import Agent
+from linhai.agent_base import DestroyedRuntimeMessage, RuntimeMessage
+from linhai.eviction import (
+    eviction_policies,
+    evict_messages,
+    get_eviction_policy,
+    message_features,
+    register_eviction_policy,
+)
+from linhai.history_compressor import estimate_message_tokens, mark_superseded_results
+from linhai.llm import ChatMessage, SystemMessage
+from linhai.tool.main import ToolResultMessage
+
+
+def read_result(path: str, size: int = 2000) -> ToolResultMessage:
+    """构造读取文件的工具结果。"""
+    return ToolResultMessage(
+        "x" * size, tool_name="read_file", tool_arguments={"filepath": path}
+    )
+
+
+def make_history(rounds: int = 20) -> list:
+    """构造包含系统消息、用户消息、助手消息和文件读取结果的历史。"""
+    messages: list = [SystemMessage("system prompt")]
+    for i in range(rounds):
+        messages.append(ChatMessage("user", f"第{i}个需求"))
+        messages.append(ChatMessage("assistant", f"读取file{i}.py"))
+        messages.append(read_result(f"/src/file{i}.py"))
+    return messages
+
+
+def total_tokens(messages: list) -> int:
+    return sum(estimate_message_tokens(msg) for msg in messages)
+
+
+class TestMessageFeatures(unittest.TestCase):
+    """测试消息特征。"""
+
+    def test_kinds_and_references(self):
+        """区分已被取代的读取结果，并识别之后被提及的文件。"""
+        messages = [
+            SystemMessage("system prompt"),
+            read_result("/src/a.py"),
+            read_result("/src/b.py"),
+            ChatMessage("assistant", "a.py里有bug"),
+            read_result("/src/b.py"),
+        ]
+
+        features = message_features(messages)
+
+        self.assertEqual(
+            [feature["kind"] for feature in features],
+            ["other", "tool_result", "superseded", "assistant", "tool_result"],
+        )
+        self.assertTrue(features[1]["referenced"])
+        self.assertFalse(features[2]["referenced"])
+        self.assertEqual(features[0]["age"], 4)
+
+
+class TestEvictMessages(unittest.TestCase):
+    """测试按策略淘汰消息。"""
+
+    def test_target_is_met_and_input_unchanged(self):
+        """删除后估计的token数不超过目标，传入的列表不被修改。"""
+        messages = make_history()
+        original = list(messages)
+        target = total_tokens(messages) // 2
+
+        result, report = evict_messages(messages, target)
+
+        self.assertEqual(messages, original)
+        self.assertLessEqual(report["tokens_after"], target)
+        self.assertEqual(report["tokens_after"], total_tokens(result))
+        self.assertEqual(report["policy"], "scored")
+
+    def test_scored_policy_keeps_user_messages(self):
+        """评分策略先删除工具结果，保留用户消息。"""
+        messages = make_history()
+
+        result, report = evict_messages(messages, total_tokens(messages) // 2)
+
+        self.assertEqual(set(report["evicted_kinds"]), {"tool_result"})
+        users = [
+            msg for msg in result if isinstance(msg, ChatMessage) and msg.role == "user"
+        ]
+        self.assertEqual(len(users), 20)
+
+    def test_superseded_results_go_first(self):
+        """已被取代的读取结果比其他工具结果先被删除。"""
+        messages = make_history()
+        messages.append(read_result("/src/file5.py"))
+        messages.extend(ChatMessage("assistant", "继续") for _ in range(10))
+        mark_superseded_results(messages)
+        # 被取代的结果只显示为简短说明，删除一条即可满足目标
+        target = total_tokens(messages) - 1
+
+        result, report = evict_messages(messages, target)
+
+        self.assertEqual(report["evicted_kinds"], {"superseded": 1})
+        self.assertNotIn(messages[18], result)
+
+    def test_prefix_and_recent_messages_are_protected(self):
+        """系统消息、开头和末尾的消息不会被删除。"""
+        messages = make_history()
+
+        result, _ = evict_messages(messages, 0, keep_recent=10, protected_prefix=5)
+
+        self.assertEqual(result[:5], messages[:5])
+        self.assertEqual(result[-10:], messages[-10:])
+        self.assertEqual(len(result), 16)
+
+    def test_consecutive_evictions_are_collapsed(self):
+        """连续被删除的消息合并为一条DestroyedRuntimeMessage。"""
+        messages = make_history()
+
+        result, report = evict_messages(messages, 0, policy_name="oldest")
+
+        destroyed = [msg for msg in result if isinstance(msg, DestroyedRuntimeMessage)]
+        self.assertEqual(len(destroyed), 1)
+        self.assertEqual(report["evicted"], len(messages) - 15)
+
+    def test_largest_policy(self):
+        """largest策略先删除最大的消息。"""
+        messages = make_history()
+        messages[10] = read_result("/src/big.py", size=20000)
+        target = total_tokens(messages) - 1000
+
+        _, report = evict_messages(messages, target, policy_name="largest")
+
+        self.assertEqual(report["evicted"], 1)
+
+    def test_random_policy(self):
+        """random策略同样满足token目标。"""
+        random.seed(0)
+        messages = make_history()
+        target = total_tokens(messages) // 2
+
+        _, report = evict_messages(messages, target, policy_name="random")
+
+        self.assertLessEqual(report["tokens_after"], target)
+
+    def test_unknown_policy(self):
+        """未知的策略名称抛出ValueError。"""
+        with self.assertRaises(ValueError):
+            get_eviction_policy("no-such-policy")
+        with self.assertRaises(ValueError):
+            evict_messages(make_history(), 0, policy_name="no-such-policy")
+
+    def test_register_custom_policy(self):
+        """注册的策略可以按名称使用。"""
+
+        @register_eviction_policy("newest_first")
+        def newest_first(features):
+            return features["age"]
+
+        try:
+            messages = make_history()
+            result, _ = evict_messages(
+                messages, total_tokens(messages) - 100, policy_name="newest_first"
+            )
+            self.assertNotIn(messages[-11], result)
+            self.assertIn(messages[5], result)
+        finally:
+            del eviction_policies["newest_first"]
+
+
+class TestThanoxHistory(unittest.IsolatedAsyncioTestCase):
+    """测试Agent.thanox_history使用淘汰策略。"""
+
+    async def test_thanox_history_reports_eviction(self):
+        """thanox_history按配置的策略删除消息并加入说明。"""
+        messages = make_history()
+        agent = SimpleNamespace(
+            messages=list(messages), config={"eviction_policy": "oldest"}
+        )
+
+        await Agent.thanox_history(agent)  # type: ignore[arg-type]
+
+        self.assertLessEqual(
+            total_tokens(agent.messages[:-1]), total_tokens(messages) // 2
+        )
+        self.assertIsInstance(agent.messages[-1], RuntimeMessage)
+        self.assertIn("按oldest策略删除了", agent.messages[-1].message)
+
+    async def test_short_history_is_untouched(self):
+        """消息不超过10条时不删除。"""
+        messages = make_history(3)
+        agent = SimpleNamespace(messages=list(messages), config={})
+
+        await Agent.thanox_history(agent)  # type: ignore[arg-type]
+
+        self.assertEqual(agent.messages, messages)
+
+
+if __name__ == "__main__":
+    unittest.main()
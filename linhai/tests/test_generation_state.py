@@ -0,0 +1,108 @@
+"""测试生成中的增量状态。"""
+
+import random
+import unittest
+
+from linhai.benchmarks.generation_state import run_benchmark, split_tokens
+from linhai.generation_state import GenerationState, TextStreamState
+from linhai.markdown_parser import ToolCallScanner
+
+TEXTS = [
+    "",
+    "no newline",
+    "a\nb\n\nlast",
+    "trailing\n",
+    "``` ```` ````` `` `\n```json toolcall\n{}\n```",
+    "``````\n`\n``\n```",
+    '说明\n```json toolcall\n{"name": "a"}\n```\n````markdown\n```json toolcall\n{}\n```\n````\n',
+]
+
+
+def chunks(text: str, rng: random.Random) -> list[str]:
+    """把文本随机切分为多段。"""
+    pieces = []
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 5)
+        pieces.append(text[position : position + size])
+        position += size
+    return pieces
+
+
+class TestTextStreamState(unittest.TestCase):
+    """测试单个输出流的增量统计。"""
+
+    def test_matches_full_text(self):
+        """任意切分方式下的统计与对完整文本的统计相同。"""
+        rng = random.Random(0)
+        for text in TEXTS:
+            for _ in range(20):
+                state = TextStreamState()
+                scanner = ToolCallScanner()
+                for piece in chunks(text, rng):
+                    state.feed(piece)
+                scanner.feed(text)
+
+                self.assertEqual(state.length, len(text), text)
+                self.assertEqual(state.line_count, text.count("\n"), text)
+                self.assertEqual(state.last_line, text.rpartition("\n")[2], text)
+                self.assertEqual(state.fence_count, text.count("```"), text)
+                self.assertEqual(state.tool_call_count, scanner.tool_call_count, text)
+
+    def test_feed_returns_events(self):
+        """结束的工具调用代码块作为事件返回。"""
+        state = TextStreamState()
+
+        self.assertEqual(
+            state.feed('```json toolcall\n{"name": "a", "arguments": {}}\n'), []
+        )
+        events = state.feed("```\n")
+
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]["tool_call"], {"name": "a", "arguments": {}})
+        self.assertEqual(state.feed(""), [])
+
+
+class TestGenerationState(unittest.TestCase):
+    """测试回答的增量状态。"""
+
+    def test_feed_tokens(self):
+        """回答内容和推理内容分别统计。"""
+        state = GenerationState()
+
+        state.feed({"reasoning_content": "想一想\n```", "content": ""})
+        state.feed({"reasoning_content": None, "content": "回答"})
+        state.feed({"reasoning_content": "", "content": "\n第二行"})
+
+        self.assertEqual(state.token_count, 3)
+        self.assertEqual(state.reasoning.length, 7)
+        self.assertEqual(state.reasoning.token_count, 1)
+        self.assertEqual(state.content.token_count, 2)
+        self.assertEqual(state.reasoning.fence_count, 1)
+        self.assertEqual(state.content.line_count, 1)
+        self.assertEqual(state.content.last_line, "第二行")
+
+
+class TestGenerationStateBenchmark(unittest.TestCase):
+    """测试生成中回调的基准测试。"""
+
+    def test_split_tokens(self):
+        """token按顺序拼接后还原推理内容和回答内容。"""
+        tokens = split_tokens("回答内容", "推理内容")
+
+        self.assertEqual(
+            "".join(token["reasoning_content"] or "" for token in tokens), "推理内容"
+        )
+        self.assertEqual("".join(token["content"] for token in tokens), "回答内容")
+
+    def test_report(self):
+        """报告包含每个回答大小两种实现的耗时。"""
+        report = run_benchmark([2000], repeat=1)
+
+        self.assertEqual([result["chars"] for result in report["results"]], [2000])
+        self.assertGreater(report["results"][0]["tokens"], 0)
+        self.assertGreater(report["results"][0]["seconds"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,237 @@
+"""测试历史存储模块。"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from linhai.history import HistoryStore
+
+
+def make_history(count: int, prefix: str = "消息") -> list[dict]:
+    """构造测试用的历史消息。"""
+    return [
+        {"type": "ChatMessage", "role": "user", "message": f"{prefix}{i}", "name": None}
+        for i in range(count)
+    ]
+
+
+class TestHistoryStore(unittest.TestCase):
+    """测试HistoryStore的保存、关闭、去重和清理。"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.root = Path(self.temp_dir) / "history"
+        self.store = HistoryStore(self.root, compression="gzip")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def set_age(self, session_id: str, seconds: float):
+        """把会话文件的修改时间调整到若干秒以前。"""
+        path = self.store._find_session_file(session_id)
+        assert path is not None
+        timestamp = time.time() - seconds
+        os.utime(path, (timestamp, timestamp))
+
+    def test_save_overwrites_single_file(self):
+        """同一会话多次保存只产生一个文件。"""
+        self.store.save_session("s1", make_history(3))
+        self.store.save_session("s1", make_history(5))
+
+        files = list(self.root.glob("conversation_*"))
+        self.assertEqual(len(files), 1)
+        self.assertEqual(self.store.load_session("s1"), make_history(5))
+
+    def test_close_session_roundtrip(self):
+        """关闭会话后读取结果保持不变。"""
+        history = make_history(4)
+        self.store.save_session("s1", history)
+
+        closed_path = self.store.close_session("s1")
+
+        self.assertIsNotNone(closed_path)
+        self.assertTrue(str(closed_path).endswith(".json.gz"))
+        self.assertFalse(self.store.session_path("s1").exists())
+        self.assertEqual(self.store.load_session("s1"), history)
+        self.assertTrue(self.store.list_sessions()[0]["closed"])
+
+    def test_close_session_deduplicates_messages(self):
+        """不同会话中相同的消息只保存一份。"""
+        self.store.save_session("s1", make_history(10))
+        self.store.save_session("s2", make_history(12))
+
+        self.store.close_session("s1")
+        self.store.close_session("s2")
+
+        self.assertEqual(len(self.store.objects.mtimes()), 12)
+        self.assertEqual(
+            sorted(path.name for path in self.root.iterdir() if path.is_file()),
+            [
+                "conversation_s1.json.gz",
+                "conversation_s2.json.gz",
+                "objects.sqlite3",
+            ],
+        )
+        self.assertEqual(self.store.load_session("s2"), make_history(12))
+
+    def test_maintain_closes_idle_sessions_only(self):
+        """维护时只关闭空闲会话，跳过活跃会话。"""
+        self.store.save_session("idle", make_history(3))
+        self.store.save_session("recent", make_history(3))
+        self.store.save_session("active", make_history(3))
+        self.set_age("idle", 7200)
+        self.set_age("active", 7200)
+
+        report = self.store.maintain(active_session_ids=["active"])
+
+        self.assertEqual(report["closed_sessions"], 1)
+        closed = {
+            info["session_id"]: info["closed"] for info in self.store.list_sessions()
+        }
+        self.assertEqual(closed, {"idle": True, "recent": False, "active": False})
+
+    def test_maintain_skips_leased_sessions(self):
+        """持有租约的会话即使空闲也不会被关闭或按保留策略删除。"""
+        lease = self.store.acquire_lease("running")
+        self.store.save_session("running", make_history(3))
+        self.store.save_session("other", make_history(3))
+        self.set_age("running", 7200)
+        self.set_age("other", 3600)
+
+        # 另一个进程中的维护不知道运行中的会话ID，只能依靠租约
+        other_process = HistoryStore(
+            self.root, retention={"max_sessions": 1}, compression="gzip"
+        )
+        report = other_process.maintain()
+
+        self.assertEqual(report["closed_sessions"], 1)
+        self.assertEqual(report["removed_sessions"], 1)
+        sessions = self.store.list_sessions()
+        self.assertEqual(
+            [(info["session_id"], info["closed"]) for info in sessions],
+            [("running", False)],
+        )
+        self.assertTrue(self.store.is_session_leased("running"))
+
+        lease.release()
+        self.assertFalse(self.store.is_session_leased("running"))
+        self.assertFalse(self.store.lease_path("running").exists())
+        self.assertEqual(other_process.maintain()["closed_sessions"], 1)
+
+    def test_maintain_reports_reclaimed_space_for_legacy_snapshots(self):
+        """旧版每轮一个文件的历史在维护后被去重压缩。"""
+        for turn in range(1, 21):
+            self.store.save_session(f"turn{turn:02d}", make_history(turn * 5))
+            self.set_age(f"turn{turn:02d}", 7200 - turn)
+
+        report = self.store.maintain()
+
+        self.assertEqual(report["closed_sessions"], 20)
+        self.assertGreater(report["bytes_reclaimed"], 0)
+        self.assertLess(report["bytes_after"], report["bytes_before"])
+        self.assertEqual(self.store.load_session("turn20"), make_history(100))
+
+    def test_retention_max_sessions(self):
+        """按数量保留时删除最旧的会话并回收无引用对象。"""
+        self.store.retention = {"max_sessions": 2}
+        for i in range(4):
+            self.store.save_session(f"s{i}", make_history(2, prefix=f"会话{i}-"))
+            self.set_age(f"s{i}", 7200 - i)
+
+        report = self.store.maintain()
+
+        self.assertEqual(report["removed_sessions"], 2)
+        self.assertEqual(report["removed_objects"], 4)
+        remaining = [info["session_id"] for info in self.store.list_sessions()]
+        self.assertEqual(remaining, ["s2", "s3"])
+
+    def test_retention_max_age(self):
+        """按时间保留时删除过期会话。"""
+        self.store.retention = {"max_age_days": 1}
+        self.store.save_session("old", make_history(2))
+        self.store.save_session("new", make_history(2))
+        self.set_age("old", 3 * 86400)
+
+        report = self.store.maintain()
+
+        self.assertEqual(report["removed_sessions"], 1)
+        self.assertEqual(
+            [info["session_id"] for info in self.store.list_sessions()], ["new"]
+        )
+
+    def test_retention_max_total_size(self):
+        """按空间保留时删除最旧的会话直到低于限制。"""
+        self.store.retention = {"max_total_mb": 0.1}
+        for i in range(3):
+            history = [
+                {
+                    "type": "ChatMessage",
+                    "role": "user",
+                    "message": os.urandom(512).hex(),
+                }
+                for _ in range(40)
+            ]
+            self.store.save_session(f"s{i}", history)
+            self.set_age(f"s{i}", 7200 - i)
+
+        report = self.store.maintain()
+
+        self.assertGreater(report["removed_sessions"], 0)
+        self.assertLessEqual(self.store.disk_usage(), 0.1 * 1024 * 1024)
+        self.assertEqual(self.store.list_sessions()[-1]["session_id"], "s2")
+
+    def test_retention_max_total_size_counts_freed_blobs(self):
+        """删除会话释放的数据块计入空间，不会多删会话。"""
+        self.store.retention = {"max_total_mb": 0.12}
+        for i in range(3):
+            digest = self.store.blobs.put_text(os.urandom(40 * 1024).hex())
+            path = self.store.blobs.find(digest)
+            assert path is not None
+            old = time.time() - 3600
+            os.utime(path, (old, old))
+            self.store.save_session(
+                f"s{i}",
+                [{"role": "user", "name": "tool-result", "content_ref": digest}],
+            )
+            self.set_age(f"s{i}", 7200 - i)
+
+        report = self.store.maintain()
+
+        self.assertEqual(report["removed_sessions"], 1)
+        self.assertEqual(report["removed_blobs"], 1)
+        self.assertLessEqual(self.store.disk_usage(), 0.12 * 1024 * 1024)
+        self.assertEqual(
+            [info["session_id"] for info in self.store.list_sessions()], ["s1", "s2"]
+        )
+
+    def test_maintain_collects_unreferenced_blobs(self):
+        """维护时回收不再被任何会话引用的数据块。"""
+        kept = self.store.blobs.put_text("仍被引用的输出")
+        dropped = self.store.blobs.put_text("已无引用的输出")
+        for digest in (kept, dropped):
+            path = self.store.blobs.find(digest)
+            assert path is not None
+            old = time.time() - 3600
+            os.utime(path, (old, old))
+        self.store.save_session(
+            "s1", [{"role": "user", "name": "tool-result", "content_ref": kept}]
+        )
+        self.set_age("s1", 7200)
+
+        report = self.store.maintain()
+
+        self.assertEqual(report["removed_blobs"], 1)
+        self.assertIn(kept, self.store.blobs)
+        self.assertNotIn(dropped, self.store.blobs)
+
+    def test_load_missing_session(self):
+        """读取不存在的会话时抛出FileNotFoundError。"""
+        with self.assertRaises(FileNotFoundError):
+            self.store.load_session("missing")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,338 @@
+"""测试本地历史压缩模块。"""
+
+import asyncio
+import os
+import tempfile
+import unittest
+
+from linhai.agent_base import RuntimeMessage, DestroyedRuntimeMessage
+from linhai.history_compressor import (
+    compress_messages_locally,
+    estimate_tokens,
+    mark_superseded_results,
+)
+from linhai.llm import ChatMessage, SystemMessage, ToolCallMessage
+from linhai.tool.main import ToolManager, ToolResultMessage, ToolErrorMessage
+
+
+def tool_result(tool_name: str, output: str, **arguments) -> ToolResultMessage:
+    """构造带有工具调用信息的工具结果。"""
+    return ToolResultMessage(output, tool_name=tool_name, tool_arguments=arguments)
+
+
+class TestEstimateTokens(unittest.TestCase):
+    """测试token估计。"""
+
+    def test_ascii_and_cjk(self):
+        """ASCII按4字符一个token，中文按每字一个token估计。"""
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("a" * 40), 10)
+        self.assertEqual(estimate_tokens("中文" * 10), 20)
+        self.assertEqual(estimate_tokens("中文abcd"), 3)
+
+
+class TestMarkSupersededResults(unittest.TestCase):
+    """测试过期文件读取结果的标记。"""
+
+    def test_reads_and_writes_supersede_older_reads(self):
+        """完整读取和修改会取代之前的读取结果，部分读取不会。"""
+        messages = [
+            tool_result("read_file", "内容1", filepath="a.py"),
+            tool_result("run_sed_expression", "部分", filepath="a.py", expression="1p"),
+            tool_result("read_file", "内容1", filepath="./a.py"),
+            tool_result("replace_file_content", "成功", filepath="a.py"),
+            tool_result("read_file", "b", filepath="b.py"),
+        ]
+
+        self.assertEqual(mark_superseded_results(messages), 3)
+
+        self.assertEqual(messages[0].superseded_by, 2)
+        self.assertTrue(messages[0].superseded_same_content)
+        self.assertIn("内容与第2条消息相同", messages[0].to_llm_message()["content"])
+        self.assertEqual(messages[1].superseded_by, 2)
+        self.assertEqual(messages[2].superseded_by, 3)
+        self.assertFalse(messages[2].superseded_same_content)
+        self.assertIsNone(messages[3].superseded_by)
+        self.assertIsNone(messages[4].superseded_by)
+
+    def test_partial_read_does_not_supersede(self):
+        """只读取一部分的结果不会让之前的完整读取过期。"""
+        messages = [
+            tool_result("read_file", "全部内容", filepath="a.py"),
+            tool_result("run_sed_expression", "部分", filepath="a.py", expression="1p"),
+            tool_result("read_file", "第1-10行", filepath="a.py", end_line=10),
+            tool_result("read_file", "最后几行", filepath="a.py", tail_lines=5),
+        ]
+
+        self.assertEqual(mark_superseded_results(messages), 0)
+        self.assertEqual(messages[0].to_llm_message()["content"], "全部内容")
+
+    def test_batch_edit_supersedes_reads_of_each_file(self):
+        """批量修改会让每个被修改文件之前的读取结果过期。"""
+        messages = [
+            tool_result("read_file", "a的内容", filepath="a.py"),
+            tool_result("read_file", "b的内容", filepath="b.py"),
+            tool_result("read_file", "c的内容", filepath="c.py"),
+            tool_result(
+                "batch_edit_files",
+                "成功",
+                edits=[
+                    {"filepath": "a.py", "old": "x", "new": "y"},
+                    {"filepath": "./b.py", "old": "x", "new": "y"},
+                ],
+            ),
+        ]
+
+        self.assertEqual(mark_superseded_results(messages), 2)
+        self.assertEqual(messages[0].superseded_by, 3)
+        self.assertEqual(messages[1].superseded_by, 3)
+        self.assertIsNone(messages[2].superseded_by)
+
+    def test_marks_follow_index_changes(self):
+        """消息下标变化后重新标记会更新取代者的下标，删除取代者后恢复原内容。"""
+        first = tool_result("read_file", "旧", filepath="a.py")
+        second = tool_result("read_file", "新", filepath="a.py")
+        messages = [first, ChatMessage("assistant", "x"), second]
+        mark_superseded_results(messages)
+        self.assertEqual(first.superseded_by, 2)
+
+        del messages[1]
+        mark_superseded_results(messages)
+        self.assertEqual(first.superseded_by, 1)
+
+        mark_superseded_results([first])
+        self.assertIsNone(first.superseded_by)
+        self.assertEqual(first.to_llm_message()["content"], "旧")
+
+
+class TestFailedToolResults(unittest.TestCase):
+    """测试失败的工具调用的标记。"""
+
+    def test_tool_manager_marks_failed_read(self):
+        """读取不存在的文件时结果被标记为失败，不记录内容哈希。"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            tool_call = ToolCallMessage(
+                "read_file", {"filepath": os.path.join(temp_dir, "missing.py")}
+            )
+            message = asyncio.run(ToolManager().process_tool_call(tool_call))
+
+        assert isinstance(message, ToolResultMessage)
+        self.assertTrue(message.failed)
+        self.assertIsNone(message.file_hash)
+
+    def test_failed_edit_keeps_earlier_read(self):
+        """替换失败时文件没有变化，之前的读取结果不会被取代；替换成功后才会被取代。"""
+        manager = ToolManager()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "a.py")
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.write("x = 1\n")
+
+            def run(name: str, **arguments) -> ToolResultMessage:
+                tool_call = ToolCallMessage(name, {"filepath": file_path, **arguments})
+                message = asyncio.run(manager.process_tool_call(tool_call))
+                assert isinstance(message, ToolResultMessage)
+                return message
+
+            read = run("read_file")
+            failed_edit = run("replace_file_content", old="y = 2", new="y = 3")
+            self.assertEqual(failed_edit.changed_files, [])
+            messages = [read, failed_edit]
+            self.assertEqual(mark_superseded_results(messages), 0)
+            self.assertIn("x = 1", read.to_llm_message()["content"])
+
+            edit = run("replace_file_content", old="x = 1", new="x = 2")
+            self.assertEqual(edit.changed_files, [file_path])
+            messages.append(edit)
+            self.assertEqual(mark_superseded_results(messages), 1)
+            self.assertEqual(read.superseded_by, 2)
+
+    def test_unchanged_writes_keep_earlier_read(self):
+        """写入相同内容或没有匹配的sed不修改文件，之前的读取结果不会被取代。"""
+        manager = ToolManager()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "a.py")
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.write("x = 1\n")
+
+            def run(name: str, **arguments) -> ToolResultMessage:
+                tool_call = ToolCallMessage(name, {"filepath": file_path, **arguments})
+                message = asyncio.run(manager.process_tool_call(tool_call))
+                assert isinstance(message, ToolResultMessage)
+                return message
+
+            read = run("read_file")
+            writes = [
+                run("write_file", content="x = 1\n"),
+                run("append_file", content=""),
+                run("replace_file_content", old="x = 1", new="x = 1"),
+                run("modify_file_with_sed", expression="s/missing/y/"),
+            ]
+            for write in writes:
+                self.assertEqual(write.changed_files, [], write.tool_name)
+            self.assertEqual(mark_superseded_results([read, *writes]), 0)
+
+            edit = run("modify_file_with_sed", expression="s/x/y/")
+            self.assertEqual(edit.changed_files, [file_path])
+            self.assertEqual(mark_superseded_results([read, *writes, edit]), 1)
+
+    def test_failed_batch_edit_keeps_earlier_reads(self):
+        """批量修改没有修改任何文件时之前的读取结果不会被取代。"""
+        manager = ToolManager()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = [os.path.join(temp_dir, name) for name in ("a.py", "b.py")]
+            for path in paths:
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write("x = 1\n")
+
+            def run(tool_call: ToolCallMessage) -> ToolResultMessage:
+                message = asyncio.run(manager.process_tool_call(tool_call))
+                assert isinstance(message, ToolResultMessage)
+                return message
+
+            reads = [
+                run(ToolCallMessage("read_file", {"filepath": path})) for path in paths
+            ]
+            edits = [
+                {"filepath": paths[0], "old": "x = 1", "new": "x = 2"},
+                {"filepath": paths[1], "old": "missing", "new": "y"},
+            ]
+            failed = run(ToolCallMessage("batch_edit_files", {"edits": edits}))
+            self.assertIn("没有修改任何文件", failed.content)
+            self.assertEqual(failed.changed_files, [])
+            self.assertEqual(mark_superseded_results([*reads, failed]), 0)
+
+            edit = run(ToolCallMessage("batch_edit_files", {"edits": edits[:1]}))
+            self.assertEqual(edit.changed_files, [paths[0]])
+            messages = [*reads, failed, edit]
+            self.assertEqual(mark_superseded_results(messages), 1)
+            self.assertEqual(reads[0].superseded_by, 3)
+            self.assertIsNone(reads[1].superseded_by)
+
+    def test_failed_flag_survives_json(self):
+        """失败标记在序列化后保留。"""
+        message = ToolResultMessage(
+            "不存在", tool_name="read_file", tool_arguments={}, failed=True
+        )
+        self.assertTrue(ToolResultMessage.from_json(message.to_json()).failed)
+        message = ToolResultMessage(
+            "成功", tool_name="write_file", tool_arguments={}, changed_files=["/a.py"]
+        )
+        restored = ToolResultMessage.from_json(message.to_json())
+        self.assertEqual(restored.changed_files, ["/a.py"])
+        self.assertFalse(
+            ToolResultMessage.from_json(tool_result("x", "y").to_json()).failed
+        )
+
+
+class TestCompressMessagesLocally(unittest.TestCase):
+    """测试compress_messages_locally的各项规则。"""
+
+    def test_stale_file_reads_are_dropped(self):
+        """文件之后被再次读取或修改时，之前的读取结果被替换。"""
+        messages = [
+            SystemMessage("系统提示"),
+            tool_result("read_file", "旧内容1", filepath="a.py"),
+            ChatMessage("assistant", "读完了a.py"),
+            tool_result("read_file", "b的内容", filepath="b.py"),
+            ChatMessage("assistant", "读完了b.py"),
+            tool_result("read_file", "旧内容2", filepath="./a.py"),
+            ChatMessage("assistant", "修改a.py"),
+            tool_result("write_file", "写入成功", filepath="a.py", content="新内容"),
+        ]
+
+        compressed, stats = compress_messages_locally(messages, keep_recent=0)
+
+        self.assertEqual(stats["stale_results"], 2)
+        self.assertIsInstance(compressed[1], RuntimeMessage)
+        self.assertIn("已过期", compressed[1].message)
+        self.assertIs(compressed[3], messages[3])
+        self.assertIsInstance(compressed[5], RuntimeMessage)
+        self.assertIs(compressed[7], messages[7])
+
+    def test_failed_read_keeps_earlier_read(self):
+        """读取失败（文件不存在或过大）时之前的读取结果不会过期。"""
+        messages = [
+            SystemMessage("系统提示"),
+            tool_result("read_file", "a的内容", filepath="a.py"),
+            ToolResultMessage(
+                "文件路径'a.py'不存在",
+                tool_name="read_file",
+                tool_arguments={"filepath": "a.py"},
+                failed=True,
+            ),
+        ]
+
+        compressed, stats = compress_messages_locally(messages, keep_recent=0)
+
+        self.assertEqual(stats["stale_results"], 0)
+        self.assertIs(compressed[1], messages[1])
+        self.assertEqual(compressed[1].to_llm_message()["content"], "a的内容")
+
+    def test_old_tool_results_become_stubs(self):
+        """较早的较长工具结果替换为一行摘要，最近的消息保持不变。"""
+        long_output = "第一行输出\n" + "x" * 1000
+        messages = [
+            SystemMessage("系统提示"),
+            tool_result("execute_command", long_output, command="ls"),
+            ChatMessage("assistant", "继续"),
+            ToolErrorMessage("错误" * 300),
+            ChatMessage("assistant", "继续"),
+            tool_result("execute_command", long_output, command="ls -la"),
+        ]
+
+        compressed, stats = compress_messages_locally(
+            messages, keep_recent=1, stub_min_chars=400
+        )
+
+        self.assertEqual(stats["stubbed_results"], 2)
+        stub = compressed[1]
+        assert isinstance(stub, RuntimeMessage)
+        self.assertIn("execute_command(command='ls')", stub.message)
+        self.assertIn("第一行输出", stub.message)
+        self.assertNotIn("\n", stub.message)
+        self.assertIs(compressed[-1], messages[-1])
+        self.assertLess(stats["tokens_after"], stats["tokens_before"])
+
+    def test_runtime_runs_are_collapsed(self):
+        """连续的运行时消息合并为一条，重复的提醒只保留一次。"""
+        messages = [
+            SystemMessage("系统提示"),
+            RuntimeMessage("提醒：读取多个文件时建议使用廉价LLM以节省成本。"),
+            RuntimeMessage("你调用了工具'read_file'，结果如下"),
+            RuntimeMessage("提醒：读取多个文件时建议使用廉价LLM以节省成本。"),
+            DestroyedRuntimeMessage(),
+            ChatMessage("assistant", "好的"),
+            RuntimeMessage("单独的运行时消息"),
+        ]
+
+        compressed, stats = compress_messages_locally(messages, keep_recent=0)
+
+        self.assertEqual(len(compressed), 4)
+        self.assertEqual(stats["collapsed_runtime"], 3)
+        merged = compressed[1]
+        assert isinstance(merged, RuntimeMessage)
+        self.assertEqual(merged.message.count("提醒"), 1)
+        self.assertIn("另有1条已被截断的消息", merged.message)
+        self.assertIs(compressed[3], messages[6])
+
+    def test_system_prefix_and_recent_tail_are_protected(self):
+        """系统消息和最近的消息不会被修改，输入列表保持不变。"""
+        long_output = "y" * 1000
+        messages = [
+            tool_result("execute_command", long_output, command="ls"),
+            SystemMessage("系统提示"),
+            RuntimeMessage("a"),
+            RuntimeMessage("b"),
+        ]
+        original = list(messages)
+
+        compressed, stats = compress_messages_locally(messages, keep_recent=2)
+
+        self.assertEqual(compressed, original)
+        self.assertEqual(messages, original)
+        self.assertEqual(stats["tokens_after"], stats["tokens_before"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,205 @@
+"""测试历史会话索引模块。"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from linhai.history import HistoryStore
+from linhai.history_index import HistoryIndex, maintain_history
+
+
+def chat(role: str, message: str) -> dict:
+    """构造ChatMessage的历史字典。"""
+    return {"type": "ChatMessage", "role": role, "message": message, "name": None}
+
+
+def runtime(message: str) -> dict:
+    """构造RuntimeMessage的历史字典。"""
+    return {"type": "RuntimeMessage", "role": "user", "message": message}
+
+
+class TestHistoryIndex(unittest.TestCase):
+    """测试HistoryIndex的增量更新、搜索和列表。"""
+
+    def setUp(self):
+        self.index = HistoryIndex(Path(":memory:"))
+
+    def tearDown(self):
+        self.index.close()
+
+    def test_search_user_and_assistant_messages(self):
+        """只搜索用户和助手消息，支持中文子串。"""
+        self.index.update_session(
+            "s1",
+            [
+                chat("user", "人类有三大欲望：饮食、繁殖、睡眠"),
+                chat("assistant", "收到，李田所"),
+                runtime("人类有三大欲望的运行时消息"),
+            ],
+        )
+
+        results = self.index.search("三大欲望")
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["session_id"], "s1")
+        self.assertEqual(results[0]["role"], "user")
+        self.assertIn("三大欲望", results[0]["snippet"])
+
+    def test_search_short_terms_and_multiple_terms(self):
+        """短搜索词和多个搜索词都能正确匹配。"""
+        self.index.update_session("s1", [chat("user", "数字114514 和 饮食")])
+        self.index.update_session("s2", [chat("user", "只有饮食")])
+
+        self.assertEqual(len(self.index.search("饮食")), 2)
+        results = self.index.search("114514 饮食")
+        self.assertEqual([result["session_id"] for result in results], ["s1"])
+
+    def test_incremental_update(self):
+        """只重新索引变化的消息，被删除的消息不再出现在搜索结果中。"""
+        history = [chat("user", f"消息{i}号") for i in range(10)]
+        self.assertEqual(self.index.update_session("s1", history), 10)
+
+        history.append(chat("assistant", "新增的回答"))
+        self.assertEqual(self.index.update_session("s1", history), 1)
+
+        history[3:6] = [runtime("历史压缩已删除3条消息")]
+        self.assertEqual(self.index.update_session("s1", history), 6)
+        self.assertEqual(self.index.search("消息4号"), [])
+        self.assertEqual(len(self.index.search("消息8号")), 1)
+        self.assertEqual(self.index.search("新增的回答")[0]["position"], 8)
+
+    def test_previous_history_skips_unchanged_prefix(self):
+        """传入上次索引的历史时，只为之后的消息计算摘要。"""
+        history = [chat("user", f"消息{i}号") for i in range(10)]
+        self.index.update_session("s1", history)
+        previous = list(history)
+        history = history + [chat("assistant", "新增的回答")]
+
+        with patch(
+            "linhai.history_index.message_digest", return_value="digest"
+        ) as digest:
+            self.assertEqual(
+                self.index.update_session("s1", history, None, previous), 1
+            )
+        digest.assert_called_once_with(history[10])
+
+        changed = history[:4] + [chat("user", "改写的消息")] + history[5:]
+        self.assertEqual(self.index.update_session("s1", changed, None, history), 7)
+        self.assertEqual(self.index.search("消息4号"), [])
+        self.assertEqual(len(self.index.search("改写的消息")), 1)
+
+    def test_session_metadata(self):
+        """记录模型、token用量和使用的工具。"""
+        self.index.update_session(
+            "s1",
+            [chat("user", "你好")],
+            {
+                "start_time": "2025-01-01T00:00:00",
+                "end_time": "2025-01-01T01:00:00",
+                "model": "deepseek-chat",
+                "input_tokens": 100,
+                "output_tokens": 20,
+                "total_tokens": 120,
+                "tools_used": ["read_file", "list_files"],
+            },
+        )
+        self.index.update_session(
+            "s2",
+            [runtime("你调用了工具'read_file'，结果如下")],
+            {"end_time": "2025-01-02"},
+        )
+
+        record = self.index.get_session("s1")
+        assert record is not None
+        self.assertEqual(record["model"], "deepseek-chat")
+        self.assertEqual(record["total_tokens"], 120)
+        self.assertEqual(record["tools_used"], ["list_files", "read_file"])
+        self.assertEqual(record["message_count"], 1)
+
+        sessions = self.index.list_sessions()
+        self.assertEqual([record["session_id"] for record in sessions], ["s2", "s1"])
+        self.assertEqual(sessions[0]["tools_used"], ["read_file"])
+
+    def test_remove_and_prune(self):
+        """删除会话后索引和搜索结果同步更新。"""
+        self.index.update_session("s1", [chat("user", "需要删除的消息")])
+        self.index.update_session("s2", [chat("user", "需要保留的消息")])
+
+        self.assertEqual(self.index.prune(["s2"]), 1)
+
+        self.assertIsNone(self.index.get_session("s1"))
+        self.assertEqual(self.index.search("需要删除"), [])
+        self.assertEqual(len(self.index.search("需要保留")), 1)
+
+
+class TestHistoryIndexRebuild(unittest.TestCase):
+    """测试从历史目录重建索引。"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = HistoryStore(Path(self.temp_dir), compression="gzip")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_rebuild_indexes_open_and_closed_sessions(self):
+        """重建索引时同时处理运行中和已关闭的会话。"""
+        self.store.save_session("open", [chat("user", "运行中的会话")])
+        self.store.save_session("closed", [chat("user", "已关闭的会话")])
+        self.store.close_session("closed")
+
+        index = HistoryIndex.for_store(self.store)
+        try:
+            self.assertEqual(index.rebuild(self.store), 2)
+            self.assertEqual(index.rebuild(self.store), 0)
+            self.assertEqual(index.search("已关闭的会话")[0]["session_id"], "closed")
+        finally:
+            index.close()
+
+    def test_rebuild_restores_iso_start_time(self):
+        """重建索引时从会话ID恢复ISO格式的开始时间。"""
+        self.store.save_session("2024-05-01T12-30-45.123456", [chat("user", "你好")])
+        self.store.save_session("legacy", [chat("user", "旧会话")])
+
+        index = HistoryIndex.for_store(self.store)
+        try:
+            index.rebuild(self.store)
+            records = {record["session_id"]: record for record in index.list_sessions()}
+        finally:
+            index.close()
+        self.assertEqual(
+            records["2024-05-01T12-30-45.123456"]["start_time"], "2024-05-01T12:30:45"
+        )
+        self.assertEqual(records["legacy"]["start_time"], records["legacy"]["end_time"])
+
+    def test_maintain_history_prunes_index(self):
+        """维护时按保留策略删除的会话同时从索引中删除。"""
+        self.store.retention = {"max_sessions": 1}
+        for session_id in ("old", "new"):
+            self.store.save_session(
+                session_id, [chat("user", f"{session_id}会话的消息")]
+            )
+        index = HistoryIndex.for_store(self.store)
+        try:
+            index.rebuild(self.store)
+        finally:
+            index.close()
+        old_path = self.store.session_path("old")
+        os.utime(old_path, (0, 0))
+
+        report = maintain_history(self.store)
+
+        self.assertEqual(report["removed_sessions"], 1)
+        index = HistoryIndex.for_store(self.store)
+        try:
+            self.assertEqual(index.indexed_session_ids(), {"new"})
+            self.assertEqual(index.search("old会话"), [])
+        finally:
+            index.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""测试历史会话回放模块。"""
+
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from linhai.agent_base import RuntimeMessage, SummaryMessage, DestroyedRuntimeMessage
+from linhai.history import HistoryStore
+from linhai.history_replay import load_session_messages, message_from_dict
+from linhai.llm import ChatMessage, SystemMessage
+from linhai.tool.main import ToolResultMessage, ToolErrorMessage
+
+
+def to_dict(message) -> dict:
+    """与Agent保存历史时相同的序列化方式。"""
+    data = json.loads(message.to_json())
+    data["type"] = type(message).__name__
+    return data
+
+
+class TestHistoryReplay(unittest.TestCase):
+    """测试消息字典还原为消息对象。"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = HistoryStore(Path(self.temp_dir), compression="gzip")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_roundtrip_typed_messages(self):
+        """带type字段的消息还原后转换为相同的LLM消息。"""
+        messages = [
+            SystemMessage("系统提示"),
+            ChatMessage("user", "你好"),
+            RuntimeMessage("运行时消息"),
+            SummaryMessage(level=1, covered=10, summary="摘要"),
+            ToolResultMessage(
+                "x" * 10000,
+                blob_store=self.store.blobs,
+                tool_name="read_file",
+                tool_arguments={"filepath": "a.py"},
+            ),
+            ToolErrorMessage("错误"),
+            DestroyedRuntimeMessage(),
+        ]
+        self.store.save_session("s1", [to_dict(msg) for msg in messages])
+
+        restored = load_session_messages(self.store, "s1")
+
+        self.assertEqual(
+            [type(msg) for msg in restored], [type(msg) for msg in messages]
+        )
+        self.assertEqual(
+            [msg.to_llm_message() for msg in restored],
+            [msg.to_llm_message() for msg in messages],
+        )
+        self.assertEqual(restored[4].file_path, messages[4].file_path)
+
+    def test_legacy_messages_without_type(self):
+        """旧版历史没有type字段时根据字段推断类型。"""
+        cases = [
+            ({"role": "user", "message": "你好", "name": None}, ChatMessage),
+            ({"role": "user", "message": "运行时"}, RuntimeMessage),
+            ({"role": "system", "content": "系统"}, SystemMessage),
+            (
+                {"role": "user", "name": "tool-result", "content": "输出"},
+                ToolResultMessage,
+            ),
+            ({}, DestroyedRuntimeMessage),
+        ]
+        for data, expected in cases:
+            with self.subTest(data=data):
+                self.assertIsInstance(message_from_dict(data), expected)
+
+    def test_unknown_type(self):
+        """未知的消息类型抛出ValueError。"""
+        with self.assertRaises(ValueError):
+            message_from_dict({"type": "NoSuchMessage"})
+        with self.assertRaises(ValueError):
+            message_from_dict({"unexpected": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+"""测试历史摘要模块。"""
+
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+from linhai.agent_base import RuntimeMessage, SummaryMessage
+from linhai.history_summary import HistorySummarizer, local_summary
+from linhai.llm import ChatMessage
+from linhai.tool.main import ToolResultMessage
+
+
+class FakeAnswer:
+    """不产生token、直接返回固定消息的回答。"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        raise StopAsyncIteration
+
+    def get_message(self):
+        return ChatMessage("assistant", self.text)
+
+
+def make_agent(messages, cheap_model=None):
+    """构造只包含消息和配置的Agent替身。"""
+    config = {} if cheap_model is None else {"cheap_model": cheap_model}
+    return SimpleNamespace(messages=messages, config=config)
+
+
+def evicted_messages():
+    """构造被压缩删除的消息。"""
+    return [
+        ChatMessage("user", "请修复登录页面的bug\n详细描述"),
+        ChatMessage("assistant", "先读取login.py"),
+        RuntimeMessage("你调用了工具'read_file'，结果如下"),
+        ToolResultMessage(
+            "def login(): ...",
+            tool_name="read_file",
+            tool_arguments={"filepath": "/src/login.py"},
+        ),
+    ]
+
+
+class TestLocalSummary(unittest.TestCase):
+    """测试本地提取的摘要。"""
+
+    def test_extracts_user_requests_tools_and_files(self):
+        """本地摘要包含用户需求、工具和文件。"""
+        summary = local_summary(evicted_messages())
+
+        self.assertIn("- 请修复登录页面的bug", summary)
+        self.assertNotIn("详细描述", summary)
+        self.assertIn("read_file", summary)
+        self.assertIn("/src/login.py", summary)
+
+    def test_summary_message_json_roundtrip(self):
+        """SummaryMessage序列化后保持不变。"""
+        message = SummaryMessage(level=2, covered=30, summary="摘要内容")
+
+        restored = SummaryMessage.from_json(message.to_json())
+
+        self.assertEqual(restored.to_llm_message(), message.to_llm_message())
+        self.assertIn("level=2", restored.to_llm_message()["content"])
+
+
+class TestHistorySummarizer(unittest.IsolatedAsyncioTestCase):
+    """测试HistorySummarizer的后台摘要和逐级合并。"""
+
+    async def test_cheap_model_summary_is_generated_in_background(self):
+        """廉价LLM在后台生成摘要，完成前显示占位内容。"""
+        cheap_model = MagicMock()
+        cheap_model.answer_stream = AsyncMock(
+            return_value=FakeAnswer("## 用户需求\n修bug")
+        )
+        placeholder = SummaryMessage(level=1, covered=4)
+        agent = make_agent([placeholder], cheap_model)
+        summarizer = HistorySummarizer()
+
+        summarizer.schedule_evicted(agent, placeholder, evicted_messages())
+        self.assertIn("摘要正在生成", placeholder.to_llm_message()["content"])
+        await summarizer.wait()
+
+        self.assertEqual(placeholder.summary, "## 用户需求\n修bug")
+        prompt_input = cheap_model.answer_stream.call_args[0][0][1].message
+        self.assertIn("请修复登录页面的bug", prompt_input)
+
+    async def test_failed_cheap_model_falls_back_to_local_summary(self):
+        """廉价LLM出错时使用本地摘要。"""
+        cheap_model = MagicMock()
+        cheap_model.answer_stream = AsyncMock(side_effect=RuntimeError("timeout"))
+        placeholder = SummaryMessage(level=1, covered=4)
+        agent = make_agent([placeholder], cheap_model)
+        summarizer = HistorySummarizer()
+
+        summarizer.schedule_evicted(agent, placeholder, evicted_messages())
+        await summarizer.wait()
+
+        self.assertIn("/src/login.py", placeholder.summary)
+
+    async def test_summaries_are_merged_by_level(self):
+        """同级摘要超过fanout条时逐级合并，历史中的摘要数量有上限。"""
+        cheap_model = MagicMock()
+        cheap_model.answer_stream = AsyncMock(return_value=FakeAnswer("合并后的摘要"))
+        agent = make_agent([], cheap_model)
+        summarizer = HistorySummarizer(fanout=2)
+
+        for i in range(9):
+            placeholder = SummaryMessage(level=1, covered=10)
+            agent.messages.append(placeholder)
+            agent.messages.append(ChatMessage("assistant", f"回答{i}"))
+            summarizer.schedule_evicted(agent, placeholder, evicted_messages())
+            await summarizer.wait()
+
+        summaries = [msg for msg in agent.messages if isinstance(msg, SummaryMessage)]
+        levels = [msg.level for msg in summaries]
+        self.assertEqual(sum(msg.covered for msg in summaries), 90)
+        self.assertLessEqual(max(levels.count(level) for level in set(levels)), 2)
+        self.assertEqual(levels, sorted(levels, reverse=True))
+        self.assertEqual(len(agent.messages), len(summaries) + 9)
+
+    async def test_merge_is_dropped_when_summary_was_removed(self):
+        """合并期间有摘要被删除时放弃合并。"""
+        release = asyncio.Event()
+
+        async def slow_answer(history):
+            await release.wait()
+            return FakeAnswer("合并后的摘要")
+
+        cheap_model = MagicMock()
+        cheap_model.answer_stream = slow_answer
+        summaries = [
+            SummaryMessage(level=1, covered=5, summary=f"摘要{i}") for i in range(3)
+        ]
+        agent = make_agent(list(summaries), cheap_model)
+        summarizer = HistorySummarizer(fanout=2)
+
+        summarizer.schedule_merge(agent)
+        agent.messages.remove(summaries[0])
+        release.set()
+        await summarizer.wait()
+
+        self.assertEqual(agent.messages, summaries[1:])
+
+    async def test_merge_is_deferred_while_held(self):
+        """暂停期间完成的合并在暂停结束后才修改历史。"""
+        summaries = [
+            SummaryMessage(level=1, covered=5, summary=f"摘要{i}") for i in range(3)
+        ]
+        agent = make_agent(list(summaries))
+        summarizer = HistorySummarizer(fanout=2)
+
+        with summarizer.hold_merges():
+            summarizer.schedule_merge(agent)
+            self.assertEqual(agent.messages, summaries)
+
+        self.assertEqual(len(agent.messages), 2)
+        self.assertEqual(agent.messages[0].level, 2)
+        self.assertEqual(agent.messages[0].covered, 10)
+        self.assertIs(agent.messages[1], summaries[2])
+
+    async def test_without_cheap_model_summary_is_immediate(self):
+        """没有廉价LLM时立即生成本地摘要。"""
+        placeholder = SummaryMessage(level=1, covered=4)
+        agent = make_agent([placeholder])
+        summarizer = HistorySummarizer()
+
+        summarizer.schedule_evicted(agent, placeholder, evicted_messages())
+
+        self.assertEqual(summarizer.pending, set())
+        self.assertIn("请修复登录页面的bug", placeholder.summary)
+
+
+if __name__ == "__main__":
+    unittest.main()
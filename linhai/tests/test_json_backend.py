@@ -0,0 +1,100 @@
+"""测试JSON后端。"""
+
+import json
+import unittest
+
+from linhai import json_backend
+from linhai.benchmarks.json_backend import run_benchmark
+
+
+class TestJsonBackend(unittest.TestCase):
+    """在每个可用的后端上测试序列化和解析。"""
+
+    def setUp(self):
+        self.previous = json_backend.backend
+
+    def tearDown(self):
+        json_backend.set_backend(self.previous)
+
+    def each_backend(self):
+        """依次切换到每个可用的后端。"""
+        for name in json_backend.available_backends():
+            json_backend.set_backend(name)
+            yield name
+
+    def test_roundtrip(self):
+        """各种数据序列化后解析得到相同的结果，非ASCII字符不转义。"""
+        data = {
+            "message": '你好\n"world"',
+            "numbers": [1, -2, 3.5],
+            "nested": {"ok": True, "none": None},
+        }
+        for _ in self.each_backend():
+            text = json_backend.dumps(data)
+            self.assertIn("你好", text)
+            self.assertEqual(json_backend.loads(text), data)
+            self.assertEqual(json_backend.loads(json_backend.dumps_bytes(data)), data)
+
+    def test_formats(self):
+        """pretty与标准库indent=2相同，compact=False与标准库默认格式相同。"""
+        data = {"b": [1, 2], "a": {"c": "值"}}
+        for _ in self.each_backend():
+            self.assertEqual(
+                json_backend.dumps(data, pretty=True),
+                json.dumps(data, ensure_ascii=False, indent=2),
+            )
+            self.assertEqual(
+                json_backend.dumps(data, compact=False),
+                json.dumps(data, ensure_ascii=False),
+            )
+            self.assertEqual(
+                json_backend.dumps_bytes(data, sort_keys=True),
+                '{"a":{"c":"值"},"b":[1,2]}'.encode("utf-8"),
+            )
+
+    def test_unsupported_data_falls_back_to_stdlib(self):
+        """快速后端不支持的数据交给标准库处理。"""
+        for _ in self.each_backend():
+            self.assertEqual(json_backend.loads(json_backend.dumps(2**70)), 2**70)
+            self.assertEqual(
+                json_backend.loads(json_backend.dumps({1: "a"})), {"1": "a"}
+            )
+            surrogate = json_backend.dumps_bytes({"s": "\ud800"})
+            self.assertEqual(json_backend.loads(surrogate), {"s": "\ud800"})
+            nan = json_backend.loads("NaN")
+            self.assertNotEqual(nan, nan)
+
+    def test_invalid_json(self):
+        """解析失败时抛出标准库的JSONDecodeError。"""
+        for _ in self.each_backend():
+            with self.assertRaises(json_backend.JSONDecodeError):
+                json_backend.loads('{"a": 1,}')
+            with self.assertRaises(json.JSONDecodeError):
+                json_backend.loads(b"")
+
+    def test_unknown_backend(self):
+        """切换到不可用的后端时抛出ValueError。"""
+        with self.assertRaises(ValueError):
+            json_backend.set_backend("simdjson")
+        self.assertIn("json", json_backend.available_backends())
+
+
+class TestJsonBackendBenchmark(unittest.TestCase):
+    """测试JSON后端基准测试。"""
+
+    def test_report(self):
+        """报告包含每个后端各阶段的耗时，并恢复原来的后端。"""
+        previous = json_backend.backend
+
+        report = run_benchmark(50, ["json"])
+
+        json.dumps(report)
+        self.assertEqual(report["messages"], 50)
+        result = report["results"][0]
+        self.assertEqual(result["backend"], "json")
+        self.assertGreater(result["total_seconds"], 0)
+        self.assertEqual(json_backend.backend, previous)
+
+
+if __name__ == "__main__":
+    unittest.main()
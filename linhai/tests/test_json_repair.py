@@ -0,0 +1,211 @@
+"""测试工具调用JSON的修复。"""
+
+from pathlib import Path
+import json
+import tempfile
+import unittest
+
+from linhai.benchmarks.json_repair import run_benchmark
+from linhai.history import HistoryStore
+from linhai.json_repair import (
+    MAX_REPAIR_CHARS,
+    REPAIR_BARE_KEY,
+    REPAIR_CONTROL_CHAR,
+    REPAIR_EXTRA_BRACKET,
+    REPAIR_EXTRA_DATA,
+    REPAIR_INVALID_ESCAPE,
+    REPAIR_MISSING_BRACKET,
+    REPAIR_PYTHON_LITERAL,
+    REPAIR_SINGLE_QUOTE,
+    REPAIR_TRAILING_COMMA,
+    new_repair_stats,
+    record_repair,
+    repair_json,
+    repair_stats,
+)
+from linhai.markdown_parser import extract_tool_calls_with_errors
+
+
+class TestRepairJson(unittest.TestCase):
+    """测试repair_json。"""
+
+    def assertRepaired(self, text, expected, repair):
+        """检查修复结果和修复说明。"""
+        result = repair_json(text)
+        self.assertIsNotNone(result, text)
+        value, repairs = result
+        self.assertEqual(value, expected)
+        self.assertIn(repair, repairs)
+
+    def test_trailing_comma(self):
+        """删除对象和数组末尾的逗号。"""
+        self.assertRepaired(
+            '{"name": "a", "arguments": {"items": [1, 2,],},}',
+            {"name": "a", "arguments": {"items": [1, 2]}},
+            REPAIR_TRAILING_COMMA,
+        )
+
+    def test_control_char(self):
+        """转义字符串中的换行符和制表符。"""
+        self.assertRepaired(
+            '{"content": "line1\nline2\tend"}',
+            {"content": "line1\nline2\tend"},
+            REPAIR_CONTROL_CHAR,
+        )
+
+    def test_invalid_escape(self):
+        """无效的反斜杠按字面保留。"""
+        self.assertRepaired(
+            r'{"pattern": "\d+\.py", "quote": "\n"}',
+            {"pattern": r"\d+\.py", "quote": "\n"},
+            REPAIR_INVALID_ESCAPE,
+        )
+
+    def test_python_literals(self):
+        """Python的常量和单引号字符串。"""
+        self.assertRepaired(
+            "{'name': 'a', 'flag': True, 'other': None, 'text': 'say \"hi\" it\\'s'}",
+            {"name": "a", "flag": True, "other": None, "text": 'say "hi" it\'s'},
+            REPAIR_SINGLE_QUOTE,
+        )
+        self.assertRepaired("[True, False]", [True, False], REPAIR_PYTHON_LITERAL)
+
+    def test_bare_key(self):
+        """给没有引号的键加上引号，值中的单词不受影响。"""
+        self.assertRepaired(
+            '{name: "a", arguments: {flag: true}}',
+            {"name": "a", "arguments": {"flag": True}},
+            REPAIR_BARE_KEY,
+        )
+
+    def test_missing_bracket(self):
+        """补全末尾缺少的右括号。"""
+        self.assertRepaired(
+            '{"name": "a", "arguments": {"items": [1, 2]',
+            {"name": "a", "arguments": {"items": [1, 2]}},
+            REPAIR_MISSING_BRACKET,
+        )
+        self.assertRepaired(
+            '{"arguments": {"a": "b"]',
+            {"arguments": {"a": "b"}},
+            REPAIR_MISSING_BRACKET,
+        )
+
+    def test_extra_bracket_and_data(self):
+        """删除多余的右括号和JSON之后的内容。"""
+        self.assertRepaired('{"a": 1}}', {"a": 1}, REPAIR_EXTRA_DATA)
+        self.assertRepaired('[{"a": 1}}]', [{"a": 1}], REPAIR_EXTRA_BRACKET)
+
+    def test_truncated_value_rejected(self):
+        """最后一个值可能不完整时不修复。"""
+        for text in [
+            '{"name": "a", "arguments": {"line": 12',
+            '{"name": "a", "arguments": {"content": "trunc',
+            '{"name": "a", "arguments": {"flag": tr',
+            "[{",
+            '{"key": }',
+            '{"key": "value\\',
+        ]:
+            self.assertIsNone(repair_json(text), text)
+
+    def test_valid_or_unrepairable(self):
+        """没有可修复的错误时返回None。"""
+        self.assertIsNone(repair_json('{"a": 1 2}'))
+        self.assertIsNone(repair_json(""))
+        self.assertIsNone(repair_json("[" + " " * MAX_REPAIR_CHARS + "1,]"))
+
+    def test_record_repair(self):
+        """统计修复成功、失败和每种修复的次数。"""
+        stats = new_repair_stats()
+        record_repair(stats, [REPAIR_TRAILING_COMMA])
+        record_repair(stats, [REPAIR_TRAILING_COMMA, REPAIR_BARE_KEY])
+        record_repair(stats, None)
+
+        self.assertEqual(stats["attempts"], 3)
+        self.assertEqual(stats["repaired"], 2)
+        self.assertEqual(stats["failed"], 1)
+        self.assertEqual(
+            stats["repairs"], {REPAIR_TRAILING_COMMA: 2, REPAIR_BARE_KEY: 1}
+        )
+
+
+class TestToolCallRepair(unittest.TestCase):
+    """测试工具调用提取时的修复。"""
+
+    def test_repaired_tool_call(self):
+        """修复后的工具调用被执行，同时告诉LLM进行了修复。"""
+        attempts = repair_stats["attempts"]
+        repaired = repair_stats["repaired"]
+        text = (
+            "```json toolcall\n"
+            '{"name": "read_file", "arguments": {"filepath": "a.py",},}\n'
+            "```\n"
+            "```json toolcall\n"
+            '{"name": "read_file", "arguments": {"filepath": "b.py"}}\n'
+            "```\n"
+        )
+
+        tool_calls, errors = extract_tool_calls_with_errors(text)
+
+        self.assertEqual(
+            [call["arguments"]["filepath"] for call in tool_calls], ["a.py", "b.py"]
+        )
+        self.assertEqual(len(errors), 1)
+        self.assertIn("第1工具调用", errors[0])
+        self.assertIn(REPAIR_TRAILING_COMMA, errors[0])
+        self.assertEqual(repair_stats["attempts"], attempts + 1)
+        self.assertEqual(repair_stats["repaired"], repaired + 1)
+
+    def test_unrepairable_tool_call(self):
+        """无法修复时仍然报告解析错误。"""
+        failed = repair_stats["failed"]
+
+        tool_calls, errors = extract_tool_calls_with_errors(
+            '```json toolcall\n{"name": "write_file", "arguments": {"content": "a\n```\n'
+        )
+
+        self.assertEqual(tool_calls, [])
+        self.assertIn("解析JSON出错", errors[0])
+        self.assertEqual(repair_stats["failed"], failed + 1)
+
+
+class TestJsonRepairBenchmark(unittest.TestCase):
+    """测试修复效果统计。"""
+
+    def test_report(self):
+        """统计历史中能修复的工具调用和节省的轮数。"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = HistoryStore(Path(temp_dir))
+            block = "```json toolcall\n{}\n```\n"
+            store.save_session(
+                "session",
+                [
+                    {"role": "user", "message": block.format("{'a': 1}")},
+                    {"role": "assistant", "message": "没有工具调用"},
+                    {
+                        "role": "assistant",
+                        "message": block.format('{"name": "a"}')
+                        + block.format('{"name": "a",}'),
+                    },
+                    {
+                        "role": "assistant",
+                        "message": block.format('{"name": "a",}')
+                        + block.format('{"name": "unfinished'),
+                    },
+                ],
+            )
+
+            report = run_benchmark(store)
+
+        json.dumps(report)
+        self.assertEqual(report["sessions"], 1)
+        self.assertEqual(report["answers"], 2)
+        self.assertEqual(report["blocks"], 4)
+        self.assertEqual(report["parse_failures"], 3)
+        self.assertEqual(report["stats"]["repaired"], 2)
+        self.assertEqual(report["answers_with_failures"], 2)
+        self.assertEqual(report["turns_saved"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,49 @@
 """Test markdown_parser module."""
 
+import random
 import unittest
-from linhai.markdown_parser import extract_tool_calls, extract_tool_calls_with_errors
+import unittest.mock
+
+import mistune
+
+from linhai.markdown_parser import (
+    CodeBlockRenderer,
+    ToolCallScanner,
+    extract_code_blocks,
+    extract_json_blocks,
+    extract_tool_calls,
+    extract_tool_calls_with_errors,
+)
+
+# 围栏的各种边界情况，增量扫描器的结果应与mistune一致
+FENCE_CASES = [
+    'a\n```json toolcall\n{"name": "x", "arguments": {}}\n```\nb',
+    'text\n```json toolcall\n{"name": "x", "arguments": {}}\n```',
+    '```json toolcall\n{"name": "x", "arguments": {}}',
+    '  ```json toolcall\n    {"name": "x",\n  "arguments": {}}\n  ```\n',
+    '````markdown\n```json toolcall\n{"name": "x", "arguments": {}}\n```\n````\n',
+    '```json toolcall\n{"name": "x", "arguments": {"s": "```"}}\n```\n',
+    '```json toolcall\n{"a": "``` nope"}\n````  \n```json toolcall\nbad\n```',
+    '~~~json toolcall\n```\n{"name": "x", "arguments": {}}\n~~~\n',
+    "```json `toolcall`\n{}\n```\n",
+    "    ```json toolcall\n    {}\n    ```\n",
+    '```json\\ toolcall\n{"name": "x", "arguments": {}}\n```\n',
+    '```JSON TOOLCALL\r\n{"name": "x", "arguments": {}}\r\n```\r\n',
+    'para\n~~~~\n```json toolcall\n~~~\n~~~~~\n```json toolcall\n{"name": "y", "arguments": {}}\n```',
+    '```json toolcall  \n{"name": "x", "arguments": {}}\n   ```\n```json toolcall\n{}\n    ```\n```\n',
+    "```\n```\n```json toolcall\n\n```",
+]
+
+
+def mistune_tool_call_blocks(markdown_text):
+    """用mistune提取json toolcall代码块的内容。"""
+    renderer = CodeBlockRenderer()
+    mistune.create_markdown(renderer=renderer)(markdown_text)
+    return [
+        block["content"]
+        for block in renderer.code_blocks
+        if block["language"].lower() == "json toolcall"
+    ]
 
 
 class TestMarkdownParser(unittest.TestCase):
@@ -35,5 +77,114 @@ invalid json
         self.assertIn("解析JSON出错", errors[0])
 
 
+class TestExtractCodeBlocks(unittest.TestCase):
+    """Test cases for the block-level code block extraction."""
+
+    def test_matches_html_renderer(self):
+        """结果与渲染HTML的CodeBlockRenderer一致，包括列表、引用和缩进代码块。"""
+        cases = FENCE_CASES + [
+            "- item\n  ```json toolcall\n  {}\n  ```\n",
+            '> ```json\n> {"a": 1}\n> ```\n',
+            "1. ```json toolcall\n   {}\n   ```",
+            "    indented\n\n```py\nx\n```",
+            "<div>\n```json\n{}\n```\n</div>\n",
+            "    indented only\n",
+        ]
+        for markdown_text in cases:
+            renderer = CodeBlockRenderer()
+            mistune.create_markdown(renderer=renderer)(markdown_text)
+            self.assertEqual(
+                extract_code_blocks(markdown_text), renderer.code_blocks, markdown_text
+            )
+
+    def test_text_without_fence_skips_parsing(self):
+        """没有围栏的文本不调用mistune。"""
+        with unittest.mock.patch(
+            "linhai.markdown_parser.extract_code_blocks"
+        ) as extract:
+            self.assertEqual(extract_tool_calls_with_errors("纯文本 `code`"), ([], []))
+            self.assertEqual(extract_json_blocks("    indented {}\n"), [])
+        extract.assert_not_called()
+
+    def test_extract_json_blocks(self):
+        """只返回能解析的json代码块。"""
+        markdown_text = '```json\n{"a": 1}\n```\n```json\nbad\n```\n~~~json\n[1]\n~~~\n'
+
+        self.assertEqual(extract_json_blocks(markdown_text), [{"a": 1}, [1]])
+
+
+class TestToolCallScanner(unittest.TestCase):
+    """Test cases for the incremental fence scanner."""
+
+    def scan_in_chunks(self, markdown_text, rng):
+        """把文本随机切成小段依次交给扫描器。"""
+        scanner = ToolCallScanner()
+        events = []
+        i = 0
+        while i < len(markdown_text):
+            size = rng.randint(1, 7)
+            events.extend(scanner.feed(markdown_text[i : i + size]))
+            i += size
+        events.extend(scanner.finish())
+        self.assertEqual(events, scanner.events)
+        return events
+
+    def test_matches_mistune(self):
+        """任意切分方式下提取的代码块都与mistune一致。"""
+        rng = random.Random(0)
+        for markdown_text in FENCE_CASES:
+            expected = mistune_tool_call_blocks(markdown_text)
+            for _ in range(20):
+                events = self.scan_in_chunks(markdown_text, rng)
+                self.assertEqual(
+                    [event["content"] for event in events], expected, markdown_text
+                )
+
+    def test_event_emitted_when_fence_closes(self):
+        """结束围栏所在行完成时立即产生事件。"""
+        scanner = ToolCallScanner()
+        text = 'call\n```json toolcall\n{"name": "t", "arguments": {"a": 1}}\n```'
+
+        self.assertEqual(scanner.feed(text), [])
+        self.assertEqual(scanner.tool_call_count, 1)
+        self.assertTrue(scanner.in_code_block)
+        events = scanner.feed("\nmore text")
+
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]["tool_call"], {"name": "t", "arguments": {"a": 1}})
+        self.assertIsNone(events[0]["error"])
+        self.assertEqual(events[0]["start"], len("call\n"))
+        self.assertEqual(events[0]["end"], len(text) + 1)
+        self.assertFalse(scanner.in_code_block)
+
+    def test_errors_match_extract_tool_calls_with_errors(self):
+        """错误消息与extract_tool_calls_with_errors相同。"""
+        markdown_text = (
+            '```json toolcall\n{"name": "t", "arguments": {}}\n```\n'
+            "```json toolcall\ninvalid json\n```\n"
+            '```json toolcall\n{"other": 1}\n```\n'
+        )
+        _, expected_errors = extract_tool_calls_with_errors(markdown_text)
+
+        scanner = ToolCallScanner()
+        scanner.feed(markdown_text)
+        scanner.finish()
+
+        errors = [event["error"] for event in scanner.events if event["error"]]
+        self.assertEqual(errors, expected_errors)
+
+    def test_sync_only_scans_new_text(self):
+        """sync接收累积文本时只处理新增部分。"""
+        scanner = ToolCallScanner()
+        text = '```json toolcall\n{"name": "t", "arguments": {}}\n```\n'
+
+        scanner.sync(text[:20])
+        scanner.sync(text)
+        scanner.sync(text)
+
+        self.assertEqual(scanner.tool_call_count, 1)
+        self.assertEqual(len(scanner.events), 1)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,93 @@
+"""测试历史消息摘要索引模块。"""
+
+import unittest
+from unittest.mock import patch
+
+from linhai.agent_base import RuntimeMessage
+from linhai.llm import ChatMessage, SystemMessage
+from linhai.message_summary import MessageSummaryIndex
+from linhai.tool.main import ToolResultMessage
+
+
+class TestMessageSummaryIndex(unittest.TestCase):
+    """测试MessageSummaryIndex的缓存和窗口摘要。"""
+
+    def setUp(self):
+        self.index = MessageSummaryIndex()
+
+    def test_full_summary_format(self):
+        """消息较少时逐条输出，格式与原来的压缩提示一致。"""
+        messages = [SystemMessage("系统提示"), ChatMessage("user", "你好")]
+
+        summary = self.index.summarize(messages)
+
+        self.assertEqual(
+            summary,
+            "- id: 0 role: 'system' content: '系统提示'\n"
+            "- id: 1 role: 'user' content: '<user>你好</user>'",
+        )
+
+    def test_digest_is_cached_across_splices(self):
+        """删除或插入消息后，已有消息的摘要不会重新计算。"""
+        messages = [RuntimeMessage(f"消息{i}") for i in range(20)]
+        self.index.summarize(messages)
+
+        del messages[5:10]
+        messages.insert(5, RuntimeMessage("历史压缩已删除5条消息"))
+        with patch.object(
+            RuntimeMessage,
+            "to_llm_message",
+            autospec=True,
+            side_effect=lambda msg: {"role": "user", "content": msg.message},
+        ) as to_llm_message:
+            summary = self.index.summarize(messages)
+
+        self.assertEqual(to_llm_message.call_count, 1)
+        self.assertIn(
+            "- id: 6 role: 'user' content: '<runtime>消息10</runtime>'", summary
+        )
+
+    def test_digest_follows_supersession_and_invalidate(self):
+        """工具结果被取代或手动失效后重新生成摘要。"""
+        result = ToolResultMessage(
+            "旧内容", tool_name="read_file", tool_arguments={"filepath": "a.py"}
+        )
+        self.assertIn("旧内容", self.index.digest(result))
+
+        result.superseded_by = 3
+        self.assertIn("已被第3条消息取代", self.index.digest(result))
+
+        chat = ChatMessage("assistant", "旧回答")
+        self.index.digest(chat)
+        chat.message = "新回答"
+        self.index.invalidate(chat)
+        self.assertIn("新回答", self.index.digest(chat))
+
+    def test_windowed_summary_size_is_bounded(self):
+        """长历史的摘要只包含窗口内的消息和有限的汇总行。"""
+        for count in (1000, 5000):
+            messages = [SystemMessage("系统提示")] + [
+                RuntimeMessage(f"消息{i}") for i in range(count)
+            ]
+
+            lines = self.index.summarize(messages, max_lines=100).split("\n")
+
+            self.assertLessEqual(len(lines), 100 + 1 + 10)
+            self.assertEqual(lines[0], "- id: 0-0 系统消息和全局记忆，不能压缩")
+            self.assertTrue(lines[1].startswith("- id: 1 "))
+            self.assertTrue(lines[-1].startswith(f"- id: {count} "))
+            self.assertTrue(any("RuntimeMessage×" in line for line in lines))
+
+    def test_released_messages_leave_cache(self):
+        """消息对象被释放后缓存中的摘要也被删除。"""
+        messages = [RuntimeMessage("临时消息")]
+        self.index.summarize(messages)
+        self.assertEqual(len(self.index), 1)
+
+        messages.clear()
+
+        self.assertEqual(len(self.index), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
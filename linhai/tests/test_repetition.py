@@ -0,0 +1,103 @@
+"""测试生成时的重复检测。"""
+
+import unittest
+
+from linhai.benchmarks.markdown_parser import synthetic_response
+from linhai.repetition import RepetitionDetector
+
+PARAGRAPH = (
+    "我需要先检查这个函数的实现，确认参数是否正确，然后修改配置文件并运行测试。\n"
+)
+
+
+def feed_chunks(detector, text, size=3):
+    """分段输入文本，返回第一次检测到重复时的位置和结果。"""
+    for position in range(0, len(text), size):
+        match = detector.feed(text[position : position + size])
+        if match is not None:
+            return position + size, match
+    return None
+
+
+class TestRepetitionDetector(unittest.TestCase):
+    """测试RepetitionDetector。"""
+
+    def test_repeated_paragraph(self):
+        """反复输出同一段话时检测到重复，周期为段落长度。"""
+        detector = RepetitionDetector()
+        text = "开始分析。\n" + PARAGRAPH * 40
+
+        result = feed_chunks(detector, text)
+
+        self.assertIsNotNone(result)
+        position, match = result
+        self.assertEqual(match["period_chars"], len(PARAGRAPH))
+        self.assertGreaterEqual(match["repeated_chars"], 800)
+        self.assertGreaterEqual(match["repeats"], 4)
+        # 重复达到阈值后很快就被发现
+        self.assertLess(position, len("开始分析。\n") + len(PARAGRAPH) + 800 + 10)
+
+    def test_min_repeats(self):
+        """长段落需要重复足够的次数。"""
+        paragraph = "".join(f"第{i}步：检查模块{i}的实现。\n" for i in range(60))
+        detector = RepetitionDetector(min_repeats=3)
+
+        self.assertIsNone(feed_chunks(detector, paragraph * 2))
+        self.assertIsNotNone(feed_chunks(detector, paragraph))
+
+    def test_normal_text(self):
+        """正常的回答和任务列表不被当作重复。"""
+        for seed in range(3):
+            detector = RepetitionDetector()
+            self.assertIsNone(feed_chunks(detector, synthetic_response(50000, seed)))
+
+        checklist = "".join(
+            f"- [x] 修改文件src/module_{i}.py中的函数\n" for i in range(200)
+        )
+        self.assertIsNone(feed_chunks(RepetitionDetector(), checklist))
+
+    def test_interrupted_repetition(self):
+        """重复被其他内容打断时重新计算。"""
+        text = "".join(PARAGRAPH * 3 + f"其他内容{i}。" * 5 + "\n" for i in range(20))
+        self.assertIsNone(feed_chunks(RepetitionDetector(), text))
+
+    def test_max_period(self):
+        """超过最大周期的重复不检测。"""
+        paragraph = "".join(f"第{i}行内容。\n" for i in range(100))
+        detector = RepetitionDetector(max_period_chars=len(paragraph) - 1)
+
+        self.assertIsNone(feed_chunks(detector, paragraph * 5))
+
+    def test_min_period(self):
+        """短于最小周期的重复（如一长串相同的字符）不检测。"""
+        self.assertIsNone(feed_chunks(RepetitionDetector(), "数据：" + "0" * 850))
+        self.assertIsNone(feed_chunks(RepetitionDetector(), "ab" * 2000))
+
+        detector = RepetitionDetector(min_period_chars=1)
+        _, match = feed_chunks(detector, "数据：" + "0" * 850)
+        self.assertEqual(match["period_chars"], 1)
+
+    def test_chunk_size_independent(self):
+        """检测结果与文本的切分方式无关。"""
+        text = "前言。\n" + PARAGRAPH * 30
+        positions = set()
+        for size in (1, 7, len(text)):
+            result = feed_chunks(RepetitionDetector(), text, size)
+            self.assertIsNotNone(result)
+            positions.add(result[1]["period_chars"])
+        self.assertEqual(positions, {len(PARAGRAPH)})
+
+    def test_from_config(self):
+        """从配置创建检测器，非法的窗口长度报错。"""
+        detector = RepetitionDetector.from_config({"min_repeats": 2, "window_chars": 8})
+
+        self.assertEqual(detector.min_repeats, 2)
+        self.assertEqual(detector.window_chars, 8)
+        self.assertEqual(detector.min_period_chars, 8)
+        self.assertEqual(detector.min_repeated_chars, 800)
+        with self.assertRaises(ValueError):
+            RepetitionDetector.from_config({"window_chars": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
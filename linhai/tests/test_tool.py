@@ -1,5 +1,8 @@
 """Unit tests for the tool module."""
 
+from pathlib import Path
+import shutil
+import tempfile
 import unittest
 import unittest.mock
 
@@ -221,21 +224,19 @@ class TestInsertAtLineTool(unittest.TestCase):
             },
             "required": ["filepath", "line_number", "content"],
         }
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_file = Path(self.temp_dir) / "test.txt"
+        self.test_file.write_text("line1\nline2\nline3", encoding="utf-8")
 
-    @unittest.mock.patch("linhai.tool.tools.file.Path")
-    def test_insert_at_line_success(self, mock_path):
-        """测试成功插入内容到指定行"""
-        # 模拟文件存在且是文件
-        mock_file = mock_path.return_value
-        mock_file.exists.return_value = True
-        mock_file.is_file.return_value = True
-        mock_file.read_text.return_value = "line1\nline2\nline3"
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
 
-        # 调用工具
+    def test_insert_at_line_success(self):
+        """测试成功插入内容到指定行"""
         result = call_tool(
             "insert_at_line",
             {
-                "filepath": "test.txt",
+                "filepath": str(self.test_file),
                 "line_number": 2,
                 "content": "inserted line",
                 "expected_line_content": "line2",
@@ -243,24 +244,19 @@ class TestInsertAtLineTool(unittest.TestCase):
         )
 
         # 验证写入的内容
-        mock_file.write_text.assert_called_once_with(
-            "line1\ninserted line\nline2\nline3", encoding="utf-8"
+        self.assertEqual(
+            self.test_file.read_text(encoding="utf-8"),
+            "line1\ninserted line\nline2\nline3",
         )
         self.assertIn("成功在文件", result)
 
-    @unittest.mock.patch("linhai.tool.tools.file.Path")
-    def test_insert_at_line_invalid_line_number(self, mock_path):
+    def test_insert_at_line_invalid_line_number(self):
         """测试无效行号的情况"""
-        mock_file = mock_path.return_value
-        mock_file.exists.return_value = True
-        mock_file.is_file.return_value = True
-        mock_file.read_text.return_value = "line1\nline2\nline3"
-
         # 行号太小
         result = call_tool(
             "insert_at_line",
             {
-                "filepath": "test.txt",
+                "filepath": str(self.test_file),
                 "line_number": 0,
                 "content": "inserted line",
                 "expected_line_content": "dummy",
@@ -272,7 +268,7 @@ class TestInsertAtLineTool(unittest.TestCase):
         result = call_tool(
             "insert_at_line",
             {
-                "filepath": "test.txt",
+                "filepath": str(self.test_file),
                 "line_number": 5,
                 "content": "inserted line",
                 "expected_line_content": "dummy",
@@ -280,16 +276,12 @@ class TestInsertAtLineTool(unittest.TestCase):
         )
         self.assertIn("行号5无效", result)
 
-    @unittest.mock.patch("linhai.tool.tools.file.Path")
-    def test_insert_at_line_file_not_exists(self, mock_path):
+    def test_insert_at_line_file_not_exists(self):
         """测试文件不存在的情况"""
-        mock_file = mock_path.return_value
-        mock_file.exists.return_value = False
-
         result = call_tool(
             "insert_at_line",
             {
-                "filepath": "nonexistent.txt",
+                "filepath": str(Path(self.temp_dir) / "nonexistent.txt"),
                 "line_number": 1,
                 "content": "inserted line",
                 "expected_line_content": "dummy",
@@ -298,17 +290,12 @@ class TestInsertAtLineTool(unittest.TestCase):
         self.assertIn("文件路径", result)
         self.assertIn("不存在", result)
 
-    @unittest.mock.patch("linhai.tool.tools.file.Path")
-    def test_insert_at_line_not_file(self, mock_path):
+    def test_insert_at_line_not_file(self):
         """测试路径不是文件的情况"""
-        mock_file = mock_path.return_value
-        mock_file.exists.return_value = True
-        mock_file.is_file.return_value = False
-
         result = call_tool(
             "insert_at_line",
             {
-                "filepath": "directory/",
+                "filepath": self.temp_dir,
                 "line_number": 1,
                 "content": "inserted line",
                 "expected_line_content": "dummy",
@@ -316,40 +303,29 @@ class TestInsertAtLineTool(unittest.TestCase):
         )
         self.assertIn("不是文件", result)
 
-    @unittest.mock.patch("linhai.tool.tools.file.Path")
-    def test_insert_at_line_line_content_match(self, mock_path):
+    def test_insert_at_line_line_content_match(self):
         """测试预期行内容匹配时成功插入"""
-        mock_file = mock_path.return_value
-        mock_file.exists.return_value = True
-        mock_file.is_file.return_value = True
-        mock_file.read_text.return_value = "line1\nline2\nline3"
-
         result = call_tool(
             "insert_at_line",
             {
-                "filepath": "test.txt",
+                "filepath": str(self.test_file),
                 "line_number": 2,
                 "content": "inserted line",
                 "expected_line_content": "line2",
             },
         )
-        mock_file.write_text.assert_called_once_with(
-            "line1\ninserted line\nline2\nline3", encoding="utf-8"
+        self.assertEqual(
+            self.test_file.read_text(encoding="utf-8"),
+            "line1\ninserted line\nline2\nline3",
         )
         self.assertIn("成功在文件", result)
 
-    @unittest.mock.patch("linhai.tool.tools.file.Path")
-    def test_insert_at_line_line_content_mismatch(self, mock_path):
+    def test_insert_at_line_line_content_mismatch(self):
         """测试预期行内容不匹配时失败"""
-        mock_file = mock_path.return_value
-        mock_file.exists.return_value = True
-        mock_file.is_file.return_value = True
-        mock_file.read_text.return_value = "line1\nline2\nline3"
-
         result = call_tool(
             "insert_at_line",
             {
-                "filepath": "test.txt",
+                "filepath": str(self.test_file),
                 "line_number": 2,
                 "content": "inserted line",
                 "expected_line_content": "wrong_line",
@@ -358,45 +334,43 @@ class TestInsertAtLineTool(unittest.TestCase):
         self.assertIn("预期行内容不匹配", result)
         self.assertIn("实际内容为'line2'", result)
         self.assertIn("预期为'wrong_line'", result)
-        mock_file.write_text.assert_not_called()
+        self.assertEqual(
+            self.test_file.read_text(encoding="utf-8"), "line1\nline2\nline3"
+        )
 
-    @unittest.mock.patch("linhai.tool.tools.file.Path")
-    def test_insert_at_line_end_of_file(self, mock_path):
+    def test_insert_at_line_end_of_file(self):
         """测试在文件末尾插入时预期内容为空的情况"""
-        mock_file = mock_path.return_value
-        mock_file.exists.return_value = True
-        mock_file.is_file.return_value = True
-        mock_file.read_text.return_value = "line1\nline2\nline3"
-
-        # 有效情况：预期内容为空
+        # 无效情况：预期内容不为空
         result = call_tool(
             "insert_at_line",
             {
-                "filepath": "test.txt",
+                "filepath": str(self.test_file),
                 "line_number": 4,
                 "content": "inserted line",
-                "expected_line_content": "",
+                "expected_line_content": "not_empty",
             },
         )
-        mock_file.write_text.assert_called_once_with(
-            "line1\nline2\nline3\ninserted line\n", encoding="utf-8"
+        self.assertIn("预期行内容不匹配", result)
+        self.assertIn("文件末尾应无内容", result)
+        self.assertEqual(
+            self.test_file.read_text(encoding="utf-8"), "line1\nline2\nline3"
         )
-        self.assertIn("成功在文件", result)
 
-        # 无效情况：预期内容不为空
-        mock_file.write_text.reset_mock()
+        # 有效情况：预期内容为空
         result = call_tool(
             "insert_at_line",
             {
-                "filepath": "test.txt",
+                "filepath": str(self.test_file),
                 "line_number": 4,
                 "content": "inserted line",
-                "expected_line_content": "not_empty",
+                "expected_line_content": "",
             },
         )
-        self.assertIn("预期行内容不匹配", result)
-        self.assertIn("文件末尾应无内容", result)
-        mock_file.write_text.assert_not_called()
+        self.assertEqual(
+            self.test_file.read_text(encoding="utf-8"),
+            "line1\nline2\nline3\ninserted line\n",
+        )
+        self.assertIn("成功在文件", result)
 
 
 class TestFileValidation(unittest.TestCase):
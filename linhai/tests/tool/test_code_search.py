@@ -0,0 +1,272 @@
+"""Unit tests for code search."""
+
+from pathlib import Path
+from unittest import mock
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from linhai.tool import code_search
+from linhai.tool.code_search import (
+    compile_pattern,
+    is_ignored,
+    iter_files,
+    parse_gitignore,
+    search_code,
+    search_file,
+)
+from linhai.tool.tools.search import search_code as search_code_tool
+
+
+class TestGitignore(unittest.TestCase):
+    """Test cases for .gitignore parsing."""
+
+    def ignored(self, text: str, path: str, is_dir: bool = False) -> bool:
+        rules = parse_gitignore("/repo", text)
+        return is_ignored(rules, "/repo/" + path, is_dir)
+
+    def test_unanchored_pattern_matches_any_level(self):
+        """测试不包含/的规则匹配任意层级"""
+        self.assertTrue(self.ignored("*.log\n", "a.log"))
+        self.assertTrue(self.ignored("*.log\n", "src/deep/a.log"))
+        self.assertFalse(self.ignored("*.log\n", "a.log.txt"))
+
+    def test_anchored_pattern(self):
+        """测试以/开头或包含/的规则只匹配相对于.gitignore的路径"""
+        self.assertTrue(self.ignored("/build\n", "build", is_dir=True))
+        self.assertFalse(self.ignored("/build\n", "src/build", is_dir=True))
+        self.assertTrue(self.ignored("docs/*.md\n", "docs/a.md"))
+        self.assertFalse(self.ignored("docs/*.md\n", "src/docs/a.md"))
+
+    def test_double_star(self):
+        """测试**匹配任意层级的目录"""
+        self.assertTrue(self.ignored("src/**/gen.py\n", "src/gen.py"))
+        self.assertTrue(self.ignored("src/**/gen.py\n", "src/a/b/gen.py"))
+
+    def test_dir_only_and_negation(self):
+        """测试以/结尾的规则只匹配目录，以!开头的规则重新包含路径"""
+        self.assertTrue(self.ignored("cache/\n", "cache", is_dir=True))
+        self.assertFalse(self.ignored("cache/\n", "cache"))
+        self.assertFalse(self.ignored("*.log\n!keep.log\n", "keep.log"))
+        self.assertTrue(self.ignored("*.log\n!keep.log\n", "other.log"))
+
+    def test_comments_and_character_class(self):
+        """测试注释和字符类"""
+        self.assertFalse(self.ignored("# a.txt\n", "a.txt"))
+        self.assertTrue(self.ignored("[ab].txt\n", "b.txt"))
+        self.assertFalse(self.ignored("[!ab].txt\n", "a.txt"))
+
+
+class TestCodeSearch(unittest.TestCase):
+    """Test cases for search_code."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        (self.root / ".git").mkdir()
+        self.cwd = os.getcwd()
+        os.chdir(self.root)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    def write(self, name: str, content: str | bytes) -> Path:
+        path = self.root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(content, bytes):
+            path.write_bytes(content)
+        else:
+            path.write_text(content, encoding="utf-8")
+        return path
+
+    def search(self, pattern: str, **kwargs):
+        return search_code(compile_pattern(pattern), str(self.root), **kwargs)
+
+    def test_walk_respects_gitignore(self):
+        """测试遍历跳过.git目录和各级.gitignore忽略的文件"""
+        self.write(".gitignore", "*.log\nbuild/\n")
+        self.write("a.py", "")
+        self.write("debug.log", "")
+        self.write("build/out.py", "")
+        self.write(".git/config", "")
+        self.write("src/.gitignore", "gen_*.py\n!gen_keep.py\n")
+        self.write("src/gen_x.py", "")
+        self.write("src/gen_keep.py", "")
+        self.write("src/main.py", "")
+
+        files = [
+            os.path.relpath(path, self.root) for path in iter_files(str(self.root))
+        ]
+        self.assertEqual(
+            files,
+            [
+                ".gitignore",
+                "a.py",
+                os.path.join("src", ".gitignore"),
+                os.path.join("src", "gen_keep.py"),
+                os.path.join("src", "main.py"),
+            ],
+        )
+
+    def test_parent_gitignore_applies_to_subdirectory(self):
+        """测试从子目录开始搜索时仓库根目录的.gitignore仍然生效"""
+        self.write(".gitignore", "*.tmp\n")
+        self.write("src/a.tmp", "needle\n")
+        self.write("src/a.py", "needle\n")
+
+        result = search_code(compile_pattern("needle"), str(self.root / "src"))
+        self.assertEqual(
+            [f["path"] for f in result["files"]], [os.path.join("src", "a.py")]
+        )
+
+    def test_line_numbers_and_glob(self):
+        """测试行号和文件名通配符"""
+        self.write("a.py", "one\nneedle two\nthree\nneedle four needle\n")
+        self.write("b.txt", "needle\n")
+
+        result = self.search("needle", glob="*.py")
+        self.assertEqual(result["files_searched"], 1)
+        self.assertEqual(
+            result["files"],
+            [
+                {
+                    "path": "a.py",
+                    "matches": [(2, "needle two"), (4, "needle four needle")],
+                    "truncated": False,
+                }
+            ],
+        )
+
+    def test_per_file_and_overall_caps(self):
+        """测试每个文件和总的匹配数量上限"""
+        for name in ("a.py", "b.py", "c.py"):
+            self.write(name, "hit\n" * 5)
+
+        result = self.search("hit", max_per_file=3)
+        self.assertEqual(result["match_count"], 9)
+        self.assertTrue(all(f["truncated"] for f in result["files"]))
+        self.assertFalse(result["truncated"])
+
+        result = self.search("hit", max_per_file=3, max_results=4)
+        self.assertEqual(result["match_count"], 4)
+        self.assertEqual([len(f["matches"]) for f in result["files"]], [3, 1])
+        self.assertTrue(result["truncated"])
+
+    def test_exactly_max_results_is_not_truncated(self):
+        """测试匹配数量正好等于上限时不报告截断"""
+        self.write("a.py", "hit\nhit\n")
+        for name in ("b.py", "c.py", "d.py"):
+            self.write(name, "miss\n")
+        with mock.patch.object(code_search, "MAX_PENDING_FILES", 1):
+            result = self.search("hit", max_results=2)
+        self.assertEqual(result["match_count"], 2)
+        self.assertFalse(result["truncated"])
+
+        self.write("e.py", "hit\n")
+        result = self.search("hit", max_results=2)
+        self.assertEqual(result["match_count"], 2)
+        self.assertTrue(result["truncated"])
+
+    def test_binary_files_are_skipped(self):
+        """测试包含NUL字节的文件被跳过"""
+        binary = self.write("data.bin", b"needle\0\x01\x02")
+        self.assertIsNone(search_file(str(binary), compile_pattern("needle"), 5))
+        self.write("a.py", "needle\n")
+        result = self.search("needle")
+        self.assertEqual([f["path"] for f in result["files"]], ["a.py"])
+
+    def test_multiline_anchor_and_crlf(self):
+        """测试^匹配每行的开头，结果中去掉\\r"""
+        self.write("a.py", "def a():\r\n    pass\r\ndef b():\r\n")
+        result = self.search("^def ")
+        self.assertEqual(
+            result["files"][0]["matches"], [(1, "def a():"), (3, "def b():")]
+        )
+
+    def test_no_empty_line_after_final_newline(self):
+        """测试文件以换行符结尾时，末尾不报告一个不存在的空行"""
+        path = self.write("a.txt", "a\nb\n")
+        for pattern in ("$", "x*", r"\Z"):
+            matches = search_file(str(path), compile_pattern(pattern), 5)
+            self.assertNotIn((3, ""), matches)
+        self.assertEqual(
+            search_file(str(path), compile_pattern("$"), 5), [(1, "a"), (2, "b")]
+        )
+        path = self.write("b.txt", "a\nb")
+        self.assertEqual(
+            search_file(str(path), compile_pattern("$"), 5), [(1, "a"), (2, "b")]
+        )
+        path = self.write("c.txt", "a\n\n")
+        self.assertEqual(search_file(str(path), compile_pattern("^$"), 5), [(2, "")])
+
+    def test_files_are_submitted_lazily(self):
+        """测试结果足够后不再遍历和搜索剩下的文件"""
+        for i in range(20):
+            self.write(f"f{i:02}.py", "hit\n")
+
+        with mock.patch.object(code_search, "MAX_PENDING_FILES", 2), mock.patch.object(
+            code_search, "search_file", wraps=search_file
+        ) as searched:
+            result = self.search("hit", max_results=3)
+        self.assertEqual(result["match_count"], 3)
+        self.assertTrue(result["truncated"])
+        self.assertLessEqual(searched.call_count, 6)
+
+    def test_walk_stops_at_deadline(self):
+        """测试超过时间限制后停止遍历"""
+        self.write("a.py", "hit\n")
+        result = self.search("hit", time_budget=0)
+        self.assertTrue(result["timed_out"])
+        self.assertTrue(result["truncated"])
+        self.assertEqual(result["files_searched"], 0)
+
+    def test_slow_file_does_not_outlast_deadline(self):
+        """测试超时后不等待仍在运行的搜索"""
+        self.write("a.py", "hit\n")
+        release = threading.Event()
+
+        def slow_search(*args):
+            release.wait(5)
+            return []
+
+        self.addCleanup(release.set)
+        with mock.patch.object(code_search, "search_file", slow_search):
+            start = time.monotonic()
+            result = self.search("hit", time_budget=0.2)
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertTrue(result["timed_out"])
+        self.assertEqual(result["files_searched"], 0)
+
+    def test_fixed_string_and_ignore_case(self):
+        """测试普通字符串和忽略大小写"""
+        path = self.write("a.py", "x = a.b(c)\nX = A.B(C)\n")
+        regex = compile_pattern("a.b(c)", fixed_string=True, ignore_case=True)
+        self.assertEqual(
+            search_file(str(path), regex, 5), [(1, "x = a.b(c)"), (2, "X = A.B(C)")]
+        )
+
+    def test_tool_output(self):
+        """测试工具的输出和错误消息"""
+
+        def search_tool(pattern, **kwargs):
+            return asyncio.run(search_code_tool(pattern, **kwargs))
+
+        self.write("src/a.py", "import os\nimport re\n")
+        output = search_tool("^import", path="src")
+        self.assertIn("搜索了1个文件，1个文件中有2处匹配", output)
+        self.assertIn(
+            f"{os.path.join('src', 'a.py')}\n  1: import os\n  2: import re", output
+        )
+
+        self.assertIn("无效", search_tool("(", path="src"))
+        self.assertIn("不存在", search_tool("x", path="missing"))
+        self.write("empty/.gitignore", "*\n")
+        self.assertIn("没有可以搜索的文件", search_tool("x", path="empty"))
+
+
+if __name__ == "__main__":
+    unittest.main()
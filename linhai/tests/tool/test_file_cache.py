@@ -0,0 +1,201 @@
+"""Unit tests for the file read cache."""
+
+from pathlib import Path
+import os
+import tempfile
+import unittest
+
+from linhai.benchmarks.file_cache import run_benchmark
+from linhai.tool import file_cache
+from linhai.tool.file_cache import (
+    FileContentCache,
+    clear_file_cache,
+    file_cache_stats,
+    invalidate_file,
+    new_file_cache_stats,
+    read_text_file,
+)
+
+
+class TestReadTextFile(unittest.TestCase):
+    """Test cases for read_text_file."""
+
+    def setUp(self):
+        clear_file_cache()
+        file_cache_stats.update(new_file_cache_stats())
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+
+    def tearDown(self):
+        clear_file_cache()
+        self.temp_dir.cleanup()
+
+    def test_repeated_read_hits_cache(self):
+        """测试文件没有变化时第二次读取使用缓存"""
+        path = self.root / "a.txt"
+        path.write_text("hello\n", encoding="utf-8")
+
+        self.assertEqual(read_text_file(path), ("hello\n", ""))
+        self.assertEqual(read_text_file(path), ("hello\n", ""))
+        self.assertEqual(file_cache_stats["hits"], 1)
+        self.assertEqual(file_cache_stats["misses"], 1)
+
+    def test_modified_file_is_read_again(self):
+        """测试文件被修改后重新读取"""
+        path = self.root / "a.txt"
+        path.write_text("hello\n", encoding="utf-8")
+        read_text_file(path)
+
+        path.write_text("world\n", encoding="utf-8")
+        # 大小相同时修改时间也必须不同
+        stat_result = path.stat()
+        os.utime(path, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns + 1))
+
+        self.assertEqual(read_text_file(path), ("world\n", ""))
+        self.assertEqual(file_cache_stats["misses"], 2)
+
+    def test_invalidate_file(self):
+        """测试文件工具写入后删除缓存"""
+        path = self.root / "a.txt"
+        path.write_text("hello\n", encoding="utf-8")
+        read_text_file(path)
+        invalidate_file(str(path))
+        read_text_file(path)
+        self.assertEqual(file_cache_stats["misses"], 2)
+
+    def test_newlines_are_translated(self):
+        """测试换行符的处理与Path.read_text相同"""
+        path = self.root / "crlf.txt"
+        path.write_bytes(b"a\r\nb\rc\n")
+
+        content, error = read_text_file(path)
+        self.assertEqual(error, "")
+        self.assertEqual(content, path.read_text(encoding="utf-8"))
+
+    def test_validation_errors(self):
+        """测试不存在、不是文件、过大和非UTF-8文件的错误消息"""
+        content, error = read_text_file(self.root / "missing.txt")
+        self.assertIsNone(content)
+        self.assertIn("不存在", error)
+
+        content, error = read_text_file(self.root)
+        self.assertIsNone(content)
+        self.assertIn("不是文件", error)
+
+        large = self.root / "large.txt"
+        large.write_bytes(b"a" * (file_cache.MAX_FILE_SIZE + 1))
+        content, error = read_text_file(large)
+        self.assertIsNone(content)
+        self.assertIn("超过1MB限制", error)
+
+        binary = self.root / "binary.bin"
+        binary.write_bytes(b"\xff\xfe\x00")
+        content, error = read_text_file(binary)
+        self.assertIsNone(content)
+        self.assertIn("不是纯文本文件", error)
+
+
+class TestFileContentCache(unittest.TestCase):
+    """Test cases for FileContentCache."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, name: str, content: str) -> Path:
+        path = self.root / name
+        path.write_text(content, encoding="utf-8")
+        return path
+
+    def test_least_recently_used_is_evicted(self):
+        """测试超过总字节数上限时删除最久没有使用的文件"""
+        cache = FileContentCache(max_bytes=25, watch=False)
+        first = self.write("first.txt", "a" * 10)
+        second = self.write("second.txt", "b" * 10)
+        third = self.write("third.txt", "c" * 10)
+
+        cache.read(first)
+        cache.read(second)
+        cache.read(first)  # first变为最近使用
+        cache.read(third)  # 删除second
+
+        self.assertEqual(cache.cached_bytes, 20)
+        self.assertEqual(cache.stats["evictions"], 1)
+        cache.read(first)
+        cache.read(second)
+        self.assertEqual(cache.stats["hits"], 2)
+        self.assertEqual(cache.stats["misses"], 4)
+
+    def test_oversized_content_is_not_cached(self):
+        """测试大于缓存上限的文件不会被缓存"""
+        cache = FileContentCache(max_bytes=5, watch=False)
+        path = self.write("a.txt", "a" * 10)
+        self.assertEqual(cache.read(path), ("a" * 10, ""))
+        self.assertEqual(len(cache), 0)
+
+    def test_inotify_catches_same_size_rewrite(self):
+        """测试inotify让修改时间和大小都没有变化的写入也会失效"""
+        cache = FileContentCache()
+        if not cache.watching:
+            self.skipTest("inotify不可用")
+        try:
+            path = self.write("a.txt", "hello")
+            stat_result = path.stat()
+            cache.read(path)
+
+            path.write_text("world", encoding="utf-8")
+            os.utime(path, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns))
+
+            self.assertEqual(cache.read(path), ("world", ""))
+            self.assertEqual(cache.stats["invalidations"], 1)
+        finally:
+            cache.close()
+
+    def test_inotify_directory_removed(self):
+        """测试目录被移动后其中文件的缓存失效"""
+        cache = FileContentCache()
+        if not cache.watching:
+            self.skipTest("inotify不可用")
+        try:
+            directory = self.root / "src"
+            directory.mkdir()
+            path = directory / "a.txt"
+            path.write_text("old", encoding="utf-8")
+            cache.read(path)
+
+            directory.rename(self.root / "moved")
+            directory.mkdir()
+            path.write_text("new", encoding="utf-8")
+
+            self.assertEqual(cache.read(path), ("new", ""))
+            self.assertEqual(cache.stats["invalidations"], 1)
+        finally:
+            cache.close()
+
+    def test_stat_fallback_without_inotify(self):
+        """测试不使用inotify时按stat结果判断文件是否变化"""
+        cache = FileContentCache(watch=False)
+        self.assertFalse(cache.watching)
+        path = self.write("a.txt", "hello")
+        cache.read(path)
+        self.write("a.txt", "hello world")
+        self.assertEqual(cache.read(path), ("hello world", ""))
+        self.assertEqual(cache.stats["misses"], 2)
+
+    def test_benchmark(self):
+        """测试基准测试的结果中缓存命中了重复的读取"""
+        report = run_benchmark(files=5, reads=60)
+        self.assertEqual(
+            [result["name"] for result in report["results"]],
+            ["legacy", "stat", "inotify"],
+        )
+        for result in report["results"][1:]:
+            self.assertEqual(result["stats"]["hits"] + result["stats"]["misses"], 60)
+            self.assertGreater(result["stats"]["hits"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
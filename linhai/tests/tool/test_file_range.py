@@ -0,0 +1,148 @@
+"""Unit tests for ranged file reads."""
+
+from pathlib import Path
+import random
+import tempfile
+import unittest
+import unittest.mock
+
+from linhai.tool import file_range
+from linhai.tool.file_range import (
+    LineIndex,
+    clear_line_indexes,
+    read_byte_range,
+    read_line_range,
+)
+
+
+class TestLineIndex(unittest.TestCase):
+    """Test cases for LineIndex."""
+
+    def test_line_starts_match_full_scan(self):
+        """测试每一行的开始位置与完整扫描的结果相同"""
+        rng = random.Random(0)
+        with unittest.mock.patch.object(file_range, "CHECKPOINT_BYTES", 16):
+            for _ in range(20):
+                data = "".join(
+                    rng.choice(["a", "bc", "\n", "\n\n", "中"])
+                    for _ in range(rng.randint(0, 60))
+                ).encode("utf-8")
+                index = LineIndex(data)
+                self.assertEqual(index.line_count, len(data.splitlines()))
+                starts = [0] + [i + 1 for i, byte in enumerate(data) if byte == 10]
+                for line in range(index.line_count + 1):
+                    expected = starts[line] if line < len(starts) else len(data)
+                    self.assertEqual(index.line_start(data, line), expected)
+
+
+class TestReadRange(unittest.TestCase):
+    """Test cases for read_line_range and read_byte_range."""
+
+    def setUp(self):
+        clear_line_indexes()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / "log.txt"
+        self.path.write_bytes(b"".join(f"line {i}\r\n".encode() for i in range(1, 101)))
+
+    def tearDown(self):
+        clear_line_indexes()
+        self.temp_dir.cleanup()
+
+    def test_read_lines(self):
+        """测试读取行范围和最后几行"""
+        self.assertEqual(
+            read_line_range(self.path, 10, 12),
+            (["line 10", "line 11", "line 12"], 10, 100, ""),
+        )
+        self.assertEqual(
+            read_line_range(self.path, tail_lines=2),
+            (["line 99", "line 100"], 99, 100, ""),
+        )
+        self.assertEqual(read_line_range(self.path, 200), ([], 200, 100, ""))
+
+    def test_index_is_cached_until_file_changes(self):
+        """测试文件没有变化时复用行偏移索引"""
+        with unittest.mock.patch.object(
+            file_range, "LineIndex", wraps=LineIndex
+        ) as line_index:
+            read_line_range(self.path, 1, 1)
+            read_line_range(self.path, 50, 60)
+            self.assertEqual(line_index.call_count, 1)
+
+            with self.path.open("ab") as f:
+                f.write(b"line 101\r\n")
+            lines, _, total, _ = read_line_range(self.path, 101, 101)
+            self.assertEqual(line_index.call_count, 2)
+        self.assertEqual((lines, total), (["line 101"], 101))
+
+    def test_tail_does_not_build_index(self):
+        """测试只读取最后几行时从文件末尾向前查找，不建立行偏移索引"""
+        with unittest.mock.patch.object(
+            file_range, "CHECKPOINT_BYTES", 100
+        ), unittest.mock.patch.object(
+            file_range, "LineIndex", wraps=LineIndex
+        ) as line_index:
+            self.assertEqual(
+                read_line_range(self.path, tail_lines=2),
+                (["line 99", "line 100"], None, None, ""),
+            )
+            with self.path.open("ab") as f:
+                f.write(b"line 101")
+            self.assertEqual(
+                read_line_range(self.path, tail_lines=1),
+                (["line 101"], None, None, ""),
+            )
+            self.assertEqual(line_index.call_count, 0)
+
+            # 有缓存的行偏移索引时使用其中的行号
+            read_line_range(self.path, 1, 1)
+            self.assertEqual(
+                read_line_range(self.path, tail_lines=1), (["line 101"], 101, 101, "")
+            )
+        self.assertEqual(read_line_range(self.path, tail_lines=200)[1:3], (1, 101))
+
+    def test_window_is_bounded(self):
+        """测试读取的内容超过MAX_RANGE_BYTES时只返回完整的前几行"""
+        with unittest.mock.patch.object(file_range, "MAX_RANGE_BYTES", 25):
+            lines, first, _, note = read_line_range(self.path, 1, 10)
+        self.assertEqual((lines, first), (["line 1", "line 2", "line 3"], 1))
+        self.assertIn("超过1MB限制", note)
+
+    def test_long_multibyte_line_is_cut_at_character_boundary(self):
+        """测试超过1MB的单行多字节文本在字符边界截断，不被当作编码错误"""
+        text = Path(self.temp_dir.name) / "long.txt"
+        text.write_text("中" * 400_000, encoding="utf-8")
+        lines, first, total, note = read_line_range(text, 1, 1)
+        self.assertEqual((first, total), (1, 1))
+        self.assertEqual(lines, ["中" * (file_range.MAX_RANGE_BYTES // 3)])
+        self.assertIn("超过1MB限制", note)
+
+        lines, _, _, note = read_line_range(text, tail_lines=1)
+        self.assertEqual(lines, ["中" * (file_range.MAX_RANGE_BYTES // 3)])
+        self.assertIn("超过1MB限制", note)
+
+    def test_errors(self):
+        """测试不存在的文件和非UTF-8内容"""
+        lines, _, _, error = read_line_range(Path(self.temp_dir.name) / "missing")
+        self.assertIsNone(lines)
+        self.assertIn("不存在", error)
+
+        binary = Path(self.temp_dir.name) / "binary.bin"
+        binary.write_bytes(b"\xff\xfe\n")
+        lines, _, _, error = read_line_range(binary)
+        self.assertIsNone(lines)
+        self.assertIn("不是纯文本文件", error)
+
+    def test_read_bytes(self):
+        """测试读取字节范围，被截断的字符显示为替换字符"""
+        self.assertEqual(read_byte_range(self.path, 0, 6), ("line 1", 0, 6, ""))
+        content, start, end, _ = read_byte_range(self.path, -10)
+        self.assertEqual((content, end - start), ("line 100\r\n", 10))
+
+        text = Path(self.temp_dir.name) / "text.txt"
+        text.write_text("中文", encoding="utf-8")
+        self.assertEqual(read_byte_range(text, 1, 5)[0], "��文")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+"""Unit tests for the similar chunk search."""
+
+import random
+import unittest
+
+from linhai.benchmarks.fuzzy_match import (
+    legacy_find_most_similar,
+    mutated_search,
+    synthetic_source,
+)
+from linhai.tool.fuzzy_match import find_similar_chunks
+
+
+class TestFindSimilarChunks(unittest.TestCase):
+    """Test cases for find_similar_chunks."""
+
+    def test_matches_full_scan(self):
+        """测试结果与对每个窗口计算相似度再排序相同"""
+        content = synthetic_source(120, seed=1)
+        for search_lines in (1, 4):
+            for seed in range(3):
+                search = mutated_search(content, search_lines, seed=seed)
+                for top_n in (1, 3, 10):
+                    with self.subTest(
+                        search_lines=search_lines, seed=seed, top_n=top_n
+                    ):
+                        self.assertEqual(
+                            find_similar_chunks(
+                                search, content, top_n, time_budget=None
+                            ),
+                            legacy_find_most_similar(search, content, top_n),
+                        )
+
+    def test_ties_keep_line_order(self):
+        """测试相似度相同时行号小的在前"""
+        content = "\n".join(["alpha", "beta"] * 5 + ["gamma"])
+        result = find_similar_chunks("beta", content, 3)
+        self.assertEqual([item["start_line"] for item in result], [2, 4, 6])
+        self.assertEqual(result, legacy_find_most_similar("beta", content, 3))
+
+    def test_random_text(self):
+        """测试随机文本（包括空行和特殊字符）的结果与完整扫描相同"""
+        rng = random.Random(0)
+        alphabet = "ab \t\r\n{}"
+        for _ in range(50):
+            content = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 80)))
+            search = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+            self.assertEqual(
+                find_similar_chunks(search, content, time_budget=None),
+                legacy_find_most_similar(search, content),
+            )
+
+    def test_search_longer_than_content(self):
+        """测试搜索字符串的行数多于内容时没有结果"""
+        self.assertEqual(find_similar_chunks("a\nb\nc", "a\nb"), [])
+
+    def test_time_budget(self):
+        """测试超过时间限制时仍返回已经找到的结果"""
+        content = synthetic_source(500, seed=2)
+        search = mutated_search(content, 3, seed=3)
+        result = find_similar_chunks(search, content, time_budget=0)
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0]["end_line"] - result[0]["start_line"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
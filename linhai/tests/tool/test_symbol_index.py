@@ -0,0 +1,292 @@
+"""Unit tests for the symbol index."""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+import asyncio
+import os
+import tempfile
+import textwrap
+import threading
+import unittest
+
+from linhai.tool import symbol_index
+from linhai.tool.symbol_index import (
+    SymbolIndex,
+    clear_symbol_indexes,
+    parse_python,
+    register_language,
+)
+from linhai.tool.tools.symbol import (
+    find_symbol as find_symbol_tool,
+    read_symbol as read_symbol_tool,
+)
+
+SAMPLE = textwrap.dedent("""\
+    import os
+    from typing import Any
+
+    LIMIT = 10
+    name: str = "x"
+
+
+    @decorator
+    class Agent(Base):
+        retries = 3
+
+        def run(self, task: Any) -> None:
+            helper = os.path.join("a", "b")
+            self.step(helper)
+
+        async def step(self, value):
+            def inner():
+                return LIMIT
+            return inner()
+
+
+    def main():
+        Agent().run(None)
+    """)
+
+
+class TestParsePython(unittest.TestCase):
+    """Test cases for parse_python."""
+
+    def test_definitions(self):
+        """测试定义的名称、类型和行范围"""
+        parsed = parse_python(SAMPLE)
+        definitions = [
+            (d["qualname"], d["kind"], d["start_line"], d["end_line"])
+            for d in parsed["definitions"]
+        ]
+        self.assertEqual(
+            definitions,
+            [
+                ("LIMIT", "variable", 4, 4),
+                ("name", "variable", 5, 5),
+                ("Agent", "class", 8, 19),
+                ("Agent.retries", "variable", 10, 10),
+                ("Agent.run", "method", 12, 14),
+                ("Agent.step", "method", 16, 19),
+                ("Agent.step.inner", "function", 17, 18),
+                ("main", "function", 22, 23),
+            ],
+        )
+
+    def test_references(self):
+        """测试记录读取的名称和属性，不记录赋值的目标"""
+        references = parse_python(SAMPLE)["references"]
+        self.assertEqual(references["LIMIT"], [18])
+        self.assertEqual(references["Agent"], [23])
+        self.assertEqual(references["run"], [23])
+        self.assertEqual(references["step"], [14])
+        self.assertEqual(references["Any"], [2, 12])
+        self.assertEqual(references["helper"], [14])
+
+    def test_syntax_error(self):
+        """测试语法错误时抛出SyntaxError"""
+        with self.assertRaises(SyntaxError):
+            parse_python("def broken(:\n")
+
+
+class TestSymbolIndex(unittest.TestCase):
+    """Test cases for SymbolIndex."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name) / "project"
+        self.root.mkdir()
+        self.index_path = Path(self.temp_dir.name) / "index.json"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, name: str, content: str) -> Path:
+        path = self.root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
+        return path
+
+    def test_find_by_name_and_qualname(self):
+        """测试按名称、带类名的名称和类型查找"""
+        self.write("pkg/agent.py", SAMPLE)
+        self.write("pkg/other.py", "def run():\n    pass\n")
+        index = SymbolIndex(str(self.root))
+        index.update()
+
+        self.assertEqual(
+            [(s["path"], s["qualname"]) for s in index.find("run")],
+            [("pkg/agent.py", "Agent.run"), ("pkg/other.py", "run")],
+        )
+        self.assertEqual(len(index.find("Agent.run")), 1)
+        self.assertEqual(len(index.find("run", kind="function")), 1)
+        self.assertEqual(index.find("gent"), [])
+        self.assertEqual(index.references("Agent.run"), [("pkg/agent.py", 23)])
+
+    def test_incremental_update(self):
+        """测试只重新解析变化的文件，删除的文件从索引中移除"""
+        a = self.write("a.py", "def a():\n    pass\n")
+        self.write("b.py", "def b():\n    pass\n")
+        index = SymbolIndex(str(self.root))
+        self.assertEqual(index.update(), {"parsed": 2, "removed": 0, "unchanged": 0})
+        self.assertEqual(index.update(), {"parsed": 0, "removed": 0, "unchanged": 2})
+
+        a.write_text("def renamed():\n    pass\n", encoding="utf-8")
+        stat_result = a.stat()
+        os.utime(a, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns + 1))
+        (self.root / "b.py").unlink()
+        self.assertEqual(index.update(), {"parsed": 1, "removed": 1, "unchanged": 0})
+        self.assertEqual(index.find("a"), [])
+        self.assertEqual(index.find("b"), [])
+        self.assertEqual(len(index.find("renamed")), 1)
+
+    def test_syntax_error_and_ignored_files(self):
+        """测试语法错误的文件没有符号，.gitignore忽略的文件不被索引"""
+        (self.root / ".git").mkdir()
+        self.write(".gitignore", "build/\n")
+        self.write("broken.py", "def broken(:\n")
+        self.write("build/gen.py", "def generated():\n    pass\n")
+        index = SymbolIndex(str(self.root))
+        self.assertEqual(index.update()["parsed"], 1)
+        self.assertEqual(index.find("broken"), [])
+        self.assertEqual(index.find("generated"), [])
+
+    def test_persistence(self):
+        """测试保存的索引在下次加载时使用，只重新解析变化的文件"""
+        self.write("a.py", "def a():\n    pass\n")
+        self.write("b.py", "def b():\n    pass\n")
+        SymbolIndex(str(self.root), self.index_path).update()
+        self.assertTrue(self.index_path.exists())
+
+        index = SymbolIndex(str(self.root), self.index_path)
+        self.assertEqual(index.update(), {"parsed": 0, "removed": 0, "unchanged": 2})
+        self.assertEqual(len(index.find("b")), 1)
+
+        # 其他目录的索引和损坏的索引被忽略
+        other = SymbolIndex(self.temp_dir.name, self.index_path)
+        self.assertEqual(other.files, {})
+        self.index_path.write_text("{broken", encoding="utf-8")
+        self.assertEqual(SymbolIndex(str(self.root), self.index_path).files, {})
+
+    def test_lookup_waits_for_update(self):
+        """测试更新索引时查找等待更新完成，不会看到更新了一半的索引"""
+        parsing = threading.Event()
+        release = threading.Event()
+
+        def slow_parser(source: str):
+            parsing.set()
+            release.wait(5)
+            return parse_python(source)
+
+        self.write("a.py", "def a():\n    pass\n")
+        index = SymbolIndex(str(self.root), self.index_path)
+        with mock.patch.dict(symbol_index.LANGUAGE_PARSERS, {".py": slow_parser}):
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                updater = executor.submit(index.update)
+                self.assertTrue(parsing.wait(5))
+                lookup = executor.submit(index.find, "a")
+                self.assertFalse(lookup.done())
+                release.set()
+                updater.result()
+                self.assertEqual(len(lookup.result()), 1)
+
+    def test_register_language(self):
+        """测试为其他语言注册解析器"""
+
+        def parse_lines(source: str):
+            return {
+                "definitions": [
+                    {
+                        "name": line[4:],
+                        "qualname": line[4:],
+                        "kind": "function",
+                        "start_line": number,
+                        "end_line": number,
+                    }
+                    for number, line in enumerate(source.splitlines(), 1)
+                    if line.startswith("fun ")
+                ],
+                "references": {},
+            }
+
+        self.write("main.toy", "fun hello\nfun world\n")
+        with mock.patch.dict(symbol_index.LANGUAGE_PARSERS):
+            register_language([".toy"], parse_lines)
+            index = SymbolIndex(str(self.root))
+            index.update()
+        self.assertEqual(index.find("world")[0]["start_line"], 2)
+
+
+def find_symbol(name, **kwargs):
+    """同步运行find_symbol工具。"""
+    return asyncio.run(find_symbol_tool(name, **kwargs))
+
+
+def read_symbol(name, **kwargs):
+    """同步运行read_symbol工具。"""
+    return asyncio.run(read_symbol_tool(name, **kwargs))
+
+
+class TestSymbolTools(unittest.TestCase):
+    """Test cases for find_symbol and read_symbol."""
+
+    def setUp(self):
+        clear_symbol_indexes()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.cwd = os.getcwd()
+        os.chdir(self.root)
+        patcher = mock.patch.object(
+            symbol_index, "default_index_dir", return_value=self.root / "cache"
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        (self.root / "src").mkdir()
+        (self.root / "src" / "agent.py").write_text(SAMPLE, encoding="utf-8")
+
+    def tearDown(self):
+        clear_symbol_indexes()
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    def test_find_symbol(self):
+        """测试列出定义和引用的位置"""
+        output = find_symbol("run", path="src", include_references=True)
+        location = os.path.join("src", "agent.py")
+        self.assertIn(f"{location}:12-14 method Agent.run", output)
+        self.assertIn(f"引用（共1处）:\n{location}:23", output)
+        self.assertIn("没有找到", find_symbol("missing", path="src"))
+        self.assertIn("kind必须是", find_symbol("run", path="src", kind="module"))
+        self.assertIn("不是目录", find_symbol("run", path="missing"))
+        self.assertTrue(any((self.root / "cache").iterdir()))
+
+    def test_read_symbol(self):
+        """测试只读取定义的代码"""
+        output = read_symbol("Agent.run", path="src")
+        self.assertIn("method Agent.run（第12-14行）", output)
+        self.assertIn("12:     def run(self, task: Any) -> None:", output)
+        self.assertIn("14:         self.step(helper)", output)
+        self.assertNotIn("async def step", output)
+
+    def test_read_symbol_sees_edits(self):
+        """测试文件修改后读取到新的定义"""
+        read_symbol("main", path="src")
+        path = self.root / "src" / "agent.py"
+        path.write_text("\n\n" + SAMPLE, encoding="utf-8")
+        self.assertIn("24: def main():", read_symbol("main", path="src"))
+
+    def test_read_symbol_with_many_definitions(self):
+        """测试定义太多时只列出位置"""
+        (self.root / "src" / "many.py").write_text(
+            "".join(
+                f"class C{i}:\n    def run(self):\n        pass\n" for i in range(4)
+            ),
+            encoding="utf-8",
+        )
+        output = read_symbol("run", path="src")
+        self.assertIn("有5个定义", output)
+        self.assertIn("method C3.run", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
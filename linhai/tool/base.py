@@ -26,6 +26,14 @@ class Tool(TypedDict):
 global_tools: dict[str, Tool] = {}
 
 
+class ToolFailure(str):
+    """工具没有完成操作时返回的错误消息
+
+    是str的子类，可以像普通字符串一样使用；ToolManager据此把结果标记为失败，
+    历史压缩不会用失败的读取结果取代之前的读取结果。
+    """
+
+
 def register_tool(
     name: str, desc: str, args: dict[str, ToolArgInfo], required_args: list[str]
 ) -> Callable:
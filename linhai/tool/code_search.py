@@ -0,0 +1,364 @@
+"""代码搜索。
+
+search_code工具用os.scandir遍历目录，跳过.git目录和.gitignore忽略的文件，
+在线程池中用mmap并行搜索每个文件，结果按遍历顺序排列，每个文件和总的匹配数量都有上限。
+遍历和搜索同时进行，线程池中最多有MAX_PENDING_FILES个等待处理的文件，达到上限或时间限制后停止遍历。
+搜索使用bytes正则表达式（按UTF-8编码），每行最多报告一次匹配，包含NUL字节的文件被当作二进制文件跳过。
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from collections import deque
+from fnmatch import fnmatch
+from typing import Iterator, NamedTuple, TypedDict
+import mmap
+import os
+import re
+import time
+
+DEFAULT_MAX_RESULTS = 200
+DEFAULT_MAX_PER_FILE = 20
+# 搜索的时间限制（秒），超过时返回已经找到的结果
+DEFAULT_TIME_BUDGET = 10.0
+# 超过这个大小的文件不搜索
+MAX_SEARCH_FILE_SIZE = 16 * 1024 * 1024
+# 检查文件开头的这么多字节中是否有NUL字节来判断二进制文件
+BINARY_CHECK_BYTES = 8192
+# 结果中每行最多显示的字符数
+MAX_LINE_CHARS = 300
+# 同时提交给线程池、还没有处理结果的最大文件数
+MAX_PENDING_FILES = 256
+
+
+class IgnoreRule(NamedTuple):
+    """一条.gitignore规则。"""
+
+    base: str  # .gitignore所在的目录
+    regex: re.Pattern[str]  # 匹配相对于base、以/分隔的路径
+    negate: bool  # 以!开头，重新包含之前被忽略的路径
+    dir_only: bool  # 以/结尾，只匹配目录
+
+
+class FileMatches(TypedDict):
+    """一个文件中的匹配。"""
+
+    path: str
+    matches: list[tuple[int, str]]  # (行号, 行内容)
+    truncated: bool  # 是否达到了每个文件的匹配上限
+
+
+class SearchResult(TypedDict):
+    """一次搜索的结果。"""
+
+    files: list[FileMatches]
+    files_searched: int
+    match_count: int
+    truncated: bool  # 是否因为总的匹配上限或时间限制而不完整
+    timed_out: bool
+
+
+def _translate_glob(pattern: str) -> str:
+    """把gitignore的通配符转换为正则表达式。"""
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+            continue
+        if char == "*":
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "[":
+            end = pattern.find("]", i + 2)
+            if end == -1:
+                parts.append(re.escape(char))
+            else:
+                content = pattern[i + 1 : end].replace("\\", "\\\\")
+                if content.startswith("!"):
+                    content = "^" + content[1:]
+                parts.append(f"[{content}]")
+                i = end
+        elif char == "\\" and i + 1 < len(pattern):
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    return "".join(parts)
+
+
+def parse_gitignore(base: str, text: str) -> list[IgnoreRule]:
+    """
+    解析.gitignore文件的内容
+
+    Args:
+        base: .gitignore所在的目录
+        text: 文件内容
+
+    Returns:
+        list[IgnoreRule]: 按文件中的顺序排列的规则
+    """
+    rules = []
+    for line in text.splitlines():
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        elif line.startswith("\\"):
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+        # 包含/的规则相对于.gitignore所在的目录，否则匹配任意层级
+        anchored = "/" in line
+        line = line.lstrip("/")
+        regex = _translate_glob(line)
+        if not anchored:
+            regex = "(?:.*/)?" + regex
+        try:
+            compiled = re.compile(regex)
+        except re.error:
+            continue
+        rules.append(IgnoreRule(base, compiled, negate, dir_only))
+    return rules
+
+
+def load_gitignore(directory: str) -> list[IgnoreRule]:
+    """读取目录中的.gitignore，没有时返回空列表。"""
+    try:
+        with open(
+            os.path.join(directory, ".gitignore"), encoding="utf-8", errors="replace"
+        ) as f:
+            return parse_gitignore(directory, f.read())
+    except OSError:
+        return []
+
+
+def is_ignored(rules: list[IgnoreRule], path: str, is_dir: bool) -> bool:
+    """按规则判断路径是否被忽略，后面的规则优先。"""
+    ignored = False
+    for rule in rules:
+        if rule.dir_only and not is_dir:
+            continue
+        relative = path[len(rule.base) + 1 :].replace(os.sep, "/")
+        if rule.regex.fullmatch(relative):
+            ignored = not rule.negate
+    return ignored
+
+
+def ancestor_rules(directory: str) -> list[IgnoreRule]:
+    """读取从git仓库根目录到directory的上级目录中的.gitignore规则。"""
+    if os.path.isdir(os.path.join(directory, ".git")):
+        return []
+    ancestors = []
+    current = directory
+    while True:
+        parent = os.path.dirname(current)
+        if parent == current:
+            # 不在git仓库中，上级目录的.gitignore不生效
+            return []
+        current = parent
+        ancestors.append(current)
+        if os.path.isdir(os.path.join(current, ".git")):
+            break
+    rules: list[IgnoreRule] = []
+    for ancestor in reversed(ancestors):
+        rules.extend(load_gitignore(ancestor))
+    return rules
+
+
+def iter_files(root: str, glob: str | None = None) -> Iterator[str]:
+    """
+    遍历目录中没有被忽略的文件，同一目录中先按名称列出文件，再进入子目录
+
+    Args:
+        root: 目录的绝对路径
+        glob: 只列出文件名匹配这个通配符的文件
+    """
+    stack = [(root, ancestor_rules(root))]
+    while stack:
+        directory, rules = stack.pop()
+        rules = rules + load_gitignore(directory)
+        try:
+            with os.scandir(directory) as iterator:
+                entries = sorted(iterator, key=lambda entry: entry.name)
+        except OSError:
+            continue
+        subdirectories = []
+        for entry in entries:
+            if entry.name == ".git":
+                continue
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                is_file = not is_dir and entry.is_file()
+            except OSError:
+                continue
+            if (is_dir or is_file) and is_ignored(rules, entry.path, is_dir):
+                continue
+            if is_dir:
+                subdirectories.append(entry.path)
+            elif is_file and (glob is None or fnmatch(entry.name, glob)):
+                yield entry.path
+        stack.extend((subdirectory, rules) for subdirectory in reversed(subdirectories))
+
+
+def search_file(
+    path: str, regex: re.Pattern[bytes], max_matches: int
+) -> list[tuple[int, str]] | None:
+    """
+    在一个文件中搜索，每行最多报告一次匹配
+
+    Args:
+        path: 文件路径
+        regex: bytes正则表达式
+        max_matches: 最多返回的匹配数量，返回max_matches + 1个匹配表示还有更多
+
+    Returns:
+        list[tuple[int, str]] | None: (行号, 行内容)列表，二进制或无法读取的文件返回None
+    """
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0 or size > MAX_SEARCH_FILE_SIZE:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if data.find(b"\0", 0, BINARY_CHECK_BYTES) != -1:
+                    return None
+                matches: list[tuple[int, str]] = []
+                line_number = 1
+                counted = 0  # 已经统计过换行符的位置
+                position = 0
+                while position < size and len(matches) <= max_matches:
+                    match = regex.search(data, position)
+                    if match is None or (
+                        match.start() == size and data[size - 1] == ord("\n")
+                    ):
+                        # 文件以换行符结尾时，末尾的空匹配不属于任何一行
+                        break
+                    line_start = data.rfind(b"\n", 0, match.start()) + 1
+                    line_end = data.find(b"\n", match.start())
+                    if line_end == -1:
+                        line_end = size
+                    line_number += data[counted:line_start].count(b"\n")
+                    counted = line_start
+                    line = data[line_start:line_end].decode("utf-8", errors="replace")
+                    matches.append((line_number, line.rstrip("\r")[:MAX_LINE_CHARS]))
+                    position = line_end + 1
+                return matches
+    except (OSError, ValueError):
+        return None
+
+
+def compile_pattern(
+    pattern: str, fixed_string: bool = False, ignore_case: bool = False
+) -> re.Pattern[bytes]:
+    """把搜索模式编译为bytes正则表达式，模式无效时抛出re.error。"""
+    source = re.escape(pattern) if fixed_string else pattern
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+    return re.compile(source.encode("utf-8"), flags)
+
+
+def search_code(
+    regex: re.Pattern[bytes],
+    path: str = ".",
+    glob: str | None = None,
+    max_results: int = DEFAULT_MAX_RESULTS,
+    max_per_file: int = DEFAULT_MAX_PER_FILE,
+    time_budget: float = DEFAULT_TIME_BUDGET,
+    max_workers: int | None = None,
+) -> SearchResult:
+    """
+    在目录或文件中并行搜索
+
+    Args:
+        regex: compile_pattern编译的正则表达式
+        path: 搜索的目录或文件
+        glob: 只搜索文件名匹配这个通配符的文件
+        max_results: 总的匹配数量上限
+        max_per_file: 每个文件的匹配数量上限
+        time_budget: 时间限制（秒）
+        max_workers: 线程数量，默认由ThreadPoolExecutor决定
+
+    Returns:
+        SearchResult: 按遍历顺序排列的结果
+    """
+    deadline = time.monotonic() + time_budget
+    root = os.path.abspath(path)
+    if os.path.isdir(root):
+        paths: Iterator[str] = iter_files(root, glob)
+    else:
+        paths = iter([root])
+    result: SearchResult = {
+        "files": [],
+        "files_searched": 0,
+        "match_count": 0,
+        "truncated": False,
+        "timed_out": False,
+    }
+    # 不使用with语句：退出时会等待正在运行的搜索完成，超时后正则表达式可能还要运行很久，
+    # 所以不等待正在运行的搜索，并取消还没有开始的搜索
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        pending: deque[tuple[str, Future]] = deque()
+        walking = True
+        walk_timed_out = False
+        while True:
+            # 遍历到足够的文件就开始处理结果，超过时间限制后不再遍历
+            while walking and len(pending) < MAX_PENDING_FILES:
+                if time.monotonic() >= deadline:
+                    walking = False
+                    walk_timed_out = True
+                    break
+                file_path = next(paths, None)
+                if file_path is None:
+                    walking = False
+                    break
+                future = executor.submit(search_file, file_path, regex, max_per_file)
+                pending.append((file_path, future))
+            if not pending:
+                if walk_timed_out:
+                    result["timed_out"] = True
+                    result["truncated"] = True
+                break
+            file_path, future = pending.popleft()
+            remaining = deadline - time.monotonic()
+            try:
+                matches = future.result(timeout=max(remaining, 0))
+            except FutureTimeout:
+                result["timed_out"] = True
+                result["truncated"] = True
+                break
+            result["files_searched"] += 1
+            if result["match_count"] >= max_results:
+                # 达到上限后继续搜索，直到确实有匹配被丢弃才算截断
+                if matches:
+                    result["truncated"] = True
+                    break
+                continue
+            if not matches:
+                continue
+            truncated = len(matches) > max_per_file
+            allowed = min(max_per_file, max_results - result["match_count"])
+            if len(matches) > allowed:
+                matches = matches[:allowed]
+                result["truncated"] = result["truncated"] or allowed < max_per_file
+            result["match_count"] += len(matches)
+            result["files"].append(
+                {
+                    "path": os.path.relpath(file_path),
+                    "matches": matches,
+                    "truncated": truncated,
+                }
+            )
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return result
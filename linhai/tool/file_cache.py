@@ -0,0 +1,252 @@
+"""文件读取缓存。
+
+文件工具通过read_text_file读取文件：只调用一次stat完成存在、类型和大小的检查，
+只读取一次文件完成UTF-8检查并返回内容。读取结果保存在进程内的workspace_cache中，
+同一进程中的所有会话共享，文件没有变化时再次读取只需要一次stat。
+
+缓存按(设备号, inode, 修改时间, 大小)判断文件是否变化；在Linux上还用inotify监视缓存文件所在的目录，
+文件被写入后即使修改时间和大小都没有变化也会失效。缓存的总字节数超过上限时删除最久没有使用的文件。
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Iterator, TypedDict
+import os
+import stat
+import threading
+
+from linhai.tool.inotify import DirectoryWatcher, create_watcher
+
+# 文件工具能操作的最大文件大小
+MAX_FILE_SIZE = 1024 * 1024
+# 缓存内容的默认最大总字节数
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+FileKey = tuple[int, int, int, int]  # (st_dev, st_ino, st_mtime_ns, st_size)
+
+
+class FileCacheStats(TypedDict):
+    """文件读取缓存的统计。"""
+
+    hits: int  # 文件没有变化、直接使用缓存的次数
+    misses: int  # 读取文件的次数
+    evictions: int  # 超过总字节数上限时删除的文件数
+    invalidations: int  # 因为inotify事件失效的文件数
+
+
+def new_file_cache_stats() -> FileCacheStats:
+    """创建空的缓存统计。"""
+    return {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+
+def file_key(stat_result: os.stat_result) -> FileKey:
+    """返回文件内容的标识，文件被修改或替换后标识会变化。"""
+    return (
+        stat_result.st_dev,
+        stat_result.st_ino,
+        stat_result.st_mtime_ns,
+        stat_result.st_size,
+    )
+
+
+class FileContentCache:
+    """
+    按最近使用顺序淘汰的文件内容缓存
+
+    Args:
+        max_bytes: 缓存内容的最大总字节数
+        watch: 是否在可用时用inotify监视缓存文件所在的目录
+        stats: 记录统计的字典，默认新建
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = MAX_CACHE_BYTES,
+        watch: bool = True,
+        stats: FileCacheStats | None = None,
+    ):
+        self.max_bytes = max_bytes
+        self.stats = new_file_cache_stats() if stats is None else stats
+        # 绝对路径 -> (文件标识, 内容, 文件大小)，最近使用的在最后
+        self._entries: OrderedDict[str, tuple[FileKey, str, int]] = OrderedDict()
+        self._bytes = 0
+        self._watcher: DirectoryWatcher | None = create_watcher() if watch else None
+        self._lock = threading.Lock()
+
+    @property
+    def cached_bytes(self) -> int:
+        """缓存内容的总字节数。"""
+        return self._bytes
+
+    @property
+    def watching(self) -> bool:
+        """是否在用inotify监视文件变化。"""
+        return self._watcher is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def read(self, file_path: Path) -> tuple[str | None, str]:
+        """
+        读取并验证文件：检查是否存在、是文件、大小不超过1MB，并且是UTF-8编码的纯文本
+
+        换行符的处理与Path.read_text相同，\\r\\n和\\r都转换为\\n。
+
+        Args:
+            file_path: 文件路径对象
+
+        Returns:
+            tuple[str | None, str]: 文件内容和错误消息，验证通过时错误消息为空字符串，否则内容为None
+        """
+        try:
+            stat_result = os.stat(file_path)
+        except FileNotFoundError:
+            return None, f"文件路径{file_path.as_posix()!r}不存在"
+        except OSError as exc:
+            return None, f"读取文件时发生错误: {exc!r}"
+        if not stat.S_ISREG(stat_result.st_mode):
+            return None, f"路径{file_path.as_posix()!r}不是文件"
+        if stat_result.st_size > MAX_FILE_SIZE:
+            return (
+                None,
+                f"文件{file_path.as_posix()!r}过大（{stat_result.st_size}字节），超过1MB限制",
+            )
+
+        path = os.path.abspath(file_path)
+        key = file_key(stat_result)
+        with self._lock:
+            self._process_events()
+            cached = self._entries.get(path)
+            if cached is not None and cached[0] == key:
+                self._entries.move_to_end(path)
+                self.stats["hits"] += 1
+                return cached[1], ""
+            self.stats["misses"] += 1
+            # 在读取之前开始监视，读取之后的写入一定会产生事件
+            if self._watcher is not None:
+                self._watcher.watch(os.path.dirname(path))
+
+        try:
+            with open(file_path, "rb") as f:
+                data = f.read()
+        except OSError as exc:
+            return None, f"读取文件时发生错误: {exc!r}"
+        try:
+            content = data.decode("utf-8")
+        except UnicodeDecodeError:
+            return None, f"文件{file_path.as_posix()!r}不是纯文本文件（UTF-8编码错误）"
+        if "\r" in content:
+            content = content.replace("\r\n", "\n").replace("\r", "\n")
+        with self._lock:
+            self._store(path, key, content)
+        return content, ""
+
+    def invalidate(self, file_path: Path | str) -> None:
+        """删除一个文件的缓存，文件工具写入文件后调用。"""
+        with self._lock:
+            self._remove(os.path.abspath(file_path))
+
+    def clear(self) -> None:
+        """清空缓存。"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def close(self) -> None:
+        """清空缓存并停止监视。"""
+        self.clear()
+        if self._watcher is not None:
+            self._watcher.close()
+            self._watcher = None
+
+    def _remove(self, path: str) -> bool:
+        entry = self._entries.pop(path, None)
+        if entry is None:
+            return False
+        self._bytes -= entry[2]
+        return True
+
+    def _store(self, path: str, key: FileKey, content: str) -> None:
+        """缓存文件内容，超过max_bytes时删除最久没有使用的文件。"""
+        size = key[3]
+        self._remove(path)
+        if size > self.max_bytes:
+            return
+        while self._entries and self._bytes + size > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.stats["evictions"] += 1
+        self._entries[path] = (key, content, size)
+        self._bytes += size
+
+    def _process_events(self) -> None:
+        """处理inotify事件，删除可能已经变化的文件的缓存。"""
+        if self._watcher is None:
+            return
+        events = self._watcher.read_events()
+        if events.overflow:
+            self.stats["invalidations"] += len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+            return
+        for path in events.paths:
+            if self._remove(path):
+                self.stats["invalidations"] += 1
+        for directory in events.directories:
+            for path in [p for p in self._entries if os.path.dirname(p) == directory]:
+                self._remove(path)
+                self.stats["invalidations"] += 1
+
+
+# 当前工具调用中被文件工具修改的文件的真实路径，没有在收集时为None
+_written_files: ContextVar[set[str] | None] = ContextVar("written_files", default=None)
+
+# 进程内所有读取的统计
+file_cache_stats = new_file_cache_stats()
+
+# 进程内所有会话共享的缓存
+workspace_cache = FileContentCache(stats=file_cache_stats)
+
+
+def read_text_file(file_path: Path) -> tuple[str | None, str]:
+    """用共享的缓存读取并验证文件，见FileContentCache.read。"""
+    return workspace_cache.read(file_path)
+
+
+def invalidate_file(file_path: Path | str) -> None:
+    """删除共享缓存中一个文件的缓存。"""
+    workspace_cache.invalidate(file_path)
+
+
+def mark_file_written(file_path: Path | str) -> None:
+    """
+    文件工具修改文件内容后调用：删除文件的缓存，并记录到track_written_files收集的集合中
+
+    内容没有变化时文件工具不写入文件，也不调用这个函数。
+    """
+    workspace_cache.invalidate(file_path)
+    written = _written_files.get()
+    if written is not None:
+        written.add(os.path.realpath(file_path))
+
+
+@contextmanager
+def track_written_files() -> Iterator[set[str]]:
+    """
+    收集代码块中被文件工具修改的文件的真实路径
+
+    不需要在工具调用前后读取文件比较内容，在线程中运行的工具也会被记录。
+    """
+    written: set[str] = set()
+    token = _written_files.set(written)
+    try:
+        yield written
+    finally:
+        _written_files.reset(token)
+
+
+def clear_file_cache() -> None:
+    """清空共享的缓存。"""
+    workspace_cache.clear()
@@ -0,0 +1,293 @@
+"""大文件的按范围读取。
+
+read_file指定行范围、字节范围或只读取最后几行时，通过mmap只访问需要的部分，不受1MB的文件大小限制。
+按行读取使用稀疏的行偏移索引：每CHECKPOINT_BYTES字节记录一次之前的换行符数量，
+定位某一行时先二分查找所在的块，再在块内查找换行符。索引按文件标识缓存，
+文件没有变化时读取任意范围的耗时只与范围的大小有关。
+只读取最后几行时不建立索引，而是从文件末尾向前查找换行符，不断增长的日志文件每次读取的耗时
+也只与读取的行数有关。
+"""
+
+from array import array
+from pathlib import Path
+import bisect
+import mmap
+import os
+import stat
+
+from linhai.tool.file_cache import MAX_FILE_SIZE, FileKey, file_key
+
+# 行偏移索引中相邻检查点之间的字节数
+CHECKPOINT_BYTES = 64 * 1024
+# 最多缓存的行偏移索引数量，超过时删除最早缓存的索引
+MAX_LINE_INDEXES = 32
+# 一次按范围读取最多返回的字节数
+MAX_RANGE_BYTES = MAX_FILE_SIZE
+
+
+class LineIndex:
+    """
+    文件的稀疏行偏移索引
+
+    行以换行符分隔，文件末尾的换行符之后不算新的一行，与str.splitlines的行数相同。
+
+    Args:
+        data: 文件内容，通常是mmap对象
+    """
+
+    def __init__(self, data: mmap.mmap | bytes):
+        self.size = len(data)
+        # checkpoints[i]是第i个块（从i * CHECKPOINT_BYTES字节开始）之前的换行符数量
+        self.checkpoints = array("q")
+        newlines = 0
+        for start in range(0, self.size, CHECKPOINT_BYTES):
+            self.checkpoints.append(newlines)
+            newlines += data[start : start + CHECKPOINT_BYTES].count(b"\n")
+        self.newline_count = newlines
+        ends_with_newline = self.size > 0 and data[self.size - 1 : self.size] == b"\n"
+        self.line_count = newlines + (1 if self.size and not ends_with_newline else 0)
+
+    def line_start(self, data: mmap.mmap | bytes, line: int) -> int:
+        """
+        返回第line行（从0开始）开始的字节偏移
+
+        Args:
+            data: 建立索引时的文件内容
+            line: 行号（从0开始），等于行数时返回文件大小
+        """
+        if line <= 0:
+            return 0
+        if line > self.newline_count:
+            return self.size
+        # 第line行从第line个换行符之后开始
+        newline = line - 1
+        block = bisect.bisect_right(self.checkpoints, newline) - 1
+        position = block * CHECKPOINT_BYTES - 1
+        for _ in range(newline - self.checkpoints[block] + 1):
+            position = data.find(b"\n", position + 1)
+        return position + 1
+
+
+# 绝对路径 -> (文件标识, 行偏移索引)
+_indexes: dict[str, tuple[FileKey, LineIndex]] = {}
+
+
+def clear_line_indexes() -> None:
+    """清空缓存的行偏移索引。"""
+    _indexes.clear()
+
+
+def cached_line_index(path: str, key: FileKey) -> LineIndex | None:
+    """返回缓存的行偏移索引，没有缓存或文件已经变化时返回None。"""
+    cached = _indexes.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    return None
+
+
+def get_line_index(path: str, key: FileKey, data: mmap.mmap) -> LineIndex:
+    """返回文件的行偏移索引，文件没有变化时使用缓存。"""
+    index = cached_line_index(path, key)
+    if index is not None:
+        return index
+    index = LineIndex(data)
+    _indexes.pop(path, None)
+    while len(_indexes) >= MAX_LINE_INDEXES:
+        _indexes.pop(next(iter(_indexes)))
+    _indexes[path] = (key, index)
+    return index
+
+
+def _open_file(file_path: Path) -> tuple[os.stat_result | None, str]:
+    """检查文件是否存在并且是文件，返回stat结果和错误消息。"""
+    try:
+        stat_result = os.stat(file_path)
+    except FileNotFoundError:
+        return None, f"文件路径{file_path.as_posix()!r}不存在"
+    except OSError as exc:
+        return None, f"读取文件时发生错误: {exc!r}"
+    if not stat.S_ISREG(stat_result.st_mode):
+        return None, f"路径{file_path.as_posix()!r}不是文件"
+    return stat_result, ""
+
+
+def _is_continuation_byte(data: mmap.mmap | bytes, position: int) -> bool:
+    """判断position处的字节是否是UTF-8多字节字符中间的字节。"""
+    return (data[position] & 0xC0) == 0x80
+
+
+def _decode_lines(data: bytes) -> list[str] | None:
+    """把完整的若干行解码为行列表，不是UTF-8时返回None。"""
+    try:
+        text = data.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+    if text.endswith("\n"):
+        text = text[:-1]
+    return [line.removesuffix("\r") for line in text.split("\n")]
+
+
+def read_line_range(
+    file_path: Path,
+    start_line: int | None = None,
+    end_line: int | None = None,
+    tail_lines: int | None = None,
+) -> tuple[list[str] | None, int | None, int | None, str]:
+    """
+    读取文件的一部分行
+
+    Args:
+        file_path: 文件路径对象
+        start_line: 开始行号（从1开始），默认为1
+        end_line: 结束行号（包含），默认为文件末尾
+        tail_lines: 只读取最后几行，指定时忽略start_line和end_line
+
+    Returns:
+        tuple[list[str] | None, int | None, int | None, str]: 读取的行、第一行的行号、
+        文件总行数和说明，出错时行为None，说明为错误消息；读取的内容超过MAX_RANGE_BYTES时
+        只返回前面（tail_lines时为最后）的行，说明中注明截断的位置。tail_lines读取大文件并且
+        没有缓存的行偏移索引时不统计行号，第一行的行号和总行数为None
+    """
+    stat_result, error = _open_file(file_path)
+    if stat_result is None:
+        return None, 0, 0, error
+    if stat_result.st_size == 0:
+        return [], 1, 0, ""
+    try:
+        with open(file_path, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as data:
+            path = os.path.abspath(file_path)
+            key = file_key(os.fstat(f.fileno()))
+            if tail_lines is not None:
+                start, end, found, note = _tail_window(data, tail_lines)
+                first, total = _tail_line_numbers(
+                    data, cached_line_index(path, key), start, found
+                )
+            else:
+                index = get_line_index(path, key, data)
+                total = index.line_count
+                first = max((start_line or 1) - 1, 0)
+                last = total if end_line is None else min(end_line, total)
+                if first >= last:
+                    return [], first + 1, total, ""
+                start, end, note = _line_window(data, index, first, last)
+            lines = _decode_lines(data[start:end])
+    except OSError as exc:
+        return None, 0, 0, f"读取文件时发生错误: {exc!r}"
+    if lines is None:
+        return (
+            None,
+            0,
+            0,
+            f"文件{file_path.as_posix()!r}不是纯文本文件（UTF-8编码错误）",
+        )
+    return lines, None if first is None else first + 1, total, note
+
+
+def _line_window(
+    data: mmap.mmap, index: LineIndex, first: int, last: int
+) -> tuple[int, int, str]:
+    """返回第first行到第last行（不包含，从0开始）的字节范围，超过MAX_RANGE_BYTES时截断。"""
+    start = index.line_start(data, first)
+    end = index.line_start(data, last)
+    if end - start <= MAX_RANGE_BYTES:
+        return start, end, ""
+    # 只保留MAX_RANGE_BYTES之内的完整行，一行就超过限制时在字符边界截断
+    cut = data.rfind(b"\n", start, start + MAX_RANGE_BYTES)
+    if cut >= start:
+        end = cut + 1
+    else:
+        end = start + MAX_RANGE_BYTES
+        while end > start and _is_continuation_byte(data, end):
+            end -= 1
+    return start, end, "内容超过1MB限制，只返回了前面的部分"
+
+
+def _tail_window(data: mmap.mmap, tail_lines: int) -> tuple[int, int, int, str]:
+    """
+    从文件末尾向前查找换行符，返回最后tail_lines行的字节范围
+
+    Returns:
+        tuple[int, int, int, str]: 开始和结束的字节偏移、范围内的行数和说明，
+        超过MAX_RANGE_BYTES时只保留最后的完整行，最后一行就超过限制时在字符边界截断
+    """
+    size = len(data)
+    start = end = size
+    if tail_lines <= 0:
+        return start, end, 0, ""
+    # 文件末尾的换行符之后不算新的一行
+    search_end = size - 1 if data[size - 1 : size] == b"\n" else size
+    found = 0
+    while found < tail_lines:
+        newline = data.rfind(b"\n", 0, search_end)
+        if end - (newline + 1) > MAX_RANGE_BYTES:
+            if found == 0:
+                start = end - MAX_RANGE_BYTES
+                while start < end and _is_continuation_byte(data, start):
+                    start += 1
+                found = 1
+            return start, end, found, "内容超过1MB限制，只返回了最后的部分"
+        start = newline + 1
+        found += 1
+        if newline < 0:
+            break
+        search_end = newline
+    return start, end, found, ""
+
+
+def _tail_line_numbers(
+    data: mmap.mmap, index: LineIndex | None, start: int, found: int
+) -> tuple[int | None, int | None]:
+    """
+    返回_tail_window读取的第一行的行号（从0开始）和文件总行数
+
+    有缓存的行偏移索引时直接使用，否则只在start之前的内容不超过CHECKPOINT_BYTES时统计换行符，
+    避免每次读取都扫描整个文件，无法得到时返回None。
+    """
+    if index is not None:
+        return index.line_count - found, index.line_count
+    if start > CHECKPOINT_BYTES:
+        return None, None
+    before = data[:start].count(b"\n")
+    if found == 0 and start and data[start - 1 : start] != b"\n":
+        # 没有读取任何行时，最后一个没有换行符的行也要计入总行数
+        before += 1
+    return before, before + found
+
+
+def read_byte_range(
+    file_path: Path, byte_offset: int, byte_count: int | None = None
+) -> tuple[str | None, int, int, str]:
+    """
+    读取文件的一段字节，范围两端被截断的UTF-8字符显示为替换字符
+
+    Args:
+        file_path: 文件路径对象
+        byte_offset: 开始的字节偏移，负数表示从文件末尾倒数
+        byte_count: 读取的字节数，默认读取到文件末尾，最多MAX_RANGE_BYTES
+
+    Returns:
+        tuple[str | None, int, int, str]: 读取的内容、实际的开始和结束偏移以及说明，
+        出错时内容为None，说明为错误消息
+    """
+    stat_result, error = _open_file(file_path)
+    if stat_result is None:
+        return None, 0, 0, error
+    size = stat_result.st_size
+    start = max(size + byte_offset, 0) if byte_offset < 0 else min(byte_offset, size)
+    end = size if byte_count is None else min(start + max(byte_count, 0), size)
+    note = ""
+    if end - start > MAX_RANGE_BYTES:
+        end = start + MAX_RANGE_BYTES
+        note = "内容超过1MB限制，只返回了前面的部分"
+    if start == end:
+        return "", start, end, note
+    try:
+        with open(file_path, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as data:
+            chunk = data[start:end]
+    except OSError as exc:
+        return None, 0, 0, f"读取文件时发生错误: {exc!r}"
+    return chunk.decode("utf-8", errors="replace"), start, end, note
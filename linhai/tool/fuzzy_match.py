@@ -0,0 +1,119 @@
+"""文件内容的相似片段查找。
+
+replace_file_content找不到要替换的内容时，返回文件中与它最相似的几段内容，
+相似度与difflib.SequenceMatcher(None, search_string, chunk).ratio()相同。
+
+ratio()的匹配字符数不会超过两段文本中相同字符的数量（即quick_ratio的上界），
+滑动窗口逐行增减字符计数，一遍就能得到每个窗口的上界。按上界从高到低计算ratio()，
+上界低于已找到的第top_n个相似度时剩下的窗口都不可能进入结果，不再计算。
+结果与对每个窗口计算ratio()再排序完全相同；超过time_budget时返回已经找到的最相似的结果。
+"""
+
+from collections import Counter
+from typing import TypedDict
+import difflib
+import heapq
+import time
+
+# 查找相似片段的默认时间限制（秒）
+DEFAULT_TIME_BUDGET = 1.0
+
+
+class SimilarChunk(TypedDict):
+    """与搜索字符串相似的一段内容。"""
+
+    similarity: float
+    start_line: int
+    end_line: int
+    content: str
+
+
+def _upper_bounds(search_string: str, lines: list[str], linenum: int) -> list[float]:
+    """计算每个窗口相似度的上界，窗口i由lines[i:i+linenum]用换行符连接而成。"""
+    search_count = Counter(search_string)
+    search_length = len(search_string)
+    # 只统计搜索字符串中出现过的字符
+    window = dict.fromkeys(search_count, 0)
+    matches = min(linenum - 1, search_count.get("\n", 0))
+    window["\n"] = linenum - 1
+    window_length = linenum - 1
+    line_counts = [Counter(line) for line in lines]
+    bounds = []
+    for i, line in enumerate(lines):
+        for char, count in line_counts[i].items():
+            limit = search_count.get(char)
+            if limit:
+                before = window[char]
+                after = before + count
+                window[char] = after
+                if before < limit:
+                    matches += (after if after < limit else limit) - before
+        window_length += len(line)
+        if i >= linenum:
+            removed = lines[i - linenum]
+            for char, count in line_counts[i - linenum].items():
+                limit = search_count.get(char)
+                if limit:
+                    before = window[char]
+                    after = before - count
+                    window[char] = after
+                    if after < limit:
+                        matches -= (before if before < limit else limit) - after
+            window_length -= len(removed)
+        if i >= linenum - 1:
+            total = search_length + window_length
+            bounds.append(2.0 * matches / total if total else 1.0)
+    return bounds
+
+
+def find_similar_chunks(
+    search_string: str,
+    content: str,
+    top_n: int = 3,
+    time_budget: float | None = DEFAULT_TIME_BUDGET,
+) -> list[SimilarChunk]:
+    """
+    在内容中查找与搜索字符串最相似的几段内容
+
+    每段内容的行数与搜索字符串相同，按相似度从高到低排序，相似度相同时行号小的在前。
+
+    Args:
+        search_string: 要搜索的字符串
+        content: 要搜索的内容
+        top_n: 返回的结果数量
+        time_budget: 时间限制（秒），None表示不限制
+
+    Returns:
+        list[SimilarChunk]: 最相似的几段内容
+    """
+    linenum = search_string.count("\n") + 1
+    lines = content.splitlines()
+    if top_n <= 0 or len(lines) < linenum:
+        return []
+    deadline = None if time_budget is None else time.monotonic() + time_budget
+
+    bounds = _upper_bounds(search_string, lines, linenum)
+    order = sorted(range(len(bounds)), key=lambda index: -bounds[index])
+    # (相似度, -窗口序号)组成的小顶堆，堆顶是目前第top_n相似的结果
+    best: list[tuple[float, int]] = []
+    for checked, index in enumerate(order):
+        if len(best) == top_n and bounds[index] < best[0][0]:
+            break
+        if deadline is not None and checked and time.monotonic() > deadline:
+            break
+        chunk = "\n".join(lines[index : index + linenum])
+        item = (difflib.SequenceMatcher(None, search_string, chunk).ratio(), -index)
+        if len(best) < top_n:
+            heapq.heappush(best, item)
+        elif item > best[0]:
+            heapq.heapreplace(best, item)
+
+    return [
+        {
+            "similarity": similarity,
+            "start_line": -negative_index + 1,
+            "end_line": -negative_index + linenum,
+            "content": "\n".join(lines[-negative_index : -negative_index + linenum]),
+        }
+        for similarity, negative_index in sorted(best, reverse=True)
+    ]
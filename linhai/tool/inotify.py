@@ -0,0 +1,145 @@
+"""Linux inotify的最小封装。
+
+文件读取缓存用它监视缓存文件所在的目录，目录中的文件被修改、替换或删除时立即让缓存失效，
+不依赖修改时间的精度（Linux的修改时间通常只精确到几毫秒，同样大小的两次快速写入可能得到相同的修改时间）。
+通过ctypes调用libc，不需要额外的依赖；文件描述符是非阻塞的，读取事件时不会等待。
+不是Linux或者inotify不可用时create_watcher返回None，缓存只按文件的stat结果判断是否过期。
+"""
+
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+# 目录中的文件内容可能变化的事件
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+# 目录本身被删除、移动或不再监视的事件
+DIRECTORY_GONE_MASK = IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED
+
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+READ_SIZE = 64 * 1024
+
+
+class WatchEvents:
+    """一次读取到的事件。"""
+
+    def __init__(self):
+        self.paths: list[str] = []  # 内容可能变化的文件
+        self.directories: list[str] = []  # 不再被监视的目录，其中的文件都要失效
+        self.overflow = False  # 事件队列溢出，所有文件都要失效
+
+
+class DirectoryWatcher:
+    """
+    用inotify监视目录中文件的变化
+
+    Args:
+        max_directories: 最多监视的目录数量，超过时watch返回False
+    """
+
+    def __init__(self, max_directories: int = 1024):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self.max_directories = max_directories
+        self._directories: dict[int, str] = {}  # 监视描述符 -> 目录
+        self._watches: dict[str, int] = {}  # 目录 -> 监视描述符
+
+    def watch(self, directory: str) -> bool:
+        """开始监视目录，返回目录是否处于监视之下。"""
+        if directory in self._watches:
+            return True
+        if self._fd < 0 or len(self._watches) >= self.max_directories:
+            return False
+        wd = self._add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            # 例如达到了系统的监视数量限制，只能按stat结果判断
+            return False
+        if wd in self._directories:
+            # 通过符号链接等另一个路径已经监视了同一个目录，事件只会报告那个路径
+            return False
+        self._directories[wd] = directory
+        self._watches[directory] = wd
+        return True
+
+    def read_events(self) -> WatchEvents:
+        """读取所有已经发生的事件，没有事件时立即返回。"""
+        events = WatchEvents()
+        while self._fd >= 0:
+            try:
+                data = os.read(self._fd, READ_SIZE)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    events.overflow = True
+                    continue
+                directory = self._directories.get(wd)
+                if directory is None:
+                    continue
+                if mask & DIRECTORY_GONE_MASK:
+                    # 移动后的目录不在原来的路径上，不再监视它，之后需要时重新监视原路径
+                    events.directories.append(directory)
+                    del self._directories[wd]
+                    del self._watches[directory]
+                    if not mask & IN_IGNORED:
+                        self._rm_watch(self._fd, wd)
+                elif name:
+                    events.paths.append(os.path.join(directory, os.fsdecode(name)))
+        return events
+
+    def close(self) -> None:
+        """关闭inotify文件描述符。"""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+        self._directories.clear()
+        self._watches.clear()
+
+
+def create_watcher(max_directories: int = 1024) -> DirectoryWatcher | None:
+    """创建目录监视器，不是Linux或者inotify不可用时返回None。"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        return DirectoryWatcher(max_directories)
+    except (OSError, AttributeError):
+        return None
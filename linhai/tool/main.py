@@ -3,30 +3,147 @@
 包含工具消息类和管理器，用于处理工具调用请求和返回结果。
 """
 
-import json
+import hashlib
 import tempfile
 import os
 from typing import cast, Any, Callable, Awaitable, Coroutine, Optional
 
+from linhai import json_backend
 from linhai.llm import Message, ToolCallMessage
 from linhai.type_hints import LanguageModelMessage
-from linhai.tool.base import call_tool, Tool, get_tools_info, global_tools
+from linhai.tool.base import call_tool, Tool, ToolFailure, get_tools_info, global_tools
 from linhai.config import Config
+from linhai.blob_store import BlobStore
+from linhai.tool.file_cache import track_written_files
+
+# 超过这个长度的工具输出会被移入数据块存储，消息中只保留哈希
+DEFAULT_BLOB_THRESHOLD = 4096
+
+# 结果是完整文件内容的工具
+FILE_FULL_READ_TOOLS = frozenset({"read_file"})
+# 结果是文件内容的工具，包括只读取一部分的工具
+FILE_READ_TOOLS = FILE_FULL_READ_TOOLS | {"run_sed_expression"}
+# 指定后read_file只读取文件一部分的参数
+FILE_RANGE_ARGUMENTS = frozenset(
+    {"start_line", "end_line", "tail_lines", "byte_offset", "byte_count"}
+)
+# 会修改文件内容的工具，之后旧的读取结果就过期了
+FILE_WRITE_TOOLS = frozenset(
+    {
+        "write_file",
+        "append_file",
+        "replace_file_content",
+        "modify_file_with_sed",
+        "insert_at_line",
+    }
+)
+
+# 修改多个文件的工具，修改的文件在edits参数的每一项中
+BATCH_EDIT_TOOLS = frozenset({"batch_edit_files"})
+
+
+def tool_file_path(
+    tool_name: str | None, tool_arguments: dict[str, Any] | None
+) -> str | None:
+    """返回文件工具操作的文件绝对路径，不是文件工具时返回None。"""
+    if tool_name not in FILE_READ_TOOLS | FILE_WRITE_TOOLS or not tool_arguments:
+        return None
+    filepath = tool_arguments.get("filepath")
+    if not isinstance(filepath, str):
+        return None
+    return os.path.abspath(filepath)
+
+
+def is_full_file_read(
+    tool_name: str | None, tool_arguments: dict[str, Any] | None
+) -> bool:
+    """判断工具调用的结果是否是完整的文件内容。"""
+    if tool_name not in FILE_FULL_READ_TOOLS:
+        return False
+    return not any(
+        (tool_arguments or {}).get(name) is not None for name in FILE_RANGE_ARGUMENTS
+    )
+
+
+def batch_edit_file_paths(
+    tool_name: str | None, tool_arguments: dict[str, Any] | None
+) -> list[str]:
+    """返回批量修改工具修改的文件绝对路径，不是批量修改工具时返回空列表。"""
+    if tool_name not in BATCH_EDIT_TOOLS or not tool_arguments:
+        return []
+    edits = tool_arguments.get("edits")
+    if not isinstance(edits, list):
+        return []
+    return [
+        os.path.abspath(edit["filepath"])
+        for edit in edits
+        if isinstance(edit, dict) and isinstance(edit.get("filepath"), str)
+    ]
+
+
+def written_file_paths(
+    tool_name: str | None, tool_arguments: dict[str, Any] | None
+) -> list[str]:
+    """返回写入工具（包括批量修改工具）可能修改的文件绝对路径，不是写入工具时返回空列表。"""
+    if tool_name in BATCH_EDIT_TOOLS:
+        return list(dict.fromkeys(batch_edit_file_paths(tool_name, tool_arguments)))
+    if tool_name not in FILE_WRITE_TOOLS:
+        return []
+    file_path = tool_file_path(tool_name, tool_arguments)
+    return [] if file_path is None else [file_path]
 
 
 class ToolResultMessage(Message):
-    """工具成功结果消息"""
+    """工具成功结果消息
+
+    较长的输出会被保存到按内容寻址的数据块存储中，消息本身只保存哈希，
+    在转换为LLM消息或读取content时再按需加载。
+
+    文件工具的结果会记录文件路径和输出内容的哈希。之后对同一文件的读取或修改
+    会让旧的读取结果过期，此时superseded_by记录取代它的消息下标，
+    转换为LLM消息时只输出一行说明，保存的内容不变。工具返回ToolFailure时
+    failed为True，失败的调用不会让其他结果过期。写入工具的结果在changed_files中
+    记录内容确实发生变化的文件，只有这些文件之前的读取结果会过期。
+    """
+
+    def __init__(
+        self,
+        content: Any,
+        max_output_length: int = 50000,
+        blob_store: BlobStore | None = None,
+        blob_threshold: int = DEFAULT_BLOB_THRESHOLD,
+        tool_name: str | None = None,
+        tool_arguments: dict[str, Any] | None = None,
+        failed: bool = False,
+        changed_files: list[str] | None = None,
+    ):
+        # 产生这条结果的工具调用，供历史压缩判断结果是否已经过期
+        self.tool_name = tool_name
+        self.tool_arguments = tool_arguments
+        self.failed = failed
+        # 写入工具实际修改的文件，None表示未知（如旧版本保存的历史）
+        self.changed_files = changed_files
+        self.superseded_by: int | None = None
+        self.superseded_same_content = False
 
-    def __init__(self, content: Any, max_output_length: int = 50000):
         # 在内部处理转换逻辑
         if isinstance(content, str):
             content_str = content
         else:
             try:
-                content_str = json.dumps(content, ensure_ascii=False)
+                content_str = json_backend.dumps(content, compact=False)
             except (TypeError, ValueError):
                 content_str = str(content)
 
+        self.file_path = tool_file_path(tool_name, tool_arguments)
+        self.file_hash: str | None = None
+        if self.file_path is not None and tool_name in FILE_READ_TOOLS and not failed:
+            self.file_hash = hashlib.sha256(content_str.encode("utf-8")).hexdigest()
+
+        # 超长输出保存到的临时文件，以及可选的廉价LLM生成的摘要
+        self.spill_path: str | None = None
+        self.digest: str | None = None
+
         # 检查内容长度是否超过max_output_length字符
         if len(content_str) > max_output_length:
             # 创建临时文件保存内容
@@ -36,6 +153,7 @@ class ToolResultMessage(Message):
                 temp_file.write(content_str)
                 temp_path = temp_file.name
                 file_size = os.path.getsize(temp_path)  # 获取文件大小
+            self.spill_path = temp_path
             # 计算行数
             line_count = content_str.count("\n") + 1
             # 返回文件路径、大小和行数的消息
@@ -43,26 +161,133 @@ class ToolResultMessage(Message):
         else:
             message_content = content_str
 
-        self.content = message_content
+        self._content: str | None = message_content
+        self.content_hash: str | None = None
+        self.blob_store = blob_store
+        if blob_store is not None and len(message_content) > blob_threshold:
+            self.content_hash = blob_store.put_text(message_content)
+            self._content = None
+
+    @classmethod
+    def from_blob(cls, content_hash: str, blob_store: BlobStore) -> "ToolResultMessage":
+        """创建引用已有数据块的工具结果消息，不读取数据块内容。"""
+        message = cls.__new__(cls)
+        message._content = None
+        message.content_hash = content_hash
+        message.blob_store = blob_store
+        message.tool_name = None
+        message.tool_arguments = None
+        message.failed = False
+        message.changed_files = None
+        message.file_path = None
+        message.file_hash = None
+        message.superseded_by = None
+        message.superseded_same_content = False
+        message.spill_path = None
+        message.digest = None
+        return message
+
+    @property
+    def content(self) -> str:
+        """工具输出内容，保存在数据块存储中时按需加载。"""
+        if self._content is not None:
+            return self._content
+        if self.blob_store is None or self.content_hash is None:
+            raise RuntimeError("工具输出的数据块存储不可用")
+        try:
+            return self.blob_store.get_text(self.content_hash)
+        except FileNotFoundError:
+            return f"工具输出（数据块{self.content_hash}）已被清理，内容不可用"
+
+    def superseded_notice(self) -> str:
+        """被取代时代替原内容发送给LLM的说明。"""
+        if self.superseded_same_content:
+            reason = f"内容与第{self.superseded_by}条消息相同"
+        else:
+            reason = f"已被第{self.superseded_by}条消息取代"
+        return f"[{self.tool_name}读取{self.file_path}的结果{reason}，原内容已省略]"
 
     def to_llm_message(self) -> LanguageModelMessage:
+        if self.superseded_by is not None:
+            content = self.superseded_notice()
+        elif self.digest is not None:
+            content = (
+                f"{self.content}\n\n以下是廉价LLM阅读完整输出后生成的摘要，"
+                f"需要细节时仍可从临时文件读取：\n{self.digest}"
+            )
+        else:
+            content = self.content
 
         return cast(
             LanguageModelMessage,
             {
                 "role": "user",
                 "name": "tool-result",
-                "content": self.content,
+                "content": content,
             },
         )
 
     def to_json(self) -> str:
-        return json.dumps(self.to_llm_message())
+        if self.content_hash is not None:
+            data: dict[str, Any] = {
+                "role": "user",
+                "name": "tool-result",
+                "content_ref": self.content_hash,
+            }
+        else:
+            data = {"role": "user", "name": "tool-result", "content": self.content}
+        if self.tool_name is not None:
+            data["tool_name"] = self.tool_name
+            data["tool_arguments"] = self.tool_arguments
+        if self.failed:
+            data["failed"] = True
+        if self.changed_files is not None:
+            data["changed_files"] = self.changed_files
+        if self.file_path is not None:
+            data["file_path"] = self.file_path
+            data["file_hash"] = self.file_hash
+        if self.spill_path is not None:
+            data["spill_path"] = self.spill_path
+        if self.digest is not None:
+            data["digest"] = self.digest
+        return json_backend.dumps(data)
 
     @classmethod
-    def from_json(cls, json_str: str):
-        data = json.loads(json_str)
-        return cls(content=data["content"])
+    def from_json(cls, json_str: str, blob_store: BlobStore | None = None):
+        """从JSON恢复工具结果消息
+
+        Args:
+            json_str: to_json生成的JSON字符串
+            blob_store: 保存这条消息时使用的数据块存储，消息引用了数据块时必须提供
+
+        Raises:
+            ValueError: 消息引用了数据块但没有提供数据块存储
+        """
+        data = json_backend.loads(json_str)
+        if "content_ref" in data:
+            if blob_store is None:
+                raise ValueError(
+                    f"工具输出保存在数据块{data['content_ref']}中，需要提供保存时使用的数据块存储"
+                )
+            message = cls.from_blob(data["content_ref"], blob_store)
+            message.tool_name = data.get("tool_name")
+            message.tool_arguments = data.get("tool_arguments")
+            message.failed = data.get("failed", False)
+            message.changed_files = data.get("changed_files")
+        else:
+            message = cls(
+                content=data["content"],
+                tool_name=data.get("tool_name"),
+                tool_arguments=data.get("tool_arguments"),
+                failed=data.get("failed", False),
+                changed_files=data.get("changed_files"),
+            )
+        # 使用保存时的路径，避免工作目录变化后解析出不同的绝对路径
+        message.file_path = data.get("file_path", message.file_path)
+        message.file_hash = data.get("file_hash", message.file_hash)
+        message.spill_path = data.get("spill_path")
+        message.digest = data.get("digest")
+        return message
 
 
 class ToolErrorMessage(Message):
@@ -82,25 +307,29 @@ class ToolErrorMessage(Message):
         )
 
     def to_json(self) -> str:
-        return json.dumps(self.to_llm_message())
+        return json_backend.dumps(self.to_llm_message())
 
     @classmethod
     def from_json(cls, json_str: str):
-        data = json.loads(json_str)
+        data = json_backend.loads(json_str)
         return cls(content=data["content"])
 
 
 class ToolManager:
     """工具管理器，负责处理工具调用请求"""
 
-    def __init__(self, config: Optional[Config] = None):
+    def __init__(
+        self, config: Optional[Config] = None, blob_store: Optional[BlobStore] = None
+    ):
         """初始化工具管理器
 
         Args:
             config: 可选配置对象
+            blob_store: 可选的数据块存储，用于保存较长的工具输出
         """
         self.workflows: dict[str, Tool] = {}
         self.config = config
+        self.blob_store = blob_store
 
     def register_workflow(
         self, name: str, desc: str, func: Callable[[Any], Coroutine[None, None, bool]]
@@ -131,12 +360,26 @@ class ToolManager:
         try:
             # function_arguments 现在直接是字典，无需解析
             args = tool_call.function_arguments if tool_call.function_arguments else {}
-            result = call_tool(tool_call.function_name, args)
-            if isinstance(result, Awaitable):
-                result = await result
+            # 文件工具只在内容确实变化时写入并记录文件，
+            # 失败或没有改变内容的写入不会让之前的读取过期
+            written = written_file_paths(tool_call.function_name, args)
+            with track_written_files() as changed:
+                result = call_tool(tool_call.function_name, args)
+                if isinstance(result, Awaitable):
+                    result = await result
+            changed_files = (
+                [path for path in written if os.path.realpath(path) in changed]
+                if written
+                else None
+            )
 
             # 如果工具返回的是 Message 实例，直接返回
             if isinstance(result, Message):
+                if isinstance(result, ToolResultMessage) and result.tool_name is None:
+                    result.tool_name = tool_call.function_name
+                    result.tool_arguments = args
+                    result.file_path = tool_file_path(tool_call.function_name, args)
+                    result.changed_files = changed_files
                 return result
 
             # 否则，用 ToolResultMessage 包装，使用配置的max_output_length或默认值
@@ -147,9 +390,19 @@ class ToolManager:
                 and "max_output_length" in self.config["tools"]
             ):
                 max_output_length = self.config["tools"]["max_output_length"]
+            blob_threshold = DEFAULT_BLOB_THRESHOLD
+            if self.config and "blob_threshold" in self.config.get("tools", {}):
+                blob_threshold = self.config["tools"]["blob_threshold"]
 
             return ToolResultMessage(
-                content=result, max_output_length=max_output_length
+                content=result,
+                max_output_length=max_output_length,
+                blob_store=self.blob_store,
+                blob_threshold=blob_threshold,
+                tool_name=tool_call.function_name,
+                tool_arguments=args,
+                failed=isinstance(result, ToolFailure),
+                changed_files=changed_files,
             )
 
         except Exception as e:  # pylint: disable=broad-exception-caught
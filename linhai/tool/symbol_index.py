@@ -0,0 +1,393 @@
+"""符号索引。
+
+记录工作区中每个源文件定义的类、函数、方法和模块级变量（包括所在的行范围），以及文件中引用的名称。
+索引按文件的(修改时间, 大小)增量更新：只有变化的文件会被重新解析，被删除的文件从索引中移除。
+索引保存为JSON，默认位于~/.cache/linhai/symbols，下次启动时只需要重新解析变化的文件。
+
+解析器按文件后缀注册，内置Python解析器（基于ast），其他语言可以通过register_language添加。
+"""
+
+from pathlib import Path
+from typing import Callable, TypedDict
+import ast
+import hashlib
+import os
+import threading
+
+from linhai import json_backend
+from linhai.blob_store import atomic_write
+from linhai.tool.code_search import iter_files
+
+# 索引格式版本，格式或解析器的结果变化时增加，旧的索引会被丢弃
+INDEX_VERSION = 1
+# 超过这个大小的文件不解析
+MAX_INDEX_FILE_SIZE = 2 * 1024 * 1024
+
+
+class Definition(TypedDict):
+    """文件中的一个定义。"""
+
+    name: str
+    qualname: str  # 包含所在类和函数的名称，如"Agent.run"
+    kind: str  # "class"、"function"、"method"或"variable"
+    start_line: int  # 包含装饰器
+    end_line: int
+
+
+class Symbol(Definition):
+    """索引中的一个定义，带有文件路径。"""
+
+    path: str  # 相对于索引根目录、以/分隔的路径
+
+
+class ParsedFile(TypedDict):
+    """解析器的结果。"""
+
+    definitions: list[Definition]
+    references: dict[str, list[int]]  # 名称 -> 引用所在的行号
+
+
+class FileEntry(ParsedFile):
+    """索引中一个文件的记录。"""
+
+    mtime_ns: int
+    size: int
+
+
+class UpdateStats(TypedDict):
+    """一次增量更新的统计。"""
+
+    parsed: int  # 重新解析的文件数
+    removed: int  # 从索引中移除的文件数
+    unchanged: int  # 没有变化的文件数
+
+
+LanguageParser = Callable[[str], ParsedFile]
+
+# 文件后缀 -> 解析器
+LANGUAGE_PARSERS: dict[str, LanguageParser] = {}
+
+
+def register_language(suffixes: list[str], parser: LanguageParser) -> None:
+    """
+    为文件后缀注册解析器
+
+    解析器接收文件内容，返回其中的定义和引用；无法解析时可以抛出任意异常，文件会被记录为没有符号。
+    注册新的解析器后已经索引的文件不会重新解析，需要时可以调用SymbolIndex.clear。
+
+    Args:
+        suffixes: 文件后缀，如[".js", ".mjs"]
+        parser: 解析器
+    """
+    for suffix in suffixes:
+        LANGUAGE_PARSERS[suffix] = parser
+
+
+class _PythonVisitor(ast.NodeVisitor):
+    """收集Python代码中的定义和引用。"""
+
+    # visit_*方法的名称由ast.NodeVisitor决定
+    # pylint: disable=invalid-name
+
+    def __init__(self) -> None:
+        """初始化空的定义、引用和作用域。"""
+        self.definitions: list[Definition] = []
+        self.references: dict[str, set[int]] = {}
+        self.scopes: list[tuple[str, str]] = []  # (名称, "class"或"function")
+
+    def add_definition(self, node: ast.stmt, name: str, kind: str) -> None:
+        """记录一个定义，起始行包含装饰器。"""
+        start_line = node.lineno
+        for decorator in getattr(node, "decorator_list", []):
+            start_line = min(start_line, decorator.lineno)
+        self.definitions.append(
+            {
+                "name": name,
+                "qualname": ".".join([scope for scope, _ in self.scopes] + [name]),
+                "kind": kind,
+                "start_line": start_line,
+                "end_line": node.end_lineno or node.lineno,
+            }
+        )
+
+    def add_reference(self, name: str, line: int) -> None:
+        """记录名称在某一行被引用。"""
+        self.references.setdefault(name, set()).add(line)
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        """记录类定义，并在类的作用域中访问类体。"""
+        self.add_definition(node, node.name, "class")
+        for child in node.decorator_list + node.bases + node.keywords:
+            self.visit(child)
+        self.scopes.append((node.name, "class"))
+        for statement in node.body:
+            self.visit(statement)
+        self.scopes.pop()
+
+    def visit_FunctionDef(self, node: ast.FunctionDef | ast.AsyncFunctionDef) -> None:
+        """记录函数或方法定义，并在函数的作用域中访问函数体。"""
+        in_class = bool(self.scopes) and self.scopes[-1][1] == "class"
+        self.add_definition(node, node.name, "method" if in_class else "function")
+        for child in node.decorator_list:
+            self.visit(child)
+        self.visit(node.args)
+        if node.returns is not None:
+            self.visit(node.returns)
+        self.scopes.append((node.name, "function"))
+        for statement in node.body:
+            self.visit(statement)
+        self.scopes.pop()
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Assign(self, node: ast.Assign) -> None:
+        """记录赋值语句定义的变量。"""
+        self.add_variables(node, node.targets)
+        self.generic_visit(node)
+
+    def visit_AnnAssign(self, node: ast.AnnAssign) -> None:
+        """记录带类型注解的赋值语句定义的变量。"""
+        self.add_variables(node, [node.target])
+        self.generic_visit(node)
+
+    def add_variables(self, node: ast.stmt, targets: list[ast.expr]) -> None:
+        """记录模块和类中的变量，函数中的局部变量不记录。"""
+        if any(kind == "function" for _, kind in self.scopes):
+            return
+        for target in targets:
+            elements = target.elts if isinstance(target, ast.Tuple) else [target]
+            for element in elements:
+                if isinstance(element, ast.Name):
+                    self.add_definition(node, element.id, "variable")
+
+    def visit_Name(self, node: ast.Name) -> None:
+        """记录被读取的名称。"""
+        if isinstance(node.ctx, ast.Load):
+            self.add_reference(node.id, node.lineno)
+
+    def visit_Attribute(self, node: ast.Attribute) -> None:
+        """记录被读取的属性名。"""
+        if isinstance(node.ctx, ast.Load):
+            self.add_reference(node.attr, node.end_lineno or node.lineno)
+        self.visit(node.value)
+
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        """记录从模块中导入的名称。"""
+        for alias in node.names:
+            self.add_reference(alias.name, node.lineno)
+
+
+def parse_python(source: str) -> ParsedFile:
+    """解析Python代码，语法错误时抛出SyntaxError。"""
+    visitor = _PythonVisitor()
+    visitor.visit(ast.parse(source))
+    return {
+        "definitions": visitor.definitions,
+        "references": {
+            name: sorted(lines) for name, lines in visitor.references.items()
+        },
+    }
+
+
+register_language([".py", ".pyi"], parse_python)
+
+
+def default_index_dir() -> Path:
+    """默认的索引目录。"""
+    return Path.home() / ".cache" / "linhai" / "symbols"
+
+
+def default_index_path(root: str) -> Path:
+    """目录的索引文件路径，按目录的绝对路径区分。"""
+    digest = hashlib.sha256(root.encode("utf-8", errors="surrogateescape")).hexdigest()
+    return default_index_dir() / f"{digest[:16]}.json"
+
+
+class SymbolIndex:
+    """
+    一个目录的符号索引
+
+    Args:
+        root: 索引的目录
+        index_path: 保存索引的文件，None表示不保存
+    """
+
+    def __init__(self, root: str, index_path: Path | None = None):
+        self.root = os.path.abspath(root)
+        self.index_path = index_path
+        # 相对路径 -> 文件记录
+        self.files: dict[str, FileEntry] = {}
+        self._lock = threading.Lock()
+        # 保存时的临时文件按进程区分，同一进程中的保存需要依次进行
+        self._save_lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        """读取保存的索引，不存在、损坏或版本不同时从空索引开始。"""
+        if self.index_path is None:
+            return
+        try:
+            data = json_backend.loads(self.index_path.read_bytes())
+        except (OSError, ValueError):
+            return
+        if (
+            isinstance(data, dict)
+            and data.get("version") == INDEX_VERSION
+            and data.get("root") == self.root
+            and isinstance(data.get("files"), dict)
+        ):
+            self.files = data["files"]
+
+    def save(self) -> None:
+        """保存索引，失败时忽略。"""
+        if self.index_path is None:
+            return
+        with self._save_lock:
+            # 文件记录只会被整体替换，浅拷贝得到一致的快照
+            with self._lock:
+                files = dict(self.files)
+            data = {"version": INDEX_VERSION, "root": self.root, "files": files}
+            try:
+                self.index_path.parent.mkdir(parents=True, exist_ok=True)
+                atomic_write(self.index_path, json_backend.dumps_bytes(data))
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        """清空索引，下次更新时重新解析所有文件。"""
+        with self._lock:
+            self.files = {}
+
+    def update(self) -> UpdateStats:
+        """
+        增量更新索引，只重新解析修改时间或大小变化的文件，有变化时保存索引
+
+        Returns:
+            UpdateStats: 更新的统计
+        """
+        stats: UpdateStats = {"parsed": 0, "removed": 0, "unchanged": 0}
+        with self._lock:
+            seen = set()
+            for file_path in iter_files(self.root):
+                parser = LANGUAGE_PARSERS.get(os.path.splitext(file_path)[1])
+                if parser is None:
+                    continue
+                try:
+                    stat_result = os.stat(file_path)
+                except OSError:
+                    continue
+                if stat_result.st_size > MAX_INDEX_FILE_SIZE:
+                    continue
+                path = os.path.relpath(file_path, self.root).replace(os.sep, "/")
+                seen.add(path)
+                entry = self.files.get(path)
+                if (
+                    entry is not None
+                    and entry["mtime_ns"] == stat_result.st_mtime_ns
+                    and entry["size"] == stat_result.st_size
+                ):
+                    stats["unchanged"] += 1
+                    continue
+                self.files[path] = self._parse(file_path, parser, stat_result)
+                stats["parsed"] += 1
+            for path in [path for path in self.files if path not in seen]:
+                del self.files[path]
+                stats["removed"] += 1
+        if stats["parsed"] or stats["removed"]:
+            self.save()
+        return stats
+
+    @staticmethod
+    def _parse(
+        file_path: str, parser: LanguageParser, stat_result: os.stat_result
+    ) -> FileEntry:
+        """解析一个文件，无法读取或解析时记录为没有符号，直到文件再次变化。"""
+        parsed: ParsedFile = {"definitions": [], "references": {}}
+        try:
+            with open(file_path, encoding="utf-8", errors="replace") as f:
+                parsed = parser(f.read())
+        except Exception:  # pylint: disable=broad-exception-caught
+            pass
+        return {
+            "mtime_ns": stat_result.st_mtime_ns,
+            "size": stat_result.st_size,
+            "definitions": parsed["definitions"],
+            "references": parsed["references"],
+        }
+
+    def find(self, name: str, kind: str | None = None) -> list[Symbol]:
+        """
+        查找定义
+
+        name可以是名称（如"run"），也可以是带类名的名称（如"Agent.run"），匹配qualname的结尾部分。
+
+        Args:
+            name: 名称
+            kind: 只返回这种类型的定义
+
+        Returns:
+            list[Symbol]: 按文件路径和行号排列的定义
+        """
+        suffix = "." + name
+        symbols: list[Symbol] = []
+        with self._lock:
+            files = dict(self.files)
+        for path in sorted(files):
+            for definition in files[path]["definitions"]:
+                if kind is not None and definition["kind"] != kind:
+                    continue
+                qualname = definition["qualname"]
+                if qualname == name or qualname.endswith(suffix):
+                    symbols.append({**definition, "path": path})
+        return symbols
+
+    def references(self, name: str) -> list[tuple[str, int]]:
+        """
+        查找名称的引用
+
+        Args:
+            name: 名称，带类名时只使用最后一部分
+
+        Returns:
+            list[tuple[str, int]]: 按文件路径和行号排列的(路径, 行号)
+        """
+        name = name.rsplit(".", 1)[-1]
+        with self._lock:
+            files = dict(self.files)
+        return [
+            (path, line)
+            for path in sorted(files)
+            for line in files[path]["references"].get(name, [])
+        ]
+
+
+# 绝对路径 -> 进程内的索引
+_indexes: dict[str, SymbolIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_symbol_index(root: str, persist: bool = True) -> SymbolIndex:
+    """
+    获取目录的索引并增量更新
+
+    Args:
+        root: 目录
+        persist: 是否在default_index_dir中保存索引
+
+    Returns:
+        SymbolIndex: 已经更新的索引
+    """
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = SymbolIndex(root, default_index_path(root) if persist else None)
+            _indexes[root] = index
+    index.update()
+    return index
+
+
+def clear_symbol_indexes() -> None:
+    """丢弃进程内的所有索引，已经保存的索引文件不受影响。"""
+    with _indexes_lock:
+        _indexes.clear()
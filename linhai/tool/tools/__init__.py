@@ -3,4 +3,4 @@
 包含所有工具的实现，如计算器、文件操作、HTTP请求等。
 """
 
-from . import calculator, dummy, file, command, http
+from . import calculator, dummy, file, command, http, search, symbol
@@ -49,12 +49,12 @@ def switch_to_cheap_llm(message_count: int) -> str:
 
 @register_tool(
     name="thanox_history",
-    desc="随机删除一半消息（不包括前5条系统消息）。调用这个工具来触发随机删除流程。",
+    desc="删除历史消息使token数减半（不包括前5条系统消息），默认优先删除价值低的消息，例如已过期的文件读取结果。调用这个工具来触发删除流程。",
     args={},
     required_args=[],
 )
 def thanox_history() -> str:
-    """随机删除历史消息工具函数。
+    """删除历史消息工具函数。
 
     此函数由Agent内部处理，用于触发随机删除流程。
 
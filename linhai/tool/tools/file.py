@@ -1,10 +1,16 @@
 """文件操作工具模块，提供文件读写、内容替换等功能。"""
 
 from pathlib import Path
-import difflib
-import json
+from typing import Any
+import os
 import platform
-from linhai.tool.base import register_tool, ToolArgInfo
+import stat
+import tempfile
+from linhai import json_backend
+from linhai.tool.base import register_tool, ToolArgInfo, ToolFailure
+from linhai.tool.file_cache import mark_file_written, read_text_file
+from linhai.tool.file_range import read_byte_range, read_line_range
+from linhai.tool.fuzzy_match import find_similar_chunks
 import subprocess
 
 
@@ -19,30 +25,7 @@ def find_most_similar_in_files(search_string: str, content: str, top_n: int = 3)
     Returns:
         包含相似度、行号和内容的字典列表
     """
-
-    linenum = search_string.count("\n") + 1
-    lines = content.splitlines()
-
-    chunks = [
-        "\n".join(lines[i : i + linenum]) for i in range(0, len(lines) - linenum + 1)
-    ]
-
-    similarities = []
-    for i, chunk in enumerate(chunks):
-        similarity = difflib.SequenceMatcher(None, search_string, chunk).ratio()
-        similarities.append((similarity, i, chunk))
-    similarities.sort(key=lambda x: x[0], reverse=True)
-    results = [
-        {
-            "similarity": similarity,
-            "start_line": chunk_index + 1,
-            "end_line": chunk_index + linenum,
-            "content": chunk_content,
-        }
-        for similarity, chunk_index, chunk_content in similarities[:top_n]
-    ]
-
-    return results
+    return find_similar_chunks(search_string, content, top_n)
 
 
 def validate_file(file_path: Path) -> str:
@@ -54,56 +37,71 @@ def validate_file(file_path: Path) -> str:
     Returns:
         空字符串如果验证通过，否则错误消息
     """
-    if not file_path.exists():
-        return f"文件路径{file_path.as_posix()!r}不存在"
-    if not file_path.is_file():
-        return f"路径{file_path.as_posix()!r}不是文件"
-
-    # 检查文件大小
-    file_size = file_path.stat().st_size
-    if isinstance(file_size, int) and file_size > 1024 * 1024:  # 1MB
-        return f"文件{file_path.as_posix()!r}过大（{file_size}字节），超过1MB限制"
-
-    # 检查是否为纯文本：尝试读取文件并检查编码
-    try:
-        content = file_path.read_text(encoding="utf-8")
-        # 如果成功读取，则认为是文本文件
-    except UnicodeDecodeError:
-        return f"文件{file_path.as_posix()!r}不是纯文本文件（UTF-8编码错误）"
-    except OSError as exc:
-        return f"读取文件时发生错误: {exc!r}"
-
-    return ""  # 验证通过
+    return read_text_file(file_path)[1]
 
 
 @register_tool(
     name="read_file",
-    desc="读取文件",
+    desc="读取文件，超过1MB的文件可以指定行范围、字节范围或只读取最后几行",
     args={
         "filepath": ToolArgInfo(desc="文件路径", type="str"),
         "show_line_numbers": ToolArgInfo(desc="是否显示行号", type="bool"),
+        "start_line": ToolArgInfo(desc="开始行号（从1开始）", type="int"),
+        "end_line": ToolArgInfo(desc="结束行号（包含）", type="int"),
+        "tail_lines": ToolArgInfo(desc="只读取文件的最后几行", type="int"),
+        "byte_offset": ToolArgInfo(
+            desc="开始的字节偏移，负数表示从文件末尾倒数", type="int"
+        ),
+        "byte_count": ToolArgInfo(desc="从byte_offset开始读取的字节数", type="int"),
     },
     required_args=["filepath"],
 )
-def read_file(filepath: str, show_line_numbers: bool = False) -> str:
+def read_file(
+    filepath: str,
+    show_line_numbers: bool = False,
+    start_line: int | None = None,
+    end_line: int | None = None,
+    tail_lines: int | None = None,
+    byte_offset: int | None = None,
+    byte_count: int | None = None,
+) -> str:
     """读取文件内容。
 
+    指定范围时通过mmap只读取需要的部分，不受1MB的文件大小限制，每次最多返回1MB。
+
     Args:
         filepath: 文件路径
         show_line_numbers: 是否显示行号
+        start_line: 开始行号（从1开始）
+        end_line: 结束行号（包含）
+        tail_lines: 只读取文件的最后几行
+        byte_offset: 开始的字节偏移，负数表示从文件末尾倒数
+        byte_count: 从byte_offset开始读取的字节数
 
     Returns:
         文件内容字符串，包含路径信息
     """
     file_path = Path(filepath)
-    validation_error = validate_file(file_path)
-    if validation_error:
-        return validation_error
+    line_range = start_line is not None or end_line is not None
+    modes = [line_range, tail_lines is not None, byte_offset is not None]
+    if sum(modes) > 1:
+        return ToolFailure("start_line/end_line、tail_lines和byte_offset只能指定一种")
+    if byte_count is not None and byte_offset is None:
+        byte_offset = 0
+    if byte_offset is not None:
+        return read_file_bytes(file_path, byte_offset, byte_count)
+    if line_range or tail_lines is not None:
+        return read_file_lines(
+            file_path, show_line_numbers, start_line, end_line, tail_lines
+        )
 
-    try:
-        content = file_path.read_text(encoding="utf-8")
-    except OSError as exc:
-        return f"发生错误: {exc!r}"
+    content, validation_error = read_text_file(file_path)
+    if content is None:
+        if "过大" in validation_error:
+            validation_error += (
+                "，请使用start_line/end_line、tail_lines或byte_offset分段读取"
+            )
+        return ToolFailure(validation_error)
 
     if show_line_numbers:
         # 添加行号
@@ -119,6 +117,55 @@ def read_file(filepath: str, show_line_numbers: bool = False) -> str:
 {formatted_content}"""
 
 
+def read_file_lines(
+    file_path: Path,
+    show_line_numbers: bool,
+    start_line: int | None,
+    end_line: int | None,
+    tail_lines: int | None,
+) -> str:
+    """按行范围读取文件，供read_file使用。"""
+    lines, first, total, note = read_line_range(
+        file_path, start_line, end_line, tail_lines
+    )
+    if lines is None:
+        return ToolFailure(note)
+    if first is None:
+        # 大文件只读取最后几行时不统计行号，用倒数的行号表示
+        if show_line_numbers:
+            lines = [f"{i - len(lines)}: {line}" for i, line in enumerate(lines)]
+        description = f"最后{len(lines)}行（行号为倒数的行号）"
+    else:
+        last = first + len(lines) - 1
+        if show_line_numbers:
+            lines = [f"{first + i}: {line}" for i, line in enumerate(lines)]
+        if lines:
+            description = f"第{first}-{last}行（共{total}行）"
+        else:
+            description = f"没有第{first}行（共{total}行）"
+    if note:
+        description += f"，{note}"
+    formatted_content = "\n".join(lines)
+    return f"""\
+文件路径为: {file_path.as_posix()!r}
+文件{description}，内容如下，不要复读文件内容:
+{formatted_content}"""
+
+
+def read_file_bytes(file_path: Path, byte_offset: int, byte_count: int | None) -> str:
+    """按字节范围读取文件，供read_file使用。"""
+    content, start, end, note = read_byte_range(file_path, byte_offset, byte_count)
+    if content is None:
+        return ToolFailure(note)
+    description = f"第{start}-{end}字节"
+    if note:
+        description += f"，{note}"
+    return f"""\
+文件路径为: {file_path.as_posix()!r}
+文件{description}，内容如下，不要复读文件内容:
+{content}"""
+
+
 @register_tool(
     name="write_file",
     desc="写入文件内容，如果没有必要则不要使用这个tool，而是优先使用replace_file_content或者append_file修改文件",
@@ -140,11 +187,15 @@ def write_file(filepath: str, content: str) -> str:
     """
     file_path = Path(filepath)
     if file_path.exists():
-        validation_error = validate_file(file_path)
-        if validation_error:
+        old_content, validation_error = read_text_file(file_path)
+        if old_content is None:
             return validation_error
+        if old_content == content:
+            # 内容没有变化时不写入，之前的读取结果仍然有效
+            return f"成功写入文件: {file_path.as_posix()!r}"
     try:
         file_path.write_text(content, encoding="utf-8")
+        mark_file_written(file_path)
     except OSError as exc:
         return f"写入文件时发生错误: {exc!r}"
     return f"成功写入文件: {file_path.as_posix()!r}"
@@ -174,9 +225,12 @@ def append_file(filepath: str, content: str) -> str:
         validation_error = validate_file(file_path)
         if validation_error:
             return validation_error
+    if not content and file_path.exists():
+        return f"成功写入文件: {file_path.as_posix()!r}"
     try:
         with file_path.open("a+", encoding="utf-8") as f:
             f.write(content)
+        mark_file_written(file_path)
     except OSError as exc:
         return f"写入文件时发生错误: {exc!r}"
     return f"成功写入文件: {file_path.as_posix()!r}"
@@ -213,15 +267,14 @@ def replace_file_content(
         成功或错误消息
     """
     file_path = Path(filepath)
-    validation_error = validate_file(file_path)
-    if validation_error:
+    content, validation_error = read_text_file(file_path)
+    if content is None:
         return validation_error
     try:
-        content = file_path.read_text(encoding="utf-8")
-        similar_info = json.dumps(
-            find_most_similar_in_files(old, content), indent=2, ensure_ascii=False
-        )
         if old not in content:
+            similar_info = json_backend.dumps(
+                find_most_similar_in_files(old, content), pretty=True
+            )
             return (
                 f"内容{old!r}在文件{file_path.as_posix()!r}中未找到。"
                 f"内容类似的部分如下: {similar_info}"
@@ -230,6 +283,9 @@ def replace_file_content(
         # 检查匹配次数
         count = content.count(old)
         if count > 1 and not replace_all:
+            similar_info = json_backend.dumps(
+                find_most_similar_in_files(old, content), pretty=True
+            )
             return (
                 f"内容{old!r}在文件{file_path.as_posix()!r}中找到{count}次匹配。"
                 f"默认只替换第一次出现，如需替换所有请设置replace_all=True。"
@@ -242,7 +298,9 @@ def replace_file_content(
         else:
             new_content = content.replace(old, new, 1)
 
-        file_path.write_text(new_content, encoding="utf-8")
+        if new_content != content:
+            file_path.write_text(new_content, encoding="utf-8")
+            mark_file_written(file_path)
     except OSError as exc:
         return f"替换内容时发生错误: {exc!r}"
     return f"路径{file_path.as_posix()!r}的文件内容{old!r}已替换为{new!r}，替换次数: {count if replace_all else 1}"
@@ -331,7 +389,7 @@ def run_sed_expression(expression: str, filepath: str) -> str:
     file_path = Path(filepath)
     validation_error = validate_file(file_path)
     if validation_error:
-        return validation_error
+        return ToolFailure(validation_error)
     try:
         # 运行sed命令，不修改文件
         result = subprocess.run(
@@ -342,9 +400,9 @@ def run_sed_expression(expression: str, filepath: str) -> str:
         )
         return result.stdout
     except subprocess.CalledProcessError as exc:
-        return f"sed命令执行错误: {exc.stderr}"
+        return ToolFailure(f"sed命令执行错误: {exc.stderr}")
     except OSError as exc:
-        return f"运行sed时发生错误: {exc!r}"
+        return ToolFailure(f"运行sed时发生错误: {exc!r}")
 
 
 @register_tool(
@@ -367,8 +425,8 @@ def modify_file_with_sed(expression: str, filepath: str) -> str:
         成功或错误消息
     """
     file_path = Path(filepath)
-    validation_error = validate_file(file_path)
-    if validation_error:
+    old_content, validation_error = read_text_file(file_path)
+    if old_content is None:
         return validation_error
     try:
         # 检测操作系统处理-i选项差异
@@ -378,6 +436,9 @@ def modify_file_with_sed(expression: str, filepath: str) -> str:
         else:  # Linux或其他
             cmd = ["sed", "-i", expression, file_path.as_posix()]
         result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        # sed -i总是重写文件，重新读取（同时更新缓存）判断内容是否确实变化
+        if read_text_file(file_path)[0] != old_content:
+            mark_file_written(file_path)
         return f"文件{file_path.as_posix()!r}已使用sed表达式修改"
     except subprocess.CalledProcessError as exc:
         return f"sed命令执行错误: {exc.stderr}"
@@ -414,11 +475,10 @@ def insert_at_line(
         成功或错误消息
     """
     file_path = Path(filepath)
-    validation_error = validate_file(file_path)
-    if validation_error:
+    current_content, validation_error = read_text_file(file_path)
+    if current_content is None:
         return validation_error
     try:
-        current_content = file_path.read_text(encoding="utf-8")
         lines = current_content.splitlines(keepends=True)  # 保留换行符
         num_lines = len(lines)
 
@@ -461,6 +521,235 @@ def insert_at_line(
             new_content = before + content_to_insert + after
 
         file_path.write_text(new_content, encoding="utf-8")
+        mark_file_written(file_path)
         return f"成功在文件{file_path.as_posix()!r}的第{line_number}行插入内容"
     except OSError as exc:
         return f"插入内容时发生错误: {exc!r}"
+
+
+def locate_replacement(
+    file_path: Path, content: str, edit: dict[str, Any]
+) -> list[tuple[int, int, str]] | str:
+    """按修改前的内容定位一个替换，返回(开始, 结束, 新内容)列表或错误消息。"""
+    old, new = edit.get("old"), edit.get("new")
+    if not isinstance(old, str) or not old or not isinstance(new, str):
+        return "替换需要非空字符串old和字符串new"
+    count = content.count(old)
+    if count == 0:
+        similar_info = json_backend.dumps(
+            find_most_similar_in_files(old, content), pretty=True
+        )
+        return (
+            f"内容{old!r}在文件{file_path.as_posix()!r}中未找到。"
+            f"内容类似的部分如下: {similar_info}"
+        )
+    if count > 1 and not edit.get("replace_all", False):
+        return (
+            f"内容{old!r}在文件{file_path.as_posix()!r}中找到{count}次匹配，"
+            "请提供更长的old使其唯一，或设置replace_all=True"
+        )
+    spans = []
+    start = content.find(old)
+    while start != -1:
+        spans.append((start, start + len(old), new))
+        start = content.find(old, start + len(old))
+    return spans
+
+
+def locate_insertion(
+    content: str, lines: list[str], edit: dict[str, Any]
+) -> list[tuple[int, int, str]] | str:
+    """按修改前的内容定位一个插入，规则与insert_at_line相同。"""
+    line_number = edit.get("line_number")
+    text = edit.get("content")
+    expected_line_content = edit.get("expected_line_content")
+    if (
+        not isinstance(line_number, int)
+        or not isinstance(text, str)
+        or not isinstance(expected_line_content, str)
+    ):
+        return "插入需要整数line_number以及字符串content和expected_line_content"
+    num_lines = len(lines)
+    if line_number < 1 or line_number > num_lines + 1:
+        return f"行号{line_number}无效，有效范围是1到{num_lines + 1}"
+    if line_number <= num_lines:
+        current_line = lines[line_number - 1].rstrip("\n")
+        if current_line != expected_line_content:
+            return (
+                f"第{line_number}行内容不匹配：实际内容为'{current_line}'，"
+                f"预期为'{expected_line_content}'"
+            )
+    elif expected_line_content != "":
+        return f"预期行内容不匹配：文件末尾应无内容，但预期为'{expected_line_content}'"
+
+    if not text.endswith("\n"):
+        text += "\n"
+    position = sum(len(line) for line in lines[: line_number - 1])
+    if line_number == num_lines + 1 and content and not content.endswith("\n"):
+        text = "\n" + text
+    return [(position, position, text)]
+
+
+def apply_edits(
+    file_path: Path, content: str, edits: list[tuple[int, dict[str, Any]]]
+) -> tuple[str | None, list[str]]:
+    """
+    在内存中对一个文件应用多个修改
+
+    所有修改都按修改前的内容定位，同一位置的插入按修改的顺序排列在替换之前。
+
+    Args:
+        file_path: 文件路径对象
+        content: 修改前的文件内容
+        edits: (修改的序号, 修改)列表
+
+    Returns:
+        tuple[str | None, list[str]]: 修改后的内容和错误消息，有错误时内容为None
+    """
+    lines = content.splitlines(keepends=True)
+    errors = []
+    # (开始, 是否是替换, 修改的序号, 结束, 新内容)
+    spans: list[tuple[int, bool, int, int, str]] = []
+    for number, edit in edits:
+        if "old" in edit:
+            located = locate_replacement(file_path, content, edit)
+        elif "line_number" in edit:
+            located = locate_insertion(content, lines, edit)
+        else:
+            located = "修改需要提供old和new（替换）或line_number和content（插入）"
+        if isinstance(located, str):
+            errors.append(f"第{number}个修改: {located}")
+            continue
+        spans.extend(
+            (start, end > start, number, end, text) for start, end, text in located
+        )
+    spans.sort()
+
+    previous_end, previous_number = 0, 0
+    for start, _, number, end, _ in spans:
+        if start < previous_end:
+            errors.append(
+                f"第{number}个修改与第{previous_number}个修改在文件"
+                f"{file_path.as_posix()!r}中的范围重叠"
+            )
+        if end >= previous_end:
+            previous_end, previous_number = end, number
+    if errors:
+        return None, errors
+
+    pieces = []
+    position = 0
+    for start, _, _, end, text in spans:
+        pieces.append(content[position:start])
+        pieces.append(text)
+        position = end
+    pieces.append(content[position:])
+    return "".join(pieces), []
+
+
+def write_files_atomically(changes: list[tuple[Path, str, str]]) -> str:
+    """
+    写入多个文件：先把新内容写入同一目录的临时文件，全部成功后再逐个重命名替换原文件
+
+    重命名失败时把已经替换的文件恢复为原内容。
+
+    Args:
+        changes: (文件路径, 原内容, 新内容)列表
+
+    Returns:
+        str: 空字符串表示成功，否则为错误消息
+    """
+    temp_paths: list[str] = []
+    try:
+        for file_path, _, new_content in changes:
+            fd, temp_path = tempfile.mkstemp(
+                dir=file_path.parent, prefix=f".{file_path.name}.", suffix=".tmp"
+            )
+            temp_paths.append(temp_path)
+            with open(fd, "w", encoding="utf-8") as f:
+                f.write(new_content)
+            os.chmod(temp_path, stat.S_IMODE(os.stat(file_path).st_mode))
+    except OSError as exc:
+        for temp_path in temp_paths:
+            Path(temp_path).unlink(missing_ok=True)
+        return f"写入临时文件时发生错误，没有修改任何文件: {exc!r}"
+
+    replaced: list[tuple[Path, str]] = []
+    for (file_path, original, _), temp_path in zip(changes, temp_paths):
+        try:
+            os.replace(temp_path, file_path)
+        except OSError as exc:
+            for temp in temp_paths[len(replaced) :]:
+                Path(temp).unlink(missing_ok=True)
+            for restored_path, restored_content in replaced:
+                restored_path.write_text(restored_content, encoding="utf-8")
+            return (
+                f"替换文件{file_path.as_posix()!r}时发生错误，已恢复所有文件: {exc!r}"
+            )
+        replaced.append((file_path, original))
+    return ""
+
+
+@register_tool(
+    name="batch_edit_files",
+    desc="一次完成多个文件中的多处修改，任何一处修改有错误时不修改任何文件。"
+    "edits中的每一项是一个修改：替换时提供filepath、old、new和可选的replace_all，"
+    "插入时提供filepath、line_number、content和expected_line_content，"
+    "含义与replace_file_content和insert_at_line相同。"
+    "同一文件的所有修改都按修改前的文件内容定位（行号不会因为前面的插入而变化），修改的范围不能重叠。",
+    args={
+        "edits": ToolArgInfo(desc="修改列表，每一项是一个修改对象", type="array"),
+    },
+    required_args=["edits"],
+)
+def batch_edit_files(edits: list[dict[str, Any]]) -> str:
+    """在多个文件中进行多处修改，所有修改都有效时才原子地写入。
+
+    每个文件只读取一次，在内存中应用所有修改并检查冲突，
+    然后写入临时文件并重命名，不会只完成一部分修改。
+
+    Args:
+        edits: 修改列表
+
+    Returns:
+        成功或错误消息
+    """
+    if not isinstance(edits, list) or not edits:
+        return "edits必须是非空的修改列表"
+    # 真实路径 -> (第一次出现的文件路径, [(修改的序号, 修改)])，同一文件的不同路径会合并
+    files: dict[str, tuple[Path, list[tuple[int, dict[str, Any]]]]] = {}
+    errors = []
+    for number, edit in enumerate(edits, 1):
+        if not isinstance(edit, dict) or not isinstance(edit.get("filepath"), str):
+            errors.append(f"第{number}个修改: 修改必须是包含filepath的对象")
+            continue
+        real_path = os.path.realpath(edit["filepath"])
+        files.setdefault(real_path, (Path(edit["filepath"]), []))[1].append(
+            (number, edit)
+        )
+
+    changes: list[tuple[Path, str, str]] = []
+    for real_path, (file_path, file_edits) in files.items():
+        content, validation_error = read_text_file(file_path)
+        if content is None:
+            numbers = "、".join(str(number) for number, _ in file_edits)
+            errors.append(f"第{numbers}个修改: {validation_error}")
+            continue
+        new_content, edit_errors = apply_edits(file_path, content, file_edits)
+        errors.extend(edit_errors)
+        if new_content is not None and new_content != content:
+            # 写入真实路径，保留符号链接
+            changes.append((Path(real_path), content, new_content))
+    if errors:
+        return "没有修改任何文件，以下修改有错误:\n" + "\n".join(errors)
+
+    write_error = write_files_atomically(changes)
+    if write_error:
+        return write_error
+    for file_path, _, _ in changes:
+        mark_file_written(file_path)
+    summary = "\n".join(
+        f"{file_path.as_posix()}: {len(file_edits)}处修改"
+        for file_path, file_edits in files.values()
+    )
+    return f"成功完成{len(edits)}处修改，涉及{len(files)}个文件:\n{summary}"
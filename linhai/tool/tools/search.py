@@ -0,0 +1,104 @@
+"""代码搜索工具模块，不通过shell直接在进程内搜索文件内容。"""
+
+import asyncio
+import os
+import re
+
+from linhai.tool.base import register_tool, ToolArgInfo
+from linhai.tool.code_search import (
+    DEFAULT_MAX_PER_FILE,
+    DEFAULT_MAX_RESULTS,
+    SearchResult,
+    compile_pattern,
+    search_code as run_search,
+)
+
+
+def format_search_result(pattern: str, path: str, result: SearchResult) -> str:
+    """把搜索结果格式化为按文件分组、带行号的文本。"""
+    summary = (
+        f"在{path!r}中搜索{pattern!r}：搜索了{result['files_searched']}个文件，"
+        f"{len(result['files'])}个文件中有{result['match_count']}处匹配"
+    )
+    if result["timed_out"]:
+        summary += "。搜索超时，结果不完整"
+    elif result["truncated"]:
+        summary += "。已达到匹配数量上限，结果不完整，可以缩小搜索范围"
+    lines = [summary]
+    for file_matches in result["files"]:
+        lines.append(file_matches["path"])
+        lines.extend(
+            f"  {line_number}: {line}" for line_number, line in file_matches["matches"]
+        )
+        if file_matches["truncated"]:
+            lines.append("  ...（这个文件中还有更多匹配）")
+    return "\n".join(lines)
+
+
+@register_tool(
+    name="search_code",
+    desc="在目录中搜索匹配正则表达式的代码行，自动跳过.git目录、.gitignore忽略的文件和二进制文件，"
+    "结果按文件分组并带有行号。搜索代码时优先使用这个工具而不是通过命令运行grep。",
+    args={
+        "pattern": ToolArgInfo(
+            desc="正则表达式，或fixed_string为True时的普通字符串", type="str"
+        ),
+        "path": ToolArgInfo(desc="搜索的目录或文件，默认为当前目录", type="str"),
+        "glob": ToolArgInfo(
+            desc="只搜索文件名匹配这个通配符的文件，如'*.py'", type="str"
+        ),
+        "fixed_string": ToolArgInfo(desc="是否把pattern当作普通字符串", type="bool"),
+        "ignore_case": ToolArgInfo(desc="是否忽略大小写", type="bool"),
+        "max_results": ToolArgInfo(
+            desc=f"最多返回的匹配数量，默认{DEFAULT_MAX_RESULTS}", type="int"
+        ),
+        "max_per_file": ToolArgInfo(
+            desc=f"每个文件最多返回的匹配数量，默认{DEFAULT_MAX_PER_FILE}", type="int"
+        ),
+    },
+    required_args=["pattern"],
+)
+async def search_code(
+    pattern: str,
+    path: str = ".",
+    glob: str | None = None,
+    fixed_string: bool = False,
+    ignore_case: bool = False,
+    max_results: int = DEFAULT_MAX_RESULTS,
+    max_per_file: int = DEFAULT_MAX_PER_FILE,
+) -> str:
+    """在目录中搜索代码。
+
+    搜索最多持续DEFAULT_TIME_BUDGET秒，在线程中运行，不阻塞事件循环。
+
+    Args:
+        pattern: 正则表达式或普通字符串
+        path: 搜索的目录或文件
+        glob: 文件名通配符
+        fixed_string: 是否把pattern当作普通字符串
+        ignore_case: 是否忽略大小写
+        max_results: 最多返回的匹配数量
+        max_per_file: 每个文件最多返回的匹配数量
+
+    Returns:
+        搜索结果或错误消息
+    """
+    try:
+        regex = compile_pattern(pattern, fixed_string, ignore_case)
+    except re.error as exc:
+        return f"正则表达式{pattern!r}无效: {exc}"
+    if not os.path.exists(path):
+        return f"路径{path!r}不存在"
+    if max_results < 1 or max_per_file < 1:
+        return "max_results和max_per_file必须大于0"
+    result = await asyncio.to_thread(
+        run_search,
+        regex,
+        path,
+        glob,
+        max_results=max_results,
+        max_per_file=max_per_file,
+    )
+    if not result["files_searched"] and not result["timed_out"]:
+        return f"路径{path!r}中没有可以搜索的文件"
+    return format_search_result(pattern, path, result)
@@ -0,0 +1,171 @@
+"""符号工具模块，通过符号索引查找和读取定义。"""
+
+from pathlib import Path
+import asyncio
+import os
+
+from linhai.tool.base import register_tool, ToolArgInfo
+from linhai.tool.file_range import read_line_range
+from linhai.tool.symbol_index import Symbol, SymbolIndex, get_symbol_index
+
+# find_symbol最多列出的定义和引用数量
+MAX_SYMBOL_RESULTS = 50
+# read_symbol最多读取的定义数量，更多时只列出定义的位置
+MAX_READ_SYMBOLS = 3
+
+SYMBOL_KINDS = ("class", "function", "method", "variable")
+
+
+def symbol_location(root: str, symbol: Symbol) -> str:
+    """返回定义的位置，路径相对于当前目录，可以直接传给read_file。"""
+    path = os.path.relpath(os.path.join(root, symbol["path"]))
+    return f"{path}:{symbol['start_line']}-{symbol['end_line']}"
+
+
+def find_definitions(
+    name: str, path: str, kind: str | None
+) -> tuple[SymbolIndex | None, list[Symbol], str]:
+    """更新索引并查找定义，返回索引、定义和错误消息。"""
+    if kind is not None and kind not in SYMBOL_KINDS:
+        return None, [], f"kind必须是{'、'.join(SYMBOL_KINDS)}之一"
+    if not os.path.isdir(path):
+        return None, [], f"路径{path!r}不是目录"
+    index = get_symbol_index(path)
+    symbols = index.find(name, kind)
+    if not symbols:
+        return index, [], f"在{path!r}中没有找到{name!r}的定义"
+    return index, symbols, ""
+
+
+@register_tool(
+    name="find_symbol",
+    desc="在目录的符号索引中查找类、函数、方法或模块级变量的定义位置（文件和行范围），"
+    "可以同时列出名称被引用的位置。目前支持Python文件。",
+    args={
+        "name": ToolArgInfo(desc="名称，可以带类名，如'Agent.run'", type="str"),
+        "path": ToolArgInfo(desc="索引的目录，默认为当前目录", type="str"),
+        "kind": ToolArgInfo(
+            desc="只查找这种定义：class、function、method或variable", type="str"
+        ),
+        "include_references": ToolArgInfo(desc="是否列出引用的位置", type="bool"),
+    },
+    required_args=["name"],
+)
+async def find_symbol(
+    name: str,
+    path: str = ".",
+    kind: str | None = None,
+    include_references: bool = False,
+) -> str:
+    """查找定义的位置。
+
+    更新索引需要遍历和解析文件，在线程中运行，不阻塞事件循环。
+
+    Args:
+        name: 名称
+        path: 索引的目录
+        kind: 定义的类型
+        include_references: 是否列出引用的位置
+
+    Returns:
+        定义的位置或错误消息
+    """
+    return await asyncio.to_thread(
+        format_symbol_locations, name, path, kind, include_references
+    )
+
+
+def format_symbol_locations(
+    name: str, path: str, kind: str | None, include_references: bool
+) -> str:
+    """更新索引，返回定义和引用的位置或错误消息。"""
+    index, symbols, error = find_definitions(name, path, kind)
+    if index is None or (error and not include_references):
+        return error
+    root = index.root
+    lines = [error] if error else [f"找到{len(symbols)}个{name!r}的定义:"]
+    lines.extend(
+        f"{symbol_location(root, symbol)} {symbol['kind']} {symbol['qualname']}"
+        for symbol in symbols[:MAX_SYMBOL_RESULTS]
+    )
+    if len(symbols) > MAX_SYMBOL_RESULTS:
+        lines.append(f"...（只显示前{MAX_SYMBOL_RESULTS}个）")
+    if include_references:
+        references = index.references(name)
+        lines.append(f"引用（共{len(references)}处）:")
+        lines.extend(
+            f"{os.path.relpath(os.path.join(root, file_path))}:{line}"
+            for file_path, line in references[:MAX_SYMBOL_RESULTS]
+        )
+        if len(references) > MAX_SYMBOL_RESULTS:
+            lines.append(f"...（只显示前{MAX_SYMBOL_RESULTS}处）")
+    return "\n".join(lines)
+
+
+@register_tool(
+    name="read_symbol",
+    desc="只读取类、函数、方法或模块级变量的定义代码（带行号），不需要读取整个文件。"
+    "名称有多个定义时可以带上类名或指定kind。目前支持Python文件。",
+    args={
+        "name": ToolArgInfo(desc="名称，可以带类名，如'Agent.run'", type="str"),
+        "path": ToolArgInfo(desc="索引的目录，默认为当前目录", type="str"),
+        "kind": ToolArgInfo(
+            desc="只读取这种定义：class、function、method或variable", type="str"
+        ),
+    },
+    required_args=["name"],
+)
+async def read_symbol(name: str, path: str = ".", kind: str | None = None) -> str:
+    """读取定义的代码。
+
+    更新索引需要遍历和解析文件，在线程中运行，不阻塞事件循环。
+
+    Args:
+        name: 名称
+        path: 索引的目录
+        kind: 定义的类型
+
+    Returns:
+        定义的代码或错误消息
+    """
+    return await asyncio.to_thread(format_symbol_code, name, path, kind)
+
+
+def format_symbol_code(name: str, path: str, kind: str | None) -> str:
+    """更新索引，返回定义的代码或错误消息。"""
+    index, symbols, error = find_definitions(name, path, kind)
+    if index is None or error:
+        return error
+    root = index.root
+    if len(symbols) > MAX_READ_SYMBOLS:
+        locations = "\n".join(
+            f"{symbol_location(root, symbol)} {symbol['kind']} {symbol['qualname']}"
+            for symbol in symbols[:MAX_SYMBOL_RESULTS]
+        )
+        return (
+            f"{name!r}有{len(symbols)}个定义，请带上类名、指定kind，"
+            f"或用read_file读取其中一个:\n{locations}"
+        )
+    parts = []
+    for symbol in symbols:
+        file_path = Path(os.path.relpath(os.path.join(root, symbol["path"])))
+        lines, _, _, note = read_line_range(
+            file_path, symbol["start_line"], symbol["end_line"]
+        )
+        if lines is None:
+            parts.append(note)
+            continue
+        description = (
+            f"{symbol['kind']} {symbol['qualname']}"
+            f"（第{symbol['start_line']}-{symbol['end_line']}行）"
+        )
+        if note:
+            description += f"，{note}"
+        numbered_lines = "\n".join(
+            f"{symbol['start_line'] + i}: {line}" for i, line in enumerate(lines)
+        )
+        parts.append(f"""\
+文件路径为: {file_path.as_posix()!r}
+{description}，内容如下，不要复读文件内容:
+{numbered_lines}""")
+    return "\n\n".join(parts)
@@ -1,14 +1,17 @@
 """文件操作工具的单元测试"""
 
 import unittest
+import unittest.mock
 import tempfile
 import os
+import shutil
 from pathlib import Path
 
 # 导入要测试的工具
 import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from linhai.tool.base import ToolFailure
 from linhai.tool.tools.file import (
     read_file,
     write_file,
@@ -17,6 +20,7 @@ from linhai.tool.tools.file import (
     list_files,
     get_absolute_path,
     insert_at_line,
+    batch_edit_files,
 )
 
 
@@ -41,7 +45,6 @@ class TestFileTools(unittest.TestCase):
 
     def tearDown(self):
         """测试后清理"""
-        import shutil
         if os.path.exists(self.temp_dir):
             shutil.rmtree(self.temp_dir)
 
@@ -57,6 +60,66 @@ class TestFileTools(unittest.TestCase):
         self.assertIn("1: 第一行内容", result)
         self.assertIn("2: 第二行内容", result)
 
+    def test_read_file_line_range(self):
+        """测试按行范围读取文件"""
+        result = read_file(
+            str(self.test_file), show_line_numbers=True, start_line=2, end_line=3
+        )
+        self.assertIn("第2-3行（共7行）", result)
+        self.assertIn("2: 第二行内容\n3: 第三行内容", result)
+        self.assertNotIn("第一行内容", result)
+
+    def test_read_file_tail(self):
+        """测试只读取最后几行"""
+        result = read_file(str(self.test_file), tail_lines=2)
+        self.assertIn("第6-7行（共7行）", result)
+        self.assertTrue(result.endswith("重复内容\n最后一行内容"))
+
+    def test_read_file_byte_range(self):
+        """测试按字节范围读取文件"""
+        result = read_file(str(self.test_file), byte_offset=0, byte_count=15)
+        self.assertIn("第0-15字节", result)
+        self.assertTrue(result.endswith("第一行内容"))
+
+        result = read_file(str(self.test_file), byte_offset=-6)
+        self.assertTrue(result.endswith("内容"))
+
+    def test_read_file_conflicting_ranges(self):
+        """测试同时指定多种范围时返回错误"""
+        result = read_file(str(self.test_file), start_line=1, tail_lines=2)
+        self.assertIn("只能指定一种", result)
+
+    def test_read_file_failures_are_reported(self):
+        """测试读取失败时返回ToolFailure，成功时返回普通字符串"""
+        self.assertNotIsInstance(read_file(str(self.test_file)), ToolFailure)
+        missing = str(Path(self.temp_dir) / "missing.txt")
+        for result in (
+            read_file(missing),
+            read_file(missing, tail_lines=1),
+            read_file(missing, byte_offset=0),
+            read_file(self.temp_dir),
+        ):
+            self.assertIsInstance(result, ToolFailure)
+
+    def test_read_file_large_file_range(self):
+        """测试超过1MB的文件可以按范围读取"""
+        large_file = Path(self.temp_dir) / "large.log"
+        large_file.write_text(
+            "".join(f"line {i}\n" for i in range(200_000)), encoding="utf-8"
+        )
+
+        result = read_file(str(large_file))
+        self.assertIn("超过1MB限制", result)
+        self.assertIn("tail_lines", result)
+
+        result = read_file(str(large_file), tail_lines=1, show_line_numbers=True)
+        self.assertIn("最后1行", result)
+        self.assertTrue(result.endswith("-1: line 199999"))
+        result = read_file(str(large_file), start_line=150_000, end_line=150_001)
+        self.assertTrue(result.endswith("line 149999\nline 150000"))
+        result = read_file(str(large_file), tail_lines=1)
+        self.assertIn("第200000-200000行（共200000行）", result)
+
     def test_write_file(self):
         """测试写入文件"""
         new_content = "新的文件内容"
@@ -173,5 +236,141 @@ class TestFileTools(unittest.TestCase):
         self.assertEqual(lines[3], "第三行内容")  # 原来的第3行现在应该是第4行
 
 
+class TestBatchEditFiles(unittest.TestCase):
+    """批量修改工具测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.file_a = Path(self.temp_dir) / "a.py"
+        self.file_b = Path(self.temp_dir) / "b.py"
+        self.file_a.write_text(
+            "import os\n\ndef old_name():\n    return 1\n", encoding="utf-8"
+        )
+        self.file_b.write_text("from a import old_name\nold_name()\n", encoding="utf-8")
+
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_edits_across_files(self):
+        """测试一次修改多个文件的多处内容，行号按修改前的内容定位"""
+        result = batch_edit_files(
+            [
+                {"filepath": str(self.file_a), "old": "old_name", "new": "new_name"},
+                {
+                    "filepath": str(self.file_a),
+                    "line_number": 1,
+                    "content": "import sys",
+                    "expected_line_content": "import os",
+                },
+                {
+                    "filepath": str(self.file_a),
+                    "line_number": 3,
+                    "content": "# 新函数",
+                    "expected_line_content": "def old_name():",
+                },
+                {
+                    "filepath": str(self.file_b),
+                    "old": "old_name",
+                    "new": "new_name",
+                    "replace_all": True,
+                },
+            ]
+        )
+
+        self.assertIn("成功完成4处修改，涉及2个文件", result)
+        self.assertEqual(
+            self.file_a.read_text(encoding="utf-8"),
+            "import sys\nimport os\n\n# 新函数\ndef new_name():\n    return 1\n",
+        )
+        self.assertEqual(
+            self.file_b.read_text(encoding="utf-8"),
+            "from a import new_name\nnew_name()\n",
+        )
+        # 临时文件都已重命名
+        self.assertEqual(
+            sorted(p.name for p in Path(self.temp_dir).iterdir()),
+            ["a.py", "b.py"],
+        )
+
+    def test_error_leaves_all_files_unchanged(self):
+        """测试任何一处修改有错误时不修改任何文件"""
+        original_a = self.file_a.read_text(encoding="utf-8")
+        original_b = self.file_b.read_text(encoding="utf-8")
+        result = batch_edit_files(
+            [
+                {"filepath": str(self.file_a), "old": "old_name", "new": "new_name"},
+                {"filepath": str(self.file_b), "old": "old_name", "new": "new_name"},
+                {"filepath": str(self.file_b), "old": "missing", "new": "x"},
+            ]
+        )
+
+        self.assertIn("没有修改任何文件", result)
+        self.assertIn("第2个修改", result)  # b.py中old_name出现了两次
+        self.assertIn("第3个修改", result)
+        self.assertEqual(self.file_a.read_text(encoding="utf-8"), original_a)
+        self.assertEqual(self.file_b.read_text(encoding="utf-8"), original_b)
+
+    def test_overlapping_edits_conflict(self):
+        """测试同一文件中范围重叠的修改被拒绝"""
+        result = batch_edit_files(
+            [
+                {"filepath": str(self.file_a), "old": "def old_name", "new": "def f"},
+                {"filepath": str(self.file_a), "old": "old_name():", "new": "g():"},
+            ]
+        )
+        self.assertIn("第2个修改与第1个修改", result)
+        self.assertIn("范围重叠", result)
+        self.assertIn("def old_name", self.file_a.read_text(encoding="utf-8"))
+
+    def test_same_file_through_different_paths(self):
+        """测试同一文件的不同路径被合并为一次读取和写入"""
+        other_path = os.path.join(self.temp_dir, ".", "a.py")
+        result = batch_edit_files(
+            [
+                {"filepath": str(self.file_a), "old": "import os", "new": "import re"},
+                {"filepath": other_path, "old": "return 1", "new": "return 2"},
+            ]
+        )
+        self.assertIn("涉及1个文件", result)
+        content = self.file_a.read_text(encoding="utf-8")
+        self.assertIn("import re", content)
+        self.assertIn("return 2", content)
+
+    def test_failed_rename_restores_files(self):
+        """测试重命名失败时恢复已经替换的文件"""
+        original_a = self.file_a.read_text(encoding="utf-8")
+        original_b = self.file_b.read_text(encoding="utf-8")
+        real_replace = os.replace
+        calls = []
+
+        def failing_replace(src, dst):
+            calls.append(dst)
+            if len(calls) == 2:
+                raise OSError("disk full")
+            real_replace(src, dst)
+
+        with unittest.mock.patch("os.replace", failing_replace):
+            result = batch_edit_files(
+                [
+                    {
+                        "filepath": str(self.file_a),
+                        "old": "import os",
+                        "new": "import re",
+                    },
+                    {"filepath": str(self.file_b), "old": "()\n", "new": "(1)\n"},
+                ]
+            )
+
+        self.assertIn("已恢复所有文件", result)
+        self.assertEqual(self.file_a.read_text(encoding="utf-8"), original_a)
+        self.assertEqual(self.file_b.read_text(encoding="utf-8"), original_b)
+        self.assertEqual(
+            sorted(p.name for p in Path(self.temp_dir).iterdir()),
+            ["a.py", "b.py"],
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file